@@ -0,0 +1,50 @@
+# scripts/archivar_precios.py
+"""
+Rollover del historial de precios a las particiones anuales de archivo.
+
+Uso:
+    python scripts/archivar_precios.py                # retención de 12 meses
+    python scripts/archivar_precios.py --meses 6
+    python scripts/archivar_precios.py --listar
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Añadir el directorio src al path
+src_dir = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from bvc_gestor.database.engine import get_database
+from bvc_gestor.database.archivo_precios import ArchivoPrecios, MESES_RETENCION_POR_DEFECTO
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivar historial de precios")
+    parser.add_argument("--meses", type=int, default=MESES_RETENCION_POR_DEFECTO,
+                        help="Meses de historial que se quedan en la base principal")
+    parser.add_argument("--listar", action="store_true",
+                        help="Solo listar las particiones existentes")
+    args = parser.parse_args()
+
+    db_engine = get_database()
+    db_engine.asegurar_esquema()
+    archivo = ArchivoPrecios(db_engine)
+
+    if not args.listar:
+        movidas = archivo.archivar(meses_retencion=args.meses)
+        total = sum(movidas.values())
+        print(f"Precios archivados: {total:,}")
+        for anio, filas in sorted(movidas.items()):
+            print(f"  {anio}: {filas:,}")
+
+    print("\nParticiones:")
+    for anio in archivo.particiones():
+        ruta = archivo.ruta_particion(anio)
+        print(f"  {ruta.name}  ({ruta.stat().st_size / (1024 * 1024):.1f} MB)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
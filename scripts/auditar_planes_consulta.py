@@ -0,0 +1,345 @@
+# scripts/auditar_planes_consulta.py
+"""
+Auditoría de planes de consulta de los repositorios.
+
+Ejecuta los métodos de BaseRepository, OrdenRepository, SaldoRepository y
+PortafolioRepository contra una base sintética poblada (o una copia de una
+base real), captura cada sentencia SQL emitida y la pasa por
+EXPLAIN QUERY PLAN. Se marcan:
+
+- scan:          recorrido completo de una tabla (SCAN tabla)
+- temp_btree:    B-tree temporal para ORDER BY / GROUP BY / DISTINCT
+- scan_indice:   recorrido completo de un índice (aviso)
+- sin_cobertura: búsqueda por índice no cubriente (aviso)
+- error:         el método no emitió SQL o registró un error
+
+El reporte se guarda en JSON. Si aparece un hallazgo de tipo 'scan' o
+'temp_btree' que no está en la línea base, el script termina con código 1.
+
+Uso:
+    python scripts/auditar_planes_consulta.py
+    python scripts/auditar_planes_consulta.py --db data/database/bvc_gestor.db
+    python scripts/auditar_planes_consulta.py --actualizar-base
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Añadir el directorio src al path
+src_dir = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from sqlalchemy import event
+
+from bvc_gestor.database.engine import DatabaseEngine
+from bvc_gestor.repositories.base_repository import BaseRepository
+from bvc_gestor.repositories.orden_repository import OrdenRepository
+from bvc_gestor.repositories.portafolio_repository import PortafolioRepository
+from bvc_gestor.repositories.saldo_repository import SaldoRepository
+from bvc_gestor.utils.constants import EstadoOrden, TipoOrden, REPORTS_DIR
+
+from datos_sinteticos import NUM_CLIENTES, poblar
+
+RUTA_BASE = Path(__file__).parent / "planes_consulta_base.json"
+RUTA_REPORTE = REPORTS_DIR / "auditoria_planes_consulta.json"
+
+TIPOS_QUE_FALLAN = ("scan", "temp_btree")
+
+_RE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?(?: USING (COVERING )?INDEX (\w+))?")
+_RE_SEARCH = re.compile(r"^SEARCH (\w+)(?: AS \w+)? USING (COVERING )?INDEX (\w+)")
+_RE_TEMP = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|(?:RIGHT PART OF|LAST TERM OF) ORDER BY)")
+
+
+# ==================== ESCENARIOS ====================
+
+def escenarios(repos: dict) -> list:
+    """(nombre, llamada) por cada consulta de los repositorios"""
+    orden = repos["orden"]
+    portafolio = repos["portafolio"]
+    saldo = repos["saldo"]
+    desde = datetime.now() - timedelta(days=90)
+    
+    lista = []
+    
+    # Operaciones genéricas de BaseRepository sobre cada repositorio
+    for nombre, repo in repos.items():
+        lista += [
+            (f"{nombre}.get_by_id", lambda r=repo: r.get_by_id(1, use_cache=False)),
+            (f"{nombre}.get_all", lambda r=repo: r.get_all({"estatus": True})),
+            (f"{nombre}.exists", lambda r=repo: r.exists(1)),
+            (f"{nombre}.count", lambda r=repo: r.count({"estatus": True})),
+            (f"{nombre}.find_one", lambda r=repo: r.find_one(id=1)),
+            (f"{nombre}.find_many", lambda r=repo: r.find_many(limit=50, order_by="-fecha_registro", estatus=True)),
+            (f"{nombre}.find_pagina", lambda r=repo: r.find_pagina(
+                limit=50, cursor=r.find_pagina(limit=50)["cursor"], contar=True)),
+            (f"{nombre}.update", lambda r=repo: r.update(2, {"estatus": True})),
+            (f"{nombre}.bulk_update", lambda r=repo: r.bulk_update([{"id": 3, "estatus": True}])),
+            (f"{nombre}.delete", lambda r=repo: r.delete(NUM_CLIENTES)),
+        ]
+    
+    lista += [
+        ("orden.get_ordenes_por_cliente", lambda: orden.get_ordenes_por_cliente(1)),
+        ("orden.get_ordenes_por_cliente[activas]", lambda: orden.get_ordenes_por_cliente(1, activas_solo=True, limit=20)),
+        ("orden.get_ordenes_por_cliente_pagina", lambda: orden.get_ordenes_por_cliente_pagina(
+            1, limit=5, cursor=orden.get_ordenes_por_cliente_pagina(1, limit=5)["cursor"], contar=True)),
+        ("orden.get_ordenes_recientes", lambda: orden.get_ordenes_recientes(30, limit=50)),
+        ("orden.get_ordenes_recientes[cliente]", lambda: orden.get_ordenes_recientes(30, cliente_id=1, limit=10)),
+        ("orden.get_ordenes_pendientes_por_cuenta", lambda: orden.get_ordenes_pendientes_por_cuenta(1)),
+        ("orden.get_estadisticas_ordenes", lambda: orden.get_estadisticas_ordenes()),
+        ("orden.get_estadisticas_ordenes[cliente]", lambda: orden.get_estadisticas_ordenes(1)),
+        ("orden.buscar_ordenes", lambda: orden.buscar_ordenes()),
+        ("orden.buscar_ordenes[cliente]", lambda: orden.buscar_ordenes(cliente_id=1)),
+        ("orden.buscar_ordenes[filtros]", lambda: orden.buscar_ordenes(
+            ticker="T00", tipo=TipoOrden.COMPRA, estado=EstadoOrden.PENDIENTE,
+            fecha_desde=desde, fecha_hasta=datetime.now())),
+        ("orden.buscar_ordenes_pagina", lambda: orden.buscar_ordenes_pagina(
+            limit=100, cursor=orden.buscar_ordenes_pagina(limit=100)["cursor"], contar=True)),
+        ("orden.buscar_ordenes_pagina[cliente]", lambda: orden.buscar_ordenes_pagina(
+            cliente_id=1, limit=5, cursor=orden.buscar_ordenes_pagina(cliente_id=1, limit=5)["cursor"])),
+        ("orden.get_orden_completa", lambda: orden.get_orden_completa(1)),
+        ("orden.cambiar_estado_orden", lambda: orden.cambiar_estado_orden(4, EstadoOrden.PENDIENTE)),
+        ("orden.cancelar_orden", lambda: orden.cancelar_orden(5, "auditoría")),
+        ("portafolio.get_portafolio_cuenta", lambda: portafolio.get_portafolio_cuenta(1)),
+        ("portafolio.get_resumen_portafolio", lambda: portafolio.get_resumen_portafolio(1)),
+        ("portafolio.get_posicion_ticker", lambda: portafolio.get_posicion_ticker(1, 1)),
+        ("portafolio.get_portafolio_cliente", lambda: portafolio.get_portafolio_cliente(1)),
+        ("saldo.get_saldo_cuenta", lambda: saldo.get_saldo_cuenta(1)),
+        ("saldo.actualizar_saldo", lambda: saldo.actualizar_saldo(1, disponible=1000)),
+        ("saldo.agregar_deposito", lambda: saldo.agregar_deposito(1, 10)),
+        ("saldo.bloquear_fondos", lambda: saldo.bloquear_fondos(1, 5)),
+        ("saldo.liberar_fondos", lambda: saldo.liberar_fondos(1, 5)),
+        ("saldo.get_saldos_cliente", lambda: saldo.get_saldos_cliente(1)),
+    ]
+    return lista
+
+
+# ==================== CAPTURA ====================
+
+class CapturaSQL:
+    """Sentencias emitidas por escenario (listener before_cursor_execute)"""
+    
+    def __init__(self):
+        self.escenario = None
+        self.sentencias = {}
+    
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.escenario is None:
+            return
+        sql = statement.strip()
+        if not re.match(r"^(SELECT|UPDATE|DELETE|INSERT|WITH)\b", sql, re.IGNORECASE):
+            return
+        if executemany and parameters:
+            parameters = parameters[0]
+        lista = self.sentencias.setdefault(self.escenario, [])
+        if all(sql != s for s, _ in lista):
+            lista.append((sql, tuple(parameters or ())))
+
+
+class CapturaErrores(logging.Handler):
+    """Errores registrados por los repositorios durante un escenario"""
+    
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.mensajes = []
+    
+    def emit(self, record):
+        self.mensajes.append(record.getMessage())
+
+
+# ==================== ANÁLISIS ====================
+
+def analizar_plan(filas) -> list:
+    """Hallazgos a partir de las filas de EXPLAIN QUERY PLAN"""
+    hallazgos = []
+    for _, _, _, detalle in filas:
+        m = _RE_SCAN.match(detalle)
+        if m:
+            tabla, _, indice = m.groups()
+            if indice:
+                hallazgos.append({"tipo": "scan_indice", "tabla": tabla, "indice": indice, "detalle": detalle})
+            else:
+                hallazgos.append({"tipo": "scan", "tabla": tabla, "detalle": detalle})
+            continue
+        
+        m = _RE_SEARCH.match(detalle)
+        if m and not m.group(2) and "PRIMARY KEY" not in detalle:
+            hallazgos.append({"tipo": "sin_cobertura", "tabla": m.group(1),
+                              "indice": m.group(3), "detalle": detalle})
+            continue
+        
+        m = _RE_TEMP.search(detalle)
+        if m:
+            hallazgos.append({"tipo": "temp_btree", "tabla": None, "detalle": detalle})
+    
+    return hallazgos
+
+
+def clave_hallazgo(escenario: str, hallazgo: dict) -> str:
+    """Identificador estable para comparar con la línea base"""
+    return f"{escenario}|{hallazgo['tipo']}|{hallazgo['tabla'] or hallazgo['detalle']}"
+
+
+def auditar(ruta_db: Path) -> dict:
+    """Ejecuta los escenarios y explica cada sentencia capturada"""
+    motor = DatabaseEngine.crear_aislado(ruta_db)
+    motor.asegurar_esquema()
+    
+    captura = CapturaSQL()
+    errores = CapturaErrores()
+    event.listen(motor.engine, "before_cursor_execute", captura)
+    event.listen(motor.read_engine, "before_cursor_execute", captura)
+    logging.getLogger("bvc_gestor.repositories").addHandler(errores)
+    
+    repos = {
+        "orden": OrdenRepository(motor),
+        "portafolio": PortafolioRepository(motor),
+        "saldo": SaldoRepository(motor),
+    }
+    
+    reporte = {"generado": datetime.now().isoformat(), "base_datos": str(ruta_db), "escenarios": {}}
+    try:
+        for nombre, llamada in escenarios(repos):
+            captura.escenario = nombre
+            errores.mensajes = []
+            llamada()
+            captura.escenario = None
+            reporte["escenarios"][nombre] = {"errores": list(errores.mensajes), "sentencias": []}
+    finally:
+        logging.getLogger("bvc_gestor.repositories").removeHandler(errores)
+        motor.cerrar()
+    
+    # EXPLAIN sobre una conexión propia, fuera del pool
+    conexion = sqlite3.connect(str(ruta_db))
+    try:
+        for nombre, datos in reporte["escenarios"].items():
+            for sql, parametros in captura.sentencias.get(nombre, []):
+                try:
+                    filas = conexion.execute(f"EXPLAIN QUERY PLAN {sql}", parametros).fetchall()
+                except sqlite3.Error as e:
+                    datos["errores"].append(f"EXPLAIN falló: {e}")
+                    continue
+                datos["sentencias"].append({
+                    "sql": sql,
+                    "plan": [fila[3] for fila in filas],
+                    "hallazgos": analizar_plan(filas),
+                })
+            if not datos["sentencias"] and not datos["errores"]:
+                datos["errores"].append("No se emitió ninguna sentencia SQL")
+    finally:
+        conexion.close()
+    
+    return reporte
+
+
+def comparar_con_base(reporte: dict, base: set) -> list:
+    """Hallazgos bloqueantes que no están en la línea base"""
+    nuevos = []
+    for nombre, datos in reporte["escenarios"].items():
+        for sentencia in datos["sentencias"]:
+            for hallazgo in sentencia["hallazgos"]:
+                if hallazgo["tipo"] not in TIPOS_QUE_FALLAN:
+                    continue
+                clave = clave_hallazgo(nombre, hallazgo)
+                if clave not in base:
+                    nuevos.append(clave)
+    return sorted(set(nuevos))
+
+
+def claves_reporte(reporte: dict) -> list:
+    """Claves bloqueantes del reporte (para guardar como línea base)"""
+    return sorted({
+        clave_hallazgo(nombre, h)
+        for nombre, datos in reporte["escenarios"].items()
+        for sentencia in datos["sentencias"]
+        for h in sentencia["hallazgos"]
+        if h["tipo"] in TIPOS_QUE_FALLAN
+    })
+
+
+def preparar_base_datos(args, directorio: Path) -> Path:
+    """Copia de la base indicada o base sintética poblada, con ANALYZE"""
+    destino = directorio / "auditoria.db"
+    
+    if args.db:
+        # Copia consistente con la API de backup (la auditoría escribe)
+        origen = sqlite3.connect(f"file:{Path(args.db).as_posix()}?mode=ro", uri=True)
+        copia = sqlite3.connect(str(destino))
+        origen.backup(copia)
+        origen.close()
+        copia.close()
+    else:
+        motor = DatabaseEngine.crear_aislado(destino, perfil="bulk-load")
+        motor.asegurar_esquema()
+        poblar(motor.engine, args.ordenes, args.precios, random.Random(args.semilla),
+               con_posiciones=True)
+        motor.cerrar()
+    
+    # Estadísticas para que el planificador elija como en producción
+    conexion = sqlite3.connect(str(destino))
+    conexion.execute("ANALYZE")
+    conexion.close()
+    return destino
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auditoría de planes de consulta")
+    parser.add_argument("--db", type=Path, help="Base real a copiar (por defecto: sintética)")
+    parser.add_argument("--ordenes", type=int, default=50000)
+    parser.add_argument("--precios", type=int, default=50000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", type=Path, default=RUTA_REPORTE)
+    parser.add_argument("--base", type=Path, default=RUTA_BASE,
+                        help="Línea base de hallazgos aceptados")
+    parser.add_argument("--actualizar-base", action="store_true",
+                        help="Aceptar los hallazgos actuales como línea base")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(prefix="bvc_planes_") as tmp:
+        ruta_db = preparar_base_datos(args, Path(tmp))
+        reporte = auditar(ruta_db)
+    
+    base = set(json.loads(args.base.read_text(encoding="utf-8"))) if args.base.exists() else set()
+    nuevos = comparar_con_base(reporte, base)
+    reporte["nuevos_hallazgos"] = nuevos
+    
+    args.salida.parent.mkdir(parents=True, exist_ok=True)
+    args.salida.write_text(json.dumps(reporte, indent=2, ensure_ascii=False), encoding="utf-8")
+    
+    # Resumen en consola
+    conteo = {}
+    for datos in reporte["escenarios"].values():
+        for sentencia in datos["sentencias"]:
+            for h in sentencia["hallazgos"]:
+                conteo[h["tipo"]] = conteo.get(h["tipo"], 0) + 1
+    con_error = [n for n, d in reporte["escenarios"].items() if d["errores"]]
+    
+    print(f"Escenarios: {len(reporte['escenarios'])} | Hallazgos: {conteo}")
+    if con_error:
+        print(f"Escenarios con errores ({len(con_error)}): {', '.join(con_error)}")
+    print(f"Reporte: {args.salida}")
+    
+    if args.actualizar_base:
+        args.base.write_text(json.dumps(claves_reporte(reporte), indent=2, ensure_ascii=False) + "\n",
+                             encoding="utf-8")
+        print(f"Línea base actualizada: {args.base}")
+        return 0
+    
+    if nuevos:
+        print(f"\n✗ {len(nuevos)} hallazgo(s) nuevo(s) respecto a la línea base:")
+        for clave in nuevos:
+            print(f"  {clave}")
+        return 1
+    
+    print("✓ Sin hallazgos nuevos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
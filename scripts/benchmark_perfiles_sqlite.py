@@ -0,0 +1,145 @@
+# scripts/benchmark_perfiles_sqlite.py
+"""
+Benchmark de perfiles de rendimiento SQLite.
+
+Crea, para cada perfil, una base de datos sintética con cientos de miles de
+órdenes y precios, mide el tiempo de carga y el de las consultas típicas
+del dashboard y de reportes.
+
+Uso:
+    python scripts/benchmark_perfiles_sqlite.py
+    python scripts/benchmark_perfiles_sqlite.py --ordenes 500000 --precios 500000
+    python scripts/benchmark_perfiles_sqlite.py --perfiles desktop reporting --json resultado.json
+"""
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio src al path
+src_dir = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from sqlalchemy import text
+
+from bvc_gestor.database.engine import DatabaseEngine
+from bvc_gestor.database.perfiles_rendimiento import PERFILES_SQLITE
+
+from datos_sinteticos import NUM_CLIENTES, poblar
+
+CONSULTAS = {
+    "estadisticas_por_estado": (
+        "SELECT estado, COUNT(*), SUM(monto_total_estimado) "
+        "FROM ordenes GROUP BY estado"
+    ),
+    "ordenes_recientes_cliente": (
+        "SELECT id, titulo_id, estado, fecha_registro FROM ordenes "
+        "WHERE cliente_id = :cliente_id ORDER BY fecha_registro DESC LIMIT 50"
+    ),
+    "ultimo_precio_por_titulo": (
+        "SELECT titulo_id, MAX(fecha_hora) FROM precios_titulos GROUP BY titulo_id"
+    ),
+    "reporte_mensual_precios": (
+        "SELECT titulo_id, strftime('%Y-%m', fecha_hora) AS mes, "
+        "AVG(precio), MIN(precio), MAX(precio), COUNT(*) "
+        "FROM precios_titulos GROUP BY titulo_id, mes ORDER BY mes DESC, titulo_id"
+    ),
+}
+
+
+def _medir(funcion, repeticiones: int) -> float:
+    """Mejor tiempo (segundos) tras una ejecución de calentamiento"""
+    funcion()
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def ejecutar_perfil(perfil: str, n_ordenes: int, n_precios: int,
+                    repeticiones: int, semilla: int) -> dict:
+    """Carga la base sintética y mide consultas con un perfil"""
+    directorio = Path(tempfile.mkdtemp(prefix=f"bvc_bench_{perfil}_"))
+    motor = DatabaseEngine.crear_aislado(directorio / "benchmark.db", perfil=perfil)
+    rng = random.Random(semilla)
+    resultado = {"perfil": perfil, "consultas": {}}
+
+    try:
+        motor.asegurar_esquema()
+
+        # Carga en lotes, una transacción por lote
+        inicio = time.perf_counter()
+        poblar(motor.engine, n_ordenes, n_precios, rng)
+        resultado["carga_s"] = time.perf_counter() - inicio
+
+        clientes = [rng.randint(1, NUM_CLIENTES) for _ in range(200)]
+
+        with motor.read_engine.connect() as conn:
+            for nombre, sql in CONSULTAS.items():
+                sentencia = text(sql)
+                if ":cliente_id" in sql:
+                    def consulta(sentencia=sentencia):
+                        for cliente_id in clientes:
+                            conn.execute(sentencia, {"cliente_id": cliente_id}).fetchall()
+                else:
+                    def consulta(sentencia=sentencia):
+                        conn.execute(sentencia).fetchall()
+                resultado["consultas"][nombre] = _medir(consulta, repeticiones)
+                conn.rollback()
+
+        resultado["tamano_mb"] = sum(
+            f.stat().st_size for f in directorio.iterdir()
+        ) / (1024 * 1024)
+    finally:
+        motor.cerrar()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    return resultado
+
+
+def imprimir_resultados(resultados: list):
+    """Tabla comparativa en consola"""
+    nombres = list(CONSULTAS)
+    encabezado = f"{'perfil':<12}{'carga (s)':>11}" + "".join(f"{n[:24]:>26}" for n in nombres)
+    print(encabezado)
+    print("-" * len(encabezado))
+    for r in resultados:
+        fila = f"{r['perfil']:<12}{r['carga_s']:>11.2f}"
+        fila += "".join(f"{r['consultas'][n] * 1000:>23.1f} ms" for n in nombres)
+        print(fila)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de perfiles SQLite")
+    parser.add_argument("--ordenes", type=int, default=300000)
+    parser.add_argument("--precios", type=int, default=300000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--perfiles", nargs="+", default=list(PERFILES_SQLITE))
+    parser.add_argument("--json", type=Path, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    print(f"Órdenes: {args.ordenes:,} | Precios: {args.precios:,} | "
+          f"Repeticiones: {args.repeticiones}\n")
+
+    resultados = [
+        ejecutar_perfil(perfil, args.ordenes, args.precios, args.repeticiones, args.semilla)
+        for perfil in args.perfiles
+    ]
+    imprimir_resultados(resultados)
+
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=2), encoding="utf-8")
+        print(f"\nResultados guardados en {args.json}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,143 @@
+# scripts/datos_sinteticos.py
+"""
+Datos sintéticos compartidos por los scripts de diagnóstico
+(benchmark de perfiles, auditoría de planes de consulta).
+
+Inserta con Core y executemany en lotes; no pasa por los validadores
+del ORM.
+"""
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from bvc_gestor.database.models_sql import (
+    BancoDB, CasaBolsaDB, ClienteDB, CuentaBursatilDB,
+    TituloDB, PrecioTituloDB, OrdenDB, PortafolioItemDB, SaldoDB
+)
+
+TAMANO_LOTE = 10000
+NUM_CLIENTES = 2000
+NUM_TITULOS = 50
+NUM_CASAS = 8
+
+
+def lotes(filas, tamano=TAMANO_LOTE):
+    """Divide un generador de filas en listas de tamaño fijo"""
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def generar_ordenes(n: int, rng: random.Random):
+    """Órdenes sintéticas repartidas en tres años"""
+    inicio = datetime.now() - timedelta(days=3 * 365)
+    estados = ["PENDIENTE", "EJECUTADA", "EJECUTADA", "EJECUTADA", "CANCELADA", "ESPERANDO_FONDOS"]
+    for _ in range(n):
+        cliente_id = rng.randint(1, NUM_CLIENTES)
+        fecha = inicio + timedelta(seconds=rng.randint(0, 3 * 365 * 86400))
+        cantidad = rng.randint(1, 5000)
+        precio = round(rng.uniform(1, 500), 2)
+        yield {
+            "cliente_id": cliente_id,
+            "cuenta_id": cliente_id,
+            "titulo_id": rng.randint(1, NUM_TITULOS),
+            "tipo": rng.choice(["COMPRA", "VENTA"]),
+            "cantidad_total": cantidad,
+            "precio_limite": precio,
+            "estado": rng.choice(estados),
+            "fecha_vencimiento": date.today() + timedelta(days=30),
+            "monto_total_estimado": round(cantidad * precio * 1.006, 2),
+            "fecha_registro": fecha,
+            "fecha_actualizacion": fecha,
+            "estatus": True,
+        }
+
+
+def generar_precios(n: int, rng: random.Random):
+    """Historial de precios sintético (intradía) para todos los títulos"""
+    inicio = datetime.now() - timedelta(days=3 * 365)
+    paso = (3 * 365 * 86400) // max(1, n // NUM_TITULOS)
+    for i in range(n):
+        titulo_id = (i % NUM_TITULOS) + 1
+        fecha = inicio + timedelta(seconds=(i // NUM_TITULOS) * paso)
+        yield {
+            "titulo_id": titulo_id,
+            "fecha_hora": fecha,
+            "precio": round(rng.uniform(1, 500), 4),
+            "volumen": rng.randint(0, 100000),
+            "tipo": "ACTUAL" if i >= n - NUM_TITULOS else "HISTORICO_INTRADIA",
+            "fuente": "BENCHMARK",
+            "fecha_registro": fecha,
+            "fecha_actualizacion": fecha,
+            "estatus": True,
+        }
+
+
+def cargar_catalogos(conn):
+    """Catálogos mínimos para cumplir las claves foráneas"""
+    conn.execute(BancoDB.__table__.insert(), [
+        {"rif": "J-00000000-0", "nombre": "Banco Benchmark", "codigo": "0001", "estatus": True}
+    ])
+    conn.execute(CasaBolsaDB.__table__.insert(), [
+        {"rif": f"J-3{i:07d}-0", "nombre": f"Casa {i}", "tipo": "Casa de Bolsa", "estatus": True}
+        for i in range(1, NUM_CASAS + 1)
+    ])
+    conn.execute(TituloDB.__table__.insert(), [
+        {"rif": f"J-5{i:07d}-0", "nombre": f"Titulo {i}", "ticker": f"T{i:03d}",
+         "sector": f"Sector {i % 7}", "estatus": True}
+        for i in range(1, NUM_TITULOS + 1)
+    ])
+    conn.execute(ClienteDB.__table__.insert(), [
+        {"nombre_completo": f"Cliente {i}", "tipo_inversor": "NATURAL",
+         "rif_cedula": f"V-{i:08d}", "telefono": "0414-0000000",
+         "email": f"cliente{i}@mail.com", "direccion_fiscal": "N/A",
+         "ciudad_estado": "Caracas", "estatus": True}
+        for i in range(1, NUM_CLIENTES + 1)
+    ])
+    conn.execute(CuentaBursatilDB.__table__.insert(), [
+        {"cliente_id": i, "casa_bolsa_id": (i % NUM_CASAS) + 1,
+         "cuenta": f"CB-{i:06d}", "default": True, "estatus": True}
+        for i in range(1, NUM_CLIENTES + 1)
+    ])
+
+
+def cargar_posiciones(conn, rng: random.Random, posiciones_por_cuenta: int = 5):
+    """Portafolio y saldo en VES para cada cuenta bursátil"""
+    items = []
+    for cuenta_id in range(1, NUM_CLIENTES + 1):
+        for titulo_id in rng.sample(range(1, NUM_TITULOS + 1), posiciones_por_cuenta):
+            items.append({
+                "cuenta_id": cuenta_id, "titulo_id": titulo_id,
+                "cantidad": rng.randint(1, 10000),
+                "costo_promedio": Decimal(str(round(rng.uniform(1, 500), 4))),
+                "estatus": True,
+            })
+    for lote in lotes(items):
+        conn.execute(PortafolioItemDB.__table__.insert(), lote)
+
+    conn.execute(SaldoDB.__table__.insert(), [
+        {"cuenta_id": cuenta_id, "moneda": "VES",
+         "disponible": Decimal(str(round(rng.uniform(0, 1e6), 2))),
+         "en_transito": Decimal("0"), "bloqueado": Decimal("0"), "estatus": True}
+        for cuenta_id in range(1, NUM_CLIENTES + 1)
+    ])
+
+
+def poblar(engine, n_ordenes: int, n_precios: int, rng: random.Random,
+           con_posiciones: bool = False):
+    """Carga completa en lotes, una transacción por lote"""
+    with engine.begin() as conn:
+        cargar_catalogos(conn)
+        if con_posiciones:
+            cargar_posiciones(conn, rng)
+    for lote in lotes(generar_ordenes(n_ordenes, rng)):
+        with engine.begin() as conn:
+            conn.execute(OrdenDB.__table__.insert(), lote)
+    for lote in lotes(generar_precios(n_precios, rng)):
+        with engine.begin() as conn:
+            conn.execute(PrecioTituloDB.__table__.insert(), lote)
\ No newline at end of file
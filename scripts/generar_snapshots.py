@@ -0,0 +1,60 @@
+# scripts/generar_snapshots.py
+"""
+Cierre diario de valoración por cuenta bursátil (tabla snapshot_valoracion).
+
+Sin argumentos hace el cierre incremental de hoy (pensado para ejecutarse
+al final de cada día); con --desde/--hasta recalcula un rango completo.
+
+Uso:
+    python scripts/generar_snapshots.py                                  # cierre de hoy
+    python scripts/generar_snapshots.py --desde 2025-01-01               # backfill hasta ayer
+    python scripts/generar_snapshots.py --desde 2025-01-01 --hasta 2025-06-30
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+# Añadir el directorio src al path
+src_dir = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from bvc_gestor.database.engine import get_database
+from bvc_gestor.services.snapshot_service import SnapshotService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generar snapshots de valoración diaria")
+    parser.add_argument("--desde", type=date.fromisoformat,
+                        help="Primer día del backfill (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=date.fromisoformat,
+                        help="Último día del backfill (por defecto, ayer)")
+    args = parser.parse_args()
+
+    if args.hasta and not args.desde:
+        parser.error("--hasta requiere --desde")
+
+    db_engine = get_database()
+    db_engine.asegurar_esquema()
+    servicio = SnapshotService(db_engine)
+
+    inicio = time.perf_counter()
+    if args.desde:
+        hasta = args.hasta or servicio.snapshot_repo.hoy() - timedelta(days=1)
+        resumen = servicio.backfill(args.desde, hasta)
+        print(f"✓ Backfill {resumen['desde']} a {resumen['hasta']}: "
+              f"{resumen['filas']:,} cierres en {resumen['dias']} días")
+    else:
+        resumen = servicio.cerrar_dia()
+        print(f"✓ Cierre {resumen['fecha']}: {resumen['recalculadas']:,} cuentas recalculadas, "
+              f"{resumen['arrastradas']:,} sin cambios")
+        if resumen['backfill']:
+            print(f"  Días pendientes completados: {resumen['backfill']:,} cierres")
+    print(f"  ({time.perf_counter() - inicio:.1f} s)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,65 @@
+# scripts/lotes_fiscales.py
+"""
+Libro de lotes fiscales (tablas lotes_fiscales y ganancias_realizadas).
+
+Sin argumentos aplica las ejecuciones que falten (la primera vez construye
+el libro completo); --reconstruir lo rehace desde el historial, por ejemplo
+tras cambiar de método de costo. Con --anio imprime el resumen fiscal.
+
+Uso:
+    python scripts/lotes_fiscales.py                                  # sincronizar
+    python scripts/lotes_fiscales.py --reconstruir --metodo PROMEDIO
+    python scripts/lotes_fiscales.py --anio 2025 [--cliente 12]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Añadir el directorio src al path
+src_dir = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from bvc_gestor.database.engine import get_database
+from bvc_gestor.services.lotes_fiscales_service import LotesFiscalesService
+from bvc_gestor.utils.constants import MetodoCosto
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Libro de lotes fiscales y ganancias realizadas")
+    parser.add_argument("--reconstruir", action="store_true",
+                        help="Rehacer el libro completo desde las transacciones")
+    parser.add_argument("--metodo", choices=[m.name for m in MetodoCosto], default=MetodoCosto.FIFO.name,
+                        help="Método de costo para las ventas (por defecto FIFO)")
+    parser.add_argument("--anio", type=int, help="Imprimir el resumen fiscal de ese año")
+    parser.add_argument("--cliente", type=int, help="Limitar el resumen a un cliente")
+    args = parser.parse_args()
+
+    db_engine = get_database()
+    db_engine.asegurar_esquema()
+    servicio = LotesFiscalesService(db_engine, MetodoCosto[args.metodo])
+
+    inicio = time.perf_counter()
+    resumen = servicio.reconstruir() if args.reconstruir else servicio.sincronizar()
+    print(f"✓ {resumen['ejecuciones']:,} ejecuciones aplicadas: {resumen['lotes_nuevos']:,} lotes nuevos, "
+          f"{resumen['ganancias']:,} ganancias realizadas ({time.perf_counter() - inicio:.1f} s)")
+    if resumen['ventas_sin_lote']:
+        print(f"  ⚠ {resumen['ventas_sin_lote']:,} ventas exceden los lotes abiertos")
+
+    if args.anio:
+        fiscal = servicio.resumen_fiscal(args.anio, cliente_id=args.cliente)
+        totales = fiscal['totales']
+        print(f"\nGanancias realizadas {fiscal['desde']} a {fiscal['hasta']}:")
+        for fila in fiscal['por_posicion'][:50]:
+            print(f"  Cuenta {fila['cuenta_id']:>6} {fila['ticker'] or fila['titulo_id']:<10} "
+                  f"{fila['cantidad']:>12,} títulos  Bs. {fila['ganancia_perdida']:>18,.2f}")
+        if len(fiscal['por_posicion']) > 50:
+            print(f"  ... y {len(fiscal['por_posicion']) - 50} más")
+        print(f"  Total: {totales['ventas']:,} ventas, venta Bs. {totales['monto_venta']:,.2f}, "
+              f"costo Bs. {totales['costo_base']:,.2f}, resultado Bs. {totales['ganancia_perdida']:,.2f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,62 @@
+# scripts/verificar_ejecucion_ordenes.py
+"""
+Verifica los acumulados de ejecución de las órdenes (cantidad_ejecutada,
+monto_ejecutado) contra la suma real de la tabla transacciones, y los
+contadores por cliente y estado (contador_ordenes) contra la tabla ordenes.
+
+Uso:
+    python scripts/verificar_ejecucion_ordenes.py             # solo reporta
+    python scripts/verificar_ejecucion_ordenes.py --corregir  # recalcula
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Añadir el directorio src al path
+src_dir = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from bvc_gestor.database.engine import get_database
+from bvc_gestor.repositories.orden_repository import OrdenRepository
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificar ejecución acumulada de órdenes")
+    parser.add_argument("--corregir", action="store_true",
+                        help="Recalcular las órdenes y contadores descuadrados")
+    args = parser.parse_args()
+
+    db_engine = get_database()
+    db_engine.asegurar_esquema()
+    repo = OrdenRepository(db_engine)
+
+    descuadres = repo.verificar_ejecucion_ordenes(corregir=args.corregir)
+    contadores = repo.verificar_contadores_ordenes(corregir=args.corregir)
+    if not descuadres and not contadores:
+        print("✓ Acumulados de ejecución consistentes con transacciones")
+        print("✓ Contadores de órdenes consistentes con ordenes")
+        return 0
+
+    if descuadres:
+        print(f"Órdenes descuadradas: {len(descuadres)}")
+        for d in descuadres[:50]:
+            print(f"  Orden {d['id']}: cantidad {d['cantidad_ejecutada']} (real {d['cantidad_real']}), "
+                  f"monto {d['monto_ejecutado']} (real {d['monto_real']})")
+        if len(descuadres) > 50:
+            print(f"  ... y {len(descuadres) - 50} más")
+
+    if contadores:
+        print(f"Contadores descuadrados: {len(contadores)}")
+        for c in contadores[:50]:
+            print(f"  Cliente {c['cliente_id']} / {c['estado']}: cantidad {c['cantidad']} "
+                  f"(real {c['cantidad_real']}), monto {c['monto']} (real {c['monto_real']})")
+        if len(contadores) > 50:
+            print(f"  ... y {len(contadores) - 50} más")
+
+    if args.corregir:
+        print("✓ Órdenes y contadores recalculados")
+        return 0
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -9,7 +9,7 @@ from sqlalchemy.orm import joinedload
 
 from ..database.engine import get_database
 from ..database.models_sql import (
-    ClienteDB, BancoDB, CasaBolsaDB, 
+    ClienteDB, 
     CuentaBancariaDB, CuentaBursatilDB,
     DocumentoDB
 )
@@ -193,24 +193,23 @@ class ClientesController:
         self.detalle.clear_dynamic()
 
     def _cargar_catalogos(self):
-        """Cargar todos los catálogos necesarios"""
-        with self._get_session() as session:
-            # Bancos
-            bancos = session.query(BancoDB).filter(BancoDB.estatus == True).all()
-            self.detalle.bancos = [
-                {"id": b.id, "nombre": f"{b.rif} | {b.nombre}"}
-                for b in bancos
-            ]
-            
-            # Casas de bolsa
-            corredores = session.query(CasaBolsaDB).filter(CasaBolsaDB.estatus == True).all()
-            self.detalle.corredores = [
-                {"id": c.id, "nombre": f"{c.rif} | {c.nombre}"}
-                for c in corredores
-            ]
-            
-            # Tipos de inversor
-            self.detalle.load_combos(TipoInversor)
+        """Cargar todos los catálogos necesarios (desde el catálogo en memoria)"""
+        catalogo = self.db_engine.get_catalogo()
+        
+        # Bancos
+        self.detalle.bancos = [
+            {"id": b["id"], "nombre": f"{b['rif']} | {b['nombre']}"}
+            for b in catalogo.bancos()
+        ]
+        
+        # Casas de bolsa
+        self.detalle.corredores = [
+            {"id": c["id"], "nombre": f"{c['rif']} | {c['nombre']}"}
+            for c in catalogo.casas_bolsa()
+        ]
+        
+        # Tipos de inversor
+        self.detalle.load_combos(TipoInversor)
 
     def _setup_widgets_dinamicos(self):
         """Configurar widgets dinámicos iniciales"""
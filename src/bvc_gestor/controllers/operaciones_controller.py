@@ -6,6 +6,7 @@ Solo maneja navegación y coordinación de UI.
 
 from PyQt6.QtCore import QObject, pyqtSignal
 from PyQt6.QtWidgets import QMessageBox
+from typing import Dict, List
 import logging
 
 from ..services.operaciones_service import OperacionesService
@@ -13,7 +14,7 @@ from ..repositories.orden_repository import OrdenRepository
 from ..repositories.saldo_repository import SaldoRepository
 from ..repositories.portafolio_repository import PortafolioRepository
 from ..repositories.base_repository import BaseRepository
-from ..database.models_sql import ClienteDB, CuentaBursatilDB, CuentaBancariaDB, TituloDB, BancoDB, CasaBolsaDB
+from ..database.models_sql import ClienteDB, CuentaBursatilDB, CuentaBancariaDB, TituloDB, PrecioTituloDB, UltimoPrecioDB
 from ..utils.constants import TipoOrden, EstadoOrden
 from ..utils.formatters import DataFormatter
 
@@ -58,56 +59,26 @@ class OperacionesController(QObject):
         self.cuenta_bursatil_repo = BaseRepository(self.db_engine, CuentaBursatilDB)
         self.cuenta_bancaria_repo = BaseRepository(self.db_engine, CuentaBancariaDB)
         self.titulo_repo = BaseRepository(self.db_engine, TituloDB)
+        self.precio_repo = BaseRepository(self.db_engine, PrecioTituloDB)
+        self.ultimo_precio_repo = BaseRepository(self.db_engine, UltimoPrecioDB)
         
         # Estado actual
         self.inversor_actual_id = None
         self.cuenta_bursatil_actual_id = None
         self.cuenta_bancaria_actual_id = None
         
-        self._nombres_cache = {
-            'bancos': {},      # {id: nombre}
-            'casas_bolsa': {}  # {id: nombre}
-        }
-        
-        # Cargar cache de nombres
-        self._cargar_cache_nombres()
+        # Nombres de bancos, casas de bolsa y tickers: catálogo compartido en memoria
+        self.catalogo = self.db_engine.get_catalogo()
         
         self.setup_connections()
-    def _cargar_cache_nombres(self):
-        """Carga en cache los nombres de bancos y casas de bolsa"""
-        try:
-            logger.info("🔄 Cargando cache de nombres...")
-            
-            # Cargar bancos
-            bancos_repo = BaseRepository(self.db_engine, BancoDB)
-            bancos = bancos_repo.find_many(estatus=True)
-            self._nombres_cache['bancos'] = {
-                b['id']: b.get('nombre', f"Banco {b['id']}")
-                for b in bancos
-            }
-            
-            # Cargar casas de bolsa
-            casas_repo = BaseRepository(self.db_engine, CasaBolsaDB)
-            casas = casas_repo.find_many(estatus=True)
-            self._nombres_cache['casas_bolsa'] = {
-                c['id']: c.get('nombre', f"Casa {c['id']}")
-                for c in casas
-            }
-            
-            logger.info(f"✅ Cache cargado: "
-                        f"{len(self._nombres_cache['bancos'])} bancos, "
-                        f"{len(self._nombres_cache['casas_bolsa'])} casas")
-            
-        except Exception as e:
-            logger.error(f"❌ Error cargando cache: {e}")
     
     def get_banco_nombre(self, banco_id: int) -> str:
-        """Obtiene nombre de un banco desde cache"""
-        return self._nombres_cache['bancos'].get(banco_id, f"Banco {banco_id}")
+        """Obtiene nombre de un banco desde el catálogo"""
+        return self.catalogo.nombre_banco(banco_id)
     
     def get_casa_bolsa_nombre(self, casa_id: int) -> str:
-        """Obtiene nombre de una casa de bolsa desde cache"""
-        return self._nombres_cache['casas_bolsa'].get(casa_id, f"Casa {casa_id}")
+        """Obtiene nombre de una casa de bolsa desde el catálogo"""
+        return self.catalogo.nombre_casa_bolsa(casa_id)
     
     # ==================== SETUP ====================
     
@@ -514,7 +485,19 @@ class OperacionesController(QObject):
     
     def buscar_activo_por_ticker(self, ticker: str):
         """Busca un activo por ticker"""
-        return self.titulo_repo.find_one(ticker=ticker.upper(), estatus=True)
+        return self.catalogo.titulo_por_ticker(ticker)
+    
+    def obtener_precio_activo(self, ticker: str):
+        """Precio vigente de un ticker (solo consulta si el ticker existe)"""
+        titulo = self.catalogo.titulo_por_ticker(ticker)
+        if not titulo:
+            return None
+        precio = self.ultimo_precio_repo.find_one(titulo_id=titulo['id'])
+        return precio['precio'] if precio else None
+    
+    def obtener_tickers_disponibles(self) -> List[str]:
+        """Tickers activos para autocompletar"""
+        return self.catalogo.tickers()
     
     def obtener_portafolio_cuenta(self, cuenta_bursatil_id: int):
         """Obtiene portafolio de una cuenta"""
@@ -522,17 +505,22 @@ class OperacionesController(QObject):
     
     def obtener_todos_tickers_activos(self):
         """Retorna todos los tickers activos"""
-        return self.titulo_repo.find_many(estatus=True)
+        return self.catalogo.titulos()
     
     def actualizar_precios_masivo(self, actualizados: list) -> bool:
         """Actualiza precios de múltiples tickers"""
         try:
-            updates = [
-                {'id': item['ticker_id'], 'precio_actual': item['precio_nuevo']}
+            # El precio vigente sale de ultimo_precio: se registran precios
+            # ACTUAL en un solo INSERT por lote y los triggers lo actualizan.
+            # Sin fecha_hora: la estampa el reloj de la base (UTC), el mismo
+            # de los precios del feed con el que el trigger los compara
+            precios = [
+                {'titulo_id': item['ticker_id'], 'precio': item['precio_nuevo'],
+                 'tipo': 'ACTUAL', 'fuente': 'MANUAL'}
                 for item in actualizados
             ]
             
-            count = self.titulo_repo.bulk_update(updates)
+            count = self.precio_repo.bulk_create(precios)
             return count > 0
         
         except Exception as e:
@@ -0,0 +1,260 @@
+# src/bvc_gestor/database/archivo_precios.py
+"""
+Archivo particionado del historial de precios.
+
+Los precios más antiguos que el periodo de retención se mueven de
+precios_titulos a bases SQLite anuales (data/database/archivo_precios/
+precios_AAAA.db). La base principal, sus índices y sus respaldos solo
+crecen con el historial reciente.
+
+Las particiones se adjuntan (ATTACH) solo cuando una consulta las
+necesita: consultar() une con UNION ALL la tabla principal y las
+particiones que se solapan con el rango de fechas pedido.
+"""
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from sqlalchemy import MetaData, select, text, union_all
+from sqlalchemy.dialects import sqlite
+
+from ..utils.constants import DATABASE_DIR
+from ..utils.logger import logger
+from .models_sql import PrecioTituloDB, UltimoPrecioDB
+
+ARCHIVO_PRECIOS_DIR = DATABASE_DIR / "archivo_precios"
+
+# Meses de historial que permanecen en la base principal
+MESES_RETENCION_POR_DEFECTO = 12
+
+# SQLite admite 10 bases adjuntas por defecto; se deja margen
+MAX_ADJUNTAS = 8
+
+
+class ArchivoPrecios:
+    """Rollover y consulta del historial de precios particionado por año"""
+    
+    def __init__(self, db_engine, directorio: Optional[Path] = None):
+        self.db_engine = db_engine
+        self.directorio = Path(directorio) if directorio else ARCHIVO_PRECIOS_DIR
+        self._tablas: Dict[str, object] = {}
+        self._lock = threading.Lock()
+    
+    # ==================== PARTICIONES ====================
+    
+    def ruta_particion(self, anio: int) -> Path:
+        """Archivo de la partición de un año"""
+        return self.directorio / f"precios_{anio}.db"
+    
+    def particiones(self) -> List[int]:
+        """Años con partición de archivo en disco"""
+        if not self.directorio.exists():
+            return []
+        anios = []
+        for ruta in self.directorio.glob("precios_*.db"):
+            sufijo = ruta.stem.split("_", 1)[1]
+            if sufijo.isdigit():
+                anios.append(int(sufijo))
+        return sorted(anios)
+    
+    def _tabla_particion(self, alias: str):
+        """Copia de precios_titulos bajo el esquema adjunto 'alias'"""
+        with self._lock:
+            if alias not in self._tablas:
+                self._tablas[alias] = PrecioTituloDB.__table__.to_metadata(
+                    MetaData(), schema=alias
+                )
+            return self._tablas[alias]
+    
+    @staticmethod
+    def _ddl_particion(alias: str) -> List[str]:
+        """DDL de la tabla de archivo (mismas columnas, sin claves foráneas)"""
+        dialecto = sqlite.dialect()
+        tabla = PrecioTituloDB.__table__
+        columnas = []
+        for columna in tabla.columns:
+            definicion = f"{columna.name} {columna.type.compile(dialect=dialecto)}"
+            if columna.primary_key:
+                definicion += " PRIMARY KEY"
+            columnas.append(definicion)
+        
+        return [
+            f"CREATE TABLE IF NOT EXISTS {alias}.{tabla.name} ({', '.join(columnas)})",
+            f"CREATE INDEX IF NOT EXISTS {alias}.idx_archivo_titulo_fecha "
+            f"ON {tabla.name} (titulo_id, fecha_hora)",
+        ]
+    
+    @staticmethod
+    def _adjuntar(raw, alias: str, ruta: Path, solo_lectura: bool):
+        """ATTACH sobre la conexión DBAPI (fuera de transacción)"""
+        if solo_lectura:
+            destino = f"file:{quote(ruta.as_posix())}?mode=ro"
+        else:
+            destino = str(ruta)
+        raw.execute(f"ATTACH DATABASE ? AS {alias}", (destino,))
+    
+    @staticmethod
+    def _separar(conn, raw, alias: str):
+        """
+        DETACH fuera de transacción. Si aun así falla, la conexión se
+        invalida: devuelta al pool con el alias adjunto, el siguiente
+        ATTACH con ese nombre fallaría.
+        """
+        try:
+            raw.execute(f"DETACH DATABASE {alias}")
+        except Exception as e:
+            logger.warning(f"No se pudo separar {alias}, se descarta la conexión: {e}")
+            conn.invalidate()
+    
+    # ==================== ROLLOVER ====================
+    
+    @staticmethod
+    def fecha_corte(meses_retencion: int, hoy: Optional[date] = None) -> datetime:
+        """Primer día del mes que queda fuera del periodo de retención"""
+        hoy = hoy or date.today()
+        total = hoy.year * 12 + (hoy.month - 1) - meses_retencion
+        return datetime(total // 12, total % 12 + 1, 1)
+    
+    def archivar(self, meses_retencion: int = MESES_RETENCION_POR_DEFECTO,
+                 hoy: Optional[date] = None) -> Dict[int, int]:
+        """
+        Mover a las particiones anuales los precios anteriores al corte.
+        
+        El precio vigente de cada título (el referenciado por ultimo_precio)
+        se queda siempre en la base principal. La copia usa INSERT OR IGNORE
+        por id, así que repetir el proceso tras una interrupción es seguro.
+        Retorna {año: filas archivadas}.
+        """
+        corte = self.fecha_corte(meses_retencion, hoy)
+        tabla = PrecioTituloDB.__tablename__
+        columnas = ", ".join(c.name for c in PrecioTituloDB.__table__.columns)
+        filtro = (
+            f"fecha_hora >= :inicio AND fecha_hora < :fin "
+            f"AND id NOT IN (SELECT precio_id FROM {UltimoPrecioDB.__tablename__})"
+        )
+        movidas: Dict[int, int] = {}
+        
+        with self.db_engine.engine.connect() as conn:
+            # Años con filas anteriores al corte
+            primera = conn.exec_driver_sql(
+                f"SELECT MIN(fecha_hora) FROM {tabla} WHERE fecha_hora < ?",
+                (str(corte),)
+            ).scalar()
+            conn.rollback()
+            if primera is None:
+                logger.info(f"Sin precios anteriores a {corte:%Y-%m-%d} para archivar")
+                return movidas
+            
+            primer_anio = int(str(primera)[:4])
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            
+            for anio in range(primer_anio, corte.year + 1):
+                inicio = datetime(anio, 1, 1)
+                fin = min(datetime(anio + 1, 1, 1), corte)
+                if inicio >= fin:
+                    continue
+                
+                alias = f"arch_{anio}"
+                # Tras invalidarse en _separar() la conexión reconecta
+                raw = conn.connection.driver_connection
+                self._adjuntar(raw, alias, self.ruta_particion(anio), solo_lectura=False)
+                try:
+                    with conn.begin():
+                        for sentencia in self._ddl_particion(alias):
+                            conn.exec_driver_sql(sentencia)
+                        
+                        # Mismo formato de texto con el que SQLAlchemy guarda DateTime
+                        params = {"inicio": str(inicio), "fin": str(fin)}
+                        conn.execute(
+                            text(f"INSERT OR IGNORE INTO {alias}.{tabla} ({columnas}) "
+                                 f"SELECT {columnas} FROM main.{tabla} WHERE {filtro}"),
+                            params
+                        )
+                        filas = conn.execute(
+                            text(f"DELETE FROM main.{tabla} WHERE {filtro}"), params
+                        ).rowcount
+                finally:
+                    self._separar(conn, raw, alias)
+                
+                if filas:
+                    movidas[anio] = filas
+                    logger.info(f"📦 Archivados {filas} precios de {anio} en {self.ruta_particion(anio).name}")
+        
+        return movidas
+    
+    # ==================== CONSULTA ====================
+    
+    def _particiones_en_rango(self, desde: Optional[datetime],
+                              hasta: Optional[datetime]) -> List[int]:
+        anios = self.particiones()
+        if desde is not None:
+            anios = [a for a in anios if a >= desde.year]
+        if hasta is not None:
+            anios = [a for a in anios if a <= hasta.year]
+        return anios
+    
+    def _sentencia(self, tabla, titulo_id, desde, hasta, tipo):
+        stmt = select(tabla)
+        if titulo_id is not None:
+            stmt = stmt.where(tabla.c.titulo_id == titulo_id)
+        if desde is not None:
+            stmt = stmt.where(tabla.c.fecha_hora >= desde)
+        if hasta is not None:
+            stmt = stmt.where(tabla.c.fecha_hora <= hasta)
+        if tipo is not None:
+            stmt = stmt.where(tabla.c.tipo == tipo)
+        return stmt
+    
+    def consultar(self, titulo_id: Optional[int] = None,
+                  desde: Optional[datetime] = None,
+                  hasta: Optional[datetime] = None,
+                  tipo: Optional[str] = None) -> List[Dict]:
+        """
+        Precios en un rango de fechas, uniendo principal y archivo.
+        
+        Solo se adjuntan las particiones cuyo año se solapa con el rango;
+        si no hay ninguna, la consulta toca únicamente la base principal.
+        """
+        anios = self._particiones_en_rango(desde, hasta)
+        tabla_principal = PrecioTituloDB.__table__
+        filas: List[Dict] = []
+        
+        # Grupos de particiones para no superar el límite de ATTACH
+        grupos: List[List[int]] = [anios[i:i + MAX_ADJUNTAS] for i in range(0, len(anios), MAX_ADJUNTAS)]
+        if not grupos:
+            grupos = [[]]
+        
+        with self.db_engine.read_engine.connect() as conn:
+            for n, grupo in enumerate(grupos):
+                # Tras invalidarse en _separar() la conexión reconecta
+                raw = conn.connection.driver_connection
+                adjuntas: List[Tuple[str, int]] = []
+                try:
+                    for anio in grupo:
+                        alias = f"arch_{anio}"
+                        self._adjuntar(raw, alias, self.ruta_particion(anio), solo_lectura=True)
+                        adjuntas.append((alias, anio))
+                    
+                    partes = [
+                        self._sentencia(self._tabla_particion(alias), titulo_id, desde, hasta, tipo)
+                        for alias, _ in adjuntas
+                    ]
+                    # La tabla principal se consulta una sola vez
+                    if n == 0:
+                        partes.insert(0, self._sentencia(tabla_principal, titulo_id, desde, hasta, tipo))
+                    
+                    stmt = partes[0] if len(partes) == 1 else union_all(*partes)
+                    filas.extend(dict(r) for r in conn.execute(stmt).mappings())
+                finally:
+                    # DETACH falla dentro de una transacción abierta (también
+                    # cuando la consulta lanzó)
+                    conn.rollback()
+                    for alias, _ in adjuntas:
+                        if conn.invalidated:
+                            break
+                        self._separar(conn, raw, alias)
+        
+        filas.sort(key=lambda r: (r["fecha_hora"], r["id"]))
+        return filas
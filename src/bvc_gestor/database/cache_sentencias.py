@@ -0,0 +1,80 @@
+# src/bvc_gestor/database/cache_sentencias.py
+"""
+Contador de aciertos de la caché de sentencias compiladas.
+
+Las consultas frecuentes de los repositorios se construyen con
+lambda_stmt(): SQLAlchemy guarda el SQL compilado en la caché del engine
+y en cada llamada solo extrae los parámetros. Para comprobar que la caché
+funciona, cada ejecución etiquetada con OPCION_SENTENCIA se cuenta como
+acierto (hit) o fallo (miss) según el contexto de ejecución.
+"""
+import threading
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+# Opción de ejecución con el nombre de la sentencia a contabilizar
+OPCION_SENTENCIA = "bvc_sentencia"
+
+
+class EstadisticasCacheSentencias:
+    """Contadores hit/miss por sentencia (seguro entre hilos)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, Dict[str, int]] = {}
+    
+    def registrar(self, nombre: str, resultado_cache) -> None:
+        """Registra el resultado de caché de una ejecución"""
+        if resultado_cache is CACHE_HIT:
+            clave = "hits"
+        elif resultado_cache is CACHE_MISS:
+            clave = "misses"
+        else:
+            clave = "sin_cache"
+        
+        with self._lock:
+            contador = self._contadores.setdefault(
+                nombre, {"hits": 0, "misses": 0, "sin_cache": 0}
+            )
+            contador[clave] += 1
+    
+    def resumen(self) -> Dict[str, Dict[str, int]]:
+        """Copia de los contadores por sentencia más un total"""
+        with self._lock:
+            resumen = {nombre: dict(c) for nombre, c in self._contadores.items()}
+        
+        total = {"hits": 0, "misses": 0, "sin_cache": 0}
+        for contador in resumen.values():
+            for clave in total:
+                total[clave] += contador[clave]
+        ejecuciones = sum(total.values())
+        total["ratio_hits"] = total["hits"] / ejecuciones if ejecuciones else 0.0
+        resumen["_total"] = total
+        
+        return resumen
+    
+    def reiniciar(self) -> None:
+        """Pone todos los contadores en cero"""
+        with self._lock:
+            self._contadores.clear()
+
+
+# Instancia única compartida por todos los engines del proceso
+estadisticas_cache = EstadisticasCacheSentencias()
+
+
+def _contar_ejecucion(conn, cursor, statement, parameters, context, executemany):
+    """Listener after_cursor_execute: solo cuenta sentencias etiquetadas"""
+    if context is None:
+        return
+    nombre = context.execution_options.get(OPCION_SENTENCIA)
+    if nombre:
+        estadisticas_cache.registrar(nombre, getattr(context, "cache_hit", None))
+
+
+def instalar_contador(engine) -> None:
+    """Registra el contador en un engine (idempotente)"""
+    if not event.contains(engine, "after_cursor_execute", _contar_ejecucion):
+        event.listen(engine, "after_cursor_execute", _contar_ejecucion)
\ No newline at end of file
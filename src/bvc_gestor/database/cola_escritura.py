@@ -0,0 +1,194 @@
+# src/bvc_gestor/database/cola_escritura.py
+"""
+Cola de escritura con commit agrupado (group commit).
+
+Cada mutación pequeña que abre su propia sesión paga un commit (y un
+fsync) propio. La cola reúne las mutaciones que llegan de varios hilos
+durante una ventana corta y las aplica en una sola transacción
+BEGIN IMMEDIATE:
+
+- cada operación corre dentro de un SAVEPOINT: si falla (incluida una
+  violación de CHECK de saldos), solo se revierte esa operación y su
+  llamador recibe la excepción; el resto del lote se confirma.
+- cada llamador recibe su propio resultado a través de un Future.
+
+Uso:
+    cola = db_engine.get_cola_escritura()
+    ok = cola.ejecutar(repo._agregar_deposito_tx, cuenta_id, monto)
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from ..utils.logger import logger
+
+# Ventana de agrupación por defecto (segundos) y tamaño máximo de lote
+VENTANA_POR_DEFECTO = 0.005
+MAX_LOTE_POR_DEFECTO = 500
+
+
+class ColaEscritura:
+    """Agrupa mutaciones de varios llamadores en una transacción por lote"""
+    
+    def __init__(self, db_engine, ventana: float = VENTANA_POR_DEFECTO,
+                 max_lote: int = MAX_LOTE_POR_DEFECTO):
+        self.db_engine = db_engine
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self._pendientes: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._detenida = False
+        
+        # Diagnóstico
+        self.lotes = 0
+        self.operaciones = 0
+        self.fallidas = 0
+    
+    # ==================== API ====================
+    
+    def enviar(self, operacion: Callable, *args, **kwargs) -> Future:
+        """
+        Encolar operacion(session, *args, **kwargs).
+        
+        Retorna un Future con el valor devuelto por la operación o con la
+        excepción que la hizo fallar.
+        """
+        futuro: Future = Future()
+        # Con el lock: nada puede encolarse detrás de la señal de parada
+        with self._lock:
+            if self._detenida:
+                raise RuntimeError("La cola de escritura está detenida")
+            self._arrancar()
+            self._pendientes.put((operacion, args, kwargs, futuro))
+        return futuro
+    
+    def ejecutar(self, operacion: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Encolar y esperar el resultado (propaga la excepción de la operación)"""
+        return self.enviar(operacion, *args, **kwargs).result(timeout=timeout)
+    
+    def aplicar(self, operaciones: List[Tuple]) -> List[Tuple[bool, Any]]:
+        """
+        Aplicar un lote ya armado en una sola transacción, sin pasar por el hilo.
+        
+        operaciones: [(operacion, args, kwargs), ...]
+        Retorna [(exito, resultado_o_excepcion), ...] en el mismo orden.
+        """
+        futuros = []
+        lote = []
+        for operacion, args, kwargs in operaciones:
+            futuro: Future = Future()
+            futuros.append(futuro)
+            lote.append((operacion, args, kwargs, futuro))
+        
+        self._aplicar_lote(lote)
+        
+        resultados = []
+        for futuro in futuros:
+            error = futuro.exception()
+            resultados.append((False, error) if error else (True, futuro.result()))
+        return resultados
+    
+    def detener(self, timeout: Optional[float] = None):
+        """Procesar lo pendiente y detener el hilo de la cola"""
+        with self._lock:
+            self._detenida = True
+            hilo = self._hilo
+            if hilo is not None:
+                self._pendientes.put(None)
+        if hilo is not None:
+            hilo.join(timeout)
+    
+    def estadisticas(self) -> dict:
+        """Lotes, operaciones y fallos acumulados (diagnóstico)"""
+        return {
+            'lotes': self.lotes,
+            'operaciones': self.operaciones,
+            'fallidas': self.fallidas,
+            'operaciones_por_lote': (self.operaciones / self.lotes) if self.lotes else 0.0,
+        }
+    
+    # ==================== HILO DE ESCRITURA ====================
+    
+    def _arrancar(self):
+        """Arranca el hilo si no está vivo (con self._lock tomado)"""
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(
+                target=self._bucle, name="cola-escritura", daemon=True
+            )
+            self._hilo.start()
+    
+    def _bucle(self):
+        while True:
+            primero = self._pendientes.get()
+            if primero is None:
+                return
+            
+            # Reunir lo que llegue durante la ventana
+            lote = [primero]
+            limite = time.monotonic() + self.ventana
+            fin = False
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                try:
+                    item = self._pendientes.get(timeout=restante) if restante > 0 else self._pendientes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    fin = True
+                    break
+                lote.append(item)
+            
+            self._aplicar_lote(lote)
+            if fin:
+                # Vaciar lo que quedó antes de la señal de parada
+                restantes = []
+                while True:
+                    try:
+                        item = self._pendientes.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        restantes.append(item)
+                if restantes:
+                    self._aplicar_lote(restantes)
+                return
+    
+    def _aplicar_lote(self, lote: List[Tuple]):
+        """Una transacción por lote, un SAVEPOINT por operación"""
+        exitos: List[Tuple[Future, Any]] = []
+        fallidas = 0
+        
+        try:
+            with self.db_engine.get_write_session() as session:
+                for operacion, args, kwargs, futuro in lote:
+                    try:
+                        with session.begin_nested():
+                            resultado = operacion(session, *args, **kwargs)
+                        exitos.append((futuro, resultado))
+                    except Exception as e:
+                        fallidas += 1
+                        futuro.set_exception(e)
+                
+                session.commit()
+        
+        except Exception as e:
+            # Falló el commit del lote: ninguna operación quedó aplicada
+            logger.error(f"Error confirmando lote de escritura ({len(lote)} operaciones): {e}")
+            for futuro, _ in exitos:
+                futuro.set_exception(e)
+            for _, _, _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        
+        self.lotes += 1
+        self.operaciones += len(lote)
+        self.fallidas += fallidas
+        for futuro, resultado in exitos:
+            futuro.set_result(resultado)
+        
+        if len(lote) > 1:
+            logger.debug(f"Lote de escritura: {len(lote)} operaciones, {fallidas} fallidas")
\ No newline at end of file
@@ -0,0 +1,260 @@
+# src/bvc_gestor/database/ddl_soporte.py
+"""
+DDL de soporte del esquema (triggers y cargas iniciales de tablas derivadas).
+
+Todo lo registrado aquí forma parte de la huella del esquema (ver
+esquema.py) y se ejecuta en cada migración, por lo que cada sentencia
+debe ser idempotente.
+"""
+from .esquema import registrar_ddl_soporte
+from .models_sql import (
+    Base, BancoDB, CambioTablaDB, CasaBolsaDB, ClienteDB, ConfiguracionDB,
+    CuentaBancariaDB, CuentaBursatilDB, DocumentoDB, OrdenDB, PortafolioItemDB,
+    SaldoDB, TituloDB,
+)
+
+# ============================================================================
+# ÚLTIMO PRECIO POR TÍTULO
+# ============================================================================
+
+# Recalcula ultimo_precio para un título a partir del historial
+_RECALCULAR_ULTIMO_PRECIO = """
+    DELETE FROM ultimo_precio WHERE titulo_id = {titulo};
+    INSERT INTO ultimo_precio (titulo_id, precio_id, precio, fecha_hora)
+    SELECT titulo_id, id, precio, fecha_hora
+    FROM precios_titulos
+    WHERE titulo_id = {titulo} AND tipo = 'ACTUAL'
+    ORDER BY fecha_hora DESC, id DESC
+    LIMIT 1;
+"""
+
+registrar_ddl_soporte("ultimo_precio", [
+    # Inserción: solo reemplaza si el precio nuevo no es más antiguo
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ultimo_precio_insert
+    AFTER INSERT ON precios_titulos
+    WHEN NEW.tipo = 'ACTUAL'
+    BEGIN
+        INSERT INTO ultimo_precio (titulo_id, precio_id, precio, fecha_hora)
+        VALUES (NEW.titulo_id, NEW.id, NEW.precio, NEW.fecha_hora)
+        ON CONFLICT(titulo_id) DO UPDATE SET
+            precio_id = excluded.precio_id,
+            precio = excluded.precio,
+            fecha_hora = excluded.fecha_hora
+        WHERE excluded.fecha_hora >= ultimo_precio.fecha_hora;
+    END
+    """,
+    # Corrección de un precio: recalcular los títulos afectados
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ultimo_precio_update
+    AFTER UPDATE OF titulo_id, precio, fecha_hora, tipo ON precios_titulos
+    WHEN OLD.tipo = 'ACTUAL' OR NEW.tipo = 'ACTUAL'
+    BEGIN
+        {_RECALCULAR_ULTIMO_PRECIO.format(titulo="OLD.titulo_id")}
+        {_RECALCULAR_ULTIMO_PRECIO.format(titulo="NEW.titulo_id")}
+    END
+    """,
+    # Borrado del precio vigente: tomar el anterior
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ultimo_precio_delete
+    AFTER DELETE ON precios_titulos
+    WHEN OLD.id = (SELECT precio_id FROM ultimo_precio WHERE titulo_id = OLD.titulo_id)
+    BEGIN
+        {_RECALCULAR_ULTIMO_PRECIO.format(titulo="OLD.titulo_id")}
+    END
+    """,
+    # Carga inicial / reconciliación desde el historial existente
+    """
+    INSERT OR REPLACE INTO ultimo_precio (titulo_id, precio_id, precio, fecha_hora)
+    SELECT titulo_id, id, precio, fecha_hora
+    FROM (
+        SELECT titulo_id, id, precio, fecha_hora,
+               ROW_NUMBER() OVER (
+                   PARTITION BY titulo_id ORDER BY fecha_hora DESC, id DESC
+               ) AS rn
+        FROM precios_titulos
+        WHERE tipo = 'ACTUAL'
+    )
+    WHERE rn = 1
+    """,
+])
+
+# ============================================================================
+# EJECUCIÓN ACUMULADA POR ORDEN
+# ============================================================================
+
+# Recalcula los acumulados de las órdenes que cumplen {filtro}
+RECALCULAR_EJECUCION_ORDENES = """
+    UPDATE ordenes SET
+        cantidad_ejecutada = COALESCE((
+            SELECT SUM(t.cantidad_ejecutada) FROM transacciones t
+            WHERE t.orden_id = ordenes.id
+        ), 0),
+        monto_ejecutado = COALESCE((
+            SELECT SUM(t.monto_bruto) FROM transacciones t
+            WHERE t.orden_id = ordenes.id
+        ), 0)
+    WHERE {filtro}
+"""
+
+registrar_ddl_soporte("ejecucion_ordenes", [
+    # Cada transacción suma a su orden en la misma transacción de la BD
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ejecucion_orden_insert
+    AFTER INSERT ON transacciones
+    BEGIN
+        UPDATE ordenes SET
+            cantidad_ejecutada = cantidad_ejecutada + NEW.cantidad_ejecutada,
+            monto_ejecutado = monto_ejecutado + NEW.monto_bruto
+        WHERE id = NEW.orden_id;
+    END
+    """,
+    # Corrección de una transacción: restar lo anterior, sumar lo nuevo
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ejecucion_orden_update
+    AFTER UPDATE OF orden_id, cantidad_ejecutada, monto_bruto ON transacciones
+    BEGIN
+        UPDATE ordenes SET
+            cantidad_ejecutada = cantidad_ejecutada - OLD.cantidad_ejecutada,
+            monto_ejecutado = monto_ejecutado - OLD.monto_bruto
+        WHERE id = OLD.orden_id;
+        UPDATE ordenes SET
+            cantidad_ejecutada = cantidad_ejecutada + NEW.cantidad_ejecutada,
+            monto_ejecutado = monto_ejecutado + NEW.monto_bruto
+        WHERE id = NEW.orden_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ejecucion_orden_delete
+    AFTER DELETE ON transacciones
+    BEGIN
+        UPDATE ordenes SET
+            cantidad_ejecutada = cantidad_ejecutada - OLD.cantidad_ejecutada,
+            monto_ejecutado = monto_ejecutado - OLD.monto_bruto
+        WHERE id = OLD.orden_id;
+    END
+    """,
+    # Carga inicial: solo órdenes con transacciones (el resto queda en 0)
+    RECALCULAR_EJECUCION_ORDENES.format(
+        filtro="id IN (SELECT DISTINCT orden_id FROM transacciones)"
+    ),
+])
+
+# ============================================================================
+# CONTADORES DE ÓRDENES POR CLIENTE Y ESTADO
+# ============================================================================
+
+# Suma (signo=1) o resta (signo=-1) una orden {fila} (NEW/OLD) a su contador
+_AJUSTAR_CONTADOR_ORDENES = """
+        INSERT INTO contador_ordenes (cliente_id, estado, cantidad, monto)
+        VALUES ({fila}.cliente_id, {fila}.estado, {signo}, {signo} * COALESCE({fila}.monto_total_estimado, 0))
+        ON CONFLICT(cliente_id, estado) DO UPDATE SET
+            cantidad = cantidad + excluded.cantidad,
+            monto = monto + excluded.monto;
+"""
+
+# Reconstruye los contadores de los clientes que cumplen {filtro}
+RECALCULAR_CONTADORES_ORDENES = [
+    "DELETE FROM contador_ordenes WHERE {filtro}",
+    """
+    INSERT INTO contador_ordenes (cliente_id, estado, cantidad, monto)
+    SELECT cliente_id, estado, COUNT(*), COALESCE(SUM(monto_total_estimado), 0)
+    FROM ordenes
+    WHERE {filtro}
+    GROUP BY cliente_id, estado
+    """,
+]
+
+registrar_ddl_soporte("contador_ordenes", [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contador_ordenes_insert
+    AFTER INSERT ON ordenes
+    BEGIN
+        {_AJUSTAR_CONTADOR_ORDENES.format(fila="NEW", signo=1)}
+    END
+    """,
+    # Transición de estado (o corrección de monto/cliente): mover la orden
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contador_ordenes_update
+    AFTER UPDATE OF cliente_id, estado, monto_total_estimado ON ordenes
+    WHEN OLD.cliente_id IS NOT NEW.cliente_id
+      OR OLD.estado IS NOT NEW.estado
+      OR OLD.monto_total_estimado IS NOT NEW.monto_total_estimado
+    BEGIN
+        {_AJUSTAR_CONTADOR_ORDENES.format(fila="OLD", signo=-1)}
+        {_AJUSTAR_CONTADOR_ORDENES.format(fila="NEW", signo=1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contador_ordenes_delete
+    AFTER DELETE ON ordenes
+    BEGIN
+        {_AJUSTAR_CONTADOR_ORDENES.format(fila="OLD", signo=-1)}
+    END
+    """,
+    # Carga inicial / reconciliación completa
+    *(sentencia.format(filtro="1 = 1") for sentencia in RECALCULAR_CONTADORES_ORDENES),
+])
+
+# ============================================================================
+# CONTADOR DE CAMBIOS POR TABLA
+# ============================================================================
+
+# Tablas vigiladas: las de los modelos que guardan las cachés (repositorios,
+# catálogo, exposición). Los historiales y tablas derivadas (precios,
+# transacciones, movimientos, snapshots, lotes, contadores) reciben miles
+# de filas por carga y un trigger por fila las encarecería; sus cambios
+# externos los detecta el vigilante solo por PRAGMA data_version (ver
+# vigilante_cambios.py).
+TABLAS_VIGILADAS = [
+    modelo.__tablename__ for modelo in (
+        BancoDB, CasaBolsaDB, TituloDB, ClienteDB, CuentaBursatilDB,
+        CuentaBancariaDB, ConfiguracionDB, DocumentoDB, OrdenDB,
+        PortafolioItemDB, SaldoDB,
+    )
+]
+
+# El resto del esquema: se les quitan los triggers de versiones anteriores
+TABLAS_NO_VIGILADAS = [
+    tabla.name for tabla in Base.metadata.sorted_tables
+    if tabla.name not in TABLAS_VIGILADAS and tabla.name != CambioTablaDB.__tablename__
+]
+
+_OPERACIONES_CAMBIOS = ("INSERT", "UPDATE", "DELETE")
+
+
+def _triggers_cambios(tabla: str) -> list:
+    """Un trigger por operación: +1 a la versión de la tabla por cada fila"""
+    return [
+        f"""
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_{tabla}_{operacion.lower()}
+    AFTER {operacion} ON {tabla}
+    BEGIN
+        UPDATE cambios_tablas SET version = version + 1 WHERE tabla = '{tabla}';
+    END
+    """
+        for operacion in _OPERACIONES_CAMBIOS
+    ]
+
+
+registrar_ddl_soporte("cambios_tablas", [
+    # Una fila por tabla vigilada: los triggers solo actualizan por clave primaria
+    "DELETE FROM cambios_tablas WHERE tabla NOT IN ("
+    + ", ".join(f"'{tabla}'" for tabla in TABLAS_VIGILADAS) + ")",
+    "INSERT OR IGNORE INTO cambios_tablas (tabla, version) VALUES "
+    + ", ".join(f"('{tabla}', 0)" for tabla in TABLAS_VIGILADAS),
+    *(f"DROP TRIGGER IF EXISTS trg_cambios_{tabla}_{operacion.lower()}"
+      for tabla in TABLAS_NO_VIGILADAS for operacion in _OPERACIONES_CAMBIOS),
+    *(sentencia for tabla in TABLAS_VIGILADAS for sentencia in _triggers_cambios(tabla)),
+])
+
+# ============================================================================
+# ÍNDICES REEMPLAZADOS
+# ============================================================================
+
+# idx_orden_cliente e idx_orden_cuenta quedaron cubiertos por los índices
+# compuestos (cliente_id, fecha_registro) y (cuenta_id, fecha_registro)
+registrar_ddl_soporte("indices_obsoletos", [
+    "DROP INDEX IF EXISTS idx_orden_cliente",
+    "DROP INDEX IF EXISTS idx_orden_cuenta",
+])
\ No newline at end of file
@@ -3,22 +3,71 @@
 Motor de base de datos SQLite con SQLAlchemy
 """
 import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
 from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, QueuePool
 
 from ..utils.constants import DATABASE_DIR
 from ..utils.logger import logger
+from .perfiles_rendimiento import (
+    resolver_perfil_inicial, sentencias_pragma, validar_perfil
+)
+from .cache_sentencias import estadisticas_cache, instalar_contador
+from .esquema import asegurar_esquema
 
 # Base para modelos SQLAlchemy
 Base = declarative_base()
 
+# Configuración del pool de conexiones (sobrescribible por variables de entorno)
+# - 'pooled': una conexión por hilo de trabajo activo, con tamaño acotado.
+#   Bajo WAL permite varios lectores simultáneos junto a un escritor.
+# - 'static': una única conexión compartida (comportamiento anterior).
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "pooled").lower()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
 class DatabaseEngine:
     """Motor de base de datos SQLite"""
     
     _instance = None
     _engine = None
     _SessionLocal = None
+    _db_path = None
+    
+    # Motor de solo lectura (mode=ro + query_only) y factories separadas
+    _read_engine = None
+    _ReadSessionLocal = None
+    _WriteSessionLocal = None
+    _read_lock = threading.Lock()
+    
+    # Perfil de rendimiento activo; la generación cambia en cada
+    # aplicar_perfil() para que las conexiones del pool se reconfiguren
+    _perfil_actual = None
+    _generacion_perfil = 0
+    
+    # Cola de escritura con commit agrupado (se crea al primer uso)
+    _cola_escritura = None
+    
+    # Caché de repositorios compartida (se crea al primer uso)
+    _cache_repositorios = None
+    
+    # Detecta commits de otros procesos para invalidar la caché
+    _vigilante_cambios = None
+    
+    # Catálogo en memoria de bancos, casas de bolsa y títulos (se crea al primer uso)
+    _catalogo = None
+    
+    # Exposición agregada de la firma (se crea al primer uso)
+    _exposicion = None
+    
+    # Rendimientos TWR/MWR por cuenta y cliente (se crea al primer uso)
+    _rendimientos = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -29,11 +78,30 @@ class DatabaseEngine:
         if not self._engine:
             self._initialize()
     
-    def _initialize(self):
+    @classmethod
+    def crear_aislado(cls, db_path: Path, perfil: Optional[str] = None) -> "DatabaseEngine":
+        """
+        Crear un motor independiente del singleton sobre otro archivo.
+        
+        Usado por benchmarks y herramientas de diagnóstico que trabajan
+        con bases de datos sintéticas sin tocar la de la aplicación.
+        """
+        instancia = object.__new__(cls)
+        instancia._read_lock = threading.Lock()
+        instancia._initialize(Path(db_path), perfil=perfil)
+        return instancia
+    
+    def _initialize(self, db_path: Optional[Path] = None, perfil: Optional[str] = None):
         """Inicializar motor de base de datos"""
         try:
             # Ruta de la base de datos
-            db_path = DATABASE_DIR / "bvc_gestor.db"
+            if db_path is None:
+                db_path = DATABASE_DIR / "bvc_gestor.db"
+            self._db_path = db_path
+            self._perfil_actual = validar_perfil(perfil) if perfil else resolver_perfil_inicial()
+            self._generacion_perfil = 0
+            # Perfil de perfil_temporal(): solo para las conexiones de ese hilo
+            self._perfil_hilo = threading.local()
             
             # Crear directorio si no existe
             db_path.parent.mkdir(parents=True, exist_ok=True)
@@ -45,46 +113,174 @@ class DatabaseEngine:
             self._engine = create_engine(
                 db_url,
                 echo=False,  # Cambiar a True para debug
-                poolclass=StaticPool,  # Para SQLite
                 connect_args={
+                    # Las conexiones del pool se reutilizan entre hilos,
+                    # pero cada una la usa un solo hilo a la vez
                     "check_same_thread": False,
                     "timeout": 30,
                 },
                 # Configuración para mejor rendimiento
                 isolation_level="SERIALIZABLE",
+                **self._pool_kwargs()
             )
             
             # Configurar conexión
-            @event.listens_for(self._engine, "connect")
-            def set_sqlite_pragma(dbapi_connection, connection_record):
-                cursor = dbapi_connection.cursor()
-                cursor.execute("PRAGMA foreign_keys = ON")
-                cursor.execute("PRAGMA journal_mode = WAL")  # Write-Ahead Logging
-                cursor.execute("PRAGMA synchronous = NORMAL")
-                cursor.execute("PRAGMA cache_size = -2000")  # 2MB cache
-                cursor.close()
+            self._configurar_conexiones(self._engine, solo_lectura=False)
             
-            # Crear session factory
+            # Crear session factory (sesión genérica, BEGIN diferido)
             self._SessionLocal = sessionmaker(
                 autocommit=False,
                 autoflush=False,
                 bind=self._engine
             )
             
-            logger.info(f"Base de datos inicializada en: {db_path}")
+            # Sesiones de escritura: BEGIN IMMEDIATE toma el lock de escritura
+            # al iniciar, evitando "database is locked" al promover el lock
+            self._WriteSessionLocal = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=self._engine.execution_options(sqlite_begin="IMMEDIATE")
+            )
+            
+            logger.info(
+                f"Base de datos inicializada en: {db_path} "
+                f"(pool={DB_POOL_MODE}, tamaño={DB_POOL_SIZE}+{DB_POOL_MAX_OVERFLOW}, "
+                f"perfil={self._perfil_actual})"
+            )
             
             # Probar conexión inmediatamente
             self.test_connection()
-            
+        
         except Exception as e:
             logger.error(f"Error inicializando base de datos: {str(e)}")
             raise
     
+    def _configurar_conexiones(self, engine, solo_lectura: bool):
+        """
+        Registra PRAGMAs y manejo de transacciones para un engine.
+        
+        pysqlite emite sus propios BEGIN de forma implícita (solo antes de DML),
+        lo que impide elegir el tipo de transacción. Se desactiva y se emite
+        el BEGIN explícitamente: DEFERRED por defecto (lecturas con snapshot
+        al primer SELECT bajo WAL) o IMMEDIATE para sesiones de escritura.
+        
+        Los PRAGMAs del perfil de rendimiento se aplican al conectar y se
+        vuelven a aplicar al sacar la conexión del pool si el perfil que le
+        toca (el global o el temporal del hilo que la saca) no es el que
+        tiene aplicado.
+        También se instala el contador de la caché de sentencias compiladas.
+        """
+        instalar_contador(engine)
+        
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragma(dbapi_connection, connection_record):
+            # Desactivar el BEGIN implícito de pysqlite
+            dbapi_connection.isolation_level = None
+            
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA foreign_keys = ON")
+            if solo_lectura:
+                # Rechazar cualquier escritura en esta conexión
+                cursor.execute("PRAGMA query_only = ON")
+            else:
+                cursor.execute("PRAGMA journal_mode = WAL")  # Write-Ahead Logging
+            cursor.close()
+            
+            self._aplicar_pragmas_perfil(dbapi_connection, connection_record, solo_lectura)
+        
+        @event.listens_for(engine, "checkout")
+        def check_perfil(dbapi_connection, connection_record, connection_proxy):
+            if connection_record.info.get("perfil_gen") != self._clave_perfil():
+                self._aplicar_pragmas_perfil(dbapi_connection, connection_record, solo_lectura)
+        
+        @event.listens_for(engine, "checkin")
+        def cerrar_transaccion(dbapi_connection, connection_record):
+            # Un COMMIT que falla (claves foráneas diferidas, disco lleno)
+            # deja la transacción abierta, y el pool no revierte conexiones
+            # cuyo commit ya se intentó: el siguiente BEGIN fallaría
+            if dbapi_connection is not None and dbapi_connection.in_transaction:
+                dbapi_connection.rollback()
+        
+        @event.listens_for(engine, "begin")
+        def do_begin(conn):
+            modo = conn.get_execution_options().get("sqlite_begin", "DEFERRED")
+            conn.exec_driver_sql(f"BEGIN {modo}")
+    
+    def _clave_perfil(self) -> tuple:
+        """(perfil, generación) que corresponde a una conexión sacada por este hilo"""
+        temporal = getattr(self._perfil_hilo, "nombre", None)
+        return (temporal or self._perfil_actual, self._generacion_perfil)
+    
+    def _aplicar_pragmas_perfil(self, dbapi_connection, connection_record, solo_lectura: bool):
+        """Ejecuta los PRAGMAs del perfil que le toca a la conexión"""
+        clave = self._clave_perfil()
+        cursor = dbapi_connection.cursor()
+        for sentencia in sentencias_pragma(clave[0], solo_lectura):
+            cursor.execute(sentencia)
+        cursor.close()
+        connection_record.info["perfil_gen"] = clave
+    
+    def _initialize_read_engine(self):
+        """Crear el engine de solo lectura (perezoso: requiere que exista el archivo)"""
+        with self._read_lock:
+            if self._read_engine is not None:
+                return
+            
+            # URI SQLite en modo solo lectura
+            read_url = f"sqlite:///file:{self._db_path.as_posix()}?mode=ro&uri=true"
+            
+            self._read_engine = create_engine(
+                read_url,
+                echo=False,
+                connect_args={
+                    "check_same_thread": False,
+                    "timeout": 30,
+                },
+                **self._pool_kwargs()
+            )
+            self._configurar_conexiones(self._read_engine, solo_lectura=True)
+            
+            self._ReadSessionLocal = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=self._read_engine
+            )
+            logger.info("Motor de solo lectura inicializado")
+    
+    @staticmethod
+    def _pool_kwargs() -> dict:
+        """Argumentos del pool según DB_POOL_MODE"""
+        if DB_POOL_MODE == "static":
+            # Una sola conexión compartida por todo el proceso
+            return {"poolclass": StaticPool}
+        
+        if DB_POOL_MODE != "pooled":
+            logger.warning(f"DB_POOL_MODE desconocido '{DB_POOL_MODE}', usando 'pooled'")
+        
+        # Cada sesión toma su propia conexión mientras está activa, de modo que
+        # los hilos (refrescos en segundo plano, reportes, órdenes) no se
+        # serializan sobre un único handle. El pool está acotado a
+        # pool_size + max_overflow conexiones; al agotarse se espera pool_timeout.
+        return {
+            "poolclass": QueuePool,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_POOL_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_use_lifo": True,  # Reutilizar conexiones con caché "caliente"
+        }
+    
     @property
     def engine(self):
         """Obtener engine de SQLAlchemy"""
         return self._engine
     
+    @property
+    def read_engine(self):
+        """Obtener engine de solo lectura"""
+        if self._read_engine is None:
+            self._initialize_read_engine()
+        return self._read_engine
+    
     @property
     def SessionLocal(self):
         """Obtener factory de sesiones"""
@@ -96,6 +292,72 @@ class DatabaseEngine:
             self._initialize()
         return self._SessionLocal()
     
+    def get_read_session(self) -> Session:
+        """
+        Obtener sesión de solo lectura.
+        
+        Usa conexiones mode=ro/query_only con transacción diferida: bajo WAL
+        la lectura trabaja sobre un snapshot y no bloquea a los escritores.
+        """
+        if not self._SessionLocal:
+            self._initialize()
+        if self._ReadSessionLocal is None:
+            self._initialize_read_engine()
+        return self._ReadSessionLocal()
+    
+    def get_write_session(self) -> Session:
+        """Obtener sesión de escritura (BEGIN IMMEDIATE)"""
+        if not self._WriteSessionLocal:
+            self._initialize()
+        return self._WriteSessionLocal()
+    
+    # ==================== PERFILES DE RENDIMIENTO ====================
+    
+    @property
+    def perfil_actual(self) -> str:
+        """Nombre del perfil de rendimiento activo"""
+        return self._perfil_actual
+    
+    def aplicar_perfil(self, nombre: str) -> str:
+        """
+        Cambiar el perfil de rendimiento en caliente.
+        
+        Las conexiones nuevas lo aplican al conectar; las que ya están en el
+        pool lo aplican la próxima vez que se sacan. Retorna el perfil anterior.
+        """
+        nuevo = validar_perfil(nombre)
+        anterior = self._perfil_actual
+        
+        if nuevo != anterior:
+            self._perfil_actual = nuevo
+            self._generacion_perfil += 1
+            logger.info(f"Perfil SQLite: {anterior} → {nuevo}")
+        
+        return anterior
+    
+    @contextmanager
+    def perfil_temporal(self, nombre: str):
+        """
+        Aplicar un perfil solo durante un bloque y solo en este hilo.
+        
+        Lo toman las conexiones que el hilo saca del pool dentro del bloque;
+        las de otros hilos siguen con el perfil global (un "bulk-load" con
+        synchronous=OFF no debe alcanzar a las escrituras de la interfaz).
+        Al volver al pool, la siguiente salida les aplica el perfil que
+        corresponda.
+        
+        Ejemplo:
+            with db_engine.perfil_temporal("bulk-load"):
+                importar_precios(...)
+        """
+        nuevo = validar_perfil(nombre)
+        anterior = getattr(self._perfil_hilo, "nombre", None)
+        self._perfil_hilo.nombre = nuevo
+        try:
+            yield self
+        finally:
+            self._perfil_hilo.nombre = anterior
+    
     def create_tables(self):
         """Crear todas las tablas en la base de datos"""
         try:
@@ -107,6 +369,21 @@ class DatabaseEngine:
             logger.error(f"Error creando tablas: {str(e)}")
             raise
     
+    def asegurar_esquema(self) -> bool:
+        """
+        Verificar el esquema comparando su huella con PRAGMA user_version.
+        
+        Si coincide no se emite DDL; si no, se migra (create_all, columnas
+        nuevas y DDL de soporte). Retorna True si hubo migración.
+        """
+        try:
+            # Registrar tablas y DDL de soporte antes de calcular la huella
+            from . import models_sql, ddl_soporte  # noqa: F401
+            return asegurar_esquema(self._engine, Base.metadata)
+        except Exception as e:
+            logger.error(f"Error verificando esquema: {str(e)}")
+            raise
+    
     def drop_tables(self):
         """Eliminar todas las tablas (solo desarrollo)"""
         try:
@@ -116,6 +393,182 @@ class DatabaseEngine:
             logger.error(f"Error eliminando tablas: {str(e)}")
             raise
     
+    def estado_pool(self) -> str:
+        """Estado del pool de conexiones (diagnóstico)"""
+        if not self._engine:
+            return "sin inicializar"
+        estado = f"escritura: {self._engine.pool.status()}"
+        if self._read_engine is not None:
+            estado += f" | lectura: {self._read_engine.pool.status()}"
+        return estado
+    
+    def estadisticas_cache_sentencias(self) -> dict:
+        """Aciertos/fallos de la caché de sentencias compiladas (diagnóstico)"""
+        return estadisticas_cache.resumen()
+    
+    # ==================== CACHÉ DE REPOSITORIOS ====================
+    
+    def get_cache_repositorios(self):
+        """
+        Caché compartida por todos los repositorios de este motor.
+        
+        Los commits de las sesiones de este motor invalidan las entradas
+        de los objetos que modificaron, sin importar qué instancia de
+        repositorio o servicio hizo la escritura. Los commits de otros
+        procesos los detecta el vigilante de cambios (vigilante_cambios.py)
+        e invalidan los modelos de las tablas que tocaron.
+        """
+        if self._cache_repositorios is None:
+            with self._read_lock:
+                if self._cache_repositorios is None:
+                    from ..repositories.cache_repositorio import (
+                        CacheRepositorio, instalar_invalidacion
+                    )
+                    from .vigilante_cambios import VigilanteCambios
+                    cache = CacheRepositorio()
+                    instalar_invalidacion(self._SessionLocal, cache)
+                    instalar_invalidacion(self._WriteSessionLocal, cache)
+                    
+                    modelos_tabla = {}
+                    for mapper in Base.registry.mappers:
+                        modelos_tabla.setdefault(mapper.local_table.name, []).append(mapper.class_.__name__)
+                    self._vigilante_cambios = VigilanteCambios(self._db_path, cache, modelos_tabla)
+                    self._instalar_registro_commits(self._vigilante_cambios)
+                    cache.instalar_verificador(self._vigilante_cambios.verificar)
+                    self._cache_repositorios = cache
+        return self._cache_repositorios
+    
+    def _instalar_registro_commits(self, vigilante):
+        """
+        Avisa al vigilante de los commits de las sesiones de escritura de
+        este proceso, para que no los tome por cambios externos.
+        
+        Con BEGIN IMMEDIATE el lock de escritura se toma al empezar, así que
+        las versiones de cambios_tablas leídas tras el BEGIN y antes del
+        COMMIT solo difieren por lo que escribió esta transacción. El salto
+        se registra cuando se sabe que el COMMIT se aplicó: al empezar la
+        siguiente transacción de la conexión o al devolverla al pool sin
+        transacción abierta.
+        """
+        def versiones(dbapi_connection) -> Optional[dict]:
+            try:
+                return dict(dbapi_connection.execute("SELECT tabla, version FROM cambios_tablas"))
+            except sqlite3.Error:
+                # Base aún sin migrar
+                return None
+        
+        def confirmar(info):
+            pendiente = info.pop("commit_pendiente", None)
+            if pendiente is not None:
+                vigilante.registrar_commit_propio(*pendiente)
+        
+        @event.listens_for(self._engine, "begin")
+        def leer_inicio(conn):
+            info = conn.connection.info
+            # BEGIN aceptado: el COMMIT anterior de esta conexión se aplicó
+            confirmar(info)
+            info.pop("versiones_inicio", None)
+            if conn.get_execution_options().get("sqlite_begin") == "IMMEDIATE":
+                info["versiones_inicio"] = versiones(conn.connection.driver_connection)
+        
+        @event.listens_for(self._engine, "commit")
+        def leer_fin(conn):
+            info = conn.connection.info
+            inicio = info.pop("versiones_inicio", None)
+            if inicio is not None:
+                fin = versiones(conn.connection.driver_connection)
+                if fin is not None:
+                    info["commit_pendiente"] = (inicio, fin)
+        
+        @event.listens_for(self._engine, "rollback")
+        def descartar(conn):
+            conn.connection.info.pop("versiones_inicio", None)
+            conn.connection.info.pop("commit_pendiente", None)
+        
+        # Antes que cerrar_transaccion: una transacción abierta al devolver
+        # la conexión es un COMMIT que falló
+        @event.listens_for(self._engine, "checkin", insert=True)
+        def confirmar_al_devolver(dbapi_connection, connection_record):
+            if dbapi_connection is not None and dbapi_connection.in_transaction:
+                connection_record.info.pop("commit_pendiente", None)
+            else:
+                confirmar(connection_record.info)
+    
+    # ==================== CATÁLOGO EN MEMORIA ====================
+    
+    def get_catalogo(self):
+        """
+        Catálogo de bancos, casas de bolsa y títulos compartido por
+        controladores, diálogos y formateadores (ver catalogo.py).
+        
+        Cada tabla se carga completa en su primera lectura (o todas con
+        cargar() al arrancar) y luego se refresca con las invalidaciones de
+        la caché de repositorios.
+        """
+        if self._catalogo is None:
+            cache = self.get_cache_repositorios()
+            with self._read_lock:
+                if self._catalogo is None:
+                    from ..repositories.catalogo import CatalogoEnMemoria
+                    self._catalogo = CatalogoEnMemoria(self, cache)
+        return self._catalogo
+    
+    def get_exposicion(self):
+        """
+        Servicio de exposición de la firma (ver exposicion_service.py),
+        compartido para que todas las vistas reutilicen el mismo resultado
+        hasta el siguiente cambio de posiciones o precios.
+        """
+        if self._exposicion is None:
+            cache = self.get_cache_repositorios()
+            with self._read_lock:
+                if self._exposicion is None:
+                    from ..services.exposicion_service import ExposicionService
+                    self._exposicion = ExposicionService(self, cache)
+        return self._exposicion
+    
+    def get_rendimientos(self):
+        """
+        Servicio de rendimientos (ver rendimiento_service.py), compartido
+        para que los cálculos de toda la firma queden guardados para las
+        consultas por cuenta o cliente.
+        """
+        if self._rendimientos is None:
+            cache = self.get_cache_repositorios()
+            with self._read_lock:
+                if self._rendimientos is None:
+                    from ..services.rendimiento_service import RendimientoService
+                    self._rendimientos = RendimientoService(self, cache)
+        return self._rendimientos
+    
+    # ==================== COLA DE ESCRITURA ====================
+    
+    def get_cola_escritura(self):
+        """
+        Cola de escritura compartida por los repositorios de este motor.
+        
+        Agrupa mutaciones pequeñas de varios llamadores en una transacción
+        por lote (ver cola_escritura.py).
+        """
+        if self._cola_escritura is None:
+            with self._read_lock:
+                if self._cola_escritura is None:
+                    from .cola_escritura import ColaEscritura
+                    self._cola_escritura = ColaEscritura(self)
+        return self._cola_escritura
+    
+    def cerrar(self):
+        """Cerrar todas las conexiones de los pools"""
+        if self._cola_escritura is not None:
+            self._cola_escritura.detener()
+            self._cola_escritura = None
+        if self._vigilante_cambios is not None:
+            self._vigilante_cambios.cerrar()
+        if self._read_engine is not None:
+            self._read_engine.dispose()
+        if self._engine is not None:
+            self._engine.dispose()
+    
     def test_connection(self) -> bool:
         """Probar conexión a la base de datos"""
         try:
@@ -0,0 +1,147 @@
+# src/bvc_gestor/database/esquema.py
+"""
+Control de versión del esquema mediante una huella (fingerprint).
+
+La huella es un hash del DDL que generan los modelos (tablas, columnas,
+índices y restricciones) más el DDL de soporte registrado (triggers,
+tablas auxiliares). Se guarda en PRAGMA user_version: si al arrancar
+coincide, no se inspecciona ni se emite DDL; si difiere, se ejecuta la
+migración y se guarda la nueva huella.
+"""
+import hashlib
+import re
+from typing import Dict, List, Sequence
+
+from sqlalchemy import inspect
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from ..utils.logger import logger
+
+# DDL adicional e idempotente (CREATE ... IF NOT EXISTS) por nombre,
+# ejecutado en orden de registro al final de cada migración
+_DDL_SOPORTE: Dict[str, List[str]] = {}
+
+# Nombre del trigger de una sentencia CREATE TRIGGER
+_CREAR_TRIGGER = re.compile(r"^\s*CREATE\s+TRIGGER\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+
+def registrar_ddl_soporte(nombre: str, sentencias: Sequence[str]) -> None:
+    """
+    Registrar DDL de soporte que forma parte del esquema.
+    
+    Las sentencias deben ser idempotentes: se vuelven a ejecutar en cada
+    migración. Cambiar su texto cambia la huella y fuerza una migración.
+    
+    Cada CREATE TRIGGER va precedido de su DROP TRIGGER IF EXISTS: con
+    IF NOT EXISTS solo, la migración dejaría instalado el cuerpo anterior.
+    """
+    registradas = []
+    for sentencia in sentencias:
+        trigger = _CREAR_TRIGGER.match(sentencia)
+        if trigger:
+            registradas.append(f"DROP TRIGGER IF EXISTS {trigger.group(1)}")
+        registradas.append(sentencia)
+    _DDL_SOPORTE[nombre] = registradas
+
+
+def calcular_huella(metadata) -> int:
+    """Huella del esquema como entero positivo de 31 bits (PRAGMA user_version)"""
+    dialecto = sqlite.dialect()
+    partes = []
+    
+    for tabla in metadata.sorted_tables:
+        partes.append(str(CreateTable(tabla).compile(dialect=dialecto)).strip())
+        for indice in sorted(tabla.indexes, key=lambda i: i.name or ""):
+            partes.append(str(CreateIndex(indice).compile(dialect=dialecto)).strip())
+    
+    for nombre, sentencias in _DDL_SOPORTE.items():
+        partes.append(f"-- {nombre}")
+        partes.extend(s.strip() for s in sentencias)
+    
+    digest = hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+    # user_version es un entero con signo de 32 bits; 0 = base sin versionar
+    return (int(digest[:8], 16) & 0x7FFFFFFF) or 1
+
+
+def leer_huella(conn) -> int:
+    """Huella guardada en la base de datos"""
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def _agregar_columnas_faltantes(conn, metadata) -> List[str]:
+    """
+    ALTER TABLE ADD COLUMN para columnas nuevas en tablas existentes.
+    
+    create_all() solo crea tablas que no existen; las columnas agregadas a
+    un modelo se añaden aquí. SQLite solo acepta en ADD COLUMN valores por
+    defecto constantes y columnas NOT NULL con default, así que la columna
+    se agrega con su tipo y, si lo tiene, su default literal.
+    """
+    inspector = inspect(conn)
+    tablas_existentes = set(inspector.get_table_names())
+    dialecto = conn.dialect
+    agregadas = []
+    
+    for tabla in metadata.sorted_tables:
+        if tabla.name not in tablas_existentes:
+            continue
+        
+        actuales = {c["name"] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in actuales:
+                continue
+            
+            definicion = f'"{columna.name}" {columna.type.compile(dialect=dialecto)}'
+            defecto = getattr(columna.server_default, "arg", None)
+            if isinstance(defecto, str):
+                definicion += f" DEFAULT '{defecto}'"
+            
+            conn.exec_driver_sql(f'ALTER TABLE "{tabla.name}" ADD COLUMN {definicion}')
+            agregadas.append(f"{tabla.name}.{columna.name}")
+    
+    return agregadas
+
+
+def migrar_esquema(engine, metadata, huella: int) -> None:
+    """Crear/actualizar tablas, índices y DDL de soporte y guardar la huella"""
+    with engine.begin() as conn:
+        metadata.create_all(bind=conn)
+        
+        agregadas = _agregar_columnas_faltantes(conn, metadata)
+        if agregadas:
+            logger.info(f"Columnas agregadas: {', '.join(agregadas)}")
+        
+        # create_all() no agrega índices nuevos a tablas ya existentes
+        for tabla in metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.create(bind=conn, checkfirst=True)
+        
+        for nombre, sentencias in _DDL_SOPORTE.items():
+            for sentencia in sentencias:
+                conn.exec_driver_sql(sentencia)
+            logger.debug(f"DDL de soporte aplicado: {nombre}")
+        
+        conn.exec_driver_sql(f"PRAGMA user_version = {huella}")
+
+
+def asegurar_esquema(engine, metadata) -> bool:
+    """
+    Verificar el esquema al arrancar.
+    
+    Retorna True si se ejecutó una migración, False si la huella coincidía
+    y no fue necesario emitir DDL.
+    """
+    huella = calcular_huella(metadata)
+    
+    with engine.connect() as conn:
+        guardada = leer_huella(conn)
+    
+    if guardada == huella:
+        logger.info(f"Esquema al día (huella {huella:08x})")
+        return False
+    
+    logger.info(f"Huella de esquema distinta ({guardada:08x} → {huella:08x}), migrando...")
+    migrar_esquema(engine, metadata, huella)
+    logger.info("Migración de esquema completada")
+    return True
\ No newline at end of file
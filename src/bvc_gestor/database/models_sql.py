@@ -32,7 +32,7 @@ import logging
 from .engine import Base
 from ..utils.constants import (
     TipoInversor, EstadoOrden, TipoOrden, 
-    TipoMovimiento, EstadoMovimiento
+    TipoMovimiento, EstadoMovimiento, MetodoCosto
 )
 
 logger = logging.getLogger(__name__)
@@ -562,6 +562,12 @@ class TituloDB(Base, AuditMixin):
     # Un título tiene múltiples precios en el tiempo
     precios = relationship("PrecioTituloDB", back_populates="titulo")
     
+    # Último precio ACTUAL (tabla mantenida por triggers, ver ddl_soporte.py).
+    # Se carga con JOIN junto al título para no recorrer el historial.
+    ultimo_precio = relationship(
+        "UltimoPrecioDB", uselist=False, lazy="joined", viewonly=True
+    )
+    
     # ==========================================
     # CONFIGURACIÓN DE LA TABLA
     # ==========================================
@@ -585,25 +591,18 @@ class TituloDB(Base, AuditMixin):
         Obtiene el precio actual más reciente.
         
         Nota: Ya no almacenamos precio_actual como campo separado.
-        Lo calculamos dinámicamente desde la tabla de precios.
+        Se lee de la tabla ultimo_precio, que los triggers de
+        precios_titulos mantienen al día en cada inserción.
         """
-        if self.precios:
-            # Filtrar precios actuales (tipo='ACTUAL')
-            precios_actuales = [p for p in self.precios if p.tipo == 'ACTUAL']
-            if precios_actuales:
-                # Ordenar por fecha descendente y tomar el más reciente
-                precios_actuales.sort(key=lambda x: x.fecha_hora, reverse=True)
-                return precios_actuales[0].precio
+        if self.ultimo_precio:
+            return self.ultimo_precio.precio
         return None
     
     @property
     def fecha_actualizacion_precio(self) -> Optional[datetime]:
         """Obtiene la fecha del último precio actual"""
-        if self.precios:
-            precios_actuales = [p for p in self.precios if p.tipo == 'ACTUAL']
-            if precios_actuales:
-                precios_actuales.sort(key=lambda x: x.fecha_hora, reverse=True)
-                return precios_actuales[0].fecha_hora
+        if self.ultimo_precio:
+            return self.ultimo_precio.fecha_hora
         return None
     
     # ==========================================
@@ -735,6 +734,30 @@ class PrecioTituloDB(Base, AuditMixin):
         return f"<PrecioTituloDB(titulo_id={self.titulo_id}, precio={self.precio}, tipo='{self.tipo}')>"
 
 
+class UltimoPrecioDB(Base):  # NOTA: No hereda AuditMixin (tabla derivada)
+    """
+    Último precio ACTUAL de cada título.
+    
+    Propósito: Evitar recorrer el historial de precios_titulos para conocer
+    el precio vigente. La mantienen los triggers de precios_titulos
+    (inserción, actualización y borrado); no se escribe desde la aplicación.
+    """
+    __tablename__ = "ultimo_precio"
+    
+    # Título (una fila por título)
+    titulo_id: Mapped[int] = mapped_column(ForeignKey("titulos.id"), primary_key=True)
+    
+    # Fila de precios_titulos de la que proviene el precio
+    precio_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    
+    # Precio vigente y su fecha
+    precio: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False)
+    fecha_hora: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    
+    def __repr__(self) -> str:
+        return f"<UltimoPrecioDB(titulo_id={self.titulo_id}, precio={self.precio})>"
+
+
 # ============================================================================
 # 5. OPERACIONES BURSÁTILES
 # ============================================================================
@@ -805,6 +828,21 @@ class OrdenDB(Base, AuditMixin):
     # Monto total estimado (incluyendo comisiones)
     monto_total_estimado: Mapped[Optional[Decimal]] = mapped_column(DECIMAL(20, 8), nullable=True)
     
+    # ==========================================
+    # EJECUCIÓN ACUMULADA
+    # ==========================================
+    
+    # Títulos ya ejecutados (suma de transacciones.cantidad_ejecutada).
+    # Los mantienen los triggers de transacciones (ver ddl_soporte.py)
+    cantidad_ejecutada: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    
+    # Monto bruto ya ejecutado (suma de transacciones.monto_bruto)
+    monto_ejecutado: Mapped[Decimal] = mapped_column(
+        DECIMAL(20, 8), default=Decimal('0'), server_default="0", nullable=False
+    )
+    
     # ==========================================
     # RELACIONES
     # ==========================================
@@ -833,13 +871,17 @@ class OrdenDB(Base, AuditMixin):
     
     __table_args__ = (
         # Índices para consultas frecuentes
-        Index('idx_orden_cliente', 'cliente_id'),
         Index('idx_orden_titulo', 'titulo_id'),
         Index('idx_orden_estado', 'estado'),
         Index('idx_orden_fecha', 'fecha_registro'),
-        Index('idx_orden_cuenta', 'cuenta_id'),
         Index('idx_orden_vencimiento', 'fecha_vencimiento'),
         
+        # Listados por cliente/cuenta ordenados por fecha (paginación por
+        # keyset): SQLite agrega el rowid al final, así que el índice
+        # cubre el orden (fecha_registro, id) sin ordenamiento temporal
+        Index('idx_orden_cliente_fecha', 'cliente_id', 'fecha_registro'),
+        Index('idx_orden_cuenta_fecha', 'cuenta_id', 'fecha_registro'),
+        
         # La cantidad debe ser positiva
         CheckConstraint('cantidad_total > 0', name='check_orden_cantidad'),
     )
@@ -859,22 +901,17 @@ class OrdenDB(Base, AuditMixin):
     # PROPIEDADES CALCULADAS
     # ==========================================
     
-    @property
-    def cantidad_ejecutada(self) -> int:
-        """Cantidad total ya ejecutada en transacciones"""
-        return sum(t.cantidad_ejecutada for t in self.transacciones)
-    
     @property
     def cantidad_pendiente(self) -> int:
         """Cantidad que falta por ejecutar"""
-        return max(0, self.cantidad_total - self.cantidad_ejecutada)
+        return max(0, self.cantidad_total - (self.cantidad_ejecutada or 0))
     
     @property
     def porcentaje_ejecutado(self) -> float:
         """Porcentaje de la orden ya ejecutado"""
         if self.cantidad_total == 0:
             return 0.0
-        return (self.cantidad_ejecutada / self.cantidad_total) * 100
+        return ((self.cantidad_ejecutada or 0) / self.cantidad_total) * 100
     
     # ==========================================
     # MÉTODOS DE UTILIDAD
@@ -889,6 +926,7 @@ class OrdenDB(Base, AuditMixin):
             'cantidad_ejecutada': self.cantidad_ejecutada,
             'cantidad_pendiente': self.cantidad_pendiente,
             'porcentaje_ejecutado': self.porcentaje_ejecutado,
+            'monto_ejecutado': float(self.monto_ejecutado or 0),
             'precio_limite': float(self.precio_limite) if self.precio_limite else None,
             'cliente_id': self.cliente_id,
             'cuenta_id': self.cuenta_id,
@@ -904,6 +942,28 @@ class OrdenDB(Base, AuditMixin):
         return f"<OrdenDB(id={self.id}, tipo='{self.tipo}', estado='{self.estado}', cantidad={self.cantidad_total})>"
 
 
+class ContadorOrdenesDB(Base):  # NOTA: No hereda AuditMixin (tabla derivada)
+    """
+    Cantidad y monto estimado de órdenes por cliente y estado.
+    
+    Propósito: Responder las estadísticas de órdenes del tablero sin
+    recorrer la tabla ordenes. La mantienen los triggers de ordenes
+    (inserción, cambio de estado/monto/cliente y borrado); no se escribe
+    desde la aplicación.
+    """
+    __tablename__ = "contador_ordenes"
+    
+    cliente_id: Mapped[int] = mapped_column(ForeignKey("clientes.id"), primary_key=True)
+    estado: Mapped[EstadoOrden] = mapped_column(SQLAlchemyEnum(EstadoOrden), primary_key=True)
+    
+    # Órdenes en ese estado y suma de su monto_total_estimado
+    cantidad: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    monto: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False, default=0, server_default="0")
+    
+    def __repr__(self) -> str:
+        return f"<ContadorOrdenesDB(cliente_id={self.cliente_id}, estado='{self.estado}', cantidad={self.cantidad})>"
+
+
 class TransaccionDB(Base, AuditMixin):
     """
     Ejecución real de una orden en la bolsa (calce).
@@ -1362,6 +1422,200 @@ class PortafolioItemDB(Base, AuditMixin):
         return f"<PortafolioItemDB(cuenta_id={self.cuenta_id}, titulo_id={self.titulo_id}, cantidad={self.cantidad})>"
 
 
+class SnapshotValoracionDB(Base):  # NOTA: No hereda AuditMixin (tabla derivada)
+    """
+    Valoración de cierre de cada cuenta bursátil, un registro por día.
+    
+    Propósito: Historial del valor del portafolio para gráficos de
+    rendimiento y estados de cuenta, sin reconstruirlo desde transacciones
+    y precios. La llena el cierre diario (services/snapshot_service.py):
+    de forma incremental para el día en curso y por rangos en el backfill.
+    """
+    __tablename__ = "snapshot_valoracion"
+    
+    # Cuenta bursátil y día de cierre
+    cuenta_id: Mapped[int] = mapped_column(ForeignKey("cuentas_bursatiles.id"), primary_key=True)
+    fecha: Mapped[date] = mapped_column(Date, primary_key=True)
+    
+    # ==========================================
+    # VALORACIÓN (posiciones con precio)
+    # ==========================================
+    
+    # Valor de mercado, costo y ganancia/pérdida no realizada
+    valor_mercado: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False, default=Decimal('0.0'))
+    costo_total: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False, default=Decimal('0.0'))
+    ganancia_perdida: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False, default=Decimal('0.0'))
+    
+    # Posiciones abiertas valoradas y sin precio (estas no entran en el valor)
+    posiciones: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sin_precio: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    
+    # Compras menos ventas ejecutadas en el día (monto bruto)
+    flujo_neto: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False, default=Decimal('0.0'))
+    
+    # Momento en que se calculó el registro
+    fecha_calculo: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        # Valoración de toda la firma en un día
+        Index('idx_snapshot_fecha', 'fecha', 'cuenta_id'),
+    )
+    
+    def to_dict(self) -> dict:
+        """Convierte a diccionario"""
+        return {
+            'cuenta_id': self.cuenta_id,
+            'fecha': self.fecha.isoformat(),
+            'valor_mercado': float(self.valor_mercado),
+            'costo_total': float(self.costo_total),
+            'ganancia_perdida': float(self.ganancia_perdida),
+            'posiciones': self.posiciones,
+            'sin_precio': self.sin_precio,
+            'flujo_neto': float(self.flujo_neto),
+        }
+    
+    def __repr__(self) -> str:
+        return f"<SnapshotValoracionDB(cuenta_id={self.cuenta_id}, fecha={self.fecha}, valor={self.valor_mercado})>"
+
+
+class LoteFiscalDB(Base):  # NOTA: No hereda AuditMixin (tabla derivada)
+    """
+    Lote de títulos adquirido en una compra, con su costo.
+    
+    Propósito: Base de costo por lote para las ganancias realizadas. Cada
+    ejecución de compra crea un lote y cada venta consume lotes según el
+    método de costo (services/lotes_fiscales_service.py). Los lotes sin
+    transacción son de apertura: la posición que ya existía al construir
+    el libro.
+    """
+    __tablename__ = "lotes_fiscales"
+    
+    # ID único
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    
+    # Posición a la que pertenece el lote
+    cuenta_id: Mapped[int] = mapped_column(ForeignKey("cuentas_bursatiles.id"), nullable=False)
+    titulo_id: Mapped[int] = mapped_column(ForeignKey("titulos.id"), nullable=False)
+    
+    # Ejecución de compra que lo creó (NULL en lotes de apertura)
+    transaccion_id: Mapped[Optional[int]] = mapped_column(ForeignKey("transacciones.id"), nullable=True)
+    
+    # Fecha de adquisición (orden de consumo en FIFO)
+    fecha_compra: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    
+    # ==========================================
+    # CANTIDAD Y COSTO
+    # ==========================================
+    
+    # Títulos comprados y los que aún no se han vendido
+    cantidad_original: Mapped[int] = mapped_column(Integer, nullable=False)
+    cantidad_restante: Mapped[int] = mapped_column(Integer, nullable=False)
+    
+    # Costo por título, comisiones de compra incluidas
+    costo_unitario: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False)
+    
+    __table_args__ = (
+        # Lotes de una posición en orden de consumo
+        Index('idx_lote_fiscal_posicion', 'cuenta_id', 'titulo_id', 'fecha_compra'),
+        
+        # Una compra crea un solo lote
+        UniqueConstraint('transaccion_id', name='uq_lote_fiscal_transaccion'),
+        
+        CheckConstraint(
+            'cantidad_restante >= 0 AND cantidad_restante <= cantidad_original',
+            name='check_lote_fiscal_cantidad'
+        ),
+    )
+    
+    def to_dict(self) -> dict:
+        """Convierte a diccionario"""
+        return {
+            'id': self.id,
+            'cuenta_id': self.cuenta_id,
+            'titulo_id': self.titulo_id,
+            'transaccion_id': self.transaccion_id,
+            'fecha_compra': self.fecha_compra.isoformat(),
+            'cantidad_original': self.cantidad_original,
+            'cantidad_restante': self.cantidad_restante,
+            'costo_unitario': float(self.costo_unitario),
+        }
+    
+    def __repr__(self) -> str:
+        return f"<LoteFiscalDB(id={self.id}, cuenta_id={self.cuenta_id}, titulo_id={self.titulo_id}, restante={self.cantidad_restante})>"
+
+
+class GananciaRealizadaDB(Base):  # NOTA: No hereda AuditMixin (tabla derivada)
+    """
+    Ganancia o pérdida realizada de una venta sobre un lote.
+    
+    Propósito: Reportes fiscales de ganancias realizadas como consulta
+    por rango de fechas, sin repetir el historial de transacciones. Una
+    venta que consume varios lotes genera un registro por lote.
+    """
+    __tablename__ = "ganancias_realizadas"
+    
+    # ID único
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    
+    # Ejecución de venta
+    transaccion_id: Mapped[int] = mapped_column(ForeignKey("transacciones.id"), nullable=False)
+    
+    # Lote consumido (NULL si la venta excedió los lotes abiertos)
+    lote_id: Mapped[Optional[int]] = mapped_column(ForeignKey("lotes_fiscales.id"), nullable=True)
+    
+    # Posición vendida
+    cuenta_id: Mapped[int] = mapped_column(ForeignKey("cuentas_bursatiles.id"), nullable=False)
+    titulo_id: Mapped[int] = mapped_column(ForeignKey("titulos.id"), nullable=False)
+    
+    # Fechas de venta y de adquisición del lote (período de tenencia)
+    fecha_venta: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    fecha_compra: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    
+    # ==========================================
+    # RESULTADO
+    # ==========================================
+    
+    # Títulos vendidos de este lote
+    cantidad: Mapped[int] = mapped_column(Integer, nullable=False)
+    
+    # Monto recibido (neto de comisiones de venta) y costo del lote
+    monto_venta: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False)
+    costo_base: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False)
+    ganancia_perdida: Mapped[Decimal] = mapped_column(DECIMAL(20, 8), nullable=False)
+    
+    # Método de costo aplicado
+    metodo: Mapped[MetodoCosto] = mapped_column(SQLAlchemyEnum(MetodoCosto), nullable=False)
+    
+    __table_args__ = (
+        # Reportes por período: toda la firma y por cuenta
+        Index('idx_ganancia_fecha', 'fecha_venta'),
+        Index('idx_ganancia_cuenta_fecha', 'cuenta_id', 'fecha_venta'),
+        Index('idx_ganancia_transaccion', 'transaccion_id'),
+        
+        CheckConstraint('cantidad > 0', name='check_ganancia_cantidad'),
+    )
+    
+    def to_dict(self) -> dict:
+        """Convierte a diccionario"""
+        return {
+            'id': self.id,
+            'transaccion_id': self.transaccion_id,
+            'lote_id': self.lote_id,
+            'cuenta_id': self.cuenta_id,
+            'titulo_id': self.titulo_id,
+            'fecha_venta': self.fecha_venta.isoformat(),
+            'fecha_compra': self.fecha_compra.isoformat() if self.fecha_compra else None,
+            'cantidad': self.cantidad,
+            'monto_venta': float(self.monto_venta),
+            'costo_base': float(self.costo_base),
+            'ganancia_perdida': float(self.ganancia_perdida),
+            'metodo': self.metodo.value,
+        }
+    
+    def __repr__(self) -> str:
+        return f"<GananciaRealizadaDB(transaccion_id={self.transaccion_id}, lote_id={self.lote_id}, ganancia={self.ganancia_perdida})>"
+
+
 # ============================================================================
 # 8. SOPORTE Y CONFIGURACIÓN
 # ============================================================================
@@ -1558,6 +1812,28 @@ class ConfiguracionDB(Base, AuditMixin):
         return f"<ConfiguracionDB(clave='{self.clave}', categoria='{self.categoria}', valor='{self.valor}')>"
 
 
+class CambioTablaDB(Base):  # NOTA: No hereda AuditMixin (tabla derivada)
+    """
+    Contador de cambios por tabla.
+    
+    Propósito: Saber qué tablas modificó otro proceso (otra instancia de
+    la aplicación, el inicializador de datos, una importación externa)
+    para invalidar solo sus entradas en la caché de repositorios. Lo
+    mantienen triggers de inserción, actualización y borrado en cada
+    tabla; no se escribe desde la aplicación.
+    """
+    __tablename__ = "cambios_tablas"
+    
+    # Nombre de la tabla vigilada
+    tabla: Mapped[str] = mapped_column(String(50), primary_key=True)
+    
+    # Aumenta en uno por cada fila insertada, modificada o borrada
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    
+    def __repr__(self) -> str:
+        return f"<CambioTablaDB(tabla='{self.tabla}', version={self.version})>"
+
+
 # ============================================================================
 # 9. CLASE AUXILIAR PARA CÁLCULOS
 # ============================================================================
@@ -0,0 +1,105 @@
+# src/bvc_gestor/database/perfiles_rendimiento.py
+"""
+Perfiles de rendimiento SQLite.
+
+Cada perfil agrupa los PRAGMAs por conexión que afectan el rendimiento.
+El perfil activo se elige desde la variable de entorno DB_PROFILE o desde
+app_config.json (sección "base_datos" -> "perfil_rendimiento") y puede
+cambiarse en caliente con DatabaseEngine.aplicar_perfil().
+
+Valores medidos con scripts/benchmark_perfiles_sqlite.py.
+"""
+import json
+import os
+from typing import Dict, List
+
+from ..utils.constants import CONFIG_DIR
+from ..utils.logger import logger
+
+PERFIL_POR_DEFECTO = "desktop"
+
+PERFILES_SQLITE: Dict[str, Dict[str, object]] = {
+    # Uso interactivo: caché moderada, lecturas mapeadas en memoria y
+    # checkpoints frecuentes para mantener el WAL pequeño
+    "desktop": {
+        "cache_size": -16000,           # 16MB
+        "mmap_size": 64 * 1024 * 1024,  # 64MB
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,     # páginas
+        "busy_timeout": 30000,          # ms (igual al timeout de conexión)
+        "synchronous": "NORMAL",
+    },
+    # Cargas masivas (inicialización, importación de precios): caché grande,
+    # checkpoints espaciados y sin fsync por transacción. Solo para cargas
+    # que se pueden repetir si se pierde la energía a mitad de proceso.
+    "bulk-load": {
+        "cache_size": -65536,            # 64MB
+        "mmap_size": 256 * 1024 * 1024,  # 256MB
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10000,
+        "busy_timeout": 60000,
+        "synchronous": "OFF",
+    },
+    # Reportes y análisis: recorridos largos y ordenamientos en memoria
+    "reporting": {
+        "cache_size": -131072,           # 128MB
+        "mmap_size": 512 * 1024 * 1024,  # 512MB
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+        "busy_timeout": 30000,
+        "synchronous": "NORMAL",
+    },
+}
+
+
+def validar_perfil(nombre: str) -> str:
+    """Normaliza el nombre del perfil o lanza ValueError si no existe"""
+    clave = (nombre or "").strip().lower()
+    if clave not in PERFILES_SQLITE:
+        raise ValueError(
+            f"Perfil SQLite desconocido '{nombre}'. "
+            f"Disponibles: {', '.join(PERFILES_SQLITE)}"
+        )
+    return clave
+
+
+def resolver_perfil_inicial() -> str:
+    """
+    Perfil con el que arranca el motor.
+    
+    Prioridad: variable de entorno DB_PROFILE > app_config.json > 'desktop'.
+    """
+    candidato = os.getenv("DB_PROFILE")
+    
+    if not candidato:
+        ruta_config = CONFIG_DIR / "app_config.json"
+        try:
+            if ruta_config.exists():
+                with open(ruta_config, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                candidato = config.get("base_datos", {}).get("perfil_rendimiento")
+        except Exception as e:
+            logger.warning(f"No se pudo leer perfil SQLite de {ruta_config}: {e}")
+    
+    if not candidato:
+        return PERFIL_POR_DEFECTO
+    
+    try:
+        return validar_perfil(candidato)
+    except ValueError as e:
+        logger.warning(f"{e}. Usando '{PERFIL_POR_DEFECTO}'")
+        return PERFIL_POR_DEFECTO
+
+
+def sentencias_pragma(nombre: str, solo_lectura: bool = False) -> List[str]:
+    """PRAGMAs a ejecutar en una conexión para aplicar el perfil"""
+    perfil = PERFILES_SQLITE[validar_perfil(nombre)]
+    sentencias = []
+    
+    for pragma, valor in perfil.items():
+        # En conexiones de solo lectura no aplica la durabilidad de escritura
+        if solo_lectura and pragma in ("synchronous", "wal_autocheckpoint"):
+            continue
+        sentencias.append(f"PRAGMA {pragma} = {valor}")
+    
+    return sentencias
\ No newline at end of file
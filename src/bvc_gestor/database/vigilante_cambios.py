@@ -0,0 +1,196 @@
+# src/bvc_gestor/database/vigilante_cambios.py
+"""
+Invalidación de la caché por cambios de otros procesos.
+
+La caché de repositorios se entera de las escrituras de este proceso (ver
+cache_repositorio.instalar_invalidacion), pero no de las de otra
+instancia de la aplicación, del inicializador de datos en otro proceso o
+de una importación externa. Para eso:
+
+- PRAGMA data_version, leído en una conexión propia que nunca escribe,
+  cambia cuando cualquier otra conexión confirma una transacción. Es una
+  lectura en memoria, sin E/S: se consulta como máximo cada 'intervalo'
+  segundos al leer de la caché.
+- Si cambió, la tabla cambios_tablas (versión por tabla vigilada,
+  mantenida por triggers; ver ddl_soporte.py) dice qué tablas se
+  modificaron y solo se invalidan los modelos de esas tablas.
+
+Las escrituras de este mismo proceso también mueven data_version. Cada
+sesión de escritura (BEGIN IMMEDIATE) lee cambios_tablas al empezar y al
+confirmar, con el lock de escritura tomado, y registra aquí el salto de
+versión de cada tabla (registrar_commit_propio): un cambio de versión
+que se explica por esos saltos ya fue invalidado por la sesión y no se
+repite.
+
+Las tablas no vigiladas (historiales y derivadas) no tienen versión: sus
+modelos se invalidan cuando hubo un commit externo, es decir, cuando
+data_version cambió sin commits propios en el intervalo o con cambios
+externos en alguna tabla vigilada. Un commit externo que solo toque
+tablas no vigiladas en el mismo intervalo que uno propio no se detecta.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..utils.logger import logger
+
+# Segundos mínimos entre dos consultas de PRAGMA data_version
+INTERVALO_POR_DEFECTO = 0.5
+
+# Tabla de versiones por tabla vigilada (ver ddl_soporte.py)
+TABLA_VERSIONES = "cambios_tablas"
+
+
+class VigilanteCambios:
+    """Detecta commits de otros procesos e invalida los modelos afectados"""
+    
+    def __init__(self, db_path: Path, cache, modelos_tabla: Dict[str, List[str]],
+                 intervalo: float = INTERVALO_POR_DEFECTO):
+        self.db_path = Path(db_path)
+        self.cache = cache
+        self.modelos_tabla = modelos_tabla
+        self.intervalo = intervalo
+        
+        self._conexion: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._versiones: Dict[str, int] = {}
+        # Commits propios desde la última verificación: tabla -> {versión inicial: final}
+        self._transiciones: Dict[str, Dict[int, int]] = {}
+        self._commits_propios = 0
+        self._lock_propios = threading.Lock()
+        self._proxima = 0.0
+        self._fallando = False
+        self._lock = threading.Lock()
+        
+        # Diagnóstico
+        self.verificaciones = 0
+        self.cambios_detectados = 0
+    
+    # ==================== API ====================
+    
+    def verificar(self, forzar: bool = False) -> List[str]:
+        """
+        Invalidar los modelos de las tablas que cambiaron desde la última
+        verificación. Retorna esas tablas (vacío si nada cambió o si no
+        tocaba verificar todavía).
+        """
+        ahora = time.monotonic()
+        if not forzar and ahora < self._proxima:
+            return []
+        
+        # Otro hilo ya está verificando: no hace falta esperar
+        if not self._lock.acquire(blocking=forzar):
+            return []
+        try:
+            self._proxima = ahora + self.intervalo
+            cambiadas = self._verificar()
+            self._fallando = False
+            return cambiadas
+        except sqlite3.Error as e:
+            # Base aún sin crear/migrar: se reintenta en la próxima lectura
+            if not self._fallando:
+                logger.warning(f"No se pudo verificar cambios externos: {e}")
+            self._fallando = True
+            self._cerrar_conexion()
+            return []
+        finally:
+            self._lock.release()
+    
+    def registrar_commit_propio(self, inicio: Dict[str, int], fin: Dict[str, int]):
+        """
+        Versiones de cambios_tablas al empezar y al confirmar una
+        transacción de escritura de este proceso (ya confirmada)
+        """
+        with self._lock_propios:
+            self._commits_propios += 1
+            for tabla, version in fin.items():
+                anterior = inicio.get(tabla)
+                if anterior is not None and anterior != version:
+                    self._transiciones.setdefault(tabla, {})[anterior] = version
+    
+    def cerrar(self):
+        with self._lock:
+            self._cerrar_conexion()
+    
+    def estadisticas(self) -> dict:
+        """Verificaciones hechas y cambios externos detectados (diagnóstico)"""
+        return {
+            'verificaciones': self.verificaciones,
+            'cambios_detectados': self.cambios_detectados,
+            'data_version': self._data_version,
+        }
+    
+    # ==================== INTERNOS ====================
+    
+    def _conectar(self) -> sqlite3.Connection:
+        if self._conexion is None:
+            # Solo lectura y en modo autocommit: nunca retiene un snapshot
+            self._conexion = sqlite3.connect(
+                f"file:{self.db_path.as_posix()}?mode=ro", uri=True,
+                check_same_thread=False, isolation_level=None, timeout=5
+            )
+        return self._conexion
+    
+    def _cerrar_conexion(self):
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+            self._data_version = None
+    
+    def _verificar(self) -> List[str]:
+        conexion = self._conectar()
+        self.verificaciones += 1
+        
+        data_version = conexion.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return []
+        self._data_version = data_version
+        primera = not self._versiones
+        
+        versiones = dict(conexion.execute(f"SELECT tabla, version FROM {TABLA_VERSIONES}"))
+        with self._lock_propios:
+            commits_propios, self._commits_propios = self._commits_propios, 0
+            transiciones = self._transiciones
+            # Las que empiezan en la versión leída son de commits posteriores
+            self._transiciones = {
+                tabla: {inicio: fin for inicio, fin in saltos.items() if inicio >= versiones.get(tabla, 0)}
+                for tabla, saltos in transiciones.items()
+            }
+        
+        cambiadas = [
+            tabla for tabla, version in versiones.items()
+            if not self._explicado(self._versiones.get(tabla), version, transiciones.get(tabla, {}))
+        ]
+        self._versiones = versiones
+        
+        # La primera lectura solo fija la línea base
+        if primera:
+            return []
+        
+        # Hubo un commit externo: las tablas sin versión pudieron cambiar
+        if cambiadas or not commits_propios:
+            cambiadas += [
+                tabla for tabla in self.modelos_tabla
+                if tabla not in versiones and tabla != TABLA_VERSIONES
+            ]
+        if not cambiadas:
+            return []
+        
+        for tabla in cambiadas:
+            for modelo in self.modelos_tabla.get(tabla, ()):
+                self.cache.invalidar(modelo)
+        self.cambios_detectados += 1
+        logger.debug(f"Cambios externos en: {', '.join(cambiadas)}")
+        return cambiadas
+    
+    @staticmethod
+    def _explicado(anterior: Optional[int], actual: int, saltos: Dict[int, int]) -> bool:
+        """El paso de 'anterior' a 'actual' es una cadena de commits propios"""
+        version = anterior
+        for _ in range(len(saltos)):
+            if version == actual:
+                break
+            version = saltos.get(version)
+        return version == actual
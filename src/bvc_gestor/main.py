@@ -14,6 +14,7 @@ from PyQt6.QtGui import QFont
 from .ui.windows.main_window import MainWindow
 from .utils.logger import logger
 from .database.engine import get_database
+from .services.lotes_fiscales_service import LotesFiscalesService
 from .core.app_state import AppState
 from .core.error_handler import GlobalExceptionHandler
 
@@ -48,13 +49,20 @@ class BVCGestorApp:
             if db_engine.test_connection():
                 logger.info("Conexión a base de datos exitosa")
                 
-                # Crear tablas si no existen
-                db_engine.create_tables()
+                # Crear/migrar tablas solo si cambió la huella del esquema
+                db_engine.asegurar_esquema()
                 logger.info("Tablas de base de datos verificadas")
                 
                 # Preguntar si se deben cargar datos iniciales
                 self._preguntar_inicializacion_datos(db_engine)
                 
+                # Catálogos maestros en memoria (bancos, casas de bolsa, títulos)
+                db_engine.get_catalogo().cargar()
+                
+                # Libro de lotes fiscales: la primera vez se construye completo;
+                # después aplica lo que el registro de ejecuciones dejó pendiente
+                self._sincronizar_lotes_fiscales(db_engine)
+            
             else:
                 logger.error("✗ Error conectando a base de datos")
                 
@@ -69,6 +77,15 @@ class BVCGestorApp:
             self._show_database_error(e)
             return False
     
+    def _sincronizar_lotes_fiscales(self, db_engine):
+        """Sincronizar el libro de lotes fiscales (sin impedir el arranque)"""
+        try:
+            resumen = LotesFiscalesService(db_engine).sincronizar()
+            if resumen['ejecuciones']:
+                logger.info(f"Libro de lotes fiscales: {resumen['ejecuciones']} ejecuciones aplicadas")
+        except Exception as e:
+            logger.error(f"✗ Error sincronizando el libro de lotes fiscales: {e}")
+    
     def _show_database_error(self, error=None):
         """Mostrar error de base de datos de forma amigable"""
         try:
@@ -93,7 +110,7 @@ class BVCGestorApp:
             
             result = msg_box.exec()
             return result == QMessageBox.StandardButton.Retry
-            
+        
         except Exception as e:
             logger.error(f"No se pudo mostrar error de BD: {e}")
             return False
@@ -102,15 +119,17 @@ class BVCGestorApp:
         """Preguntar al usuario si desea cargar datos iniciales"""
         try:
             # Verificar si ya hay datos
-            session = db_engine.get_session()
+            session = db_engine.get_read_session()
             from .database.models_sql import ClienteDB
             
-            # Contar clientes existentes
-            count_clientes = session.query(ClienteDB).filter_by(estatus=True).count()
+            # EXISTS se detiene en la primera fila (COUNT recorre la tabla)
+            hay_clientes = session.query(
+                session.query(ClienteDB.id).filter_by(estatus=True).exists()
+            ).scalar()
             session.close()
             
-            if count_clientes > 0:
-                logger.info(f"Base de datos ya tiene {count_clientes} clientes")
+            if hay_clientes:
+                logger.info("Base de datos ya tiene clientes")
                 return
             
             # Solo preguntar si no hay clientes
@@ -118,7 +137,7 @@ class BVCGestorApp:
             
             # Si es la primera ejecución, cargar datos automáticamente
             self._cargar_datos_iniciales(db_engine)
-            
+        
         except Exception as e:
             logger.error(f"Error verificando datos existentes: {e}")
     
@@ -149,7 +168,7 @@ class BVCGestorApp:
                     "• Configuración básica\n\n"
                     "¡Ya puedes comenzar a usar la aplicación!"
                 )
-                
+        
         except ImportError:
             logger.warning("Módulo data_initializer no encontrado, saltando carga de datos")
         except Exception as e:
@@ -190,7 +209,7 @@ class BVCGestorApp:
             app_font = QFont("Sans Serif", 10)
             self.app.setFont(app_font)
             logger.info("Fuente configurada: Sans Serif, 10pt")
-            
+        
         except Exception as e:
             logger.warning(f"No se pudo configurar fuente: {e}")
             # Usar fuente por defecto
@@ -230,7 +249,7 @@ class BVCGestorApp:
             
             # Ejecutar loop principal
             return self.app.exec()
-            
+        
         except Exception as e:
             # Este bloque ahora capturará errores durante la inicialización
             logger.error(f"Error crítico durante inicialización: {str(e)}", exc_info=True)
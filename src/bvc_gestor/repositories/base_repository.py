@@ -3,26 +3,61 @@ Base Repository - Patrón Repository para acceso a datos.
 Proporciona operaciones CRUD genéricas con caché opcional.
 """
 
-from typing import List, Optional, Dict, Any, Type, TypeVar
+import base64
+import json
+from typing import List, Optional, Dict, Any, Iterator, Sequence, Tuple, Type, TypeVar
 from sqlalchemy.orm import Session
-from sqlalchemy import inspect
-from datetime import datetime, timedelta
+from sqlalchemy import (
+    inspect, select, insert, update, func, tuple_, bindparam, type_coerce,
+    Date, DateTime, Numeric, String, UniqueConstraint
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import date, datetime
+from decimal import Decimal
+from ..database.cache_sentencias import OPCION_SENTENCIA
+from .cache_repositorio import CacheRepositorio
+from .perfiles_carga import opciones_carga
 import logging
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
 
+# Tope del conteo en las páginas por cursor: por encima se informa
+# total_estimado=TOPE_CONTEO con total_exacto=False
+TOPE_CONTEO = 10000
 
-class CacheEntry:
-    """Entrada de caché con TTL"""
-    def __init__(self, data, ttl_seconds=300):
-        self.data = data
-        self.timestamp = datetime.now()
-        self.ttl = timedelta(seconds=ttl_seconds)
-    
-    def is_valid(self):
-        return datetime.now() - self.timestamp < self.ttl
+# Columna extra de las páginas por cursor con la clave de orden DateTime
+# tal como está guardada (se quita de los items antes de devolverlos)
+CLAVE_CURSOR = '_clave_cursor'
+
+# Filas por sentencia en las operaciones masivas (bulk_*)
+TAMANO_LOTE = 1000
+
+# Por modelo: (atributos, columnas etiquetadas para select(), atributos DateTime)
+_COLUMNAS_MODELO: Dict[type, Tuple[tuple, tuple, tuple]] = {}
+
+
+def _info_columnas(model_class) -> Tuple[tuple, tuple, tuple]:
+    """Columnas mapeadas de un modelo, calculadas una sola vez"""
+    info = _COLUMNAS_MODELO.get(model_class)
+    if info is None:
+        atributos = inspect(model_class).column_attrs
+        claves = tuple(a.key for a in atributos)
+        columnas = tuple(getattr(model_class, a.key).label(a.key) for a in atributos)
+        fechas = tuple(a.key for a in atributos if isinstance(a.columns[0].type, DateTime))
+        info = _COLUMNAS_MODELO[model_class] = (claves, columnas, fechas)
+    return info
+
+
+def columnas_modelo(model_class) -> tuple:
+    """
+    Columnas del modelo etiquetadas con el nombre del atributo.
+    
+    select(*columnas_modelo(OrdenDB), TituloDB.ticker) devuelve filas planas
+    con las mismas claves que _to_dict(), sin hidratar entidades ORM.
+    """
+    return _info_columnas(model_class)[1]
 
 
 class BaseRepository:
@@ -31,36 +66,70 @@ class BaseRepository:
     Todas las consultas a BD deben pasar por repositorios.
     """
     
+    # TTL (segundos) de las entradas en caché de este modelo. Es solo un
+    # tope: las escrituras de este y de otros procesos invalidan antes
+    CACHE_TTL = 3600
+    
     def __init__(self, db_engine, model_class: Type[T]):
         self.db_engine = db_engine
         self.model_class = model_class
-        self._cache: Dict[str, CacheEntry] = {}
+        self._modelo = model_class.__name__
+        # Caché del motor, compartida con las demás instancias de repositorio
+        self._cache: CacheRepositorio = db_engine.get_cache_repositorios()
+        self._cache.configurar_ttl(self._modelo, self.CACHE_TTL)
         self._cache_enabled = True
+        self._cola_escritura = None
+    
+    # ==================== SESIONES ====================
+    
+    def _read_session(self) -> Session:
+        """
+        Sesión para métodos de consulta.
+        Usa conexiones de solo lectura que no bloquean a los escritores.
+        """
+        return self.db_engine.get_read_session()
+    
+    def _write_session(self) -> Session:
+        """Sesión para métodos que modifican datos (BEGIN IMMEDIATE)"""
+        return self.db_engine.get_write_session()
+    
+    def _execute_cached(self, session: Session, nombre: str, stmt, params: Optional[Dict] = None):
+        """
+        Ejecuta una sentencia lambda_stmt() etiquetada para el contador de caché.
+        
+        La etiqueta se pasa al ejecutar: con lambda_stmt().execution_options()
+        SQLAlchemy reutiliza los parámetros de la primera llamada.
+        """
+        return session.execute(
+            stmt, params,
+            execution_options={OPCION_SENTENCIA: f"{self.model_class.__name__}.{nombre}"}
+        )
     
     # ==================== CRUD BÁSICO ====================
     
     def get_by_id(self, id: int, use_cache=True) -> Optional[Dict]:
         """Obtiene un registro por ID"""
-        cache_key = f"{self.model_class.__name__}:{id}"
+        cache_key = CacheRepositorio.clave_id(self._modelo, id)
         
         # Verificar caché
         if use_cache and self._cache_enabled:
-            cached = self._cache.get(cache_key)
-            if cached and cached.is_valid():
+            cached = self._cache.obtener(cache_key)
+            if cached is not None:
                 logger.debug(f"Cache HIT: {cache_key}")
-                return cached.data
+                return cached
         
         # Query a BD
         try:
-            with self.db_engine.get_session() as session:
-                entity = session.query(self.model_class).filter_by(id=id).first()
+            with self._read_session() as session:
+                stmt = self._select_modelo().where(self.model_class.id == id)
+                filas = self._filas_a_dicts(session.execute(stmt).mappings().all())
                 
-                if entity:
-                    data = self._to_dict(entity)
+                if filas:
+                    data = filas[0]
                     
                     # Guardar en caché
                     if use_cache and self._cache_enabled:
-                        self._cache[cache_key] = CacheEntry(data)
+                        self._cache.guardar(cache_key, data)
                     
                     return data
                 
@@ -72,27 +141,26 @@ class BaseRepository:
     
     def get_all(self, filters: Optional[Dict] = None, use_cache=False) -> List[Dict]:
         """Obtiene todos los registros con filtros opcionales"""
-        cache_key = f"{self.model_class.__name__}:all:{str(filters)}"
+        cache_key = CacheRepositorio.clave_consulta(self._modelo, 'all', filters)
         
         if use_cache and self._cache_enabled:
-            cached = self._cache.get(cache_key)
-            if cached and cached.is_valid():
+            cached = self._cache.obtener(cache_key)
+            if cached is not None:
                 logger.debug(f"Cache HIT: {cache_key}")
-                return cached.data
+                return cached
         
         try:
-            with self.db_engine.get_session() as session:
-                query = session.query(self.model_class)
+            with self._read_session() as session:
+                stmt = self._select_modelo()
                 
                 # Aplicar filtros
                 if filters:
-                    query = query.filter_by(**filters)
+                    stmt = stmt.where(*self._condiciones(filters))
                 
-                entities = query.all()
-                data = [self._to_dict(e) for e in entities]
+                data = self._filas_a_dicts(session.execute(stmt).mappings())
                 
                 if use_cache and self._cache_enabled:
-                    self._cache[cache_key] = CacheEntry(data)
+                    self._cache.guardar(cache_key, data)
                 
                 return data
         
@@ -103,7 +171,7 @@ class BaseRepository:
     def create(self, data: Dict) -> Optional[int]:
         """Crea un nuevo registro"""
         try:
-            with self.db_engine.get_session() as session:
+            with self._write_session() as session:
                 entity = self.model_class(**data)
                 session.add(entity)
                 session.commit()
@@ -121,7 +189,7 @@ class BaseRepository:
     def update(self, id: int, data: Dict) -> bool:
         """Actualiza un registro existente"""
         try:
-            with self.db_engine.get_session() as session:
+            with self._write_session() as session:
                 entity = session.query(self.model_class).filter_by(id=id).first()
                 
                 if not entity:
@@ -148,7 +216,7 @@ class BaseRepository:
     def delete(self, id: int) -> bool:
         """Elimina un registro (soft delete si tiene campo 'activo')"""
         try:
-            with self.db_engine.get_session() as session:
+            with self._write_session() as session:
                 entity = session.query(self.model_class).filter_by(id=id).first()
                 
                 if not entity:
@@ -175,7 +243,7 @@ class BaseRepository:
     def exists(self, id: int) -> bool:
         """Verifica si existe un registro"""
         try:
-            with self.db_engine.get_session() as session:
+            with self._read_session() as session:
                 return session.query(self.model_class).filter_by(id=id).count() > 0
         except Exception as e:
             logger.error(f"Error en exists: {e}")
@@ -184,7 +252,7 @@ class BaseRepository:
     def count(self, filters: Optional[Dict] = None) -> int:
         """Cuenta registros con filtros opcionales"""
         try:
-            with self.db_engine.get_session() as session:
+            with self._read_session() as session:
                 query = session.query(self.model_class)
                 
                 if filters:
@@ -195,46 +263,65 @@ class BaseRepository:
             logger.error(f"Error en count: {e}")
             return 0
     
+    # ==================== FILAS ====================
+    
+    def _select_modelo(self):
+        """select() Core con las columnas del modelo (sin entidades ORM)"""
+        return select(*columnas_modelo(self.model_class))
+    
+    def _condiciones(self, filters: Dict) -> list:
+        """Filtros {atributo: valor} como condiciones de igualdad"""
+        return [getattr(self.model_class, clave) == valor for clave, valor in filters.items()]
+    
+    def _filas_a_dicts(self, filas) -> List[Dict]:
+        """
+        Filas de select() (mappings) a diccionarios.
+        
+        Los DateTime del modelo se pasan a ISO columna por columna sobre
+        todo el lote; las columnas extra de la consulta se copian tal cual.
+        """
+        datos = [dict(fila) for fila in filas]
+        if datos:
+            for clave in _info_columnas(self.model_class)[2]:
+                if clave not in datos[0]:
+                    continue
+                for fila in datos:
+                    valor = fila[clave]
+                    if valor is not None:
+                        fila[clave] = valor.isoformat()
+        return datos
+    
     def _to_dict(self, entity) -> Dict:
-        """Convierte una entidad SQLAlchemy a diccionario"""
+        """
+        Convierte una entidad SQLAlchemy a diccionario.
+        
+        Para listados usar select(*columnas_modelo(...)) y _filas_a_dicts():
+        evita hidratar una entidad por fila.
+        """
         if entity is None:
             return {}
         
-        # Usar inspector de SQLAlchemy
-        mapper = inspect(entity)
-        
-        result = {}
-        for column in mapper.mapper.column_attrs:
-            value = getattr(entity, column.key)
-            
-            # Convertir datetime a string
-            if isinstance(value, datetime):
-                value = value.isoformat()
-            
-            result[column.key] = value
+        claves, _, fechas = _info_columnas(type(entity))
+        result = {clave: getattr(entity, clave) for clave in claves}
         
-        # Agregar ID si existe
-        if hasattr(entity, 'id'):
-            result['id'] = entity.id
+        # Convertir datetime a string
+        for clave in fechas:
+            valor = result[clave]
+            if isinstance(valor, datetime):
+                result[clave] = valor.isoformat()
         
         return result
     
     def _invalidate_cache(self, id: Optional[int] = None):
-        """Invalida el caché"""
-        if id:
-            # Invalidar solo el registro específico
-            cache_key = f"{self.model_class.__name__}:{id}"
-            self._cache.pop(cache_key, None)
-        else:
-            # Invalidar todo el caché del modelo
-            prefix = f"{self.model_class.__name__}:"
-            keys_to_remove = [k for k in self._cache.keys() if k.startswith(prefix)]
-            for key in keys_to_remove:
-                self._cache.pop(key, None)
+        """
+        Invalida el caché del modelo: con id, el registro y las consultas
+        que podrían incluirlo; sin id, todas sus entradas.
+        """
+        self._cache.invalidar(self._modelo, id)
     
     def clear_cache(self):
         """Limpia todo el caché"""
-        self._cache.clear()
+        self._cache.limpiar(self._modelo)
         logger.debug(f"Cache cleared for {self.model_class.__name__}")
     
     def enable_cache(self):
@@ -244,26 +331,36 @@ class BaseRepository:
     def disable_cache(self):
         """Deshabilita el caché"""
         self._cache_enabled = False
-        self._cache.clear()
+        self._cache.limpiar(self._modelo)
+    
+    def estadisticas_cache(self) -> Dict:
+        """Hits, misses, desalojos y ocupación del caché (diagnóstico)"""
+        return self._cache.estadisticas(self._modelo)
     
     # ==================== QUERY HELPERS ====================
     
     def find_one(self, **filters) -> Optional[Dict]:
         """Busca un solo registro por filtros"""
         try:
-            with self.db_engine.get_session() as session:
-                entity = session.query(self.model_class).filter_by(**filters).first()
-                return self._to_dict(entity) if entity else None
+            with self._read_session() as session:
+                stmt = self._select_modelo().where(*self._condiciones(filters)).limit(1)
+                filas = self._filas_a_dicts(session.execute(stmt).mappings().all())
+                return filas[0] if filas else None
         except Exception as e:
             logger.error(f"Error en find_one: {e}")
             return None
     
     def find_many(self, limit: Optional[int] = None, offset: int = 0, 
                   order_by: Optional[str] = None, **filters) -> List[Dict]:
-        """Busca múltiples registros con paginación"""
+        """
+        Busca múltiples registros con paginación por OFFSET.
+        
+        Para tablas grandes usar find_pagina(): OFFSET recorre y descarta
+        todas las filas anteriores a la página.
+        """
         try:
-            with self.db_engine.get_session() as session:
-                query = session.query(self.model_class)
+            with self._read_session() as session:
+                stmt = self._select_modelo()
                 
                 # Aplicar filtros CON VALIDACIÓN
                 if filters:
@@ -276,44 +373,333 @@ class BaseRepository:
                             logger.warning(f"⚠️ Filtro ignorado: '{key}' no existe en {self.model_class.__name__}")
                     
                     if valid_filters:
-                        query = query.filter_by(**valid_filters)
+                        stmt = stmt.where(*self._condiciones(valid_filters))
                     else:
                         logger.warning(f"⚠️ Ningún filtro válido para {self.model_class.__name__}")
-                        
+                
                 # Ordenamiento
                 if order_by:
                     if order_by.startswith('-'):
                         # Descendente
                         column = order_by[1:]
                         if hasattr(self.model_class, column):
-                            query = query.order_by(getattr(self.model_class, column).desc())
+                            stmt = stmt.order_by(getattr(self.model_class, column).desc())
                     else:
                         # Ascendente
                         if hasattr(self.model_class, order_by):
-                            query = query.order_by(getattr(self.model_class, order_by))
+                            stmt = stmt.order_by(getattr(self.model_class, order_by))
                 
                 # Paginación
                 if offset > 0:
-                    query = query.offset(offset)
+                    stmt = stmt.offset(offset)
                 if limit:
-                    query = query.limit(limit)
+                    stmt = stmt.limit(limit)
+                
+                results = self._filas_a_dicts(session.execute(stmt).mappings())
                 
-                entities = query.all()
-                results  = [self._to_dict(e) for e in entities]
-        
                 logger.debug(f"🔍 {self.model_class.__name__}.find_many() → {len(results)} resultados")
                 return results
-            
+        
         except Exception as e:
             logger.error(f"❌ Error en find_many {self.model_class.__name__}: {e}", exc_info=True)
             return []
     
-    def bulk_create(self, data_list: List[Dict]) -> int:
-        """Crea múltiples registros en una transacción"""
+    # ==================== ENTIDADES CON PERFIL DE CARGA ====================
+    
+    def get_entidad(self, id: int, perfil: str = 'detalle'):
+        """
+        Entidad ORM con las relaciones del perfil (ver perfiles_carga).
+        
+        Se devuelve separada de la sesión: to_dict() y las relaciones del
+        perfil se leen sin más consultas; lo que el perfil no carga lanza
+        en lugar de consultar fila por fila.
+        """
+        opciones = opciones_carga(self.model_class, perfil)
+        try:
+            with self._read_session() as session:
+                stmt = select(self.model_class).where(self.model_class.id == id).options(*opciones)
+                return session.execute(stmt).unique().scalar_one_or_none()
+        
+        except Exception as e:
+            logger.error(f"Error en get_entidad {self.model_class.__name__} ({perfil}): {e}")
+            return None
+    
+    def find_entidades(self, perfil: str = 'lista', limit: Optional[int] = None,
+                       order_by: Optional[str] = None, **filters) -> List:
+        """
+        Entidades ORM filtradas, cargadas con el perfil indicado: el número
+        de sentencias es el del perfil, no crece con las filas devueltas.
+        """
+        opciones = opciones_carga(self.model_class, perfil)
+        try:
+            with self._read_session() as session:
+                stmt = select(self.model_class).options(*opciones)
+                
+                valid_filters = {k: v for k, v in filters.items() if hasattr(self.model_class, k)}
+                if valid_filters:
+                    stmt = stmt.where(*self._condiciones(valid_filters))
+                
+                if order_by:
+                    columna = getattr(self.model_class, order_by.lstrip('-'))
+                    stmt = stmt.order_by(columna.desc() if order_by.startswith('-') else columna)
+                
+                if limit:
+                    stmt = stmt.limit(limit)
+                
+                return list(session.execute(stmt).scalars().unique())
+        
+        except Exception as e:
+            logger.error(f"Error en find_entidades {self.model_class.__name__} ({perfil}): {e}")
+            return []
+    
+    # ==================== PAGINACIÓN POR CURSOR ====================
+    
+    @staticmethod
+    def _codificar_cursor(valores: list) -> str:
+        """Token opaco con la clave de orden de la última fila entregada"""
+        crudo = json.dumps(valores, default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(crudo.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def _columna_cursor(columna):
+        """
+        Columna DateTime como el texto guardado, para el token del cursor.
+        
+        SQLite ordena y compara los DateTime como texto, y el formato varía
+        por fila: CURRENT_TIMESTAMP (server_default) no lleva microsegundos y
+        SQLAlchemy guarda '.000000' cuando son cero. Reconstruir el texto
+        desde el datetime no puede saber cuál de los dos tenía la fila.
+        """
+        return type_coerce(columna, String).label(CLAVE_CURSOR)
+    
+    @staticmethod
+    def _decodificar_cursor(token: str, columnas: list) -> list:
+        """
+        Valores del token listos para comparar con cada columna de orden.
+        
+        Los DateTime llegan como el texto guardado (ver _columna_cursor) y
+        se ligan como String, tal cual.
+        """
+        valores = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        if len(valores) != len(columnas):
+            raise ValueError("Cursor de paginación inválido")
+        
+        convertidos = []
+        for columna, valor in zip(columnas, valores):
+            tipo = columna.type
+            if valor is None:
+                pass
+            elif isinstance(tipo, DateTime):
+                if not isinstance(valor, str):
+                    raise ValueError("Cursor de paginación inválido")
+            elif isinstance(tipo, Date):
+                valor = date.fromisoformat(valor)
+            elif isinstance(tipo, Numeric):
+                valor = Decimal(valor)
+            convertidos.append(valor)
+        return convertidos
+    
+    @staticmethod
+    def _parametro_cursor(columna, valor):
+        """Parámetro para la comparación por keyset (DateTime como texto)"""
+        if isinstance(columna.type, DateTime):
+            return bindparam(None, valor, type_=String())
+        return bindparam(None, valor, type_=columna.type)
+    
+    def _armar_pagina(self, filas: List[Dict], limit: int, claves_orden: Tuple[str, ...]) -> Dict:
+        """
+        Página a partir de limit + 1 filas: la fila extra solo indica que
+        hay más; el cursor apunta a la última fila entregada.
+        """
+        hay_mas = len(filas) > limit
+        filas = filas[:limit]
+        cursor = None
+        if hay_mas and filas:
+            cursor = self._codificar_cursor([filas[-1][clave] for clave in claves_orden])
+        for fila in filas:
+            fila.pop(CLAVE_CURSOR, None)
+        return {'items': filas, 'cursor': cursor}
+    
+    def _conteo_estimado(self, session: Session, stmt) -> Dict:
+        """
+        COUNT sobre la consulta filtrada, detenido en TOPE_CONTEO filas:
+        el costo no crece con el tamaño de la tabla.
+        """
+        sub = stmt.with_only_columns(self.model_class.id).order_by(None).limit(TOPE_CONTEO).subquery()
+        total = session.execute(select(func.count()).select_from(sub)).scalar() or 0
+        return {'total_estimado': total, 'total_exacto': total < TOPE_CONTEO}
+    
+    def find_pagina(self, limit: int = 50, cursor: Optional[str] = None,
+                    order_by: str = '-fecha_registro', contar: bool = False,
+                    **filters) -> Dict:
+        """
+        Página por keyset (cursor) en lugar de OFFSET.
+        
+        Ordena por (order_by, id) y continúa con WHERE (col, id) < (último)
+        (o > en orden ascendente), así la página N cuesta lo mismo que la
+        primera si hay un índice que empiece por los filtros y siga con la
+        columna de orden. La columna de orden no debe admitir NULL.
+        
+        Retorna {'items': [...], 'cursor': token o None} y, con contar=True,
+        'total_estimado' y 'total_exacto'.
+        """
+        try:
+            descendente = order_by.startswith('-')
+            nombre = order_by.lstrip('-')
+            columna = getattr(self.model_class, nombre)
+            pk = self.model_class.id
+            clave_orden = nombre
+            
+            valid_filters = {k: v for k, v in filters.items() if hasattr(self.model_class, k)}
+            
+            with self._read_session() as session:
+                stmt = self._select_modelo()
+                if valid_filters:
+                    stmt = stmt.where(*self._condiciones(valid_filters))
+                
+                conteo = self._conteo_estimado(session, stmt) if contar else {}
+                
+                if isinstance(columna.type, DateTime):
+                    stmt = stmt.add_columns(self._columna_cursor(columna))
+                    clave_orden = CLAVE_CURSOR
+                
+                if cursor:
+                    valores = self._decodificar_cursor(cursor, [columna, pk])
+                    ultimo = tuple_(*(
+                        self._parametro_cursor(c, v) for c, v in zip((columna, pk), valores)
+                    ))
+                    clave = tuple_(columna, pk)
+                    stmt = stmt.where(clave < ultimo if descendente else clave > ultimo)
+                
+                if descendente:
+                    stmt = stmt.order_by(columna.desc(), pk.desc())
+                else:
+                    stmt = stmt.order_by(columna, pk)
+                
+                filas = self._filas_a_dicts(session.execute(stmt.limit(limit + 1)).mappings())
+                pagina = self._armar_pagina(filas, limit, (clave_orden, 'id'))
+                pagina.update(conteo)
+                return pagina
+        
+        except Exception as e:
+            logger.error(f"Error en find_pagina {self.model_class.__name__}: {e}")
+            return {'items': [], 'cursor': None}
+    
+    # ==================== ITERACIÓN POR LOTES ====================
+    
+    def stream_query(self, stmt, params: Optional[Dict] = None,
+                     tamano_lote: int = TAMANO_LOTE,
+                     nombre: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Recorre las filas de una sentencia select() sin materializar el
+        resultado completo.
+        
+        yield_per trae tamano_lote filas del cursor por vez y cada lote se
+        convierte con _filas_a_dicts, así la memoria no crece con la tabla.
+        La sesión de lectura (y su instantánea WAL) sigue abierta mientras
+        se consume el generador; terminar, salir del for o close() la libera.
+        A diferencia de los métodos que devuelven listas, un error se
+        registra y se propaga: un recorrido cortado no debe parecer completo.
+        """
+        opciones = {'yield_per': tamano_lote}
+        if nombre:
+            opciones[OPCION_SENTENCIA] = f"{self.model_class.__name__}.{nombre}"
+        
+        try:
+            with self._read_session() as session:
+                result = session.execute(stmt, params, execution_options=opciones)
+                for lote in result.mappings().partitions():
+                    yield from self._filas_a_dicts(lote)
+        
+        except Exception as e:
+            logger.error(f"Error recorriendo {self.model_class.__name__}: {e}")
+            raise
+    
+    def iter_many(self, order_by: Optional[str] = 'id',
+                  tamano_lote: int = TAMANO_LOTE, **filters) -> Iterator[Dict]:
+        """
+        Igual que find_many() sin límite, pero como generador (ver
+        stream_query): para exportaciones, conciliaciones y análisis que
+        recorren tablas completas (ordenes, transacciones, precios_titulos).
+        """
+        stmt = self._select_modelo()
+        
+        valid_filters = {k: v for k, v in filters.items() if hasattr(self.model_class, k)}
+        if valid_filters:
+            stmt = stmt.where(*self._condiciones(valid_filters))
+        
+        if order_by:
+            columna = getattr(self.model_class, order_by.lstrip('-'))
+            stmt = stmt.order_by(columna.desc() if order_by.startswith('-') else columna)
+        
+        return self.stream_query(stmt, tamano_lote=tamano_lote)
+    
+    # ==================== OPERACIONES MASIVAS ====================
+    
+    @staticmethod
+    def _lotes(filas: List[Dict], tamano: int):
+        for i in range(0, len(filas), tamano):
+            yield filas[i:i + tamano]
+    
+    def _valores_columnas(self, datos: Dict, excluir: Sequence[str] = ()) -> Dict:
+        """Atributos del dict -> claves de columna (descarta lo que no es columna)"""
+        atributos = inspect(self.model_class).column_attrs
+        return {
+            atributos[k].columns[0].key: v
+            for k, v in datos.items()
+            if k in atributos and k not in excluir
+        }
+    
+    @staticmethod
+    def _agrupar_por_claves(filas: List[Dict]) -> Dict[tuple, List[Dict]]:
+        """executemany requiere las mismas claves en cada fila del lote"""
+        grupos: Dict[tuple, List[Dict]] = {}
+        for fila in filas:
+            grupos.setdefault(tuple(sorted(fila)), []).append(fila)
+        return grupos
+    
+    def _claves_unicas(self) -> List[Tuple[str, ...]]:
+        """Claves UNIQUE del modelo: restricciones, columnas unique=True e índices únicos"""
+        tabla = self.model_class.__table__
+        claves = [tuple(c.key for c in r.columns)
+                  for r in tabla.constraints if isinstance(r, UniqueConstraint)]
+        claves += [(c.key,) for c in tabla.columns if c.unique]
+        claves += [tuple(c.key for c in i.columns) for i in tabla.indexes if i.unique]
+        return list(dict.fromkeys(claves))
+    
+    def _claves_conflicto(self, conflicto: Optional[Sequence[str]] = None) -> Tuple[str, ...]:
+        """
+        Destino del ON CONFLICT de bulk_upsert. Sin 'conflicto' se infiere
+        solo si el modelo tiene una única clave UNIQUE (titulos.ticker,
+        saldos (cuenta_id, moneda), ...); con varias (bancos: rif, nombre
+        y codigo) hay que indicarla, porque cualquiera puede chocar y la
+        elegida decide qué fila se actualiza.
+        """
+        claves = self._claves_unicas()
+        if conflicto:
+            conflicto = tuple(conflicto)
+            if not any(set(conflicto) == set(clave) for clave in claves):
+                raise ValueError(f"{conflicto} no es una clave UNIQUE de {self._modelo}")
+            return conflicto
+        if not claves:
+            raise ValueError(f"{self._modelo} no tiene restricción UNIQUE para upsert")
+        if len(claves) > 1:
+            raise ValueError(
+                f"{self._modelo} tiene varias claves UNIQUE {claves}: indique 'conflicto'"
+            )
+        return claves[0]
+    
+    def bulk_create(self, data_list: List[Dict], tamano_lote: int = TAMANO_LOTE) -> int:
+        """
+        Crea múltiples registros en una transacción.
+        
+        INSERT por lotes de tamano_lote filas (executemany). No instancia
+        entidades, así que no pasan por los validadores del ORM.
+        """
         try:
-            with self.db_engine.get_session() as session:
-                entities = [self.model_class(**data) for data in data_list]
-                session.bulk_save_objects(entities)
+            with self._write_session() as session:
+                for lote in self._lotes(data_list, tamano_lote):
+                    session.execute(insert(self.model_class), lote)
                 session.commit()
                 
                 self._invalidate_cache()
@@ -325,23 +711,38 @@ class BaseRepository:
             logger.error(f"Error en bulk_create: {e}")
             return 0
     
-    def bulk_update(self, updates: List[Dict]) -> int:
+    def bulk_update(self, updates: List[Dict], tamano_lote: int = TAMANO_LOTE) -> int:
         """
         Actualiza múltiples registros.
         updates = [{'id': 1, 'campo': 'valor'}, ...]
+        
+        Un UPDATE ... WHERE id = ? por combinación de campos, ejecutado con
+        executemany por lotes; fecha_actualizacion se actualiza por su
+        onupdate. No pasa por los validadores del ORM. Retorna la cantidad
+        de filas actualizadas.
         """
         try:
+            tabla = self.model_class.__table__
+            filas = []
+            for update_data in updates:
+                valores = self._valores_columnas(update_data, excluir=('id',))
+                if 'id' in update_data and valores:
+                    # Nombres de parámetro propios: los de columna están
+                    # reservados para el SET de la sentencia
+                    fila = {f'p_{k}': v for k, v in valores.items()}
+                    fila['p_id'] = update_data['id']
+                    filas.append(fila)
+            
             count = 0
-            with self.db_engine.get_session() as session:
-                for update_data in updates:
-                    id = update_data.pop('id')
-                    entity = session.query(self.model_class).filter_by(id=id).first()
-                    
-                    if entity:
-                        for key, value in update_data.items():
-                            if hasattr(entity, key):
-                                setattr(entity, key, value)
-                        count += 1
+            with self._write_session() as session:
+                for claves, grupo in self._agrupar_por_claves(filas).items():
+                    stmt = (
+                        update(tabla)
+                        .where(tabla.c.id == bindparam('p_id'))
+                        .values({k[2:]: bindparam(k) for k in claves if k != 'p_id'})
+                    )
+                    for lote in self._lotes(grupo, tamano_lote):
+                        count += session.connection().execute(stmt, lote).rowcount
                 
                 session.commit()
                 self._invalidate_cache()
@@ -353,15 +754,95 @@ class BaseRepository:
             logger.error(f"Error en bulk_update: {e}")
             return 0
     
+    def bulk_upsert(self, data_list: List[Dict],
+                    conflicto: Optional[Sequence[str]] = None,
+                    actualizar: Optional[Sequence[str]] = None,
+                    tamano_lote: int = TAMANO_LOTE, lanzar: bool = False) -> int:
+        """
+        Inserta o actualiza con INSERT ... ON CONFLICT DO UPDATE.
+        
+        conflicto: columnas de una restricción UNIQUE; obligatorio si el
+        modelo tiene más de una (ver _claves_conflicto, que lanza
+        ValueError). actualizar: columnas a sobrescribir en las filas
+        existentes (por defecto todas las recibidas salvo id y las de
+        conflicto; sin ninguna, DO NOTHING). Una fila que choca con otra
+        clave UNIQUE hace fallar el lote completo. Retorna la cantidad de
+        filas escritas (con DO NOTHING no cuentan las que ya existían).
+        
+        Si falla, registra el error y retorna 0; con lanzar=True propaga la
+        excepción (para cargas que no deben seguir a medias).
+        """
+        conflicto = self._claves_conflicto(conflicto)
+        try:
+            tabla = self.model_class.__table__
+            filas = [self._valores_columnas(datos) for datos in data_list]
+            escritas = 0
+            
+            with self._write_session() as session:
+                for claves, grupo in self._agrupar_por_claves(filas).items():
+                    stmt = sqlite_insert(tabla)
+                    columnas = actualizar if actualizar is not None else [
+                        k for k in claves if k != 'id' and k not in conflicto
+                    ]
+                    
+                    if columnas:
+                        valores = {c: stmt.excluded[c] for c in columnas}
+                        if 'fecha_actualizacion' in tabla.c and 'fecha_actualizacion' not in valores:
+                            valores['fecha_actualizacion'] = func.now()
+                        stmt = stmt.on_conflict_do_update(index_elements=conflicto, set_=valores)
+                    else:
+                        stmt = stmt.on_conflict_do_nothing(index_elements=conflicto)
+                    
+                    for lote in self._lotes(grupo, tamano_lote):
+                        escritas += session.connection().execute(stmt, lote).rowcount
+                
+                session.commit()
+                self._invalidate_cache()
+                
+                logger.info(f"✅ Bulk upserted {escritas}/{len(filas)} {self.model_class.__name__}")
+                return escritas
+        
+        except Exception as e:
+            logger.error(f"Error en bulk_upsert {self.model_class.__name__}: {e}")
+            if lanzar:
+                raise
+            return 0
+    
     # ==================== TRANSACCIONES ====================
     
+    def usar_cola_escritura(self, activar: bool = True):
+        """
+        Enrutar las mutaciones de este repositorio por la cola de escritura
+        del motor (commit agrupado). Con activar=False vuelven a confirmar
+        cada una en su propia transacción.
+        """
+        self._cola_escritura = self.db_engine.get_cola_escritura() if activar else None
+    
+    def _mutar(self, func, *args, **kwargs):
+        """
+        Ejecuta func(session, *args, **kwargs) como una mutación.
+        
+        Con cola de escritura activa se agrupa con las de otros llamadores
+        (un SAVEPOINT por mutación); si no, usa su propia transacción.
+        Las excepciones de func se propagan al llamador.
+        """
+        if self._cola_escritura is not None:
+            resultado = self._cola_escritura.ejecutar(func, *args, **kwargs)
+        else:
+            with self._write_session() as session:
+                resultado = func(session, *args, **kwargs)
+                session.commit()
+        
+        self._invalidate_cache()
+        return resultado
+    
     def execute_in_transaction(self, func, *args, **kwargs):
         """
         Ejecuta una función dentro de una transacción.
         Si la función falla, hace rollback automático.
         """
         try:
-            with self.db_engine.get_session() as session:
+            with self._write_session() as session:
                 result = func(session, *args, **kwargs)
                 session.commit()
                 self._invalidate_cache()
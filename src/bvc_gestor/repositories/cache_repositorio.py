@@ -0,0 +1,253 @@
+"""
+Caché de repositorios acotada (LRU + TTL por modelo) con métricas.
+
+Reemplaza al diccionario sin límite de CacheEntry: las entradas viven en
+un OrderedDict en orden de uso; al superar el máximo se descarta la menos
+usada. Las entradas vencidas se eliminan al leerlas.
+
+Hay una caché por motor de base de datos (DatabaseEngine.
+get_cache_repositorios()), compartida por todas las instancias de
+repositorio: lo que escribe una la invalida para todas.
+
+Las claves se indexan por modelo, así que invalidar un registro o un
+modelo completo no recorre todas las claves:
+- por id: elimina la entrada del registro y las consultas del modelo
+  (listas que podrían contenerlo)
+- por modelo: elimina todas las entradas del modelo
+
+Otros componentes con datos derivados (el catálogo en memoria) se
+suscriben con suscribir() y reciben cada invalidación.
+
+Los cambios hechos por otros procesos llegan por el verificador que
+instala el motor (database/vigilante_cambios.py): se consulta al leer,
+antes de buscar la entrada.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+
+# Límite de entradas y TTL por defecto
+MAX_ENTRADAS_POR_DEFECTO = 2000
+TTL_POR_DEFECTO = 300
+
+# Marca para distinguir "no está en caché" de un valor None guardado
+_AUSENTE = object()
+
+
+class CacheRepositorio:
+    """Caché LRU con TTL por modelo e invalidación indexada"""
+    
+    def __init__(self, max_entradas: int = MAX_ENTRADAS_POR_DEFECTO,
+                 ttl_por_defecto: float = TTL_POR_DEFECTO):
+        self.max_entradas = max_entradas
+        self.ttl_por_defecto = ttl_por_defecto
+        self._ttl_modelo: Dict[str, float] = {}
+        
+        # clave -> (datos, vence); el orden es el de uso (el último, el más reciente)
+        self._entradas: "OrderedDict[Tuple, Tuple[Any, float]]" = OrderedDict()
+        
+        # Índices para invalidar sin recorrer todas las claves
+        self._por_modelo: Dict[str, Set[Tuple]] = {}
+        self._consultas_modelo: Dict[str, Set[Tuple]] = {}
+        
+        self._lock = threading.RLock()
+        self._suscriptores: List[Callable] = []
+        self._verificador: Optional[Callable] = None
+        self._contadores = {'hits': 0, 'misses': 0, 'expiradas': 0,
+                            'desalojos': 0, 'invalidaciones': 0}
+    
+    # ==================== CONFIGURACIÓN ====================
+    
+    def configurar_ttl(self, modelo: str, segundos: float):
+        """TTL de las entradas de un modelo"""
+        self._ttl_modelo[modelo] = segundos
+    
+    def ttl(self, modelo: str) -> float:
+        return self._ttl_modelo.get(modelo, self.ttl_por_defecto)
+    
+    # ==================== CLAVES ====================
+    
+    @staticmethod
+    def clave_id(modelo: str, id: Hashable) -> Tuple:
+        return (modelo, 'id', id)
+    
+    @staticmethod
+    def clave_consulta(modelo: str, nombre: str, filtros: Optional[Dict] = None) -> Tuple:
+        """Clave estable para una consulta (los filtros se ordenan)"""
+        return (modelo, nombre, tuple(
+            (k, v if isinstance(v, Hashable) else repr(v))
+            for k, v in sorted((filtros or {}).items(), key=lambda kv: kv[0])
+        ))
+    
+    # ==================== LECTURA / ESCRITURA ====================
+    
+    def obtener(self, clave: Tuple, defecto: Any = None) -> Any:
+        """Valor en caché o 'defecto' (cuenta hit/miss; elimina vencidas)"""
+        self.verificar_externos()
+        with self._lock:
+            entrada = self._entradas.get(clave, _AUSENTE)
+            if entrada is _AUSENTE:
+                self._contadores['misses'] += 1
+                return defecto
+            
+            datos, vence = entrada
+            if vence <= time.monotonic():
+                self._eliminar(clave)
+                self._contadores['expiradas'] += 1
+                self._contadores['misses'] += 1
+                return defecto
+            
+            self._entradas.move_to_end(clave)
+            self._contadores['hits'] += 1
+            return datos
+    
+    def guardar(self, clave: Tuple, datos: Any):
+        """Guarda una entrada con el TTL de su modelo (clave[0])"""
+        modelo = clave[0]
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+            self._entradas[clave] = (datos, time.monotonic() + self.ttl(modelo))
+            
+            self._por_modelo.setdefault(modelo, set()).add(clave)
+            if clave[1] != 'id':
+                self._consultas_modelo.setdefault(modelo, set()).add(clave)
+            
+            while len(self._entradas) > self.max_entradas:
+                antigua = next(iter(self._entradas))
+                self._eliminar(antigua)
+                self._contadores['desalojos'] += 1
+    
+    def _eliminar(self, clave: Tuple):
+        """Quita una entrada y sus referencias en los índices (con lock tomado)"""
+        if self._entradas.pop(clave, _AUSENTE) is _AUSENTE:
+            return
+        modelo = clave[0]
+        claves = self._por_modelo.get(modelo)
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_modelo[modelo]
+        consultas = self._consultas_modelo.get(modelo)
+        if consultas is not None:
+            consultas.discard(clave)
+            if not consultas:
+                del self._consultas_modelo[modelo]
+    
+    # ==================== INVALIDACIÓN ====================
+    
+    def invalidar(self, modelo: str, id: Optional[Hashable] = None):
+        """
+        Invalida un registro (y las consultas del modelo) o, sin id,
+        todas las entradas del modelo.
+        """
+        with self._lock:
+            if id is not None:
+                claves = set(self._consultas_modelo.get(modelo, ()))
+                claves.add(self.clave_id(modelo, id))
+            else:
+                claves = set(self._por_modelo.get(modelo, ()))
+            
+            for clave in claves:
+                self._eliminar(clave)
+            self._contadores['invalidaciones'] += 1
+        
+        for suscriptor in self._suscriptores:
+            suscriptor(modelo, id)
+    
+    def suscribir(self, funcion: Callable):
+        """funcion(modelo, id) se llama en cada invalidación (id None: todo el modelo)"""
+        self._suscriptores.append(funcion)
+    
+    def instalar_verificador(self, funcion: Callable):
+        """funcion() invalida lo que otros procesos hayan modificado"""
+        self._verificador = funcion
+    
+    def verificar_externos(self):
+        """Aplicar los cambios de otros procesos (el verificador limita la frecuencia)"""
+        if self._verificador is not None:
+            self._verificador()
+    
+    def limpiar(self, modelo: Optional[str] = None):
+        """Vacía la caché completa o solo la de un modelo"""
+        with self._lock:
+            if modelo is None:
+                self._entradas.clear()
+                self._por_modelo.clear()
+                self._consultas_modelo.clear()
+            else:
+                for clave in list(self._por_modelo.get(modelo, ())):
+                    self._eliminar(clave)
+    
+    # ==================== MÉTRICAS ====================
+    
+    def estadisticas(self, modelo: Optional[str] = None) -> Dict:
+        """Contadores de hits/misses/desalojos y ocupación"""
+        with self._lock:
+            datos = dict(self._contadores)
+            consultas = datos['hits'] + datos['misses']
+            datos['ratio_hits'] = (datos['hits'] / consultas) if consultas else 0.0
+            datos['entradas'] = len(self._entradas)
+            datos['max_entradas'] = self.max_entradas
+            if modelo is not None:
+                datos['entradas_modelo'] = len(self._por_modelo.get(modelo, ()))
+            return datos
+    
+    def reiniciar_estadisticas(self):
+        with self._lock:
+            for clave in self._contadores:
+                self._contadores[clave] = 0
+    
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+# ==================== INVALIDACIÓN POR SESIÓN ====================
+
+# Claves en Session.info: los (modelo, id) modificados en la transacción y
+# la marca de que la transacción externa se confirmó
+_CLAVE_MODIFICADOS = "bvc_cache_modificados"
+_CLAVE_CONFIRMADA = "bvc_cache_confirmada"
+
+
+def instalar_invalidacion(fabrica_sesiones, cache: CacheRepositorio):
+    """
+    Invalida en 'cache' lo que confirme cualquier sesión de la fábrica.
+    
+    after_flush anota los objetos insertados, modificados o eliminados; al
+    terminar la transacción externa se invalidan su registro y las
+    consultas de su modelo si se confirmó, o se descartan las anotaciones
+    si se revirtió. Así una escritura hecha desde cualquier repositorio, o
+    desde un servicio con su propia sesión, llega a todos los lectores.
+    Las sentencias Core/texto no pasan por aquí: quien las ejecuta sigue
+    llamando a _invalidate_cache().
+    
+    after_commit y after_rollback también se emiten al liberar o revertir
+    un SAVEPOINT (begin_nested, como en ColaEscritura), con la transacción
+    externa aún abierta: solo el fin de la externa (parent None) invalida
+    o descarta.
+    """
+    def _anotar(session, contexto):
+        modificados = session.info.setdefault(_CLAVE_MODIFICADOS, set())
+        for objeto in chain(session.new, session.dirty, session.deleted):
+            modificados.add((type(objeto).__name__, getattr(objeto, 'id', None)))
+    
+    def _confirmada(session):
+        if not session.in_nested_transaction():
+            session.info[_CLAVE_CONFIRMADA] = True
+    
+    def _terminar(session, transaccion):
+        if transaccion.parent is not None:
+            return
+        modificados = session.info.pop(_CLAVE_MODIFICADOS, ())
+        if session.info.pop(_CLAVE_CONFIRMADA, False):
+            for modelo, id in modificados:
+                cache.invalidar(modelo, id)
+    
+    event.listen(fabrica_sesiones, "after_flush", _anotar)
+    event.listen(fabrica_sesiones, "after_commit", _confirmada)
+    event.listen(fabrica_sesiones, "after_transaction_end", _terminar)
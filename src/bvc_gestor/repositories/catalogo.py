@@ -0,0 +1,272 @@
+"""
+Catálogo en memoria de bancos, casas de bolsa y títulos.
+
+Son tablas pequeñas que casi no cambian y que la interfaz consulta todo el
+tiempo (nombres en combos y formateadores, tickers al escribir en los
+diálogos). Se cargan una vez por motor (DatabaseEngine.get_catalogo()) y
+se buscan en O(1) por id, código, RIF y ticker.
+
+Refresco incremental: el catálogo se suscribe a la caché de repositorios,
+que ya recibe las invalidaciones de los commits ORM y de las escrituras
+Core (bulk_*) y, por el vigilante de cambios del motor, las de otros
+procesos. Una invalidación solo marca lo pendiente; la siguiente lectura
+recarga:
+- por id: solo esos registros (si ya no existen, se quitan)
+- por modelo: las filas con fecha_actualizacion desde la última carga; si
+  luego el total de filas no cuadra (hubo borrados), la tabla completa
+
+Las entradas son diccionarios con las mismas claves que find_one(); se
+comparten entre lectores, así que no deben modificarse.
+"""
+
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import String, bindparam, func, select
+
+from ..database.models_sql import BancoDB, CasaBolsaDB, TituloDB
+from .base_repository import columnas_modelo
+import logging
+
+logger = logging.getLogger(__name__)
+
+# nombre -> (modelo, {índice: columna}); las claves de índice se normalizan
+_TABLAS = {
+    'bancos': (BancoDB, {'codigo': 'codigo', 'rif': 'rif'}),
+    'casas_bolsa': (CasaBolsaDB, {'rif': 'rif'}),
+    'titulos': (TituloDB, {'ticker': 'ticker'}),
+}
+
+# Marca de "recargar la tabla" en los pendientes
+_TODA = None
+
+
+def _clave(valor) -> Optional[str]:
+    """Clave de índice: códigos, RIF y tickers sin distinción de mayúsculas"""
+    return valor.strip().upper() if isinstance(valor, str) else None
+
+
+class _Tabla:
+    """Instantánea de una tabla: se reemplaza completa en cada refresco"""
+    
+    __slots__ = ('por_id', 'indices', 'marca', 'total')
+    
+    def __init__(self, por_id: Dict[int, Dict], indices: Dict[str, Dict[str, Dict]],
+                 marca: Optional[datetime], total: int):
+        self.por_id = por_id
+        self.indices = indices
+        self.marca = marca
+        self.total = total
+
+
+class CatalogoEnMemoria:
+    """Catálogos maestros cargados una vez y refrescados por invalidación"""
+    
+    def __init__(self, db_engine, cache=None):
+        self.db_engine = db_engine
+        self._tablas: Dict[str, _Tabla] = {}
+        self._pendientes: Dict[str, Set] = {}
+        self._nombre_modelo = {modelo.__name__: nombre for nombre, (modelo, _) in _TABLAS.items()}
+        self._lock = threading.RLock()
+        self.recargas = 0
+        self.refrescos = 0
+        self._cache = cache
+        
+        if cache is not None:
+            cache.suscribir(self._on_invalidacion)
+    
+    # ==================== CARGA ====================
+    
+    def cargar(self):
+        """Carga completa de todos los catálogos (arranque)"""
+        with self._lock:
+            for nombre in _TABLAS:
+                self._recargar(nombre)
+                self._pendientes.pop(nombre, None)
+        logger.info(
+            "Catálogo cargado: " + ", ".join(f"{len(t.por_id)} {n}" for n, t in self._tablas.items())
+        )
+    
+    def refrescar(self, nombre: Optional[str] = None):
+        """
+        Refresco incremental de uno o todos los catálogos, para escrituras
+        SQL directas de este proceso (las de otros procesos las detecta el
+        vigilante de cambios del motor).
+        """
+        with self._lock:
+            for n in ([nombre] if nombre else list(_TABLAS)):
+                self._pendientes.setdefault(n, set()).add(_TODA)
+        for n in ([nombre] if nombre else list(_TABLAS)):
+            self._vigente(n)
+    
+    def _on_invalidacion(self, modelo: str, id=None):
+        """Suscriptor de CacheRepositorio.invalidar(): solo anota"""
+        nombre = self._nombre_modelo.get(modelo)
+        if nombre is not None:
+            with self._lock:
+                self._pendientes.setdefault(nombre, set()).add(id if id is not None else _TODA)
+    
+    def _vigente(self, nombre: str) -> _Tabla:
+        """Instantánea de la tabla, aplicando antes lo pendiente"""
+        if self._cache is not None:
+            # Cambios de otros procesos: llegan como invalidaciones del modelo
+            self._cache.verificar_externos()
+        if nombre in self._tablas and not self._pendientes.get(nombre):
+            return self._tablas[nombre]
+        
+        with self._lock:
+            pendientes = self._pendientes.pop(nombre, None)
+            try:
+                if nombre not in self._tablas:
+                    self._recargar(nombre)
+                elif pendientes:
+                    if _TODA in pendientes:
+                        self._refrescar_desde_marca(nombre)
+                    else:
+                        self._refrescar_ids(nombre, pendientes)
+            except Exception as e:
+                # Se conserva la instantánea anterior y se reintenta en la próxima lectura
+                logger.error(f"Error refrescando catálogo {nombre}: {e}")
+                if pendientes:
+                    self._pendientes.setdefault(nombre, set()).update(pendientes)
+                if nombre not in self._tablas:
+                    self._tablas[nombre] = _Tabla({}, {i: {} for i in _TABLAS[nombre][1]}, None, 0)
+            return self._tablas[nombre]
+    
+    def _consultar(self, nombre: str, condicion=None) -> List[Dict]:
+        modelo = _TABLAS[nombre][0]
+        stmt = select(*columnas_modelo(modelo))
+        if condicion is not None:
+            stmt = stmt.where(condicion)
+        with self.db_engine.get_read_session() as session:
+            return [dict(fila) for fila in session.execute(stmt).mappings()]
+    
+    def _total(self, nombre: str) -> int:
+        modelo = _TABLAS[nombre][0]
+        with self.db_engine.get_read_session() as session:
+            return session.execute(select(func.count()).select_from(modelo)).scalar_one()
+    
+    def _recargar(self, nombre: str):
+        filas = self._consultar(nombre)
+        self._publicar(nombre, {}, filas, ())
+        self.recargas += 1
+    
+    def _refrescar_ids(self, nombre: str, ids: Set):
+        modelo = _TABLAS[nombre][0]
+        filas = self._consultar(nombre, modelo.id.in_(ids))
+        self._publicar(nombre, self._tablas[nombre].por_id, filas, ids)
+        self.refrescos += 1
+    
+    def _refrescar_desde_marca(self, nombre: str):
+        """
+        Filas modificadas desde la última carga. La marca se compara como
+        texto truncado al segundo (CURRENT_TIMESTAMP no guarda
+        microsegundos) y con >=: releer alguna fila de más es inocuo. Si
+        después el total no cuadra con la tabla, hubo borrados: se recarga.
+        """
+        tabla = self._tablas[nombre]
+        modelo = _TABLAS[nombre][0]
+        if tabla.marca is None:
+            self._recargar(nombre)
+            return
+        marca = bindparam(None, tabla.marca.strftime('%Y-%m-%d %H:%M:%S'), type_=String())
+        filas = self._consultar(nombre, modelo.fecha_actualizacion >= marca)
+        self._publicar(nombre, tabla.por_id, filas, ())
+        self.refrescos += 1
+        if self._total(nombre) != self._tablas[nombre].total:
+            self._recargar(nombre)
+    
+    def _publicar(self, nombre: str, anterior: Dict[int, Dict], filas: List[Dict], ids: Iterable):
+        """Arma la nueva instantánea (índices y marca) y la reemplaza"""
+        por_id = dict(anterior)
+        for id in ids:
+            por_id.pop(id, None)
+        
+        marca = self._tablas[nombre].marca if anterior else None
+        for fila in filas:
+            fecha = fila.get('fecha_actualizacion')
+            if fecha is not None and (marca is None or fecha > marca):
+                marca = fecha
+            for clave, valor in fila.items():
+                if isinstance(valor, datetime):
+                    fila[clave] = valor.isoformat()
+            por_id[fila['id']] = fila
+        
+        indices = {
+            indice: {_clave(fila[columna]): fila for fila in por_id.values()}
+            for indice, columna in _TABLAS[nombre][1].items()
+        }
+        self._tablas[nombre] = _Tabla(por_id, indices, marca, len(por_id))
+    
+    # ==================== BÚSQUEDAS ====================
+    
+    def _por_id(self, nombre: str, id) -> Optional[Dict]:
+        return self._vigente(nombre).por_id.get(id)
+    
+    def _por_indice(self, nombre: str, indice: str, valor) -> Optional[Dict]:
+        return self._vigente(nombre).indices[indice].get(_clave(valor))
+    
+    def _listar(self, nombre: str, activos: bool) -> List[Dict]:
+        filas = self._vigente(nombre).por_id.values()
+        if activos:
+            filas = [f for f in filas if f.get('estatus')]
+        return sorted(filas, key=lambda f: f['nombre'])
+    
+    # Bancos
+    def banco(self, id: int) -> Optional[Dict]:
+        return self._por_id('bancos', id)
+    
+    def banco_por_codigo(self, codigo: str) -> Optional[Dict]:
+        return self._por_indice('bancos', 'codigo', codigo)
+    
+    def banco_por_rif(self, rif: str) -> Optional[Dict]:
+        return self._por_indice('bancos', 'rif', rif)
+    
+    def nombre_banco(self, id: int) -> str:
+        banco = self.banco(id)
+        return banco['nombre'] if banco else f"Banco {id}"
+    
+    def bancos(self, activos: bool = True) -> List[Dict]:
+        return self._listar('bancos', activos)
+    
+    # Casas de bolsa
+    def casa_bolsa(self, id: int) -> Optional[Dict]:
+        return self._por_id('casas_bolsa', id)
+    
+    def casa_bolsa_por_rif(self, rif: str) -> Optional[Dict]:
+        return self._por_indice('casas_bolsa', 'rif', rif)
+    
+    def nombre_casa_bolsa(self, id: int) -> str:
+        casa = self.casa_bolsa(id)
+        return casa['nombre'] if casa else f"Casa {id}"
+    
+    def casas_bolsa(self, activos: bool = True) -> List[Dict]:
+        return self._listar('casas_bolsa', activos)
+    
+    # Títulos
+    def titulo(self, id: int) -> Optional[Dict]:
+        return self._por_id('titulos', id)
+    
+    def titulo_por_ticker(self, ticker: str, activos: bool = True) -> Optional[Dict]:
+        titulo = self._por_indice('titulos', 'ticker', ticker)
+        if titulo is not None and activos and not titulo.get('estatus'):
+            return None
+        return titulo
+    
+    def titulos(self, activos: bool = True) -> List[Dict]:
+        return self._listar('titulos', activos)
+    
+    def tickers(self, activos: bool = True) -> List[str]:
+        return sorted(t['ticker'] for t in self.titulos(activos))
+    
+    # ==================== MÉTRICAS ====================
+    
+    def estadisticas(self) -> Dict:
+        """Filas por catálogo y número de recargas/refrescos (diagnóstico)"""
+        with self._lock:
+            datos = {nombre: len(tabla.por_id) for nombre, tabla in self._tablas.items()}
+            datos['recargas'] = self.recargas
+            datos['refrescos'] = self.refrescos
+            datos['pendientes'] = sorted(n for n, p in self._pendientes.items() if p)
+            return datos
\ No newline at end of file
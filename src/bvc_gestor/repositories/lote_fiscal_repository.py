@@ -0,0 +1,352 @@
+"""
+Repositorio del libro de lotes fiscales (lotes de compra y ganancias realizadas)
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    String, bindparam, case, delete, exists, func, insert, lambda_stmt, select,
+    tuple_, type_coerce, update
+)
+
+from .base_repository import BaseRepository, columnas_modelo
+from ..database.models_sql import (
+    LoteFiscalDB, GananciaRealizadaDB, OrdenDB, TransaccionDB, PortafolioItemDB,
+    CuentaBursatilDB, TituloDB
+)
+from ..utils.constants import TipoOrden
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Claves (cuenta_id, titulo_id) por consulta de lotes abiertos
+TAMANO_CLAVES = 400
+
+
+def _rango_texto(desde: date, hasta: date) -> Tuple[str, str]:
+    """
+    Límites [desde, hasta + 1 día) como texto, para comparar con columnas
+    DateTime por su representación guardada. Los días son locales y las
+    fechas de venta vienen de fecha_registro (UTC, CURRENT_TIMESTAMP): los
+    límites se pasan a UTC, así una venta del 31 de diciembre por la noche
+    queda en su año fiscal
+    """
+    def _utc(dia: date) -> str:
+        momento = datetime.combine(dia, time.min).astimezone(timezone.utc)
+        return momento.strftime('%Y-%m-%d %H:%M:%S')
+    
+    return _utc(desde), _utc(hasta + timedelta(days=1))
+
+
+class LoteFiscalRepository(BaseRepository):
+    """Repositorio de lotes fiscales y ganancias realizadas"""
+    
+    def __init__(self, db_engine):
+        super().__init__(db_engine, LoteFiscalDB)
+    
+    # ==================== CONSULTAS ====================
+    
+    def get_lotes_abiertos(self, cuenta_id: int, titulo_id: Optional[int] = None) -> List[Dict]:
+        """Lotes con títulos sin vender de una cuenta, en orden de consumo"""
+        try:
+            stmt = lambda_stmt(lambda: (
+                select(*columnas_modelo(LoteFiscalDB), TituloDB.ticker)
+                .join(TituloDB, LoteFiscalDB.titulo_id == TituloDB.id)
+                .where(LoteFiscalDB.cuenta_id == cuenta_id)
+                .where(LoteFiscalDB.cantidad_restante > 0)
+            ))
+            
+            if titulo_id is not None:
+                stmt += lambda s: s.where(LoteFiscalDB.titulo_id == titulo_id)
+            
+            stmt += lambda s: s.order_by(
+                LoteFiscalDB.titulo_id, LoteFiscalDB.fecha_compra, LoteFiscalDB.id
+            )
+            
+            with self._read_session() as session:
+                filas = self._execute_cached(session, 'get_lotes_abiertos', stmt)
+                return self._filas_a_dicts(filas.mappings())
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo lotes abiertos de cuenta {cuenta_id}: {e}")
+            return []
+    
+    def _filtrar_ganancias(self, stmt, desde: date, hasta: date,
+                           cuenta_id: Optional[int], cliente_id: Optional[int]):
+        """Ganancias realizadas con fecha de venta en [desde, hasta]"""
+        inicio, fin = _rango_texto(desde, hasta)
+        stmt += lambda s: s.where(
+            type_coerce(GananciaRealizadaDB.fecha_venta, String) >= inicio,
+            type_coerce(GananciaRealizadaDB.fecha_venta, String) < fin
+        )
+        
+        if cuenta_id is not None:
+            stmt += lambda s: s.where(GananciaRealizadaDB.cuenta_id == cuenta_id)
+        
+        if cliente_id is not None:
+            stmt += lambda s: s.join(
+                CuentaBursatilDB, GananciaRealizadaDB.cuenta_id == CuentaBursatilDB.id
+            ).where(CuentaBursatilDB.cliente_id == cliente_id)
+        
+        return stmt
+    
+    def get_ganancias(self, desde: date, hasta: date,
+                      cuenta_id: Optional[int] = None,
+                      cliente_id: Optional[int] = None) -> List[Dict]:
+        """Detalle de ganancias realizadas entre dos fechas (inclusive)"""
+        try:
+            stmt = lambda_stmt(lambda: select(*columnas_modelo(GananciaRealizadaDB)))
+            stmt = self._filtrar_ganancias(stmt, desde, hasta, cuenta_id, cliente_id)
+            stmt += lambda s: s.order_by(GananciaRealizadaDB.fecha_venta, GananciaRealizadaDB.id)
+            
+            with self._read_session() as session:
+                filas = self._execute_cached(session, 'get_ganancias', stmt)
+                return self._filas_a_dicts(filas.mappings())
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo ganancias realizadas: {e}")
+            return []
+    
+    def get_resumen_ganancias(self, desde: date, hasta: date,
+                              cuenta_id: Optional[int] = None,
+                              cliente_id: Optional[int] = None) -> List[Dict]:
+        """
+        Ganancias realizadas entre dos fechas sumadas por cuenta y título:
+        ventas (ejecuciones), cantidad, monto_venta, costo_base y
+        ganancia_perdida.
+        """
+        try:
+            stmt = lambda_stmt(lambda: select(
+                GananciaRealizadaDB.cuenta_id,
+                GananciaRealizadaDB.titulo_id,
+                func.count(func.distinct(GananciaRealizadaDB.transaccion_id)).label('ventas'),
+                func.sum(GananciaRealizadaDB.cantidad).label('cantidad'),
+                func.sum(GananciaRealizadaDB.monto_venta).label('monto_venta'),
+                func.sum(GananciaRealizadaDB.costo_base).label('costo_base'),
+                func.sum(GananciaRealizadaDB.ganancia_perdida).label('ganancia_perdida')
+            ))
+            stmt = self._filtrar_ganancias(stmt, desde, hasta, cuenta_id, cliente_id)
+            stmt += lambda s: s.group_by(GananciaRealizadaDB.cuenta_id, GananciaRealizadaDB.titulo_id)
+            
+            with self._read_session() as session:
+                filas = self._execute_cached(session, 'get_resumen_ganancias', stmt)
+                return self._filas_a_dicts(filas.mappings())
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo resumen de ganancias: {e}")
+            return []
+    
+    def hay_ejecuciones_pendientes(self) -> bool:
+        """Si alguna ejecución aún no está en el libro (o el libro no se ha construido)"""
+        try:
+            stmt = (
+                select(TransaccionDB.id)
+                .where(
+                    ~exists().where(LoteFiscalDB.transaccion_id == TransaccionDB.id),
+                    ~exists().where(GananciaRealizadaDB.transaccion_id == TransaccionDB.id),
+                )
+                .limit(1)
+            )
+            with self._read_session() as session:
+                return session.execute(stmt).first() is not None
+        
+        except Exception as e:
+            logger.error(f"Error verificando ejecuciones pendientes del libro: {e}")
+            raise
+    
+    # ==================== LIBRO (dentro de una transacción) ====================
+    # Los métodos *_tx usan la sesión del llamador y no confirman; los
+    # orquesta LotesFiscalesService dentro de execute_in_transaction().
+    
+    def _stmt_ejecuciones(self):
+        """
+        Ejecuciones como (transaccion_id, cuenta_id, titulo_id, es_venta,
+        fecha, cantidad, monto_bruto, comisiones), en orden cronológico
+        """
+        return (
+            select(
+                TransaccionDB.id,
+                OrdenDB.cuenta_id,
+                OrdenDB.titulo_id,
+                case((OrdenDB.tipo == TipoOrden.VENTA, True), else_=False),
+                TransaccionDB.fecha_registro,
+                TransaccionDB.cantidad_ejecutada,
+                TransaccionDB.monto_bruto,
+                (
+                    TransaccionDB.comision_corretaje + TransaccionDB.comision_bvc +
+                    TransaccionDB.comision_cvv + TransaccionDB.iva
+                ).label('comisiones')
+            )
+            .join(OrdenDB, TransaccionDB.orden_id == OrdenDB.id)
+            .order_by(TransaccionDB.fecha_registro, TransaccionDB.id)
+        )
+    
+    def ejecuciones_pendientes_tx(self, session,
+                                  transaccion_ids: Optional[List[int]] = None) -> List[Tuple]:
+        """Ejecuciones que aún no están en el libro (opcionalmente solo esas)"""
+        stmt = self._stmt_ejecuciones().where(
+            ~exists().where(LoteFiscalDB.transaccion_id == TransaccionDB.id),
+            ~exists().where(GananciaRealizadaDB.transaccion_id == TransaccionDB.id),
+        )
+        if transaccion_ids is not None:
+            stmt = stmt.where(TransaccionDB.id.in_(transaccion_ids))
+        return session.execute(stmt).tuples().all()
+    
+    def todas_ejecuciones_tx(self, session,
+                             claves: Optional[List[Tuple[int, int]]] = None) -> List[Tuple]:
+        """Todas las ejecuciones (opcionalmente solo las de esas posiciones)"""
+        if claves is None:
+            return session.execute(self._stmt_ejecuciones()).tuples().all()
+        filas = []
+        for bloque in self._lotes(list(claves), TAMANO_CLAVES):
+            stmt = self._stmt_ejecuciones().where(tuple_(OrdenDB.cuenta_id, OrdenDB.titulo_id).in_(bloque))
+            filas.extend(session.execute(stmt).tuples())
+        # Orden cronológico entre bloques
+        filas.sort(key=lambda e: (e[4], e[0]))
+        return filas
+    
+    def ultimas_aplicadas_tx(self, session, claves: List[Tuple[int, int]],
+                             desde: datetime) -> Dict[Tuple[int, int], Tuple]:
+        """
+        (fecha, transaccion_id) de la última ejecución ya aplicada al libro
+        de cada posición, entre las registradas desde 'desde' (truncado al
+        segundo: incluye las de ese segundo guardadas con y sin fracción)
+        """
+        desde_texto = desde.strftime('%Y-%m-%d %H:%M:%S')
+        aplicada = (
+            exists().where(LoteFiscalDB.transaccion_id == TransaccionDB.id) |
+            exists().where(GananciaRealizadaDB.transaccion_id == TransaccionDB.id)
+        )
+        ultimas = {}
+        for bloque in self._lotes(list(claves), TAMANO_CLAVES):
+            stmt = (
+                select(OrdenDB.cuenta_id, OrdenDB.titulo_id, TransaccionDB.fecha_registro, TransaccionDB.id)
+                .join(OrdenDB, TransaccionDB.orden_id == OrdenDB.id)
+                .where(tuple_(OrdenDB.cuenta_id, OrdenDB.titulo_id).in_(bloque))
+                .where(type_coerce(TransaccionDB.fecha_registro, String) >= desde_texto)
+                .where(aplicada)
+            )
+            for cuenta_id, titulo_id, fecha, transaccion_id in session.execute(stmt):
+                clave = (cuenta_id, titulo_id)
+                ultimas[clave] = max(ultimas.get(clave, (fecha, transaccion_id)), (fecha, transaccion_id))
+        return ultimas
+    
+    def libro_vacio_tx(self, session) -> bool:
+        """True si el libro no tiene lotes ni ganancias"""
+        return (
+            session.execute(select(LoteFiscalDB.id).limit(1)).first() is None and
+            session.execute(select(GananciaRealizadaDB.id).limit(1)).first() is None
+        )
+    
+    def lotes_abiertos_tx(self, session, claves: List[Tuple[int, int]]) -> List[Tuple]:
+        """
+        Lotes abiertos de las posiciones dadas como (id, cuenta_id,
+        titulo_id, fecha_compra, cantidad_restante, costo_unitario)
+        """
+        filas = []
+        for bloque in self._lotes(list(claves), TAMANO_CLAVES):
+            stmt = (
+                select(
+                    LoteFiscalDB.id, LoteFiscalDB.cuenta_id, LoteFiscalDB.titulo_id,
+                    LoteFiscalDB.fecha_compra, LoteFiscalDB.cantidad_restante,
+                    LoteFiscalDB.costo_unitario
+                )
+                .where(tuple_(LoteFiscalDB.cuenta_id, LoteFiscalDB.titulo_id).in_(bloque))
+                .where(LoteFiscalDB.cantidad_restante > 0)
+            )
+            filas.extend(session.execute(stmt).tuples())
+        return filas
+    
+    def costos_promedio_tx(self, session, claves: List[Tuple[int, int]]) -> Dict[Tuple[int, int], object]:
+        """Costo promedio del portafolio por posición (respaldo sin lotes)"""
+        costos = {}
+        for bloque in self._lotes(list(claves), TAMANO_CLAVES):
+            stmt = (
+                select(PortafolioItemDB.cuenta_id, PortafolioItemDB.titulo_id, PortafolioItemDB.costo_promedio)
+                .where(tuple_(PortafolioItemDB.cuenta_id, PortafolioItemDB.titulo_id).in_(bloque))
+            )
+            for cuenta_id, titulo_id, costo in session.execute(stmt):
+                costos[(cuenta_id, titulo_id)] = costo
+        return costos
+    
+    def posiciones_apertura_tx(self, session,
+                               claves: Optional[List[Tuple[int, int]]] = None) -> List[Tuple]:
+        """
+        Posición previa a todas las ejecuciones: la actual menos lo
+        ejecutado, como (cuenta_id, titulo_id, cantidad, costo_promedio,
+        fecha). La fecha es la de la primera ejecución de la posición (o
+        la del registro si no tiene), para que el lote quede primero.
+        Con 'claves', solo esas posiciones.
+        """
+        signo = case((OrdenDB.tipo == TipoOrden.VENTA, -1), else_=1)
+        ejecutado = (
+            select(
+                OrdenDB.cuenta_id,
+                OrdenDB.titulo_id,
+                func.sum(signo * TransaccionDB.cantidad_ejecutada).label('cantidad'),
+                func.min(TransaccionDB.fecha_registro).label('primera')
+            )
+            .join(OrdenDB, TransaccionDB.orden_id == OrdenDB.id)
+            .group_by(OrdenDB.cuenta_id, OrdenDB.titulo_id)
+            .subquery()
+        )
+        stmt = (
+            select(
+                PortafolioItemDB.cuenta_id,
+                PortafolioItemDB.titulo_id,
+                PortafolioItemDB.cantidad - func.coalesce(ejecutado.c.cantidad, 0),
+                PortafolioItemDB.costo_promedio,
+                func.coalesce(ejecutado.c.primera, PortafolioItemDB.fecha_registro)
+            )
+            .outerjoin(ejecutado, (ejecutado.c.cuenta_id == PortafolioItemDB.cuenta_id) &
+                       (ejecutado.c.titulo_id == PortafolioItemDB.titulo_id))
+            .order_by(PortafolioItemDB.cuenta_id, PortafolioItemDB.titulo_id)
+        )
+        if claves is None:
+            return session.execute(stmt).tuples().all()
+        filas = []
+        for bloque in self._lotes(list(claves), TAMANO_CLAVES):
+            filas.extend(session.execute(
+                stmt.where(tuple_(PortafolioItemDB.cuenta_id, PortafolioItemDB.titulo_id).in_(bloque))
+            ).tuples())
+        return filas
+    
+    def siguiente_id_tx(self, session) -> int:
+        """Primer id libre para los lotes nuevos de una pasada"""
+        return (session.execute(select(func.max(LoteFiscalDB.id))).scalar() or 0) + 1
+    
+    def vaciar_tx(self, session, claves: Optional[List[Tuple[int, int]]] = None):
+        """Borra el libro completo o solo el de esas posiciones"""
+        if claves is None:
+            session.execute(delete(GananciaRealizadaDB))
+            session.execute(delete(LoteFiscalDB))
+            return
+        for bloque in self._lotes(list(claves), TAMANO_CLAVES):
+            session.execute(delete(GananciaRealizadaDB).where(
+                tuple_(GananciaRealizadaDB.cuenta_id, GananciaRealizadaDB.titulo_id).in_(bloque)
+            ))
+            session.execute(delete(LoteFiscalDB).where(
+                tuple_(LoteFiscalDB.cuenta_id, LoteFiscalDB.titulo_id).in_(bloque)
+            ))
+    
+    def guardar_tx(self, session, lotes_nuevos: List[Dict], lotes_cambiados: List[Dict],
+                   ganancias: List[Dict]):
+        """
+        Escribe los cambios de una pasada del libro: lotes nuevos (con id
+        asignado), saldo y costo de los lotes consumidos y ganancias.
+        """
+        # Inserciones sobre la tabla (Core): el bulk insert del ORM parte
+        # las filas en lotes distintos según qué columnas vienen en None
+        if lotes_nuevos:
+            session.execute(insert(LoteFiscalDB.__table__), lotes_nuevos)
+        if lotes_cambiados:
+            tabla = LoteFiscalDB.__table__
+            session.execute(
+                update(tabla)
+                .where(tabla.c.id == bindparam('lote_id'))
+                .values(cantidad_restante=bindparam('restante'), costo_unitario=bindparam('costo')),
+                lotes_cambiados
+            )
+        if ganancias:
+            session.execute(insert(GananciaRealizadaDB.__table__), ganancias)
\ No newline at end of file
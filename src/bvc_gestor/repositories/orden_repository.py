@@ -2,16 +2,23 @@
 Repositorio de Órdenes - Queries especializadas para órdenes.
 """
 
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 from datetime import datetime, timedelta
-from .base_repository import BaseRepository
-from ..database.models_sql import OrdenDB, TituloDB, CuentaBursatilDB, ClienteDB
+from .base_repository import BaseRepository, columnas_modelo, TOPE_CONTEO, CLAVE_CURSOR
+from ..database.models_sql import (
+    OrdenDB, TituloDB, CuentaBursatilDB, ClienteDB, CasaBolsaDB, UltimoPrecioDB,
+    ContadorOrdenesDB
+)
+from ..database.ddl_soporte import RECALCULAR_EJECUCION_ORDENES, RECALCULAR_CONTADORES_ORDENES
 from ..utils.constants import TipoOrden, EstadoOrden
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select, lambda_stmt, text, tuple_, bindparam, String
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Estados de una orden activa (la columna Enum guarda el nombre del miembro)
+ESTADOS_ACTIVOS = (EstadoOrden.PENDIENTE, EstadoOrden.ESPERANDO_FONDOS)
+
 
 class OrdenRepository(BaseRepository):
     """Repositorio para gestionar órdenes de compra/venta"""
@@ -21,53 +28,69 @@ class OrdenRepository(BaseRepository):
     
     # ==================== QUERIES ESPECIALIZADAS ====================
     
+    def _stmt_ordenes_cliente(self, cliente_id: int, activas_solo: bool):
+        """Órdenes de un cliente con título y cuenta (sin orden ni límite)"""
+        # Filas planas (select de columnas), sin hidratar OrdenDB
+        stmt = lambda_stmt(lambda: (
+            select(
+                *columnas_modelo(OrdenDB),
+                TituloDB.ticker,
+                TituloDB.nombre.label('titulo_nombre'),
+                CuentaBursatilDB.cuenta.label('numero_cuenta')
+            )
+            .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
+            .join(CuentaBursatilDB, OrdenDB.cuenta_id == CuentaBursatilDB.id)
+            .where(OrdenDB.cliente_id == cliente_id)
+        ))
+        
+        if activas_solo:
+            stmt += lambda s: s.where(OrdenDB.estado.in_(ESTADOS_ACTIVOS))
+        
+        return stmt
+    
     def get_ordenes_por_cliente(self, cliente_id: int, 
                                 activas_solo: bool = False,
                                 limit: Optional[int] = None) -> List[Dict]:
         """Obtiene órdenes de un cliente con información completa"""
         try:
-            with self.db_engine.get_session() as session:
-                query = (
-                    session.query(
-                        OrdenDB,
-                        TituloDB.ticker,
-                        TituloDB.nombre.label('titulo_nombre'),
-                        CuentaBursatilDB.numero_cuenta
-                    )
-                    .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
-                    .join(CuentaBursatilDB, OrdenDB.cuenta_bursatil_id == CuentaBursatilDB.id)
-                    .filter(CuentaBursatilDB.cliente_id == cliente_id)
-                )
-                
-                if activas_solo:
-                    query = query.filter(
-                        OrdenDB.estado.in_([
-                            EstadoOrden.PENDIENTE.value,
-                            EstadoOrden.ESPERANDO_FONDOS.value
-                        ])
-                    )
-                
-                query = query.order_by(OrdenDB.fecha_orden.desc())
-                
-                if limit:
-                    query = query.limit(limit)
-                
-                results = query.all()
-                
-                ordenes = []
-                for orden, ticker, titulo_nombre, numero_cuenta in results:
-                    data = self._to_dict(orden)
-                    data['ticker'] = ticker
-                    data['titulo_nombre'] = titulo_nombre
-                    data['numero_cuenta'] = numero_cuenta
-                    ordenes.append(data)
-                
-                return ordenes
+            # Sentencia cacheada: se compila una vez por variante
+            # (activas_solo / limit); cliente_id y limit viajan como parámetros
+            stmt = self._stmt_ordenes_cliente(cliente_id, activas_solo)
+            stmt += lambda s: s.order_by(OrdenDB.fecha_registro.desc(), OrdenDB.id.desc())
+            
+            if limit:
+                stmt += lambda s: s.limit(limit)
+            
+            with self._read_session() as session:
+                results = self._execute_cached(session, 'get_ordenes_por_cliente', stmt)
+                return self._filas_a_dicts(results.mappings())
         
         except Exception as e:
             logger.error(f"Error obteniendo órdenes del cliente {cliente_id}: {e}")
             return []
     
+    def get_ordenes_por_cliente_pagina(self, cliente_id: int,
+                                       activas_solo: bool = False,
+                                       limit: int = 50,
+                                       cursor: Optional[str] = None,
+                                       contar: bool = False) -> Dict:
+        """
+        Órdenes de un cliente por páginas (keyset sobre fecha_registro, id).
+        
+        Retorna {'items', 'cursor'} (+ 'total_estimado', 'total_exacto'
+        con contar=True); pasar 'cursor' para obtener la página siguiente.
+        """
+        try:
+            stmt = self._stmt_ordenes_cliente(cliente_id, activas_solo)
+            with self._read_session() as session:
+                return self._pagina_ordenes(
+                    session, 'get_ordenes_por_cliente_pagina', stmt, limit, cursor, contar
+                )
+        
+        except Exception as e:
+            logger.error(f"Error paginando órdenes del cliente {cliente_id}: {e}")
+            return {'items': [], 'cursor': None}
+    
     def get_ordenes_recientes(self, limite_dias: int = 30, 
                             cliente_id: Optional[int] = None,
                             limit: int = 50) -> List[Dict]:
@@ -75,38 +98,28 @@ class OrdenRepository(BaseRepository):
         try:
             fecha_limite = datetime.now() - timedelta(days=limite_dias)
             
-            with self.db_engine.get_session() as session:
-                query = (
-                    session.query(
-                        OrdenDB,
-                        TituloDB.ticker,
-                        TituloDB.nombre.label('titulo_nombre'),
-                        ClienteDB.nombre_completo.label('cliente_nombre'),
-                        CuentaBursatilDB.numero_cuenta
-                    )
-                    .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
-                    .join(CuentaBursatilDB, OrdenDB.cuenta_bursatil_id == CuentaBursatilDB.id)
-                    .join(ClienteDB, CuentaBursatilDB.cliente_id == ClienteDB.id)
-                    .filter(OrdenDB.fecha_orden >= fecha_limite)
+            stmt = lambda_stmt(lambda: (
+                select(
+                    *columnas_modelo(OrdenDB),
+                    TituloDB.ticker,
+                    TituloDB.nombre.label('titulo_nombre'),
+                    ClienteDB.nombre_completo.label('cliente_nombre'),
+                    CuentaBursatilDB.cuenta.label('numero_cuenta')
                 )
-                
-                if cliente_id:
-                    query = query.filter(ClienteDB.id == cliente_id)
-                
-                query = query.order_by(OrdenDB.fecha_orden.desc()).limit(limit)
-                
-                results = query.all()
-                
-                ordenes = []
-                for orden, ticker, titulo_nombre, cliente_nombre, numero_cuenta in results:
-                    data = self._to_dict(orden)
-                    data['ticker'] = ticker
-                    data['titulo_nombre'] = titulo_nombre
-                    data['cliente_nombre'] = cliente_nombre
-                    data['numero_cuenta'] = numero_cuenta
-                    ordenes.append(data)
-                
-                return ordenes
+                .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
+                .join(CuentaBursatilDB, OrdenDB.cuenta_id == CuentaBursatilDB.id)
+                .join(ClienteDB, OrdenDB.cliente_id == ClienteDB.id)
+                .where(OrdenDB.fecha_registro >= fecha_limite)
+            ))
+            
+            if cliente_id:
+                stmt += lambda s: s.where(OrdenDB.cliente_id == cliente_id)
+            
+            stmt += lambda s: s.order_by(OrdenDB.fecha_registro.desc()).limit(limit)
+            
+            with self._read_session() as session:
+                results = self._execute_cached(session, 'get_ordenes_recientes', stmt)
+                return self._filas_a_dicts(results.mappings())
         
         except Exception as e:
             logger.error(f"Error obteniendo órdenes recientes: {e}")
@@ -115,82 +128,81 @@ class OrdenRepository(BaseRepository):
     def get_ordenes_pendientes_por_cuenta(self, cuenta_bursatil_id: int) -> List[Dict]:
         """Obtiene órdenes pendientes de una cuenta bursátil"""
         try:
-            with self.db_engine.get_session() as session:
-                query = (
-                    session.query(OrdenDB, TituloDB.ticker, TituloDB.nombre)
-                    .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
-                    .filter(
-                        and_(
-                            OrdenDB.cuenta_bursatil_id == cuenta_bursatil_id,
-                            OrdenDB.estado.in_([
-                                EstadoOrden.PENDIENTE.value,
-                                EstadoOrden.ESPERANDO_FONDOS.value
-                            ])
-                        )
-                    )
-                    .order_by(OrdenDB.fecha_orden.desc())
+            stmt = lambda_stmt(lambda: (
+                select(
+                    *columnas_modelo(OrdenDB),
+                    TituloDB.ticker,
+                    TituloDB.nombre.label('titulo_nombre')
                 )
-                
-                results = query.all()
-                
-                ordenes = []
-                for orden, ticker, nombre in results:
-                    data = self._to_dict(orden)
-                    data['ticker'] = ticker
-                    data['titulo_nombre'] = nombre
-                    ordenes.append(data)
-                
-                return ordenes
+                .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
+                .where(
+                    OrdenDB.cuenta_id == cuenta_bursatil_id,
+                    OrdenDB.estado.in_(ESTADOS_ACTIVOS)
+                )
+                .order_by(OrdenDB.fecha_registro.desc())
+            ))
+            
+            with self._read_session() as session:
+                results = self._execute_cached(session, 'get_ordenes_pendientes_por_cuenta', stmt)
+                return self._filas_a_dicts(results.mappings())
         
         except Exception as e:
             logger.error(f"Error obteniendo órdenes pendientes: {e}")
             return []
     
-    def get_estadisticas_ordenes(self, cliente_id: Optional[int] = None) -> Dict:
-        """Obtiene estadísticas de órdenes"""
+    def get_estadisticas_ordenes(self, cliente_id: Optional[int] = None,
+                                 usar_contadores: bool = True) -> Dict:
+        """
+        Obtiene estadísticas de órdenes (por estado y monto activo).
+        
+        Con usar_contadores=True lee contador_ordenes, que mantienen los
+        triggers de ordenes: una búsqueda por clave primaria por cliente.
+        Con False cuenta sobre ordenes en un solo GROUP BY estado.
+        """
         try:
-            with self.db_engine.get_session() as session:
-                query = session.query(OrdenDB)
-                
+            if usar_contadores:
+                stmt = lambda_stmt(lambda: (
+                    select(
+                        ContadorOrdenesDB.estado,
+                        func.sum(ContadorOrdenesDB.cantidad).label('cantidad'),
+                        func.sum(ContadorOrdenesDB.monto).label('monto')
+                    )
+                    .group_by(ContadorOrdenesDB.estado)
+                ))
                 if cliente_id:
-                    query = query.join(CuentaBursatilDB).filter(
-                        CuentaBursatilDB.cliente_id == cliente_id
+                    stmt += lambda s: s.where(ContadorOrdenesDB.cliente_id == cliente_id)
+            else:
+                stmt = lambda_stmt(lambda: (
+                    select(
+                        OrdenDB.estado,
+                        func.count().label('cantidad'),
+                        func.sum(OrdenDB.monto_total_estimado).label('monto')
                     )
-                
-                total = query.count()
-                
-                pendientes = query.filter(
-                    OrdenDB.estado == EstadoOrden.PENDIENTE.value
-                ).count()
-                
-                ejecutadas = query.filter(
-                    OrdenDB.estado == EstadoOrden.EJECUTADA.value
-                ).count()
-                
-                canceladas = query.filter(
-                    OrdenDB.estado == EstadoOrden.CANCELADA.value
-                ).count()
-                
-                esperando_fondos = query.filter(
-                    OrdenDB.estado == EstadoOrden.ESPERANDO_FONDOS.value
-                ).count()
-                
-                # Monto total en órdenes activas
-                monto_activo = query.filter(
-                    OrdenDB.estado.in_([
-                        EstadoOrden.PENDIENTE.value,
-                        EstadoOrden.ESPERANDO_FONDOS.value
-                    ])
-                ).with_entities(func.sum(OrdenDB.monto_total_estimado)).scalar() or 0
-                
-                return {
-                    'total': total,
-                    'pendientes': pendientes,
-                    'ejecutadas': ejecutadas,
-                    'canceladas': canceladas,
-                    'esperando_fondos': esperando_fondos,
-                    'monto_activo': float(monto_activo)
-                }
+                    .group_by(OrdenDB.estado)
+                ))
+                if cliente_id:
+                    stmt += lambda s: s.where(OrdenDB.cliente_id == cliente_id)
+            
+            with self._read_session() as session:
+                nombre = 'get_estadisticas_ordenes' + ('.contadores' if usar_contadores else '')
+                filas = self._execute_cached(session, nombre, stmt).all()
+            
+            por_estado = {estado: (cantidad or 0, monto or 0) for estado, cantidad, monto in filas}
+            
+            def cantidad(estado: EstadoOrden) -> int:
+                return int(por_estado.get(estado, (0, 0))[0])
+            
+            # Monto total en órdenes activas
+            monto_activo = sum(por_estado.get(estado, (0, 0))[1] for estado in ESTADOS_ACTIVOS)
+            
+            return {
+                'total': sum(int(c) for c, _ in por_estado.values()),
+                'pendientes': cantidad(EstadoOrden.PENDIENTE),
+                'ejecutadas': cantidad(EstadoOrden.EJECUTADA),
+                'canceladas': cantidad(EstadoOrden.CANCELADA),
+                'esperando_fondos': cantidad(EstadoOrden.ESPERANDO_FONDOS),
+                'monto_activo': float(monto_activo)
+            }
         
         except Exception as e:
             logger.error(f"Error obteniendo estadísticas: {e}")
@@ -203,30 +215,42 @@ class OrdenRepository(BaseRepository):
                 'monto_activo': 0
             }
     
+    def _cambiar_estado_orden_tx(self, session, orden_id: int, nuevo_estado: EstadoOrden):
+        """Retorna el estado anterior, o None si la orden no existe"""
+        orden = session.query(OrdenDB).filter_by(id=orden_id).first()
+        
+        if not orden:
+            return None
+        
+        estado_anterior = orden.estado
+        # La columna Enum guarda el nombre del miembro: asignar el miembro
+        orden.estado = nuevo_estado
+        
+        # Actualizar fecha de ejecución si aplica
+        if nuevo_estado == EstadoOrden.EJECUTADA:
+            orden.fecha_ejecucion = datetime.now()
+        
+        session.flush()
+        return estado_anterior
+    
     def cambiar_estado_orden(self, orden_id: int, nuevo_estado: EstadoOrden) -> bool:
-        """Cambia el estado de una orden"""
+        """
+        Cambia el estado de una orden.
+        
+        Con usar_cola_escritura() activo, el cambio se confirma junto con
+        las demás mutaciones encoladas en la misma ventana.
+        """
         try:
-            with self.db_engine.get_session() as session:
-                orden = session.query(OrdenDB).filter_by(id=orden_id).first()
-                
-                if not orden:
-                    logger.warning(f"Orden {orden_id} no encontrada")
-                    return False
-                
-                estado_anterior = orden.estado
-                orden.estado = nuevo_estado.value
-                
-                # Actualizar fecha de ejecución si aplica
-                if nuevo_estado == EstadoOrden.EJECUTADA:
-                    orden.fecha_ejecucion = datetime.now()
-                
-                session.commit()
-                self._invalidate_cache(orden_id)
-                
-                logger.info(
-                    f"✅ Orden {orden_id}: {estado_anterior} → {nuevo_estado.value}"
-                )
-                return True
+            estado_anterior = self._mutar(self._cambiar_estado_orden_tx, orden_id, nuevo_estado)
+            
+            if estado_anterior is None:
+                logger.warning(f"Orden {orden_id} no encontrada")
+                return False
+            
+            logger.info(
+                f"✅ Orden {orden_id}: {estado_anterior.value} → {nuevo_estado.value}"
+            )
+            return True
         
         except Exception as e:
             logger.error(f"Error cambiando estado de orden: {e}")
@@ -235,23 +259,20 @@ class OrdenRepository(BaseRepository):
     def cancelar_orden(self, orden_id: int, motivo: Optional[str] = None) -> bool:
         """Cancela una orden con motivo opcional"""
         try:
-            with self.db_engine.get_session() as session:
+            with self._write_session() as session:
                 orden = session.query(OrdenDB).filter_by(id=orden_id).first()
                 
                 if not orden:
                     return False
                 
                 # Solo se pueden cancelar órdenes pendientes o esperando fondos
-                if orden.estado not in [
-                    EstadoOrden.PENDIENTE.value,
-                    EstadoOrden.ESPERANDO_FONDOS.value
-                ]:
+                if orden.estado not in ESTADOS_ACTIVOS:
                     logger.warning(
                         f"No se puede cancelar orden {orden_id} en estado {orden.estado}"
                     )
                     return False
                 
-                orden.estado = EstadoOrden.CANCELADA.value
+                orden.estado = EstadoOrden.CANCELADA
                 
                 if motivo:
                     if orden.observaciones:
@@ -269,83 +290,177 @@ class OrdenRepository(BaseRepository):
             logger.error(f"Error cancelando orden: {e}")
             return False
     
+    def _stmt_buscar_ordenes(self, ticker, tipo, estado, fecha_desde, fecha_hasta, cliente_id):
+        """Sentencia de búsqueda con sus filtros (sin orden ni límite)"""
+        stmt = lambda_stmt(lambda: (
+            select(
+                *columnas_modelo(OrdenDB),
+                TituloDB.ticker,
+                TituloDB.nombre.label('titulo_nombre'),
+                ClienteDB.nombre_completo.label('cliente_nombre')
+            )
+            .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
+            .join(ClienteDB, OrdenDB.cliente_id == ClienteDB.id)
+        ))
+        
+        # Aplicar filtros: cada combinación de filtros es una variante
+        # cacheada; los valores se calculan fuera de las lambdas
+        if ticker:
+            patron_ticker = f"%{ticker}%"
+            stmt += lambda s: s.where(TituloDB.ticker.ilike(patron_ticker))
+        
+        if tipo:
+            stmt += lambda s: s.where(OrdenDB.tipo == tipo)
+        
+        if estado:
+            stmt += lambda s: s.where(OrdenDB.estado == estado)
+        
+        if fecha_desde:
+            stmt += lambda s: s.where(OrdenDB.fecha_registro >= fecha_desde)
+        
+        if fecha_hasta:
+            stmt += lambda s: s.where(OrdenDB.fecha_registro <= fecha_hasta)
+        
+        if cliente_id:
+            stmt += lambda s: s.where(OrdenDB.cliente_id == cliente_id)
+        
+        return stmt
+    
     def buscar_ordenes(self, 
                       ticker: Optional[str] = None,
                       tipo: Optional[TipoOrden] = None,
                       estado: Optional[EstadoOrden] = None,
                       fecha_desde: Optional[datetime] = None,
                       fecha_hasta: Optional[datetime] = None,
-                      cliente_id: Optional[int] = None) -> List[Dict]:
-        """Búsqueda avanzada de órdenes con múltiples filtros"""
+                      cliente_id: Optional[int] = None,
+                      limit: Optional[int] = None) -> List[Dict]:
+        """
+        Búsqueda avanzada de órdenes con múltiples filtros.
+        
+        Sin limit devuelve todas las coincidencias; para listados grandes
+        usar buscar_ordenes_pagina().
+        """
         try:
-            with self.db_engine.get_session() as session:
-                query = (
-                    session.query(
-                        OrdenDB,
-                        TituloDB.ticker,
-                        TituloDB.nombre.label('titulo_nombre'),
-                        ClienteDB.nombre_completo.label('cliente_nombre')
-                    )
-                    .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
-                    .join(CuentaBursatilDB, OrdenDB.cuenta_bursatil_id == CuentaBursatilDB.id)
-                    .join(ClienteDB, CuentaBursatilDB.cliente_id == ClienteDB.id)
-                )
-                
-                # Aplicar filtros
-                if ticker:
-                    query = query.filter(TituloDB.ticker.ilike(f"%{ticker}%"))
-                
-                if tipo:
-                    query = query.filter(OrdenDB.tipo == tipo.value)
-                
-                if estado:
-                    query = query.filter(OrdenDB.estado == estado.value)
-                
-                if fecha_desde:
-                    query = query.filter(OrdenDB.fecha_orden >= fecha_desde)
-                
-                if fecha_hasta:
-                    query = query.filter(OrdenDB.fecha_orden <= fecha_hasta)
-                
-                if cliente_id:
-                    query = query.filter(ClienteDB.id == cliente_id)
-                
-                query = query.order_by(OrdenDB.fecha_orden.desc())
-                
-                results = query.all()
-                
-                ordenes = []
-                for orden, ticker, titulo_nombre, cliente_nombre in results:
-                    data = self._to_dict(orden)
-                    data['ticker'] = ticker
-                    data['titulo_nombre'] = titulo_nombre
-                    data['cliente_nombre'] = cliente_nombre
-                    ordenes.append(data)
-                
-                return ordenes
+            stmt = self._stmt_buscar_ordenes(ticker, tipo, estado, fecha_desde, fecha_hasta, cliente_id)
+            stmt += lambda s: s.order_by(OrdenDB.fecha_registro.desc(), OrdenDB.id.desc())
+            
+            if limit:
+                stmt += lambda s: s.limit(limit)
+            
+            with self._read_session() as session:
+                results = self._execute_cached(session, 'buscar_ordenes', stmt)
+                return self._filas_a_dicts(results.mappings())
         
         except Exception as e:
             logger.error(f"Error en búsqueda de órdenes: {e}")
             return []
     
+    def buscar_ordenes_pagina(self,
+                              ticker: Optional[str] = None,
+                              tipo: Optional[TipoOrden] = None,
+                              estado: Optional[EstadoOrden] = None,
+                              fecha_desde: Optional[datetime] = None,
+                              fecha_hasta: Optional[datetime] = None,
+                              cliente_id: Optional[int] = None,
+                              limit: int = 100,
+                              cursor: Optional[str] = None,
+                              contar: bool = False) -> Dict:
+        """
+        Búsqueda de órdenes por páginas (keyset sobre fecha_registro, id).
+        
+        Retorna {'items', 'cursor'} (+ 'total_estimado', 'total_exacto'
+        con contar=True); pasar 'cursor' para obtener la página siguiente.
+        """
+        try:
+            stmt = self._stmt_buscar_ordenes(ticker, tipo, estado, fecha_desde, fecha_hasta, cliente_id)
+            with self._read_session() as session:
+                return self._pagina_ordenes(
+                    session, 'buscar_ordenes_pagina', stmt, limit, cursor, contar
+                )
+        
+        except Exception as e:
+            logger.error(f"Error paginando búsqueda de órdenes: {e}")
+            return {'items': [], 'cursor': None}
+    
+    def iter_ordenes(self,
+                     ticker: Optional[str] = None,
+                     tipo: Optional[TipoOrden] = None,
+                     estado: Optional[EstadoOrden] = None,
+                     fecha_desde: Optional[datetime] = None,
+                     fecha_hasta: Optional[datetime] = None,
+                     cliente_id: Optional[int] = None,
+                     tamano_lote: int = 1000) -> Iterator[Dict]:
+        """
+        Mismos filtros y columnas que buscar_ordenes(), como generador por
+        lotes (ver BaseRepository.stream_query): exportaciones de cierre de
+        año y conciliaciones sin cargar todas las órdenes en memoria.
+        Recorre en orden de id (el de la tabla), sin ordenamiento temporal.
+        """
+        stmt = self._stmt_buscar_ordenes(ticker, tipo, estado, fecha_desde, fecha_hasta, cliente_id)
+        stmt += lambda s: s.order_by(OrdenDB.id)
+        return self.stream_query(stmt, tamano_lote=tamano_lote, nombre='iter_ordenes')
+    
+    def _pagina_ordenes(self, session, nombre: str, stmt, limit: int,
+                        cursor: Optional[str], contar: bool) -> Dict:
+        """
+        Ejecuta una consulta de órdenes por keyset: ORDER BY fecha_registro
+        DESC, id DESC y WHERE (fecha_registro, id) < cursor. Con los índices
+        (cliente_id, fecha_registro) / (fecha_registro) SQLite busca el punto
+        de continuación en el índice en lugar de saltar filas con OFFSET.
+        """
+        conteo = {}
+        if contar:
+            stmt_conteo = stmt + (lambda s: select(func.count()).select_from(
+                s.with_only_columns(OrdenDB.id).limit(TOPE_CONTEO).subquery()
+            ))
+            total = self._execute_cached(session, f'{nombre}.conteo', stmt_conteo).scalar() or 0
+            conteo = {'total_estimado': total, 'total_exacto': total < TOPE_CONTEO}
+        
+        params = {'limite_pagina': limit + 1}
+        if cursor:
+            params['cursor_fecha'], params['cursor_id'] = self._decodificar_cursor(
+                cursor, [OrdenDB.fecha_registro, OrdenDB.id]
+            )
+            # Fecha como el texto guardado (ver _columna_cursor)
+            stmt += lambda s: s.where(
+                tuple_(OrdenDB.fecha_registro, OrdenDB.id)
+                < tuple_(bindparam('cursor_fecha', type_=String()), bindparam('cursor_id'))
+            )
+        
+        columna_cursor = self._columna_cursor(OrdenDB.fecha_registro)
+        stmt += lambda s: (
+            s.add_columns(columna_cursor)
+            .order_by(OrdenDB.fecha_registro.desc(), OrdenDB.id.desc())
+            .limit(bindparam('limite_pagina'))
+        )
+        
+        results = self._execute_cached(session, nombre, stmt, params)
+        filas = self._filas_a_dicts(results.mappings())
+        
+        pagina = self._armar_pagina(filas, limit, (CLAVE_CURSOR, 'id'))
+        pagina.update(conteo)
+        return pagina
+    
     def get_orden_completa(self, orden_id: int) -> Optional[Dict]:
         """Obtiene una orden con toda la información relacionada"""
         try:
-            with self.db_engine.get_session() as session:
+            with self._read_session() as session:
                 result = (
                     session.query(
                         OrdenDB,
                         TituloDB.ticker,
                         TituloDB.nombre.label('titulo_nombre'),
-                        TituloDB.precio_actual.label('precio_mercado'),
+                        UltimoPrecioDB.precio.label('precio_mercado'),
                         ClienteDB.nombre_completo.label('cliente_nombre'),
                         ClienteDB.rif_cedula.label('cliente_cedula'),
                         CuentaBursatilDB.cuenta,
-                        CuentaBursatilDB.casa_bolsa
+                        CasaBolsaDB.nombre.label('casa_bolsa')
                     )
                     .join(TituloDB, OrdenDB.titulo_id == TituloDB.id)
-                    .join(CuentaBursatilDB, OrdenDB.cuenta_bursatil_id == CuentaBursatilDB.id)
-                    .join(ClienteDB, CuentaBursatilDB.cliente_id == ClienteDB.id)
+                    .outerjoin(UltimoPrecioDB, UltimoPrecioDB.titulo_id == TituloDB.id)
+                    .join(CuentaBursatilDB, OrdenDB.cuenta_id == CuentaBursatilDB.id)
+                    .join(CasaBolsaDB, CuentaBursatilDB.casa_bolsa_id == CasaBolsaDB.id)
+                    .join(ClienteDB, OrdenDB.cliente_id == ClienteDB.id)
                     .filter(OrdenDB.id == orden_id)
                     .first()
                 )
@@ -371,4 +486,93 @@ class OrdenRepository(BaseRepository):
         
         except Exception as e:
             logger.error(f"Error obteniendo orden completa: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    # ==================== EJECUCIÓN ACUMULADA ====================
+    
+    def verificar_ejecucion_ordenes(self, corregir: bool = False) -> List[Dict]:
+        """
+        Compara cantidad_ejecutada/monto_ejecutado con la suma de transacciones.
+        
+        Retorna las órdenes descuadradas; con corregir=True las recalcula
+        desde transacciones en la misma transacción de escritura.
+        """
+        consulta = text("""
+            SELECT o.id, o.cantidad_ejecutada, o.monto_ejecutado,
+                   COALESCE(t.cantidad, 0) AS cantidad_real,
+                   COALESCE(t.monto, 0) AS monto_real
+            FROM ordenes o
+            LEFT JOIN (
+                SELECT orden_id, SUM(cantidad_ejecutada) AS cantidad, SUM(monto_bruto) AS monto
+                FROM transacciones
+                GROUP BY orden_id
+            ) t ON t.orden_id = o.id
+            WHERE o.cantidad_ejecutada IS NOT COALESCE(t.cantidad, 0)
+               OR o.monto_ejecutado IS NULL
+               OR ABS(o.monto_ejecutado - COALESCE(t.monto, 0)) > 0.000001
+        """)
+        try:
+            session_factory = self._write_session if corregir else self._read_session
+            with session_factory() as session:
+                descuadres = [dict(fila) for fila in session.execute(consulta).mappings()]
+                
+                if corregir and descuadres:
+                    ids = ", ".join(str(int(d['id'])) for d in descuadres)
+                    session.execute(text(
+                        RECALCULAR_EJECUCION_ORDENES.format(filtro=f"id IN ({ids})")
+                    ))
+                    session.commit()
+                    self._invalidate_cache()
+                    logger.info(f"✅ Ejecución recalculada en {len(descuadres)} órdenes")
+                
+                return descuadres
+        
+        except Exception as e:
+            logger.error(f"Error verificando ejecución de órdenes: {e}")
+            return []
+    
+    def verificar_contadores_ordenes(self, corregir: bool = False) -> List[Dict]:
+        """
+        Compara contador_ordenes con un conteo sobre ordenes.
+        
+        Retorna los (cliente, estado) descuadrados; con corregir=True
+        reconstruye los contadores de esos clientes.
+        """
+        consulta = text("""
+            WITH real AS (
+                SELECT cliente_id, estado, COUNT(*) AS cantidad,
+                       COALESCE(SUM(monto_total_estimado), 0) AS monto
+                FROM ordenes
+                GROUP BY cliente_id, estado
+            ),
+            claves AS (
+                SELECT cliente_id, estado FROM real
+                UNION
+                SELECT cliente_id, estado FROM contador_ordenes
+            )
+            SELECT k.cliente_id, k.estado,
+                   COALESCE(c.cantidad, 0) AS cantidad, COALESCE(c.monto, 0) AS monto,
+                   COALESCE(r.cantidad, 0) AS cantidad_real, COALESCE(r.monto, 0) AS monto_real
+            FROM claves k
+            LEFT JOIN contador_ordenes c ON c.cliente_id = k.cliente_id AND c.estado = k.estado
+            LEFT JOIN real r ON r.cliente_id = k.cliente_id AND r.estado = k.estado
+            WHERE COALESCE(c.cantidad, 0) != COALESCE(r.cantidad, 0)
+               OR ABS(COALESCE(c.monto, 0) - COALESCE(r.monto, 0)) > 0.005
+        """)
+        try:
+            session_factory = self._write_session if corregir else self._read_session
+            with session_factory() as session:
+                descuadres = [dict(fila) for fila in session.execute(consulta).mappings()]
+                
+                if corregir and descuadres:
+                    ids = ", ".join(sorted({str(int(d['cliente_id'])) for d in descuadres}))
+                    for sentencia in RECALCULAR_CONTADORES_ORDENES:
+                        session.execute(text(sentencia.format(filtro=f"cliente_id IN ({ids})")))
+                    session.commit()
+                    logger.info(f"✅ Contadores recalculados en {len(descuadres)} (cliente, estado)")
+                
+                return descuadres
+        
+        except Exception as e:
+            logger.error(f"Error verificando contadores de órdenes: {e}")
+            return []
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Perfiles de carga para consultas que devuelven entidades ORM.
+
+Un perfil fija qué relaciones se cargan junto con la entidad y cómo
+(joinedload para muchos-a-uno, selectinload para colecciones, load_only
+para limitar columnas) y cierra el resto con raiseload('*'): un acceso no
+previsto lanza una excepción en lugar de emitir una consulta por fila
+(N+1). Así cada perfil emite un número fijo de sentencias por llamada,
+sin importar cuántas filas devuelva; los tests lo verifican.
+
+- lista: solo las columnas de la entidad
+- detalle: la entidad con las relaciones que se muestran en su ficha
+- valoracion: lo que necesitan to_dict() y el valor de mercado
+  (título y último precio)
+
+Los repositorios los reciben por nombre (BaseRepository.get_entidad(),
+find_entidades()).
+"""
+
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm import joinedload, selectinload, raiseload, load_only
+
+from ..database.models_sql import (
+    OrdenDB, TituloDB, ClienteDB, CuentaBursatilDB, CasaBolsaDB,
+    SaldoDB, PortafolioItemDB
+)
+
+# modelo -> {perfil: (opciones de carga, sentencias por llamada)}
+_PERFILES: Dict[type, Dict[str, Tuple[list, int]]] = {}
+
+
+def registrar_perfil(modelo: type, nombre: str, opciones: list, sentencias: int) -> None:
+    """Registrar un perfil y el número de sentencias que emite"""
+    _PERFILES.setdefault(modelo, {})[nombre] = (list(opciones), sentencias)
+
+
+def opciones_carga(modelo: type, perfil: str) -> list:
+    """Opciones de carga del perfil (ValueError si no existe)"""
+    try:
+        return _PERFILES[modelo][perfil][0]
+    except KeyError:
+        raise ValueError(f"Perfil de carga '{perfil}' no definido para {modelo.__name__}")
+
+
+def sentencias_perfil(modelo: type, perfil: str) -> int:
+    """Sentencias SQL que emite una consulta con el perfil"""
+    opciones_carga(modelo, perfil)
+    return _PERFILES[modelo][perfil][1]
+
+
+def perfiles(modelo: type) -> List[str]:
+    """Nombres de los perfiles definidos para un modelo"""
+    return list(_PERFILES.get(modelo, {}))
+
+
+# ==================== OPCIONES COMPARTIDAS ====================
+# Las columnas fuera de load_only(raiseload=True) también lanzan al leerse
+
+def _titulo_valorado(relacion):
+    """Título (identificación) con su último precio, en el mismo JOIN"""
+    return joinedload(relacion).options(
+        load_only(TituloDB.id, TituloDB.ticker, TituloDB.nombre, raiseload=True),
+        joinedload(TituloDB.ultimo_precio),
+        raiseload("*"),
+    )
+
+
+def _cuenta_con_casa(relacion):
+    """Cuenta bursátil con el nombre de su casa de bolsa"""
+    return joinedload(relacion).options(
+        joinedload(CuentaBursatilDB.casa_bolsa).options(
+            load_only(CasaBolsaDB.id, CasaBolsaDB.nombre, raiseload=True),
+            raiseload("*"),
+        ),
+        raiseload("*"),
+    )
+
+
+def _cliente_ficha(relacion):
+    """Cliente con los datos que se muestran junto a sus órdenes y cuentas"""
+    return joinedload(relacion).options(
+        load_only(ClienteDB.id, ClienteDB.nombre_completo, ClienteDB.rif_cedula, raiseload=True),
+        raiseload("*"),
+    )
+
+
+# ==================== ÓRDENES ====================
+
+registrar_perfil(OrdenDB, "lista", [raiseload("*")], sentencias=1)
+
+registrar_perfil(OrdenDB, "detalle", [
+    _titulo_valorado(OrdenDB.titulo),
+    _cliente_ficha(OrdenDB.cliente),
+    _cuenta_con_casa(OrdenDB.cuenta),
+    # Colección: una sentencia más para todas las órdenes de la consulta
+    selectinload(OrdenDB.transacciones).raiseload("*"),
+    raiseload("*"),
+], sentencias=2)
+
+# ==================== PORTAFOLIO ====================
+
+registrar_perfil(PortafolioItemDB, "lista", [raiseload("*")], sentencias=1)
+
+registrar_perfil(PortafolioItemDB, "valoracion", [
+    _titulo_valorado(PortafolioItemDB.titulo),
+    raiseload("*"),
+], sentencias=1)
+
+registrar_perfil(PortafolioItemDB, "detalle", [
+    _titulo_valorado(PortafolioItemDB.titulo),
+    _cuenta_con_casa(PortafolioItemDB.cuenta),
+    raiseload("*"),
+], sentencias=1)
+
+# ==================== CUENTAS Y SALDOS ====================
+
+registrar_perfil(CuentaBursatilDB, "lista", [raiseload("*")], sentencias=1)
+
+registrar_perfil(CuentaBursatilDB, "detalle", [
+    joinedload(CuentaBursatilDB.casa_bolsa).options(
+        load_only(CasaBolsaDB.id, CasaBolsaDB.nombre, raiseload=True),
+        raiseload("*"),
+    ),
+    _cliente_ficha(CuentaBursatilDB.cliente),
+    selectinload(CuentaBursatilDB.saldos).raiseload("*"),
+    raiseload("*"),
+], sentencias=2)
+
+registrar_perfil(CuentaBursatilDB, "valoracion", [
+    selectinload(CuentaBursatilDB.saldos).raiseload("*"),
+    selectinload(CuentaBursatilDB.portafolio).options(
+        _titulo_valorado(PortafolioItemDB.titulo),
+        raiseload("*"),
+    ),
+    raiseload("*"),
+], sentencias=3)
+
+registrar_perfil(SaldoDB, "lista", [raiseload("*")], sentencias=1)
+
+registrar_perfil(SaldoDB, "detalle", [
+    _cuenta_con_casa(SaldoDB.cuenta),
+    raiseload("*"),
+], sentencias=1)
+
+# ==================== TÍTULOS ====================
+
+# El último precio ya viaja en el JOIN (lazy="joined"); el resto, cerrado
+registrar_perfil(TituloDB, "lista", [
+    joinedload(TituloDB.ultimo_precio),
+    raiseload("*"),
+], sentencias=1)
\ No newline at end of file
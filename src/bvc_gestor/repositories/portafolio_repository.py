@@ -2,10 +2,15 @@
 Repositorios de Portafolio
 """
 
-from typing import List, Dict, Optional
-from .base_repository import BaseRepository
-from ..database.models_sql import SaldoDB, PortafolioItemDB, TituloDB, CuentaBursatilDB
-from sqlalchemy import func
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from .base_repository import BaseRepository, columnas_modelo
+from ..database.models_sql import (
+    SaldoDB, PortafolioItemDB, TituloDB, CuentaBursatilDB, CasaBolsaDB, UltimoPrecioDB,
+    ClienteDB
+)
+from ..utils.valoracion import valorar_arrays, METRICAS
+from sqlalchemy import Float, func, select, lambda_stmt, type_coerce
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,41 +25,27 @@ class PortafolioRepository(BaseRepository):
                             incluir_precios_actuales: bool = True) -> List[Dict]:
         """Obtiene el portafolio completo de una cuenta bursátil"""
         try:
-            with self.db_engine.get_session() as session:
-                query = (
-                    session.query(
-                        PortafolioItemDB,
-                        TituloDB.ticker,
-                        TituloDB.nombre,
-                        TituloDB.precio_actual
-                    )
-                    .join(TituloDB, PortafolioItemDB.titulo_id == TituloDB.id)
-                    .filter(PortafolioItemDB.cuenta_bursatil_id == cuenta_bursatil_id)
-                    .filter(PortafolioItemDB.cantidad_total > 0)
+            # Sentencia cacheada; el precio actual sale de ultimo_precio
+            # en lugar de recorrer el historial de cada título
+            stmt = lambda_stmt(lambda: (
+                select(
+                    *columnas_modelo(PortafolioItemDB),
+                    TituloDB.ticker,
+                    TituloDB.nombre,
+                    UltimoPrecioDB.precio.label('precio_actual')
                 )
+                .join(TituloDB, PortafolioItemDB.titulo_id == TituloDB.id)
+                .outerjoin(UltimoPrecioDB, UltimoPrecioDB.titulo_id == TituloDB.id)
+                .where(PortafolioItemDB.cuenta_id == cuenta_bursatil_id)
+                .where(PortafolioItemDB.cantidad > 0)
+            ))
+            
+            with self._read_session() as session:
+                results = self._execute_cached(session, 'get_portafolio_cuenta', stmt)
                 
-                results = query.all()
-                
-                portafolio = []
-                for item, ticker, nombre, precio_actual in results:
-                    data = self._to_dict(item)
-                    data['ticker'] = ticker
-                    data['nombre'] = nombre
-                    data['precio_actual'] = precio_actual
-                    
-                    # Calcular métricas
-                    if incluir_precios_actuales and precio_actual:
-                        valor_mercado = item.cantidad_total * precio_actual
-                        costo_total = item.cantidad_total * item.costo_promedio
-                        ganancia_perdida = valor_mercado - costo_total
-                        rendimiento = (ganancia_perdida / costo_total * 100) if costo_total > 0 else 0
-                        
-                        data['valor_mercado'] = float(valor_mercado)
-                        data['costo_total'] = float(costo_total)
-                        data['ganancia_perdida'] = float(ganancia_perdida)
-                        data['rendimiento_pct'] = float(rendimiento)
-                    
-                    portafolio.append(data)
+                portafolio = self._filas_a_dicts(results.mappings())
+                if incluir_precios_actuales:
+                    self._agregar_metricas(portafolio, METRICAS)
                 
                 return portafolio
         
@@ -76,8 +67,10 @@ class PortafolioRepository(BaseRepository):
                     'rendimiento_total_pct': 0
                 }
             
-            valor_mercado_total = sum(p['valor_mercado'] for p in portafolio)
-            inversion_total = sum(p['costo_total'] for p in portafolio)
+            # Las posiciones sin precio no tienen valor de mercado: no suman
+            valoradas = [p for p in portafolio if 'valor_mercado' in p]
+            valor_mercado_total = sum(p['valor_mercado'] for p in valoradas)
+            inversion_total = sum(p['costo_total'] for p in valoradas)
             ganancia_perdida = valor_mercado_total - inversion_total
             rendimiento = (ganancia_perdida / inversion_total * 100) if inversion_total > 0 else 0
             
@@ -98,32 +91,26 @@ class PortafolioRepository(BaseRepository):
                            titulo_id: int) -> Optional[Dict]:
         """Obtiene la posición de un ticker específico"""
         try:
-            with self.db_engine.get_session() as session:
-                result = (
-                    session.query(
-                        PortafolioItemDB,
-                        TituloDB.ticker,
-                        TituloDB.nombre,
-                        TituloDB.precio_actual
-                    )
-                    .join(TituloDB, PortafolioItemDB.titulo_id == TituloDB.id)
-                    .filter(
-                        PortafolioItemDB.cuenta_bursatil_id == cuenta_bursatil_id,
-                        PortafolioItemDB.titulo_id == titulo_id
-                    )
-                    .first()
+            stmt = lambda_stmt(lambda: (
+                select(
+                    *columnas_modelo(PortafolioItemDB),
+                    TituloDB.ticker,
+                    TituloDB.nombre,
+                    UltimoPrecioDB.precio.label('precio_actual')
                 )
+                .join(TituloDB, PortafolioItemDB.titulo_id == TituloDB.id)
+                .outerjoin(UltimoPrecioDB, UltimoPrecioDB.titulo_id == TituloDB.id)
+                .where(
+                    PortafolioItemDB.cuenta_id == cuenta_bursatil_id,
+                    PortafolioItemDB.titulo_id == titulo_id
+                )
+            ))
+            
+            with self._read_session() as session:
+                result = self._execute_cached(session, 'get_posicion_ticker', stmt)
+                filas = self._filas_a_dicts(result.mappings().all())
                 
-                if not result:
-                    return None
-                
-                item, ticker, nombre, precio_actual = result
-                data = self._to_dict(item)
-                data['ticker'] = ticker
-                data['nombre'] = nombre
-                data['precio_actual'] = precio_actual
-                
-                return data
+                return filas[0] if filas else None
         
         except Exception as e:
             logger.error(f"Error obteniendo posición: {e}")
@@ -132,48 +119,129 @@ class PortafolioRepository(BaseRepository):
     def get_portafolio_cliente(self, cliente_id: int) -> List[Dict]:
         """Obtiene portafolio consolidado de todas las cuentas de un cliente"""
         try:
-            with self.db_engine.get_session() as session:
-                results = (
-                    session.query(
-                        PortafolioItemDB,
-                        TituloDB.ticker,
-                        TituloDB.nombre,
-                        TituloDB.precio_actual,
-                        CuentaBursatilDB.casa_bolsa,
-                        CuentaBursatilDB.numero_cuenta
-                    )
-                    .join(TituloDB, PortafolioItemDB.titulo_id == TituloDB.id)
-                    .join(CuentaBursatilDB, PortafolioItemDB.cuenta_bursatil_id == CuentaBursatilDB.id)
-                    .filter(CuentaBursatilDB.cliente_id == cliente_id)
-                    .filter(PortafolioItemDB.cantidad_total > 0)
-                    .all()
+            stmt = lambda_stmt(lambda: (
+                select(
+                    *columnas_modelo(PortafolioItemDB),
+                    TituloDB.ticker,
+                    TituloDB.nombre,
+                    UltimoPrecioDB.precio.label('precio_actual'),
+                    CasaBolsaDB.nombre.label('casa_bolsa'),
+                    CuentaBursatilDB.cuenta.label('numero_cuenta')
                 )
+                .join(TituloDB, PortafolioItemDB.titulo_id == TituloDB.id)
+                .outerjoin(UltimoPrecioDB, UltimoPrecioDB.titulo_id == TituloDB.id)
+                .join(CuentaBursatilDB, PortafolioItemDB.cuenta_id == CuentaBursatilDB.id)
+                .join(CasaBolsaDB, CuentaBursatilDB.casa_bolsa_id == CasaBolsaDB.id)
+                .where(CuentaBursatilDB.cliente_id == cliente_id)
+                .where(PortafolioItemDB.cantidad > 0)
+            ))
+            
+            with self._read_session() as session:
+                results = self._execute_cached(session, 'get_portafolio_cliente', stmt)
                 
-                portafolio = []
-                for item, ticker, nombre, precio_actual, casa_bolsa, numero_cuenta in results:
-                    data = self._to_dict(item)
-                    data.update({
-                        'ticker': ticker,
-                        'nombre': nombre,
-                        'precio_actual': precio_actual,
-                        'casa_bolsa': casa_bolsa,
-                        'numero_cuenta': numero_cuenta
-                    })
-                    
-                    # Calcular métricas
-                    if precio_actual:
-                        valor_mercado = item.cantidad_total * precio_actual
-                        costo_total = item.cantidad_total * item.costo_promedio
-                        ganancia_perdida = valor_mercado - costo_total
-                        
-                        data['valor_mercado'] = float(valor_mercado)
-                        data['costo_total'] = float(costo_total)
-                        data['ganancia_perdida'] = float(ganancia_perdida)
-                    
-                    portafolio.append(data)
+                portafolio = self._filas_a_dicts(results.mappings())
+                self._agregar_metricas(portafolio, ('valor_mercado', 'costo_total', 'ganancia_perdida'))
                 
                 return portafolio
         
         except Exception as e:
             logger.error(f"Error obteniendo portafolio del cliente: {e}")
+            return []
+    
+    @staticmethod
+    def _agregar_metricas(portafolio: List[Dict], metricas: Tuple[str, ...]):
+        """
+        Métricas de todas las posiciones en una pasada vectorizada (ver
+        utils/valoracion.py); solo se agregan a las que tienen precio.
+        """
+        if not portafolio:
+            return
+        
+        cantidad = np.fromiter((p['cantidad'] or 0 for p in portafolio), dtype=float, count=len(portafolio))
+        costo = np.fromiter((p['costo_promedio'] or 0 for p in portafolio), dtype=float, count=len(portafolio))
+        precio = np.fromiter(
+            (p['precio_actual'] if p['precio_actual'] else np.nan for p in portafolio),
+            dtype=float, count=len(portafolio)
+        )
+        valores = valorar_arrays(cantidad, costo, precio)
+        columnas = [valores[m].tolist() for m in metricas]
+        
+        for i in np.flatnonzero(~np.isnan(precio)).tolist():
+            data = portafolio[i]
+            for metrica, columna in zip(metricas, columnas):
+                data[metrica] = columna[i]
+    
+    # ==================== VALORACIÓN VECTORIZADA ====================
+    
+    def get_posiciones_valoracion(self, cuenta_id: Optional[int] = None,
+                                  cliente_id: Optional[int] = None) -> List[Tuple]:
+        """
+        Posiciones abiertas como tuplas (id, cuenta_id, titulo_id, cantidad,
+        costo_promedio, precio) listas para arreglos de NumPy.
+        
+        Los montos se leen como float (sin pasar por Decimal) y el precio
+        es None si el título no tiene precio vigente. Sin filtros: todas
+        las posiciones de la firma.
+        """
+        try:
+            stmt = lambda_stmt(lambda: (
+                select(
+                    PortafolioItemDB.id,
+                    PortafolioItemDB.cuenta_id,
+                    PortafolioItemDB.titulo_id,
+                    PortafolioItemDB.cantidad,
+                    type_coerce(PortafolioItemDB.costo_promedio, Float),
+                    type_coerce(UltimoPrecioDB.precio, Float)
+                )
+                .outerjoin(UltimoPrecioDB, UltimoPrecioDB.titulo_id == PortafolioItemDB.titulo_id)
+                .where(PortafolioItemDB.cantidad > 0)
+            ))
+            
+            if cuenta_id is not None:
+                stmt += lambda s: s.where(PortafolioItemDB.cuenta_id == cuenta_id)
+            
+            if cliente_id is not None:
+                stmt += lambda s: s.join(
+                    CuentaBursatilDB, PortafolioItemDB.cuenta_id == CuentaBursatilDB.id
+                ).where(CuentaBursatilDB.cliente_id == cliente_id)
+            
+            with self._read_session() as session:
+                return self._execute_cached(session, 'get_posiciones_valoracion', stmt).tuples().all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo posiciones para valoración: {e}")
+            return []
+    
+    def get_posiciones_exposicion(self) -> List[Tuple]:
+        """
+        Posiciones abiertas de toda la firma con sus dimensiones de riesgo:
+        tuplas (cuenta_id, titulo_id, cantidad, costo_promedio, precio,
+        sector, casa_bolsa_id, tipo_inversor), en una sola consulta.
+        
+        Montos como float; precio None si el título no tiene precio vigente.
+        """
+        try:
+            stmt = lambda_stmt(lambda: (
+                select(
+                    PortafolioItemDB.cuenta_id,
+                    PortafolioItemDB.titulo_id,
+                    PortafolioItemDB.cantidad,
+                    type_coerce(PortafolioItemDB.costo_promedio, Float),
+                    type_coerce(UltimoPrecioDB.precio, Float),
+                    TituloDB.sector,
+                    CuentaBursatilDB.casa_bolsa_id,
+                    ClienteDB.tipo_inversor
+                )
+                .join(TituloDB, PortafolioItemDB.titulo_id == TituloDB.id)
+                .join(CuentaBursatilDB, PortafolioItemDB.cuenta_id == CuentaBursatilDB.id)
+                .join(ClienteDB, CuentaBursatilDB.cliente_id == ClienteDB.id)
+                .outerjoin(UltimoPrecioDB, UltimoPrecioDB.titulo_id == PortafolioItemDB.titulo_id)
+                .where(PortafolioItemDB.cantidad > 0)
+            ))
+            
+            with self._read_session() as session:
+                return self._execute_cached(session, 'get_posiciones_exposicion', stmt).tuples().all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo posiciones para exposición: {e}")
             return []
\ No newline at end of file
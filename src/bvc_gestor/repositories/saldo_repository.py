@@ -2,26 +2,38 @@
 Repositorios de Saldo
 """
 
+from decimal import Decimal
 from typing import List, Dict, Optional
 from .base_repository import BaseRepository
-from ..database.models_sql import SaldoDB, PortafolioItemDB, TituloDB, CuentaBursatilDB
-from sqlalchemy import func
+from ..database.models_sql import SaldoDB, CuentaBursatilDB, CasaBolsaDB
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _decimal(monto) -> Decimal:
+    """Montos recibidos como float/str a Decimal (columnas DECIMAL)"""
+    return monto if isinstance(monto, Decimal) else Decimal(str(monto))
+
+
 class SaldoRepository(BaseRepository):
-    """Repositorio para gestionar saldos de cuentas bancarias"""
+    """
+    Repositorio para gestionar saldos por cuenta bursátil y moneda.
+    
+    Las mutaciones se implementan como funciones *_tx(session, ...) y se
+    ejecutan con _mutar(): en su propia transacción o, si se activó
+    usar_cola_escritura(), agrupadas con otras en un solo commit.
+    """
     
     def __init__(self, db_engine):
         super().__init__(db_engine, SaldoDB)
     
-    def get_saldo_cuenta(self, cuenta_bancaria_id: int) -> Optional[Dict]:
-        """Obtiene el saldo de una cuenta bancaria"""
+    def get_saldo_cuenta(self, cuenta_id: int, moneda: str = 'VES') -> Optional[Dict]:
+        """Obtiene el saldo de una cuenta en una moneda"""
         try:
-            with self.db_engine.get_session() as session:
+            with self._read_session() as session:
                 saldo = session.query(SaldoDB).filter_by(
-                    cuenta_bancaria_id=cuenta_bancaria_id
+                    cuenta_id=cuenta_id, moneda=moneda
                 ).first()
                 
                 if saldo:
@@ -29,7 +41,8 @@ class SaldoRepository(BaseRepository):
                 else:
                     # Retornar saldo en ceros si no existe
                     return {
-                        'cuenta_bancaria_id': cuenta_bancaria_id,
+                        'cuenta_id': cuenta_id,
+                        'moneda': moneda,
                         'disponible': 0,
                         'bloqueado': 0,
                         'en_transito': 0
@@ -39,141 +52,148 @@ class SaldoRepository(BaseRepository):
             logger.error(f"Error obteniendo saldo: {e}")
             return None
     
-    def actualizar_saldo(self, cuenta_bancaria_id: int, 
+    # ==================== MUTACIONES ====================
+    
+    @staticmethod
+    def _saldo(session, cuenta_id: int, moneda: str) -> Optional[SaldoDB]:
+        return session.query(SaldoDB).filter_by(cuenta_id=cuenta_id, moneda=moneda).first()
+    
+    def _actualizar_saldo_tx(self, session, cuenta_id: int, moneda: str,
+                             disponible, bloqueado, en_transito) -> bool:
+        saldo = self._saldo(session, cuenta_id, moneda)
+        
+        if not saldo:
+            # Crear saldo si no existe
+            saldo = SaldoDB(
+                cuenta_id=cuenta_id,
+                moneda=moneda,
+                disponible=_decimal(disponible or 0),
+                bloqueado=_decimal(bloqueado or 0),
+                en_transito=_decimal(en_transito or 0)
+            )
+            session.add(saldo)
+        else:
+            # Actualizar solo los campos provistos
+            if disponible is not None:
+                saldo.disponible = _decimal(disponible)
+            if bloqueado is not None:
+                saldo.bloqueado = _decimal(bloqueado)
+            if en_transito is not None:
+                saldo.en_transito = _decimal(en_transito)
+        
+        session.flush()
+        return True
+    
+    def _agregar_deposito_tx(self, session, cuenta_id: int, monto, moneda: str) -> bool:
+        monto = _decimal(monto)
+        saldo = self._saldo(session, cuenta_id, moneda)
+        
+        if not saldo:
+            saldo = SaldoDB(
+                cuenta_id=cuenta_id,
+                moneda=moneda,
+                disponible=monto,
+                bloqueado=Decimal('0'),
+                en_transito=Decimal('0')
+            )
+            session.add(saldo)
+        else:
+            saldo.disponible += monto
+        
+        session.flush()
+        return True
+    
+    def _bloquear_fondos_tx(self, session, cuenta_id: int, monto, moneda: str) -> bool:
+        monto = _decimal(monto)
+        saldo = self._saldo(session, cuenta_id, moneda)
+        
+        if not saldo or saldo.disponible < monto:
+            return False
+        
+        saldo.disponible -= monto
+        saldo.bloqueado += monto
+        session.flush()
+        return True
+    
+    def _liberar_fondos_tx(self, session, cuenta_id: int, monto, moneda: str) -> bool:
+        monto = _decimal(monto)
+        saldo = self._saldo(session, cuenta_id, moneda)
+        
+        if not saldo or saldo.bloqueado < monto:
+            return False
+        
+        saldo.bloqueado -= monto
+        saldo.disponible += monto
+        session.flush()
+        return True
+    
+    def actualizar_saldo(self, cuenta_id: int, 
                         disponible: float = None,
                         bloqueado: float = None,
-                        en_transito: float = None) -> bool:
+                        en_transito: float = None,
+                        moneda: str = 'VES') -> bool:
         """Actualiza componentes del saldo"""
         try:
-            with self.db_engine.get_session() as session:
-                saldo = session.query(SaldoDB).filter_by(
-                    cuenta_bancaria_id=cuenta_bancaria_id
-                ).first()
-                
-                if not saldo:
-                    # Crear saldo si no existe
-                    saldo = SaldoDB(
-                        cuenta_bancaria_id=cuenta_bancaria_id,
-                        disponible=disponible or 0,
-                        bloqueado=bloqueado or 0,
-                        en_transito=en_transito or 0
-                    )
-                    session.add(saldo)
-                else:
-                    # Actualizar solo los campos provistos
-                    if disponible is not None:
-                        saldo.disponible = disponible
-                    if bloqueado is not None:
-                        saldo.bloqueado = bloqueado
-                    if en_transito is not None:
-                        saldo.en_transito = en_transito
-                
-                session.commit()
-                self._invalidate_cache()
-                return True
+            return self._mutar(
+                self._actualizar_saldo_tx, cuenta_id, moneda,
+                disponible, bloqueado, en_transito
+            )
         
         except Exception as e:
             logger.error(f"Error actualizando saldo: {e}")
             return False
     
-    def agregar_deposito(self, cuenta_bancaria_id: int, monto: float) -> bool:
+    def agregar_deposito(self, cuenta_id: int, monto: float, moneda: str = 'VES') -> bool:
         """Agrega un depósito al saldo disponible"""
         try:
-            with self.db_engine.get_session() as session:
-                saldo = session.query(SaldoDB).filter_by(
-                    cuenta_bancaria_id=cuenta_bancaria_id
-                ).first()
-                
-                if not saldo:
-                    saldo = SaldoDB(
-                        cuenta_bancaria_id=cuenta_bancaria_id,
-                        disponible=monto,
-                        bloqueado=0,
-                        en_transito=0
-                    )
-                    session.add(saldo)
-                else:
-                    saldo.disponible += monto
-                
-                session.commit()
-                self._invalidate_cache()
-                
-                logger.info(f"💰 Depósito agregado: +Bs. {monto:,.2f}")
-                return True
+            ok = self._mutar(self._agregar_deposito_tx, cuenta_id, monto, moneda)
+            logger.info(f"💰 Depósito agregado: +Bs. {monto:,.2f}")
+            return ok
         
         except Exception as e:
             logger.error(f"Error agregando depósito: {e}")
             return False
     
-    def bloquear_fondos(self, cuenta_bancaria_id: int, monto: float) -> bool:
+    def bloquear_fondos(self, cuenta_id: int, monto: float, moneda: str = 'VES') -> bool:
         """Bloquea fondos (mueve de disponible a bloqueado)"""
         try:
-            with self.db_engine.get_session() as session:
-                saldo = session.query(SaldoDB).filter_by(
-                    cuenta_bancaria_id=cuenta_bancaria_id
-                ).first()
-                
-                if not saldo or saldo.disponible < monto:
-                    return False
-                
-                saldo.disponible -= monto
-                saldo.bloqueado += monto
-                
-                session.commit()
-                self._invalidate_cache()
-                return True
+            return self._mutar(self._bloquear_fondos_tx, cuenta_id, monto, moneda)
         
         except Exception as e:
             logger.error(f"Error bloqueando fondos: {e}")
             return False
     
-    def liberar_fondos(self, cuenta_bancaria_id: int, monto: float) -> bool:
+    def liberar_fondos(self, cuenta_id: int, monto: float, moneda: str = 'VES') -> bool:
         """Libera fondos bloqueados"""
         try:
-            with self.db_engine.get_session() as session:
-                saldo = session.query(SaldoDB).filter_by(
-                    cuenta_bancaria_id=cuenta_bancaria_id
-                ).first()
-                
-                if not saldo or saldo.bloqueado < monto:
-                    return False
-                
-                saldo.bloqueado -= monto
-                saldo.disponible += monto
-                
-                session.commit()
-                self._invalidate_cache()
-                return True
+            return self._mutar(self._liberar_fondos_tx, cuenta_id, monto, moneda)
         
         except Exception as e:
             logger.error(f"Error liberando fondos: {e}")
             return False
     
     def get_saldos_cliente(self, cliente_id: int) -> List[Dict]:
-        """Obtiene todos los saldos de cuentas bancarias de un cliente"""
+        """Obtiene los saldos de todas las cuentas bursátiles de un cliente"""
         try:
-            with self.db_engine.get_session() as session:
-                from ..database.models_sql import CuentaBancariaDB
-                
+            with self._read_session() as session:
                 results = (
                     session.query(
                         SaldoDB,
-                        CuentaBancariaDB.banco,
-                        CuentaBancariaDB.numero_cuenta,
-                        CuentaBancariaDB.tipo_cuenta
+                        CuentaBursatilDB.cuenta,
+                        CasaBolsaDB.nombre
                     )
-                    .join(CuentaBancariaDB, SaldoDB.cuenta_bancaria_id == CuentaBancariaDB.id)
-                    .filter(CuentaBancariaDB.cliente_id == cliente_id)
+                    .join(CuentaBursatilDB, SaldoDB.cuenta_id == CuentaBursatilDB.id)
+                    .join(CasaBolsaDB, CuentaBursatilDB.casa_bolsa_id == CasaBolsaDB.id)
+                    .filter(CuentaBursatilDB.cliente_id == cliente_id)
                     .all()
                 )
                 
                 saldos = []
-                for saldo, banco, numero_cuenta, tipo_cuenta in results:
+                for saldo, numero_cuenta, casa_bolsa in results:
                     data = self._to_dict(saldo)
                     data.update({
-                        'banco': banco,
                         'numero_cuenta': numero_cuenta,
-                        'tipo_cuenta': tipo_cuenta
+                        'casa_bolsa': casa_bolsa
                     })
                     saldos.append(data)
                 
@@ -0,0 +1,530 @@
+"""
+Repositorio de snapshots de valoración (valor de cierre por cuenta y día)
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    Date, DateTime, Float, String, bindparam, case, func, lambda_stmt, literal, select,
+    type_coerce, union
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .base_repository import BaseRepository, columnas_modelo
+from ..database.models_sql import (
+    SnapshotValoracionDB, PortafolioItemDB, UltimoPrecioDB, OrdenDB, TransaccionDB,
+    CuentaBursatilDB, MovimientoDB
+)
+from ..utils.constants import TipoOrden, TipoMovimiento, EstadoMovimiento
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Clave de cada registro (no hay UniqueConstraint con nombre: es la PK)
+CLAVE_SNAPSHOT = ('cuenta_id', 'fecha')
+
+# Columnas de valoración que se copian al arrastrar un cierre
+_COLUMNAS_VALOR = ('valor_mercado', 'costo_total', 'ganancia_perdida', 'posiciones', 'sin_precio')
+
+# Columnas de un cierre en el orden en que se insertan
+COLUMNAS_SNAPSHOT = CLAVE_SNAPSHOT + _COLUMNAS_VALOR + ('flujo_neto', 'fecha_calculo')
+
+
+def _marca_texto(momento: datetime):
+    """
+    Parámetro para comparar con columnas DateTime: como texto truncado al
+    segundo, que es como CURRENT_TIMESTAMP las guarda
+    """
+    return bindparam(None, momento.strftime('%Y-%m-%d %H:%M:%S'), type_=String())
+
+
+class SnapshotRepository(BaseRepository):
+    """Repositorio de la tabla snapshot_valoracion"""
+    
+    def __init__(self, db_engine):
+        super().__init__(db_engine, SnapshotValoracionDB)
+    
+    # ==================== CONSULTA ====================
+    
+    def get_serie(self, cuenta_id: int, desde: Optional[date] = None,
+                  hasta: Optional[date] = None) -> List[Dict]:
+        """Cierres de una cuenta ordenados por fecha (rango opcional)"""
+        try:
+            stmt = lambda_stmt(lambda: (
+                select(*columnas_modelo(SnapshotValoracionDB))
+                .where(SnapshotValoracionDB.cuenta_id == cuenta_id)
+            ))
+            
+            if desde is not None:
+                stmt += lambda s: s.where(SnapshotValoracionDB.fecha >= desde)
+            
+            if hasta is not None:
+                stmt += lambda s: s.where(SnapshotValoracionDB.fecha <= hasta)
+            
+            stmt += lambda s: s.order_by(SnapshotValoracionDB.fecha)
+            
+            with self._read_session() as session:
+                resultado = self._execute_cached(session, 'get_serie', stmt)
+                return self._filas_a_dicts(resultado.mappings())
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo serie de la cuenta {cuenta_id}: {e}")
+            return []
+    
+    def get_serie_cliente(self, cliente_id: int, desde: Optional[date] = None,
+                          hasta: Optional[date] = None) -> List[Dict]:
+        """Cierres de todas las cuentas de un cliente, sumados por fecha"""
+        try:
+            stmt = lambda_stmt(lambda: (
+                select(
+                    SnapshotValoracionDB.fecha,
+                    func.sum(SnapshotValoracionDB.valor_mercado).label('valor_mercado'),
+                    func.sum(SnapshotValoracionDB.costo_total).label('costo_total'),
+                    func.sum(SnapshotValoracionDB.ganancia_perdida).label('ganancia_perdida'),
+                    func.sum(SnapshotValoracionDB.posiciones).label('posiciones'),
+                    func.sum(SnapshotValoracionDB.sin_precio).label('sin_precio'),
+                    func.sum(SnapshotValoracionDB.flujo_neto).label('flujo_neto'),
+                    func.count().label('cuentas')
+                )
+                .join(CuentaBursatilDB, SnapshotValoracionDB.cuenta_id == CuentaBursatilDB.id)
+                .where(CuentaBursatilDB.cliente_id == cliente_id)
+            ))
+            
+            if desde is not None:
+                stmt += lambda s: s.where(SnapshotValoracionDB.fecha >= desde)
+            
+            if hasta is not None:
+                stmt += lambda s: s.where(SnapshotValoracionDB.fecha <= hasta)
+            
+            stmt += lambda s: s.group_by(SnapshotValoracionDB.fecha).order_by(SnapshotValoracionDB.fecha)
+            
+            with self._read_session() as session:
+                resultado = self._execute_cached(session, 'get_serie_cliente', stmt)
+                return [dict(fila) for fila in resultado.mappings()]
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo serie del cliente {cliente_id}: {e}")
+            return []
+    
+    def get_cierre(self, fecha: date) -> List[Dict]:
+        """Cierres de todas las cuentas en una fecha"""
+        try:
+            stmt = lambda_stmt(lambda: (
+                select(*columnas_modelo(SnapshotValoracionDB))
+                .where(SnapshotValoracionDB.fecha == fecha)
+                .order_by(SnapshotValoracionDB.cuenta_id)
+            ))
+            
+            with self._read_session() as session:
+                resultado = self._execute_cached(session, 'get_cierre', stmt)
+                return self._filas_a_dicts(resultado.mappings())
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo cierre del {fecha}: {e}")
+            return []
+    
+    def ultima_fecha(self, antes_de: Optional[date] = None) -> Optional[date]:
+        """Fecha del último cierre guardado (anterior a 'antes_de' si se indica)"""
+        try:
+            stmt = select(func.max(SnapshotValoracionDB.fecha))
+            if antes_de is not None:
+                stmt = stmt.where(SnapshotValoracionDB.fecha < antes_de)
+            
+            with self._read_session() as session:
+                return session.execute(stmt).scalar()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo la fecha del último cierre: {e}")
+            return None
+    
+    # ==================== SERIES PARA RENDIMIENTOS ====================
+    
+    def get_fechas_cerradas(self, desde: date, hasta: date) -> List[date]:
+        """Fechas con cierre guardado en el rango (ambos incluidos)"""
+        try:
+            stmt = (
+                select(SnapshotValoracionDB.fecha).distinct()
+                .where(SnapshotValoracionDB.fecha >= desde)
+                .where(SnapshotValoracionDB.fecha <= hasta)
+                .order_by(SnapshotValoracionDB.fecha)
+            )
+            
+            with self._read_session() as session:
+                return list(session.execute(stmt).scalars())
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo fechas cerradas: {e}")
+            raise
+    
+    def get_valores_rango(self, desde: date, hasta: date,
+                          cuenta_ids: Optional[List[int]] = None) -> List[Tuple]:
+        """
+        Valor de cierre de cada cuenta y día como (cuenta_id, fecha,
+        valor_mercado), con la fecha como texto ISO
+        """
+        try:
+            stmt = (
+                select(
+                    SnapshotValoracionDB.cuenta_id,
+                    type_coerce(SnapshotValoracionDB.fecha, String),
+                    SnapshotValoracionDB.valor_mercado
+                )
+                .where(SnapshotValoracionDB.fecha >= desde)
+                .where(SnapshotValoracionDB.fecha <= hasta)
+            )
+            if cuenta_ids is not None:
+                stmt = stmt.where(SnapshotValoracionDB.cuenta_id.in_(cuenta_ids))
+            
+            # Por la conexión: una fila por cuenta y día, sin el procesamiento
+            # de filas del ORM
+            with self._read_session() as session:
+                return session.connection().execute(stmt).all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo valores de {desde} a {hasta}: {e}")
+            raise
+    
+    def get_flujos_rango(self, desde: date, hasta: date,
+                         cuenta_ids: Optional[List[int]] = None) -> List[Tuple]:
+        """
+        Aporte neto al portafolio por cuenta y día como (cuenta_id, fecha,
+        flujo): compras con sus comisiones, menos ventas netas de
+        comisiones. Fecha como texto ISO.
+        """
+        try:
+            comisiones = (
+                type_coerce(func.coalesce(TransaccionDB.comision_corretaje, 0), Float)
+                + type_coerce(func.coalesce(TransaccionDB.comision_bvc, 0), Float)
+                + type_coerce(func.coalesce(TransaccionDB.comision_cvv, 0), Float)
+                + type_coerce(func.coalesce(TransaccionDB.iva, 0), Float)
+            )
+            bruto = type_coerce(TransaccionDB.monto_bruto, Float)
+            dia = func.date(TransaccionDB.fecha_registro)
+            stmt = (
+                select(
+                    OrdenDB.cuenta_id,
+                    dia,
+                    func.sum(case((OrdenDB.tipo == TipoOrden.VENTA, -bruto), else_=bruto) + comisiones)
+                )
+                .join(OrdenDB, TransaccionDB.orden_id == OrdenDB.id)
+                .where(TransaccionDB.fecha_registro >= _marca_texto(datetime.combine(desde, time.min)))
+                .where(TransaccionDB.fecha_registro < _marca_texto(
+                    datetime.combine(hasta + timedelta(days=1), time.min)
+                ))
+                .group_by(OrdenDB.cuenta_id, dia)
+            )
+            if cuenta_ids is not None:
+                stmt = stmt.where(OrdenDB.cuenta_id.in_(cuenta_ids))
+            
+            with self._read_session() as session:
+                return session.execute(stmt).tuples().all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo flujos de {desde} a {hasta}: {e}")
+            raise
+    
+    def get_ingresos_rango(self, desde: date, hasta: date,
+                           cuenta_ids: Optional[List[int]] = None) -> List[Tuple]:
+        """
+        Dividendos menos comisiones cobradas aparte, por cuenta y día de
+        los movimientos completados, como (cuenta_id, fecha, monto). Fecha
+        como texto ISO.
+        """
+        try:
+            momento = func.coalesce(MovimientoDB.fecha_completado, MovimientoDB.fecha_solicitud)
+            monto = type_coerce(MovimientoDB.monto, Float)
+            dia = func.date(momento)
+            stmt = (
+                select(
+                    MovimientoDB.cuenta_bursatil_id,
+                    dia,
+                    func.sum(case((MovimientoDB.tipo == TipoMovimiento.COMISION, -monto), else_=monto))
+                )
+                .where(MovimientoDB.tipo.in_([TipoMovimiento.DIVIDENDO, TipoMovimiento.COMISION]))
+                .where(MovimientoDB.estado == EstadoMovimiento.COMPLETADO)
+                .where(momento >= _marca_texto(datetime.combine(desde, time.min)))
+                .where(momento < _marca_texto(datetime.combine(hasta + timedelta(days=1), time.min)))
+                .group_by(MovimientoDB.cuenta_bursatil_id, dia)
+            )
+            if cuenta_ids is not None:
+                stmt = stmt.where(MovimientoDB.cuenta_bursatil_id.in_(cuenta_ids))
+            
+            with self._read_session() as session:
+                return session.execute(stmt).tuples().all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo ingresos de {desde} a {hasta}: {e}")
+            raise
+    
+    def get_cuentas_cliente(self, cliente_ids: Optional[List[int]] = None) -> List[Tuple]:
+        """Pares (cuenta_id, cliente_id) de las cuentas bursátiles"""
+        try:
+            stmt = select(CuentaBursatilDB.id, CuentaBursatilDB.cliente_id)
+            if cliente_ids is not None:
+                stmt = stmt.where(CuentaBursatilDB.cliente_id.in_(cliente_ids))
+            
+            with self._read_session() as session:
+                return session.execute(stmt).tuples().all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo cuentas de clientes: {e}")
+            raise
+    
+    # ==================== CIERRE INCREMENTAL ====================
+    
+    def ahora(self) -> datetime:
+        """
+        Momento actual según la base (UTC, el reloj de CURRENT_TIMESTAMP):
+        el mismo con el que se estampan las columnas de auditoría que se
+        comparan con fecha_calculo
+        """
+        with self._read_session() as session:
+            return session.execute(select(func.now())).scalar()
+    
+    def hoy(self) -> date:
+        """
+        Día actual en el calendario de los cierres: el de ahora() (UTC),
+        con el que se reparten por día las ejecuciones y los precios
+        """
+        return self.ahora().date()
+    
+    def marca_cierre(self, fecha: date) -> Optional[datetime]:
+        """
+        Desde cuándo buscar cambios para el cierre siguiente a 'fecha': el
+        momento en que se calculó ese cierre o, si se calculó después
+        (backfill, cierre tardío), el fin de ese día.
+        """
+        try:
+            with self._read_session() as session:
+                calculo = session.execute(
+                    select(func.max(SnapshotValoracionDB.fecha_calculo))
+                    .where(SnapshotValoracionDB.fecha == fecha)
+                ).scalar()
+            
+            fin_dia = datetime.combine(fecha + timedelta(days=1), time.min)
+            return min(calculo, fin_dia) if calculo is not None else fin_dia
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo la marca del cierre del {fecha}: {e}")
+            return None
+    
+    def _stmt_cuentas_cambiadas(self, marca: datetime, anterior: date):
+        """
+        Cuentas cuyo valor pudo cambiar desde 'marca': posiciones
+        modificadas, títulos en cartera con precio nuevo, ejecuciones, y
+        cuentas con posiciones abiertas sin cierre en 'anterior'.
+        """
+        posiciones = select(PortafolioItemDB.cuenta_id).where(
+            PortafolioItemDB.fecha_actualizacion >= _marca_texto(marca)
+        )
+        precios = (
+            select(PortafolioItemDB.cuenta_id)
+            .join(UltimoPrecioDB, UltimoPrecioDB.titulo_id == PortafolioItemDB.titulo_id)
+            .where(UltimoPrecioDB.fecha_hora >= _marca_texto(marca))
+            .where(PortafolioItemDB.cantidad > 0)
+        )
+        ejecuciones = (
+            select(OrdenDB.cuenta_id)
+            .join(TransaccionDB, TransaccionDB.orden_id == OrdenDB.id)
+            .where(TransaccionDB.fecha_registro >= _marca_texto(marca))
+        )
+        sin_cierre = (
+            select(PortafolioItemDB.cuenta_id)
+            .where(PortafolioItemDB.cantidad > 0)
+            .where(PortafolioItemDB.cuenta_id.not_in(
+                select(SnapshotValoracionDB.cuenta_id).where(SnapshotValoracionDB.fecha == anterior)
+            ))
+        )
+        return union(posiciones, precios, ejecuciones, sin_cierre)
+    
+    def get_cuentas_cambiadas(self, marca: datetime, anterior: date) -> List[int]:
+        """Cuentas a recalcular en el cierre siguiente a 'anterior'"""
+        try:
+            with self._read_session() as session:
+                return sorted(session.execute(self._stmt_cuentas_cambiadas(marca, anterior)).scalars())
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo cuentas cambiadas: {e}")
+            raise
+    
+    def get_posiciones_cambiadas(self, marca: datetime, anterior: date) -> List[Tuple]:
+        """
+        Posiciones abiertas de las cuentas cambiadas, con el formato de
+        PortafolioRepository.get_posiciones_valoracion()
+        """
+        try:
+            cambiadas = self._stmt_cuentas_cambiadas(marca, anterior).subquery()
+            stmt = (
+                select(
+                    PortafolioItemDB.id,
+                    PortafolioItemDB.cuenta_id,
+                    PortafolioItemDB.titulo_id,
+                    PortafolioItemDB.cantidad,
+                    type_coerce(PortafolioItemDB.costo_promedio, Float),
+                    type_coerce(UltimoPrecioDB.precio, Float)
+                )
+                .outerjoin(UltimoPrecioDB, UltimoPrecioDB.titulo_id == PortafolioItemDB.titulo_id)
+                .where(PortafolioItemDB.cantidad > 0)
+                .where(PortafolioItemDB.cuenta_id.in_(select(cambiadas.c.cuenta_id)))
+            )
+            
+            with self._read_session() as session:
+                return session.execute(stmt).tuples().all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo posiciones cambiadas: {e}")
+            raise
+    
+    def get_flujos_dia(self, fecha: date) -> Dict[int, float]:
+        """
+        Compras menos ventas (monto bruto) ejecutadas en el día, por cuenta.
+        El día es UTC, como fecha_registro (ver hoy())
+        """
+        try:
+            inicio = datetime.combine(fecha, time.min)
+            stmt = (
+                select(
+                    OrdenDB.cuenta_id,
+                    func.sum(case(
+                        (OrdenDB.tipo == TipoOrden.VENTA, -type_coerce(TransaccionDB.monto_bruto, Float)),
+                        else_=type_coerce(TransaccionDB.monto_bruto, Float)
+                    ))
+                )
+                .join(OrdenDB, TransaccionDB.orden_id == OrdenDB.id)
+                .where(TransaccionDB.fecha_registro >= _marca_texto(inicio))
+                .where(TransaccionDB.fecha_registro < _marca_texto(inicio + timedelta(days=1)))
+                .group_by(OrdenDB.cuenta_id)
+            )
+            
+            with self._read_session() as session:
+                return {cuenta: float(flujo or 0) for cuenta, flujo in session.execute(stmt)}
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo flujos del {fecha}: {e}")
+            raise
+    
+    def arrastrar(self, anterior: date, fecha: date, marca: datetime, calculo: datetime) -> int:
+        """
+        Copia a 'fecha' el cierre de 'anterior' de las cuentas sin cambios
+        (mismas posiciones y precios: mismo valor, sin flujo), con
+        fecha_calculo 'calculo'. Las cuentas sin posiciones en 'anterior'
+        no se arrastran. Un solo INSERT ... SELECT; retorna las filas
+        copiadas.
+        """
+        try:
+            tabla = SnapshotValoracionDB.__table__
+            cambiadas = self._stmt_cuentas_cambiadas(marca, anterior).subquery()
+            origen = (
+                select(
+                    tabla.c.cuenta_id,
+                    literal(fecha, Date()),
+                    *(tabla.c[columna] for columna in _COLUMNAS_VALOR),
+                    literal(0),
+                    literal(calculo, DateTime())
+                )
+                .where(tabla.c.fecha == anterior)
+                .where(tabla.c.posiciones + tabla.c.sin_precio > 0)
+                .where(tabla.c.cuenta_id.not_in(select(cambiadas.c.cuenta_id)))
+            )
+            
+            stmt = sqlite_insert(tabla).from_select(COLUMNAS_SNAPSHOT, origen)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=CLAVE_SNAPSHOT,
+                set_={c: stmt.excluded[c] for c in COLUMNAS_SNAPSHOT if c not in CLAVE_SNAPSHOT}
+            )
+            
+            with self._write_session() as session:
+                filas = session.execute(stmt).rowcount
+                session.commit()
+            
+            self._invalidate_cache()
+            return filas
+        
+        except Exception as e:
+            logger.error(f"Error arrastrando el cierre del {anterior} al {fecha}: {e}")
+            raise
+    
+    def guardar(self, filas: List[Tuple], calculo: Optional[datetime] = None) -> int:
+        """
+        Inserta o reemplaza cierres a partir de tuplas (cuenta_id, fecha,
+        valor_mercado, costo_total, ganancia_perdida, posiciones,
+        sin_precio, flujo_neto), con fecha como date y montos como float.
+        fecha_calculo es 'calculo' o, por defecto, ahora().
+        
+        executemany directo sobre el driver: el backfill escribe cientos de
+        miles de filas y la conversión por fila de bulk_upsert sería la
+        mayor parte del tiempo. Retorna las filas escritas.
+        """
+        if not filas:
+            return 0
+        try:
+            columnas = ", ".join(COLUMNAS_SNAPSHOT)
+            actualizar = ", ".join(
+                f"{c} = excluded.{c}" for c in COLUMNAS_SNAPSHOT if c not in CLAVE_SNAPSHOT
+            )
+            sql = (
+                f"INSERT INTO {SnapshotValoracionDB.__tablename__} ({columnas}) "
+                f"VALUES ({', '.join('?' * len(COLUMNAS_SNAPSHOT))}) "
+                f"ON CONFLICT ({', '.join(CLAVE_SNAPSHOT)}) DO UPDATE SET {actualizar}"
+            )
+            # Mismo formato de texto con el que SQLAlchemy guarda Date y DateTime
+            marca = (calculo or self.ahora()).strftime('%Y-%m-%d %H:%M:%S.%f')
+            parametros = [(cuenta, fecha.isoformat(), *valores, marca) for cuenta, fecha, *valores in filas]
+            
+            with self._write_session() as session:
+                session.connection().exec_driver_sql(sql, parametros)
+                session.commit()
+            
+            self._invalidate_cache()
+            return len(parametros)
+        
+        except Exception as e:
+            logger.error(f"Error guardando cierres: {e}")
+            raise
+    
+    # ==================== BACKFILL ====================
+    
+    def get_posiciones_actuales(self) -> List[Tuple]:
+        """Todas las posiciones como (cuenta_id, titulo_id, cantidad, costo_promedio)"""
+        try:
+            stmt = select(
+                PortafolioItemDB.cuenta_id,
+                PortafolioItemDB.titulo_id,
+                PortafolioItemDB.cantidad,
+                type_coerce(PortafolioItemDB.costo_promedio, Float)
+            )
+            
+            with self._read_session() as session:
+                return session.execute(stmt).tuples().all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo posiciones actuales: {e}")
+            raise
+    
+    def get_ejecuciones(self) -> List[Tuple]:
+        """
+        Todas las ejecuciones en orden cronológico como (cuenta_id,
+        titulo_id, fecha_registro, cantidad, monto_bruto); cantidad y monto
+        son negativos en las ventas.
+        """
+        try:
+            signo = case((OrdenDB.tipo == TipoOrden.VENTA, -1), else_=1)
+            stmt = (
+                select(
+                    OrdenDB.cuenta_id,
+                    OrdenDB.titulo_id,
+                    TransaccionDB.fecha_registro,
+                    signo * TransaccionDB.cantidad_ejecutada,
+                    signo * type_coerce(TransaccionDB.monto_bruto, Float)
+                )
+                .join(OrdenDB, TransaccionDB.orden_id == OrdenDB.id)
+                .order_by(TransaccionDB.fecha_registro, TransaccionDB.id)
+            )
+            
+            with self._read_session() as session:
+                return session.execute(stmt).tuples().all()
+        
+        except Exception as e:
+            logger.error(f"Error obteniendo ejecuciones: {e}")
+            raise
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""
+Service de Exposición - Agregación de riesgo de toda la firma.
+
+Responde preguntas como "exposición total a BNC entre todos los clientes"
+o "exposición por sector" sin recorrer cuenta por cuenta: una consulta
+trae todas las posiciones abiertas con sus dimensiones (título, sector,
+casa de bolsa, tipo de inversor), se valoran en una pasada vectorizada y
+cada dimensión se agrega con bincount.
+
+El resultado se comparte por motor (DatabaseEngine.get_exposicion()) y
+se guarda hasta el siguiente cambio de posiciones, precios o datos
+maestros: el servicio se suscribe a la caché de repositorios, que recibe
+las invalidaciones de los commits de este proceso y, por el vigilante de
+cambios, las de otros procesos. Los diccionarios devueltos se comparten
+entre lectores, así que no deben modificarse.
+"""
+
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+
+from ..repositories.portafolio_repository import PortafolioRepository
+from ..utils.valoracion import valorar_arrays, totales, totales_por_grupo
+
+logger = logging.getLogger(__name__)
+
+# Modelos de los que depende el resultado
+MODELOS_DEPENDENCIAS = frozenset({
+    'PortafolioItemDB', 'PrecioTituloDB', 'UltimoPrecioDB', 'TituloDB',
+    'CuentaBursatilDB', 'ClienteDB', 'CasaBolsaDB',
+})
+
+DIMENSIONES = ('ticker', 'sector', 'casa_bolsa', 'tipo_inversor')
+
+SIN_SECTOR = 'Sin sector'
+
+
+class ExposicionService:
+    """Exposición de la firma por título, sector, casa de bolsa y tipo de inversor"""
+    
+    def __init__(self, db_engine, cache=None):
+        self.db_engine = db_engine
+        self.portafolio_repo = PortafolioRepository(db_engine)
+        self._cache = cache
+        self._resultado: Optional[Dict] = None
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self.calculos = 0
+        
+        if cache is not None:
+            cache.suscribir(self._on_invalidacion)
+    
+    # ==================== API ====================
+    
+    def exposicion(self) -> Dict:
+        """
+        Exposición completa (calculada o guardada).
+        
+        Returns:
+            {
+                'posiciones': int,  # abiertas, con o sin precio
+                'totales': {...totales(), 'sin_precio': int},
+                'por_ticker': [...], 'por_sector': [...],
+                'por_casa_bolsa': [...], 'por_tipo_inversor': [...],
+                'calculado': str  # ISO
+            }
+            Cada grupo trae los totales de valoración, 'cuentas' (cuentas
+            con posición), 'sin_precio' y 'peso_pct' (sobre el valor total),
+            ordenados por valor de mercado descendente.
+        """
+        if self._cache is not None:
+            # Cambios de otros procesos: llegan como invalidaciones
+            self._cache.verificar_externos()
+        
+        resultado = self._resultado
+        if resultado is not None:
+            return resultado
+        
+        with self._lock:
+            if self._resultado is not None:
+                return self._resultado
+            generacion = self._generacion
+            resultado = self._calcular()
+            # Si algo cambió durante el cálculo no se guarda el resultado,
+            # ni una lista vacía (firma sin posiciones o error de lectura)
+            if generacion == self._generacion and resultado['posiciones']:
+                self._resultado = resultado
+            return resultado
+    
+    def por_dimension(self, dimension: str) -> List[Dict]:
+        """Grupos de una dimensión ('ticker', 'sector', 'casa_bolsa', 'tipo_inversor')"""
+        if dimension not in DIMENSIONES:
+            raise ValueError(f"Dimensión desconocida: {dimension} (válidas: {', '.join(DIMENSIONES)})")
+        return self.exposicion()[f'por_{dimension}']
+    
+    def exposicion_ticker(self, ticker: str) -> Optional[Dict]:
+        """Exposición de toda la firma a un título (None si nadie lo tiene)"""
+        clave = ticker.strip().upper()
+        return next((g for g in self.por_dimension('ticker') if g['ticker'] == clave), None)
+    
+    def invalidar(self):
+        """Descarta el resultado guardado (escrituras SQL directas)"""
+        self._on_invalidacion(None)
+    
+    def estadisticas(self) -> Dict:
+        """Cálculos hechos y si hay un resultado vigente (diagnóstico)"""
+        return {'calculos': self.calculos, 'vigente': self._resultado is not None}
+    
+    def _on_invalidacion(self, modelo: Optional[str], id=None):
+        """Suscriptor de CacheRepositorio.invalidar()"""
+        if modelo is None or modelo in MODELOS_DEPENDENCIAS:
+            self._generacion += 1
+            self._resultado = None
+    
+    # ==================== CÁLCULO ====================
+    
+    def _calcular(self) -> Dict:
+        posiciones = self.portafolio_repo.get_posiciones_exposicion()
+        self.calculos += 1
+        
+        columnas = list(zip(*posiciones)) or [()] * 8
+        cuenta_id, titulo_id, casa_bolsa_id = (
+            np.array(columnas[i], dtype=np.int64) for i in (0, 1, 6)
+        )
+        cantidad, costo_promedio, precio = (np.array(columnas[i], dtype=float) for i in (2, 3, 4))
+        sector = np.array([s or SIN_SECTOR for s in columnas[5]], dtype=object)
+        tipo_inversor = np.array([t.value if t is not None else '' for t in columnas[7]], dtype=object)
+        
+        metricas = valorar_arrays(cantidad, costo_promedio, precio)
+        resumen = totales(metricas)
+        resumen['sin_precio'] = int(np.isnan(precio).sum())
+        valor_total = resumen['valor_mercado_total']
+        
+        catalogo = self.db_engine.get_catalogo()
+        
+        def etiqueta_titulo(id):
+            titulo = catalogo.titulo(id) or {}
+            return {'titulo_id': id, 'ticker': titulo.get('ticker'), 'nombre': titulo.get('nombre')}
+        
+        return {
+            'posiciones': len(posiciones),
+            'totales': resumen,
+            'por_ticker': self._agrupar(titulo_id, cuenta_id, precio, metricas, valor_total, etiqueta_titulo),
+            'por_sector': self._agrupar(sector, cuenta_id, precio, metricas, valor_total,
+                                        lambda s: {'sector': s}),
+            'por_casa_bolsa': self._agrupar(casa_bolsa_id, cuenta_id, precio, metricas, valor_total,
+                                            lambda id: {'casa_bolsa_id': id,
+                                                        'casa_bolsa': catalogo.nombre_casa_bolsa(id)}),
+            'por_tipo_inversor': self._agrupar(tipo_inversor, cuenta_id, precio, metricas, valor_total,
+                                               lambda t: {'tipo_inversor': t}),
+            'calculado': datetime.now().isoformat(),
+        }
+    
+    @staticmethod
+    def _agrupar(claves: np.ndarray, cuenta_id: np.ndarray, precio: np.ndarray,
+                 metricas: Dict[str, np.ndarray], valor_total: float, etiqueta) -> List[Dict]:
+        """
+        Totales por valor de la dimensión. Las claves (enteros o textos) se
+        codifican como enteros para sumar con totales_por_grupo(); cuentas
+        y posiciones sin precio se cuentan con bincount sobre los mismos
+        códigos.
+        """
+        unicas, codigo = np.unique(claves, return_inverse=True)
+        por_codigo = totales_por_grupo(codigo, metricas)
+        sin_precio = np.bincount(codigo[np.isnan(precio)], minlength=len(unicas))
+        pares = np.unique(np.stack([codigo, cuenta_id]), axis=1)
+        cuentas = np.bincount(pares[0], minlength=len(unicas))
+        
+        grupos = []
+        for i, clave in enumerate(unicas.tolist()):
+            datos = etiqueta(clave)
+            # Grupos sin ninguna posición con precio no salen en totales_por_grupo()
+            datos.update(por_codigo.get(i) or totales(metricas, codigo == i))
+            datos['cuentas'] = int(cuentas[i])
+            datos['sin_precio'] = int(sin_precio[i])
+            datos['peso_pct'] = datos['valor_mercado_total'] / valor_total * 100 if valor_total else 0.0
+            grupos.append(datos)
+        
+        grupos.sort(key=lambda g: g['valor_mercado_total'], reverse=True)
+        return grupos
\ No newline at end of file
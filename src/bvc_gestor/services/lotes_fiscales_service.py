@@ -0,0 +1,386 @@
+"""
+Service de Lotes Fiscales - Libro de lotes y ganancias realizadas.
+
+Cada ejecución de compra crea un lote con su costo (comisiones incluidas)
+y cada venta consume lotes según el método de costo: FIFO (los más
+antiguos primero, cada uno a su costo) o costo promedio (la cantidad se
+toma igual en orden de antigüedad, pero al costo promedio ponderado de los
+lotes abiertos, que pasa a ser el costo de los que quedan). Cada consumo
+queda como un registro de ganancia realizada con la fecha de la venta,
+así que el reporte de un año fiscal es una consulta por rango indexada.
+
+El libro se alimenta de la tabla transacciones:
+- registrar_ejecuciones_tx() aplica ejecuciones recién registradas dentro
+  de la misma transacción que las crea (OperacionesService). Con el libro
+  aún vacío, o con ejecuciones anteriores a otras ya aplicadas de la
+  misma posición, no hace nada: las deja para sincronizar().
+- sincronizar() aplica las que falten (importaciones, otros procesos). Si
+  el libro está vacío lo construye completo; las posiciones con
+  ejecuciones pendientes anteriores a otras ya aplicadas se reconstruyen
+  (aplicarlas al final consumiría los lotes en otro orden).
+- Los reportes (lotes_abiertos, ganancias_periodo, resumen_fiscal)
+  sincronizan antes de consultar si hay ejecuciones fuera del libro; la
+  aplicación también sincroniza al arrancar (main.py).
+- reconstruir() rehace el libro completo desde el historial; la posición
+  que ya existía antes de la primera ejecución (la actual menos todo lo
+  ejecutado) entra como lote de apertura al costo promedio actual.
+
+Cambiar el método de costo solo afecta a las ventas que se apliquen
+después; para recalcular las anteriores hay que reconstruir().
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+
+from ..repositories.lote_fiscal_repository import LoteFiscalRepository
+from ..utils.constants import MetodoCosto
+
+logger = logging.getLogger(__name__)
+
+CERO = Decimal('0')
+
+
+class _LibroLotes:
+    """
+    Lotes abiertos por posición en memoria y los cambios que generan las
+    ejecuciones aplicadas, listos para escribir con _guardar_tx()
+    """
+    
+    def __init__(self, metodo: MetodoCosto, siguiente_id: int):
+        self.metodo = metodo
+        self.siguiente_id = siguiente_id
+        # (cuenta_id, titulo_id) -> lotes en orden de consumo; cada lote es
+        # [id, fecha_compra, cantidad_restante, costo_unitario]
+        self.lotes: Dict[Tuple[int, int], List[list]] = {}
+        self.costos_respaldo: Dict[Tuple[int, int], Decimal] = {}
+        self._originales: Dict[int, Tuple[int, Decimal]] = {}
+        self.lotes_nuevos: List[Dict] = []
+        self.ganancias: List[Dict] = []
+        self.sin_lote = 0
+    
+    def cargar(self, filas: List[Tuple]):
+        """Lotes abiertos guardados: (id, cuenta_id, titulo_id, fecha_compra, restante, costo)"""
+        for id, cuenta_id, titulo_id, fecha_compra, restante, costo in filas:
+            self.lotes.setdefault((cuenta_id, titulo_id), []).append([id, fecha_compra, restante, costo])
+            self._originales[id] = (restante, costo)
+        for lotes in self.lotes.values():
+            lotes.sort(key=lambda l: (l[1], l[0]))
+    
+    def abrir(self, clave: Tuple[int, int], fecha, cantidad: int, costo_unitario: Decimal,
+              transaccion_id: Optional[int] = None):
+        """Lote nuevo (compra o apertura)"""
+        id = self.siguiente_id
+        self.siguiente_id += 1
+        lotes = self.lotes.setdefault(clave, [])
+        lotes.append([id, fecha, cantidad, costo_unitario])
+        # Una ejecución con fecha anterior a lotes ya abiertos va antes
+        if len(lotes) > 1 and lotes[-2][1] > fecha:
+            lotes.sort(key=lambda l: (l[1], l[0]))
+        self.lotes_nuevos.append({
+            'id': id, 'cuenta_id': clave[0], 'titulo_id': clave[1],
+            'transaccion_id': transaccion_id, 'fecha_compra': fecha,
+            'cantidad_original': cantidad, 'cantidad_restante': cantidad,
+            'costo_unitario': costo_unitario,
+        })
+    
+    def aplicar(self, ejecucion: Tuple):
+        """Una ejecución de _stmt_ejecuciones()"""
+        transaccion_id, cuenta_id, titulo_id, es_venta, fecha, cantidad, monto_bruto, comisiones = ejecucion
+        clave = (cuenta_id, titulo_id)
+        comisiones = comisiones or CERO
+        
+        if not es_venta:
+            self.abrir(clave, fecha, cantidad, (monto_bruto + comisiones) / cantidad, transaccion_id)
+            return
+        
+        # Venta: monto neto repartido entre los lotes por cantidad; el
+        # último consumo lleva el resto para que la suma sea exacta
+        neto = monto_bruto - comisiones
+        lotes = [l for l in self.lotes.get(clave, ()) if l[2] > 0]
+        if self.metodo == MetodoCosto.PROMEDIO and lotes:
+            disponible = sum(l[2] for l in lotes)
+            promedio = sum(l[2] * l[3] for l in lotes) / disponible
+        else:
+            promedio = None
+        
+        pendiente = cantidad
+        asignado = CERO
+        consumos = []
+        for lote in lotes:
+            if pendiente == 0:
+                break
+            tomar = min(pendiente, lote[2])
+            lote[2] -= tomar
+            pendiente -= tomar
+            costo_unitario = promedio if promedio is not None else lote[3]
+            consumos.append((lote[0], lote[1], tomar, tomar * costo_unitario))
+        
+        if pendiente:
+            # Venta por encima de los lotes abiertos: al costo promedio del
+            # portafolio, sin lote
+            self.sin_lote += 1
+            logger.debug(
+                f"Venta {transaccion_id}: {pendiente} títulos sin lote abierto "
+                f"(cuenta {cuenta_id}, título {titulo_id})"
+            )
+            respaldo = self.costos_respaldo.get(clave) or CERO
+            consumos.append((None, None, pendiente, pendiente * respaldo))
+        
+        for i, (lote_id, fecha_compra, tomar, costo_base) in enumerate(consumos):
+            if i == len(consumos) - 1:
+                monto_venta = neto - asignado
+            else:
+                monto_venta = neto * tomar / cantidad
+                asignado += monto_venta
+            self.ganancias.append({
+                'transaccion_id': transaccion_id, 'lote_id': lote_id,
+                'cuenta_id': cuenta_id, 'titulo_id': titulo_id,
+                'fecha_venta': fecha, 'fecha_compra': fecha_compra,
+                'cantidad': tomar, 'monto_venta': monto_venta, 'costo_base': costo_base,
+                'ganancia_perdida': monto_venta - costo_base, 'metodo': self.metodo,
+            })
+        
+        if promedio is not None:
+            for lote in lotes:
+                if lote[2] > 0:
+                    lote[3] = promedio
+    
+    def cambios(self) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """(lotes nuevos, lotes guardados que cambiaron, ganancias)"""
+        nuevos = {l['id']: l for l in self.lotes_nuevos}
+        cambiados = []
+        for lotes in self.lotes.values():
+            for id, _, restante, costo in lotes:
+                if id in nuevos:
+                    nuevos[id]['cantidad_restante'] = restante
+                    nuevos[id]['costo_unitario'] = costo
+                elif self._originales[id] != (restante, costo):
+                    cambiados.append({'lote_id': id, 'restante': restante, 'costo': costo})
+        return self.lotes_nuevos, cambiados, self.ganancias
+
+
+class LotesFiscalesService:
+    """Libro de lotes fiscales y reportes de ganancias realizadas"""
+    
+    def __init__(self, db_engine, metodo: MetodoCosto = MetodoCosto.FIFO):
+        self.db_engine = db_engine
+        self.metodo = metodo
+        self.lote_repo = LoteFiscalRepository(db_engine)
+    
+    # ==================== LIBRO ====================
+    
+    def registrar_ejecuciones_tx(self, session, transaccion_ids: List[int]) -> Dict:
+        """
+        Aplica al libro las ejecuciones dadas, dentro de la transacción del
+        llamador (las ya aplicadas se ignoran). Retorna el resumen de la
+        pasada; 'pendientes' son las que quedan para sincronizar().
+        
+        Se llama antes de actualizar el portafolio, así que aquí no se
+        puede calcular la posición de apertura: con el libro vacío o fuera
+        de orden no se aplica nada.
+        """
+        if self.lote_repo.libro_vacio_tx(session):
+            resumen = self._aplicar_tx(session, [])
+            resumen['pendientes'] = len(transaccion_ids)
+            return resumen
+        
+        ejecuciones = self.lote_repo.ejecuciones_pendientes_tx(session, transaccion_ids)
+        desordenadas = self._fuera_de_orden_tx(session, ejecuciones)
+        resumen = self._aplicar_tx(session, [e for e in ejecuciones if (e[1], e[2]) not in desordenadas])
+        resumen['pendientes'] = len(ejecuciones) - resumen['ejecuciones']
+        if desordenadas:
+            logger.info(
+                f"{resumen['pendientes']} ejecuciones anteriores a otras ya aplicadas; "
+                f"se aplican al sincronizar el libro"
+            )
+        return resumen
+    
+    def sincronizar(self) -> Dict:
+        """
+        Aplica todas las ejecuciones que aún no están en el libro. Si el
+        libro está vacío lo construye completo (con lotes de apertura).
+        """
+        try:
+            resumen = self.lote_repo.execute_in_transaction(self._sincronizar_tx)
+            
+            logger.info(
+                f"Libro de lotes sincronizado: {resumen['ejecuciones']} ejecuciones, "
+                f"{resumen['lotes_nuevos']} lotes, {resumen['ganancias']} ganancias"
+                + (f", {resumen['posiciones_reconstruidas']} posiciones reconstruidas"
+                   if resumen.get('posiciones_reconstruidas') else "")
+            )
+            return resumen
+        
+        except Exception as e:
+            logger.error(f"Error sincronizando libro de lotes: {e}")
+            raise
+    
+    def reconstruir(self) -> Dict:
+        """Rehace el libro completo desde el historial de ejecuciones"""
+        try:
+            resumen = self.lote_repo.execute_in_transaction(self._reconstruir_tx)
+            
+            logger.info(
+                f"Libro de lotes reconstruido ({self.metodo.value}): {resumen['ejecuciones']} "
+                f"ejecuciones, {resumen['lotes_nuevos']} lotes, {resumen['ganancias']} ganancias"
+            )
+            return resumen
+        
+        except Exception as e:
+            logger.error(f"Error reconstruyendo libro de lotes: {e}")
+            raise
+    
+    def _sincronizar_tx(self, session) -> Dict:
+        """Aplica lo pendiente; reconstruye las posiciones fuera de orden"""
+        if self.lote_repo.libro_vacio_tx(session):
+            return self._reconstruir_tx(session)
+        
+        ejecuciones = self.lote_repo.ejecuciones_pendientes_tx(session)
+        desordenadas = self._fuera_de_orden_tx(session, ejecuciones)
+        resumen = self._aplicar_tx(session, [e for e in ejecuciones if (e[1], e[2]) not in desordenadas])
+        resumen['posiciones_reconstruidas'] = len(desordenadas)
+        if desordenadas:
+            reconstruccion = self._reconstruir_tx(session, sorted(desordenadas))
+            for campo in ('ejecuciones', 'lotes_nuevos', 'lotes_actualizados',
+                          'ganancias', 'ventas_sin_lote'):
+                resumen[campo] += reconstruccion[campo]
+        return resumen
+    
+    def _reconstruir_tx(self, session, claves: Optional[List[Tuple[int, int]]] = None) -> Dict:
+        """Rehace el libro completo o, con 'claves', solo el de esas posiciones"""
+        self.lote_repo.vaciar_tx(session, claves)
+        libro = _LibroLotes(self.metodo, 1 if claves is None else self.lote_repo.siguiente_id_tx(session))
+        
+        aperturas = descuadradas = 0
+        for cuenta_id, titulo_id, cantidad, costo_promedio, fecha in \
+                self.lote_repo.posiciones_apertura_tx(session, claves):
+            clave = (cuenta_id, titulo_id)
+            libro.costos_respaldo[clave] = costo_promedio
+            if cantidad > 0:
+                libro.abrir(clave, fecha, cantidad, costo_promedio)
+                aperturas += 1
+            elif cantidad < 0:
+                descuadradas += 1
+        
+        ejecuciones = self.lote_repo.todas_ejecuciones_tx(session, claves)
+        for ejecucion in ejecuciones:
+            libro.aplicar(ejecucion)
+        
+        resumen = self._guardar_tx(session, libro, len(ejecuciones))
+        resumen['aperturas'] = aperturas
+        resumen['posiciones_descuadradas'] = descuadradas
+        if descuadradas:
+            logger.warning(
+                f"{descuadradas} posiciones con menos títulos que sus ejecuciones; "
+                f"sin lote de apertura"
+            )
+        return resumen
+    
+    def _fuera_de_orden_tx(self, session, ejecuciones: List[Tuple]) -> Set[Tuple[int, int]]:
+        """
+        Posiciones con alguna ejecución pendiente anterior (por fecha e id)
+        a la última ya aplicada de esa posición
+        """
+        primera = {}
+        for ejecucion in ejecuciones:
+            transaccion_id, cuenta_id, titulo_id, _, fecha = ejecucion[:5]
+            clave = (cuenta_id, titulo_id)
+            primera[clave] = min(primera.get(clave, (fecha, transaccion_id)), (fecha, transaccion_id))
+        if not primera:
+            return set()
+        
+        desde = min(fecha for fecha, _ in primera.values())
+        ultimas = self.lote_repo.ultimas_aplicadas_tx(session, sorted(primera), desde)
+        return {clave for clave, ultima in ultimas.items() if ultima > primera[clave]}
+    
+    def _aplicar_tx(self, session, ejecuciones: List[Tuple]) -> Dict:
+        """Aplica ejecuciones cargando solo los lotes de sus posiciones"""
+        libro = _LibroLotes(self.metodo, self.lote_repo.siguiente_id_tx(session))
+        if ejecuciones:
+            claves = sorted({(e[1], e[2]) for e in ejecuciones})
+            libro.cargar(self.lote_repo.lotes_abiertos_tx(session, claves))
+            ventas = sorted({(e[1], e[2]) for e in ejecuciones if e[3]})
+            libro.costos_respaldo = self.lote_repo.costos_promedio_tx(session, ventas)
+            for ejecucion in ejecuciones:
+                libro.aplicar(ejecucion)
+        return self._guardar_tx(session, libro, len(ejecuciones))
+    
+    def _guardar_tx(self, session, libro: _LibroLotes, n_ejecuciones: int) -> Dict:
+        nuevos, cambiados, ganancias = libro.cambios()
+        self.lote_repo.guardar_tx(session, nuevos, cambiados, ganancias)
+        if libro.sin_lote:
+            logger.warning(
+                f"{libro.sin_lote} ventas exceden los lotes abiertos; el exceso se "
+                f"registró al costo promedio del portafolio, sin lote"
+            )
+        return {
+            'ejecuciones': n_ejecuciones,
+            'lotes_nuevos': len(nuevos),
+            'lotes_actualizados': len(cambiados),
+            'ganancias': len(ganancias),
+            'ventas_sin_lote': libro.sin_lote,
+        }
+    
+    # ==================== REPORTES ====================
+    
+    def _sincronizar_pendientes(self):
+        """Antes de un reporte: aplica lo que el registro dejó fuera del libro"""
+        if self.lote_repo.hay_ejecuciones_pendientes():
+            self.sincronizar()
+    
+    def lotes_abiertos(self, cuenta_id: int, titulo_id: Optional[int] = None) -> List[Dict]:
+        """Lotes sin vender de una cuenta (opcionalmente de un título)"""
+        self._sincronizar_pendientes()
+        return self.lote_repo.get_lotes_abiertos(cuenta_id, titulo_id)
+    
+    def ganancias_periodo(self, desde: date, hasta: date,
+                          cuenta_id: Optional[int] = None,
+                          cliente_id: Optional[int] = None) -> List[Dict]:
+        """Detalle de ganancias realizadas entre dos fechas (inclusive)"""
+        self._sincronizar_pendientes()
+        return self.lote_repo.get_ganancias(desde, hasta, cuenta_id, cliente_id)
+    
+    def resumen_fiscal(self, anio: int, cliente_id: Optional[int] = None,
+                       cuenta_id: Optional[int] = None) -> Dict:
+        """
+        Ganancias realizadas de un año fiscal (calendario).
+        
+        Returns:
+            {
+                'anio': int, 'desde': str, 'hasta': str,
+                'por_posicion': [{cuenta_id, titulo_id, ticker, ventas,
+                                  cantidad, monto_venta, costo_base,
+                                  ganancia_perdida}],
+                'totales': {ventas, cantidad, monto_venta, costo_base,
+                            ganancia_perdida, ganancias, perdidas}
+            }
+        """
+        self._sincronizar_pendientes()
+        desde = date(anio, 1, 1)
+        hasta = date(anio + 1, 1, 1) - timedelta(days=1)
+        filas = self.lote_repo.get_resumen_ganancias(desde, hasta, cuenta_id, cliente_id)
+        
+        catalogo = self.db_engine.get_catalogo()
+        totales = dict.fromkeys(
+            ('ventas', 'cantidad', 'monto_venta', 'costo_base', 'ganancia_perdida', 'ganancias', 'perdidas'), 0
+        )
+        for fila in filas:
+            titulo = catalogo.titulo(fila['titulo_id']) or {}
+            fila['ticker'] = titulo.get('ticker')
+            for campo in ('ventas', 'cantidad', 'monto_venta', 'costo_base', 'ganancia_perdida'):
+                totales[campo] += fila[campo] or 0
+            if fila['ganancia_perdida'] >= 0:
+                totales['ganancias'] += fila['ganancia_perdida']
+            else:
+                totales['perdidas'] += fila['ganancia_perdida']
+        
+        filas.sort(key=lambda f: (f['cuenta_id'], f['ticker'] or ''))
+        return {
+            'anio': anio,
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'por_posicion': filas,
+            'totales': totales,
+        }
\ No newline at end of file
@@ -16,6 +16,7 @@ from ..utils.constants import TipoOrden, EstadoOrden, TipoMovimiento
 from ..repositories.orden_repository import OrdenRepository
 from ..repositories.saldo_repository import SaldoRepository
 from ..repositories.portafolio_repository import PortafolioRepository
+from .lotes_fiscales_service import LotesFiscalesService
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +35,9 @@ class OperacionesService:
         self.saldo_repo = SaldoRepository(db_engine)
         self.portafolio_repo = PortafolioRepository(db_engine)
         
+        # Libro de lotes fiscales (ganancias realizadas por venta)
+        self.lotes_service = LotesFiscalesService(db_engine)
+        
         # Configuración de comisiones (puede venir de config)
         self.config_comisiones = {
             'casa_bolsa_compra': 0.005,  # 0.5%
@@ -314,6 +318,13 @@ class OperacionesService:
         )
         session.add(transaccion)
         
+        # El trigger de transacciones actualiza los acumulados de la orden
+        session.flush()
+        session.expire(orden, ['cantidad_ejecutada', 'monto_ejecutado'])
+        
+        # Lote fiscal de la compra
+        self.lotes_service.registrar_ejecuciones_tx(session, [transaccion.id])
+        
         # 2. Actualizar orden
         orden.estado = EstadoOrden.EJECUTADA.value
         orden.fecha_ejecucion = fecha_ejecucion
@@ -390,6 +401,13 @@ class OperacionesService:
         )
         session.add(transaccion)
         
+        # El trigger de transacciones actualiza los acumulados de la orden
+        session.flush()
+        session.expire(orden, ['cantidad_ejecutada', 'monto_ejecutado'])
+        
+        # Consumo de lotes fiscales y ganancia realizada de la venta
+        self.lotes_service.registrar_ejecuciones_tx(session, [transaccion.id])
+        
         # 2. Actualizar orden
         orden.estado = EstadoOrden.EJECUTADA.value
         orden.fecha_ejecucion = fecha_ejecucion
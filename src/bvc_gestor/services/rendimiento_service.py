@@ -0,0 +1,314 @@
+"""
+Service de Rendimientos - TWR y MWR (TIR) por cuenta y cliente.
+
+Los rendimientos salen de series diarias alineadas: el valor de cierre de
+snapshot_valoracion (posiciones de las ejecuciones valoradas con los
+precios de cada día), los aportes netos de las ejecuciones y los ingresos
+de los movimientos (dividendos, comisiones cobradas aparte). Cada serie se
+lee con una consulta para todo el rango y todas las cuentas, se arma como
+matriz día × cuenta y utils/rendimientos.py resuelve todas las columnas a
+la vez; a nivel de cliente las columnas se suman antes de calcular.
+
+Es el rendimiento de la cartera de títulos: depósitos y retiros entran y
+salen del efectivo de la cuenta, no de la cartera, así que no son flujos.
+
+Los días del rango sin cierre se completan con SnapshotService antes de
+calcular; el cierre de hoy se rehace si algo cambió después de calcularlo
+(precios, posiciones, ejecuciones). Los resultados por (cuenta o cliente,
+rango) se guardan hasta el siguiente cambio de cierres, ejecuciones,
+movimientos o cuentas; un cálculo para toda la firma (cierre de mes) deja
+guardadas todas las cuentas para las consultas individuales que vengan
+después.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from ..repositories.snapshot_repository import SnapshotRepository
+from ..utils.rendimientos import retornos_diarios, resumen_rango, retornos_por_periodo
+from .snapshot_service import SnapshotService
+
+logger = logging.getLogger(__name__)
+
+# Modelos de los que dependen los resultados guardados
+MODELOS_DEPENDENCIAS = frozenset({
+    'SnapshotValoracionDB', 'TransaccionDB', 'MovimientoDB', 'CuentaBursatilDB',
+})
+
+# Resultados (cuenta o cliente, rango) guardados como máximo
+MAX_RESULTADOS = 50_000
+
+COLUMNAS_RESULTADO = (
+    'valor_inicial', 'valor_final', 'flujo_neto', 'ingresos', 'ganancia',
+    'twr', 'mwr', 'tir_anual', 'dias',
+)
+
+
+class RendimientoService:
+    """Rendimientos ponderados por tiempo (TWR) y por dinero (MWR/TIR)"""
+    
+    def __init__(self, db_engine, cache=None):
+        self.db_engine = db_engine
+        self.snapshot_repo = SnapshotRepository(db_engine)
+        self.snapshot_service = SnapshotService(db_engine)
+        self._cache = cache
+        self._resultados: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._fechas_cerradas = set()
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self.calculos = 0
+        
+        if cache is not None:
+            cache.suscribir(self._on_invalidacion)
+    
+    # ==================== API ====================
+    
+    def calcular(self, desde: date, hasta: date, cuenta_ids: Optional[List[int]] = None,
+                 por_cliente: bool = False, cliente_ids: Optional[List[int]] = None) -> pd.DataFrame:
+        """
+        Rendimiento del rango (ambos días incluidos) de muchas cuentas, o
+        clientes con por_cliente, en un solo cálculo. Sin filtro: toda la
+        firma.
+        
+        Returns:
+            DataFrame indexado por cuenta_id (o cliente_id) con las columnas
+            valor_inicial (cierre del día anterior a 'desde'), valor_final,
+            flujo_neto, ingresos, ganancia, twr, mwr (del periodo),
+            tir_anual y dias. mwr y tir_anual son NaN donde la TIR no tiene
+            solución (por ejemplo, sin capital en todo el rango).
+        """
+        self._validar_rango(desde, hasta)
+        self._completar_cierres(desde - timedelta(days=1), hasta)
+        if self._cache is not None:
+            self._cache.verificar_externos()
+        
+        generacion = self._generacion
+        etiquetas, valor, flujo, ingreso = self._series(desde, hasta, cuenta_ids, por_cliente, cliente_ids)
+        twr, tir_anual, mwr, ganancia = resumen_rango(valor, flujo, ingreso)
+        self.calculos += 1
+        
+        indice = pd.Index(etiquetas, name='cliente_id' if por_cliente else 'cuenta_id')
+        resultado = pd.DataFrame({
+            'valor_inicial': valor[0],
+            'valor_final': valor[-1],
+            'flujo_neto': flujo.sum(axis=0),
+            'ingresos': ingreso.sum(axis=0),
+            'ganancia': ganancia,
+            'twr': twr,
+            'mwr': mwr,
+            'tir_anual': tir_anual,
+            'dias': flujo.shape[0],
+        }, index=indice, columns=list(COLUMNAS_RESULTADO))
+        
+        # Un cliente limitado a algunas de sus cuentas no es su rendimiento
+        if not (por_cliente and cuenta_ids is not None):
+            self._guardar('cliente' if por_cliente else 'cuenta', desde, hasta, resultado, generacion)
+        return resultado
+    
+    def rendimiento_cuenta(self, cuenta_id: int, desde: date, hasta: date) -> Optional[Dict]:
+        """Rendimiento de una cuenta en el rango (guardado o calculado)"""
+        return self._rendimiento('cuenta', cuenta_id, desde, hasta)
+    
+    def rendimiento_cliente(self, cliente_id: int, desde: date, hasta: date) -> Optional[Dict]:
+        """Rendimiento de todas las cuentas de un cliente en el rango"""
+        return self._rendimiento('cliente', cliente_id, desde, hasta)
+    
+    def retornos_periodicos(self, desde: date, hasta: date, frecuencia: str = 'M',
+                            cuenta_ids: Optional[List[int]] = None, por_cliente: bool = False,
+                            cliente_ids: Optional[List[int]] = None) -> pd.DataFrame:
+        """
+        TWR por periodo calendario ('M', 'Q', 'Y'): una fila por periodo y
+        una columna por cuenta (o cliente). Los periodos en los extremos
+        del rango cubren solo los días dentro del rango.
+        """
+        self._validar_rango(desde, hasta)
+        self._completar_cierres(desde - timedelta(days=1), hasta)
+        
+        etiquetas, valor, flujo, ingreso = self._series(desde, hasta, cuenta_ids, por_cliente, cliente_ids)
+        self.calculos += 1
+        diarios = pd.DataFrame(
+            retornos_diarios(valor, flujo, ingreso),
+            index=pd.date_range(desde, hasta, freq='D'),
+            columns=pd.Index(etiquetas, name='cliente_id' if por_cliente else 'cuenta_id')
+        )
+        return retornos_por_periodo(diarios, frecuencia)
+    
+    def invalidar(self):
+        """Descarta los resultados guardados (escrituras SQL directas)"""
+        self._on_invalidacion(None)
+    
+    def estadisticas(self) -> Dict:
+        """Cálculos hechos y resultados guardados (diagnóstico)"""
+        return {'calculos': self.calculos, 'guardados': len(self._resultados)}
+    
+    def _on_invalidacion(self, modelo: Optional[str], id=None):
+        """Suscriptor de CacheRepositorio.invalidar()"""
+        if modelo is None or modelo in MODELOS_DEPENDENCIAS:
+            with self._lock:
+                self._generacion += 1
+                self._resultados.clear()
+                self._fechas_cerradas = set()
+    
+    # ==================== RESULTADOS GUARDADOS ====================
+    
+    def _rendimiento(self, nivel: str, id: int, desde: date, hasta: date) -> Optional[Dict]:
+        try:
+            if self._cache is not None:
+                self._cache.verificar_externos()
+            if hasta == self.snapshot_repo.hoy():
+                # Un resultado guardado que incluye hoy vale mientras su cierre esté al día
+                self._completar_cierres(desde - timedelta(days=1), hasta)
+            clave = (nivel, id, desde, hasta)
+            with self._lock:
+                guardado = self._resultados.get(clave)
+                if guardado is not None:
+                    self._resultados.move_to_end(clave)
+                    return guardado
+            
+            if nivel == 'cliente':
+                resultado = self.calcular(desde, hasta, por_cliente=True, cliente_ids=[id])
+            else:
+                resultado = self.calcular(desde, hasta, cuenta_ids=[id])
+            if id not in resultado.index:
+                return None
+            return self._a_dict(resultado.loc[id])
+        
+        except Exception as e:
+            logger.error(f"Error calculando rendimiento ({nivel} {id}, {desde} a {hasta}): {e}")
+            return None
+    
+    def _guardar(self, nivel: str, desde: date, hasta: date, resultado: pd.DataFrame, generacion: int):
+        """Guarda cada fila salvo que algo haya cambiado durante el cálculo"""
+        with self._lock:
+            if generacion != self._generacion:
+                return
+            for id, fila in zip(resultado.index.tolist(), resultado.itertuples(index=False)):
+                self._resultados[(nivel, id, desde, hasta)] = self._a_dict(fila._asdict())
+            while len(self._resultados) > MAX_RESULTADOS:
+                self._resultados.popitem(last=False)
+    
+    @staticmethod
+    def _a_dict(fila) -> Dict:
+        datos = {c: float(fila[c]) for c in COLUMNAS_RESULTADO}
+        datos['dias'] = int(datos['dias'])
+        return datos
+    
+    # ==================== SERIES ====================
+    
+    def _validar_rango(self, desde: date, hasta: date):
+        if hasta < desde:
+            raise ValueError(f"Rango inválido: {desde} > {hasta}")
+        if hasta > self.snapshot_repo.hoy():
+            raise ValueError(f"No hay cierres de días futuros: {hasta}")
+    
+    def _completar_cierres(self, desde: date, hasta: date):
+        """
+        Calcula los cierres que falten en el rango (backfill por tramos) y,
+        si el rango incluye hoy, cierra el día si no está cerrado o cambió
+        algo después del cierre. Solo los días pasados se recuerdan como
+        cerrados: el de hoy cambia con cada precio o ejecución.
+        """
+        hoy = self.snapshot_repo.hoy()
+        ultimo = min(hasta, hoy - timedelta(days=1))
+        pasados = [desde + timedelta(days=i) for i in range((ultimo - desde).days + 1)]
+        
+        if not all(dia in self._fechas_cerradas for dia in pasados):
+            cerradas = set(self.snapshot_repo.get_fechas_cerradas(desde, hasta))
+            
+            # Tramos de días consecutivos sin cierre
+            tramos = []
+            for dia in pasados:
+                if dia in cerradas:
+                    continue
+                if tramos and tramos[-1][1] + timedelta(days=1) == dia:
+                    tramos[-1][1] = dia
+                else:
+                    tramos.append([dia, dia])
+            
+            for inicio, fin in tramos:
+                logger.info(f"Rendimientos: calculando cierres del {inicio} al {fin}")
+                self.snapshot_service.backfill(inicio, fin)
+            self._fechas_cerradas.update(pasados)
+        
+        if hasta == hoy and self._cierre_hoy_desactualizado(hoy):
+            self.snapshot_service.cerrar_dia()
+            # Los resultados guardados que incluyen hoy ya no valen
+            self._on_invalidacion('SnapshotValoracionDB')
+    
+    def _cierre_hoy_desactualizado(self, hoy: date) -> bool:
+        """Hoy sin cierre, o con cuentas que cambiaron después de calcularlo"""
+        if self.snapshot_repo.ultima_fecha() != hoy:
+            return True
+        marca = self.snapshot_repo.marca_cierre(hoy)
+        return marca is None or bool(self.snapshot_repo.get_cuentas_cambiadas(marca, hoy))
+    
+    def _series(self, desde: date, hasta: date, cuenta_ids: Optional[List[int]], por_cliente: bool,
+                cliente_ids: Optional[List[int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (etiquetas, valor, flujo, ingreso): matrices día × columna, con el
+        cierre del día anterior a 'desde' como primera fila de valor
+        """
+        if por_cliente:
+            pares = np.array(self.snapshot_repo.get_cuentas_cliente(cliente_ids), dtype=np.int64).reshape(-1, 2)
+            if cuenta_ids is not None:
+                pares = pares[np.isin(pares[:, 0], cuenta_ids)]
+            filtro = pares[:, 0].tolist() if cliente_ids is not None or cuenta_ids is not None else None
+        else:
+            filtro = cuenta_ids
+        
+        inicio = desde - timedelta(days=1)
+        valores = self.snapshot_repo.get_valores_rango(inicio, hasta, filtro)
+        flujos = self.snapshot_repo.get_flujos_rango(desde, hasta, filtro)
+        ingresos = self.snapshot_repo.get_ingresos_rango(desde, hasta, filtro)
+        
+        cuentas = np.unique(np.concatenate([
+            np.array([fila[0] for fila in serie], dtype=np.int64) for serie in (valores, flujos, ingresos)
+        ]))
+        if cuenta_ids is not None and not por_cliente:
+            cuentas = cuentas[np.isin(cuentas, cuenta_ids)]
+        dias = (hasta - desde).days + 1
+        
+        # Una fila por día desde 'inicio': la fila 0 es el cierre previo
+        valor = self._matriz(valores, cuentas, np.datetime64(inicio, 'D'), dias + 1)
+        flujo = self._matriz(flujos, cuentas, np.datetime64(desde, 'D'), dias)
+        ingreso = self._matriz(ingresos, cuentas, np.datetime64(desde, 'D'), dias)
+        
+        if not por_cliente:
+            return cuentas.tolist(), valor, flujo, ingreso
+        
+        # Cuentas ordenadas por cliente: las columnas de cada cliente se suman con reduceat
+        pares = pares[np.isin(pares[:, 0], cuentas)]
+        pares = pares[np.argsort(pares[:, 1], kind='stable')]
+        if not len(pares):
+            vacia = np.zeros((0, 0))
+            return [], vacia.reshape(dias + 1, 0), vacia.reshape(dias, 0), vacia.reshape(dias, 0)
+        columnas = np.searchsorted(cuentas, pares[:, 0])
+        clientes, inicios = np.unique(pares[:, 1], return_index=True)
+        return (
+            clientes.tolist(),
+            *(np.add.reduceat(matriz[:, columnas], inicios, axis=1) for matriz in (valor, flujo, ingreso))
+        )
+    
+    @staticmethod
+    def _matriz(filas: List[Tuple], cuentas: np.ndarray, origen: np.datetime64, dias: int) -> np.ndarray:
+        """Matriz días × cuentas a partir de tuplas (cuenta_id, fecha, monto); sin dato vale 0"""
+        matriz = np.zeros((dias, len(cuentas)))
+        if not filas:
+            return matriz
+        
+        cuenta, fecha, monto = zip(*filas)
+        cuenta = np.array(cuenta, dtype=np.int64)
+        dia = (np.array(fecha, dtype='datetime64[D]') - origen).astype(np.int64)
+        monto = np.array(monto, dtype=float)
+        columna = np.searchsorted(cuentas, cuenta)
+        
+        dentro = (dia >= 0) & (dia < dias) & (columna < len(cuentas))
+        dentro[dentro] &= cuentas[columna[dentro]] == cuenta[dentro]
+        np.add.at(matriz, (dia[dentro], columna[dentro]), np.nan_to_num(monto[dentro]))
+        return matriz
\ No newline at end of file
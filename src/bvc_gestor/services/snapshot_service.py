@@ -0,0 +1,336 @@
+"""
+Service de Snapshots - Valoración de cierre diaria por cuenta bursátil.
+
+Llena snapshot_valoracion (una fila por cuenta y día) para que los
+gráficos de rendimiento y los estados de cuenta lean unos cientos de
+filas en lugar de reconstruir el historial.
+
+Cierre diario (cerrar_dia): incremental. Solo se recalculan las cuentas
+cuyo valor pudo cambiar desde el cierre anterior (posiciones modificadas,
+ejecuciones, títulos en cartera con precio nuevo); las demás copian el
+cierre anterior con un INSERT ... SELECT. Los días sin cierre entre el
+último y el de hoy se completan con el backfill.
+
+Backfill (backfill): rangos de fechas en bloque. Las posiciones de cada
+día salen de repetir las ejecuciones (costo promedio como en
+PortafolioItemDB.actualizar_posicion) desde la posición de apertura, que
+es la actual menos todo lo ejecutado; los precios son el último conocido
+de cada día, de cualquier tipo, incluido el archivo particionado.
+Cantidades, costos y precios se arman como matrices posición × día y se
+valoran con utils/valoracion.py.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional
+import logging
+
+import numpy as np
+
+from ..database.archivo_precios import ArchivoPrecios
+from ..repositories.portafolio_repository import PortafolioRepository
+from ..repositories.snapshot_repository import SnapshotRepository
+from ..utils.valoracion import valorar_arrays
+from .valoracion_service import ValoracionService, ValoracionPortafolio
+
+logger = logging.getLogger(__name__)
+
+# Días por bloque del backfill (acota la memoria de las matrices)
+DIAS_POR_BLOQUE = 31
+
+# Historial previo al rango en el que se busca el precio inicial de cada
+# título; uno sin cotizaciones en ese periodo empieza sin precio
+VENTANA_PRECIO_INICIAL = timedelta(days=366)
+
+
+def _ultimo_por_clave(claves: np.ndarray) -> np.ndarray:
+    """Índices de la última aparición de cada clave"""
+    _, primeros = np.unique(claves[::-1], return_index=True)
+    return len(claves) - 1 - primeros
+
+
+def _matriz_diaria(inicial: np.ndarray, filas: np.ndarray, columnas: np.ndarray,
+                   valores: np.ndarray, dias: int) -> np.ndarray:
+    """
+    Matriz filas × días con el último valor conocido al cierre de cada día.
+    
+    inicial: valor de cada fila antes del primer día (NaN: desconocido).
+    filas/columnas/valores: cambios en orden cronológico; en un mismo día
+    vale el último.
+    """
+    matriz = np.full((len(inicial), dias + 1), np.nan)
+    matriz[:, 0] = inicial
+    if len(valores):
+        ultimos = _ultimo_por_clave(filas * (dias + 1) + columnas + 1)
+        matriz[filas[ultimos], columnas[ultimos] + 1] = valores[ultimos]
+    
+    # Arrastrar hacia adelante el último valor conocido
+    indices = np.where(np.isnan(matriz), 0, np.arange(dias + 1))
+    np.maximum.accumulate(indices, axis=1, out=indices)
+    return np.take_along_axis(matriz, indices, axis=1)[:, 1:]
+
+
+class SnapshotService:
+    """Service de valoración de cierre diaria"""
+    
+    def __init__(self, db_engine):
+        self.db_engine = db_engine
+        self.snapshot_repo = SnapshotRepository(db_engine)
+        self.portafolio_repo = PortafolioRepository(db_engine)
+        self.archivo_precios = ArchivoPrecios(db_engine)
+    
+    # ==================== CIERRE DIARIO ====================
+    
+    def cerrar_dia(self, fecha: Optional[date] = None) -> Dict:
+        """
+        Cierre incremental del día (hoy por defecto).
+        
+        Hoy es el día UTC de la base (SnapshotRepository.hoy()), el mismo
+        calendario con el que se reparten las ejecuciones y los precios.
+        Los precios vigentes solo valen para hoy: un día anterior se
+        calcula con el backfill.
+        
+        Returns:
+            {'fecha', 'recalculadas', 'arrastradas', 'backfill'}
+        """
+        hoy = self.snapshot_repo.hoy()
+        fecha = fecha or hoy
+        if fecha > hoy:
+            raise ValueError(f"No se puede cerrar un día futuro: {fecha}")
+        if fecha < hoy:
+            resumen = self.backfill(fecha, fecha)
+            return {'fecha': fecha, 'recalculadas': resumen['filas'], 'arrastradas': 0, 'backfill': 0}
+        
+        resumen = {'fecha': fecha, 'recalculadas': 0, 'arrastradas': 0, 'backfill': 0}
+        # Antes de buscar cambios: lo que se confirme durante el cierre
+        # queda después de la marca y lo toma el cierre siguiente
+        calculo = self.snapshot_repo.ahora()
+        anterior = self.snapshot_repo.ultima_fecha(antes_de=fecha)
+        
+        # Días sin cierre entre el último y hoy
+        ayer = fecha - timedelta(days=1)
+        if anterior is not None and anterior < ayer:
+            resumen['backfill'] = self.backfill(anterior + timedelta(days=1), ayer)['filas']
+            anterior = ayer
+        
+        flujos = self.snapshot_repo.get_flujos_dia(fecha)
+        if anterior is None:
+            # Primer cierre: todas las cuentas
+            posiciones = self.portafolio_repo.get_posiciones_valoracion()
+            cuentas = {cuenta for _, cuenta, *_ in posiciones}
+        else:
+            marca = self.snapshot_repo.marca_cierre(anterior)
+            posiciones = self.snapshot_repo.get_posiciones_cambiadas(marca, anterior)
+            cuentas = set(self.snapshot_repo.get_cuentas_cambiadas(marca, anterior))
+            resumen['arrastradas'] = self.snapshot_repo.arrastrar(anterior, fecha, marca, calculo)
+        
+        valoracion = ValoracionService.valorar_posiciones(posiciones)
+        filas = self._filas_cierre(fecha, valoracion, cuentas | set(flujos), flujos)
+        resumen['recalculadas'] = self.snapshot_repo.guardar(filas, calculo)
+        
+        logger.info(
+            f"Cierre {fecha}: {resumen['recalculadas']} cuentas recalculadas, "
+            f"{resumen['arrastradas']} arrastradas"
+        )
+        return resumen
+    
+    @staticmethod
+    def _filas_cierre(fecha: date, valoracion: ValoracionPortafolio,
+                      cuentas: Iterable[int], flujos: Dict[int, float]) -> List[tuple]:
+        """Una fila por cuenta; las que ya no tienen posiciones quedan en cero"""
+        por_cuenta = valoracion.totales_por_cuenta()
+        sin_precio = np.isnan(valoracion.precio)
+        sin_precio_cuenta = dict(zip(*np.unique(valoracion.cuenta_id[sin_precio], return_counts=True)))
+        
+        filas = []
+        for cuenta in sorted(cuentas):
+            totales = por_cuenta.get(cuenta, {})
+            filas.append((
+                cuenta, fecha,
+                totales.get('valor_mercado_total', 0.0),
+                totales.get('inversion_total', 0.0),
+                totales.get('ganancia_perdida_total', 0.0),
+                totales.get('total_posiciones', 0),
+                int(sin_precio_cuenta.get(cuenta, 0)),
+                flujos.get(cuenta, 0.0),
+            ))
+        return filas
+    
+    # ==================== BACKFILL ====================
+    
+    def backfill(self, desde: date, hasta: date,
+                 dias_por_bloque: int = DIAS_POR_BLOQUE) -> Dict:
+        """
+        Calcula (o recalcula) los cierres de todas las cuentas entre
+        'desde' y 'hasta', ambos incluidos, por bloques de días.
+        
+        Returns:
+            {'desde', 'hasta', 'dias', 'filas'}
+        """
+        if hasta < desde:
+            raise ValueError(f"Rango inválido: {desde} > {hasta}")
+        
+        dias = (hasta - desde).days + 1
+        origen = np.datetime64(desde, 'D')
+        calculo = self.snapshot_repo.ahora()
+        
+        # Posiciones: actuales más las que aparecen en ejecuciones, ordenadas
+        # por cuenta para sumar por cuenta con reduceat
+        actuales = self.snapshot_repo.get_posiciones_actuales()
+        ejecuciones = self.snapshot_repo.get_ejecuciones()
+        claves = sorted({(c, t) for c, t, *_ in actuales} | {(c, t) for c, t, *_ in ejecuciones})
+        if not claves:
+            return {'desde': desde, 'hasta': hasta, 'dias': dias, 'filas': 0}
+        
+        indice = {clave: k for k, clave in enumerate(claves)}
+        cuenta_k = np.array([c for c, _ in claves], dtype=np.int64)
+        titulo_k = np.array([t for _, t in claves], dtype=np.int64)
+        cuentas, inicio_cuenta = np.unique(cuenta_k, return_index=True)
+        
+        cantidad_actual = np.zeros(len(claves))
+        costo_actual = np.zeros(len(claves))
+        for cuenta, titulo, cantidad, costo_promedio in actuales:
+            k = indice[(cuenta, titulo)]
+            cantidad_actual[k] = cantidad
+            costo_actual[k] = costo_promedio or 0.0
+        
+        # Ejecuciones como columnas; día relativo a 'desde' (negativo: antes)
+        columnas = list(zip(*ejecuciones)) or [()] * 5
+        k_ejec = np.array([indice[(c, t)] for c, t in zip(columnas[0], columnas[1])], dtype=np.int64)
+        dia_ejec = (np.array(columnas[2], dtype='datetime64[D]') - origen).astype(np.int64)
+        cantidad_ejec = np.array(columnas[3], dtype=float)
+        monto_ejec = np.array(columnas[4], dtype=float)
+        
+        # Posición anterior a todas las ejecuciones (cargas iniciales)
+        apertura = cantidad_actual - np.bincount(k_ejec, weights=cantidad_ejec, minlength=len(claves))
+        if (apertura < 0).any():
+            logger.warning(
+                f"{int((apertura < 0).sum())} posiciones con menos títulos que sus ejecuciones; "
+                f"se toman desde cero"
+            )
+            apertura = np.maximum(apertura, 0)
+        
+        en_rango = dia_ejec < dias
+        cantidad_tras, costo_tras = self._replay(
+            apertura, apertura * costo_actual,
+            k_ejec[en_rango], cantidad_ejec[en_rango], monto_ejec[en_rango]
+        )
+        k_ejec, dia_ejec, monto_ejec = k_ejec[en_rango], dia_ejec[en_rango], monto_ejec[en_rango]
+        
+        # Precios: fila por título en cartera, día relativo a 'desde'
+        titulos, titulo_fila = np.unique(titulo_k, return_inverse=True)
+        precios = self.archivo_precios.consultar(
+            desde=datetime.combine(desde, time.min) - VENTANA_PRECIO_INICIAL,
+            hasta=datetime.combine(hasta, time.max)
+        )
+        precio_titulo = np.array([p['titulo_id'] for p in precios], dtype=np.int64)
+        precio_dia = (np.array([p['fecha_hora'] for p in precios], dtype='datetime64[D]') - origen).astype(np.int64)
+        precio_valor = np.array([float(p['precio']) for p in precios], dtype=float)
+        en_cartera = np.isin(precio_titulo, titulos)
+        precio_fila = np.searchsorted(titulos, precio_titulo[en_cartera])
+        precio_dia, precio_valor = precio_dia[en_cartera], precio_valor[en_cartera]
+        
+        # Estado al inicio del rango; luego, el del final de cada bloque
+        cantidad_ini = self._estado_previo(apertura, k_ejec, dia_ejec, cantidad_tras)
+        costo_ini = self._estado_previo(apertura * costo_actual, k_ejec, dia_ejec, costo_tras)
+        precio_ini = self._estado_previo(np.full(len(titulos), np.nan), precio_fila, precio_dia, precio_valor)
+        
+        filas_guardadas = 0
+        for bloque in range(0, dias, dias_por_bloque):
+            n = min(dias_por_bloque, dias - bloque)
+            ejec = (dia_ejec >= bloque) & (dia_ejec < bloque + n)
+            prec = (precio_dia >= bloque) & (precio_dia < bloque + n)
+            
+            cantidad = _matriz_diaria(cantidad_ini, k_ejec[ejec], dia_ejec[ejec] - bloque, cantidad_tras[ejec], n)
+            costo = _matriz_diaria(costo_ini, k_ejec[ejec], dia_ejec[ejec] - bloque, costo_tras[ejec], n)
+            precio = _matriz_diaria(precio_ini, precio_fila[prec], precio_dia[prec] - bloque, precio_valor[prec], n)
+            cantidad_ini, costo_ini, precio_ini = cantidad[:, -1], costo[:, -1], precio[:, -1]
+            
+            flujo = np.zeros((len(cuentas), n))
+            np.add.at(flujo, (np.searchsorted(cuentas, cuenta_k[k_ejec[ejec]]), dia_ejec[ejec] - bloque), monto_ejec[ejec])
+            
+            filas = self._filas_bloque(
+                desde + timedelta(days=bloque), cuentas, inicio_cuenta,
+                cantidad, costo, precio[titulo_fila], flujo
+            )
+            filas_guardadas += self.snapshot_repo.guardar(filas, calculo)
+        
+        logger.info(f"Backfill {desde} a {hasta}: {filas_guardadas} cierres en {dias} días")
+        return {'desde': desde, 'hasta': hasta, 'dias': dias, 'filas': filas_guardadas}
+    
+    @staticmethod
+    def _replay(cantidad_inicial: np.ndarray, costo_inicial: np.ndarray, k_ejec: np.ndarray,
+                cantidad_ejec: np.ndarray, monto_ejec: np.ndarray):
+        """
+        Cantidad y costo total de la posición después de cada ejecución.
+        
+        Compra: suma cantidad y monto. Venta: resta cantidad al costo
+        promedio vigente; una posición que llega a cero reinicia su costo.
+        Secuencial por naturaleza (cada costo depende del anterior).
+        """
+        cantidad = cantidad_inicial.tolist()
+        costo = costo_inicial.tolist()
+        cantidad_tras = np.empty(len(k_ejec))
+        costo_tras = np.empty(len(k_ejec))
+        
+        for i, (k, unidades, monto) in enumerate(zip(k_ejec.tolist(), cantidad_ejec.tolist(), monto_ejec.tolist())):
+            if unidades > 0:
+                cantidad[k] += unidades
+                costo[k] += monto
+            else:
+                vendidas = min(-unidades, cantidad[k])
+                if vendidas > 0:
+                    costo[k] -= costo[k] / cantidad[k] * vendidas
+                    cantidad[k] -= vendidas
+                if cantidad[k] <= 0:
+                    cantidad[k], costo[k] = 0.0, 0.0
+            cantidad_tras[i] = cantidad[k]
+            costo_tras[i] = costo[k]
+        
+        return cantidad_tras, costo_tras
+    
+    @staticmethod
+    def _estado_previo(inicial: np.ndarray, filas: np.ndarray, dias: np.ndarray,
+                       valores: np.ndarray) -> np.ndarray:
+        """Valor de cada fila antes del rango: el último cambio previo o 'inicial'"""
+        estado = inicial.copy()
+        previos = dias < 0
+        if previos.any():
+            ultimos = _ultimo_por_clave(filas[previos])
+            estado[filas[previos][ultimos]] = valores[previos][ultimos]
+        return estado
+    
+    @staticmethod
+    def _filas_bloque(inicio: date, cuentas: np.ndarray, inicio_cuenta: np.ndarray,
+                      cantidad: np.ndarray, costo: np.ndarray, precio: np.ndarray,
+                      flujo: np.ndarray) -> List[tuple]:
+        """
+        Filas de un bloque: matrices posición × día sumadas por cuenta. Se
+        omiten las cuentas sin posiciones ni flujo en el día.
+        """
+        abierta = cantidad > 0
+        costo_promedio = np.zeros_like(costo)
+        np.divide(costo, cantidad, out=costo_promedio, where=abierta)
+        metricas = valorar_arrays(cantidad, costo_promedio, precio)
+        
+        con_precio = abierta & ~np.isnan(precio)
+        
+        def sumar(metrica):
+            return np.add.reduceat(np.where(con_precio, metrica, 0.0), inicio_cuenta, axis=0)
+        
+        valor = sumar(metricas['valor_mercado'])
+        costo_total = sumar(metricas['costo_total'])
+        posiciones = np.add.reduceat(con_precio, inicio_cuenta, axis=0)
+        sin_precio = np.add.reduceat(abierta & ~con_precio, inicio_cuenta, axis=0)
+        
+        cuenta, dia = np.nonzero((posiciones + sin_precio > 0) | (flujo != 0))
+        fechas = [inicio + timedelta(days=d) for d in range(cantidad.shape[1])]
+        return list(zip(
+            cuentas[cuenta].tolist(),
+            [fechas[d] for d in dia.tolist()],
+            valor[cuenta, dia].tolist(),
+            costo_total[cuenta, dia].tolist(),
+            (valor[cuenta, dia] - costo_total[cuenta, dia]).tolist(),
+            posiciones[cuenta, dia].tolist(),
+            sin_precio[cuenta, dia].tolist(),
+            flujo[cuenta, dia].tolist(),
+        ))
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Service de Valoración - Motor vectorizado de valoración de portafolios.
+
+Carga cantidades, costos promedio y últimos precios de todas las
+posiciones pedidas (una cuenta, un cliente o la firma completa) en
+arreglos de NumPy y calcula valor de mercado, costo, ganancia/pérdida y
+rendimiento en una sola pasada. Los totales por cuenta o por título salen
+de bincount, sin recorrer los grupos.
+
+Para cuadrar contra la contabilidad, conciliar() recalcula los totales
+con Decimal y reporta la diferencia con los totales en float64.
+"""
+
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+
+from ..repositories.portafolio_repository import PortafolioRepository
+from ..utils.valoracion import (
+    valorar_arrays, totales, totales_por_grupo, totales_exactos, METRICAS,
+    TOLERANCIA_CONCILIACION
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ValoracionPortafolio:
+    """Posiciones y métricas como arreglos paralelos (una fila por posición)"""
+    
+    id: np.ndarray
+    cuenta_id: np.ndarray
+    titulo_id: np.ndarray
+    cantidad: np.ndarray
+    costo_promedio: np.ndarray
+    precio: np.ndarray  # NaN: sin precio vigente
+    metricas: Dict[str, np.ndarray] = field(default_factory=dict)
+    
+    def __len__(self) -> int:
+        return len(self.id)
+    
+    @property
+    def sin_precio(self) -> np.ndarray:
+        """Ids de las posiciones sin precio vigente (no entran en los totales)"""
+        return self.id[np.isnan(self.precio)]
+    
+    def totales(self) -> Dict[str, float]:
+        return totales(self.metricas)
+    
+    def totales_por_cuenta(self) -> Dict[int, Dict[str, float]]:
+        return totales_por_grupo(self.cuenta_id, self.metricas)
+    
+    def totales_por_titulo(self) -> Dict[int, Dict[str, float]]:
+        return totales_por_grupo(self.titulo_id, self.metricas)
+    
+    def filas(self) -> List[Dict]:
+        """Posiciones como diccionarios (para la UI); NaN pasa a None"""
+        columnas = {
+            'id': self.id.tolist(),
+            'cuenta_id': self.cuenta_id.tolist(),
+            'titulo_id': self.titulo_id.tolist(),
+            'cantidad': self.cantidad.astype(np.int64).tolist(),
+            'costo_promedio': self.costo_promedio.tolist(),
+            'precio_actual': self.precio.tolist(),
+        }
+        for metrica in METRICAS:
+            columnas[metrica] = self.metricas[metrica].tolist()
+        
+        claves = list(columnas)
+        return [
+            {clave: (None if valor != valor else valor) for clave, valor in zip(claves, fila)}
+            for fila in zip(*columnas.values())
+        ]
+
+
+class ValoracionService:
+    """
+    Service de valoración de portafolios.
+    Toda la aritmética por posición es vectorizada.
+    """
+    
+    def __init__(self, db_engine):
+        self.db_engine = db_engine
+        self.portafolio_repo = PortafolioRepository(db_engine)
+    
+    # ==================== VALORACIÓN ====================
+    
+    def valorar(self, cuenta_id: Optional[int] = None,
+                cliente_id: Optional[int] = None) -> ValoracionPortafolio:
+        """
+        Valora las posiciones abiertas de una cuenta, de un cliente o, sin
+        filtros, de toda la firma.
+        """
+        posiciones = self.portafolio_repo.get_posiciones_valoracion(
+            cuenta_id=cuenta_id, cliente_id=cliente_id
+        )
+        return self.valorar_posiciones(posiciones)
+    
+    def valorar_firma(self) -> ValoracionPortafolio:
+        """Todas las cuentas × todos los títulos"""
+        return self.valorar()
+    
+    @staticmethod
+    def valorar_posiciones(posiciones: List[tuple]) -> ValoracionPortafolio:
+        """
+        Valoración a partir de tuplas (id, cuenta_id, titulo_id, cantidad,
+        costo_promedio, precio); precio None se toma como sin precio.
+        """
+        # Transponer a columnas y crear un arreglo por columna; pasar las
+        # filas (Row) directo a np.array es ~50 veces más lento
+        columnas = list(zip(*posiciones)) or [()] * 6
+        ids, cuentas, titulos = (np.array(c, dtype=np.int64) for c in columnas[:3])
+        # float: None (sin precio) se convierte en NaN
+        cantidad, costo_promedio, precio = (np.array(c, dtype=float) for c in columnas[3:])
+        
+        return ValoracionPortafolio(
+            id=ids, cuenta_id=cuentas, titulo_id=titulos,
+            cantidad=cantidad, costo_promedio=costo_promedio, precio=precio,
+            metricas=valorar_arrays(cantidad, costo_promedio, precio),
+        )
+    
+    # ==================== CONCILIACIÓN ====================
+    
+    def conciliar(self, valoracion: ValoracionPortafolio) -> Dict:
+        """
+        Totales exactos (Decimal) frente a los vectorizados.
+        
+        Returns:
+            {
+                'exactos': {...Decimal},
+                'vectorizados': {...float},
+                'diferencias': {...Decimal},
+                'cuadra': bool  # todas las diferencias <= TOLERANCIA_CONCILIACION
+            }
+        """
+        exactos = totales_exactos(zip(
+            valoracion.cantidad.tolist(),
+            valoracion.costo_promedio.tolist(),
+            valoracion.precio.tolist()
+        ))
+        vectorizados = valoracion.totales()
+        
+        diferencias = {
+            clave: abs(exactos[clave] - Decimal(repr(vectorizados[clave])))
+            for clave in exactos
+        }
+        cuadra = all(d <= TOLERANCIA_CONCILIACION for d in diferencias.values())
+        if not cuadra:
+            logger.warning(f"Valoración no cuadra con los totales exactos: {diferencias}")
+        
+        return {
+            'exactos': exactos,
+            'vectorizados': vectorizados,
+            'diferencias': diferencias,
+            'cuadra': cuadra,
+        }
\ No newline at end of file
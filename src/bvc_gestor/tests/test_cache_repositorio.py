@@ -0,0 +1,210 @@
+# =============================================================================
+# TEST DE LA CACHÉ DE REPOSITORIOS
+# Archivo: src/bvc_gestor/tests/test_cache_repositorio.py
+# =============================================================================
+#
+# CacheRepositorio es una LRU con TTL por modelo e invalidación indexada.
+# Aquí se verifica el desalojo al llegar a max_entradas, el vencimiento por
+# TTL, qué claves quita invalidar() (las del registro y las consultas de su
+# modelo, no las de otros modelos) y los contadores de estadisticas().
+#
+# instalar_invalidacion() invalida la caché con lo que confirman las
+# sesiones: se verifica que lo hace al confirmar la transacción externa y
+# no al liberar un SAVEPOINT (begin_nested, como la cola de escritura), y
+# que revertir un SAVEPOINT no descarta lo anotado por la transacción que
+# lo contiene.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_cache_repositorio.py
+#     python src/bvc_gestor/tests/test_cache_repositorio.py
+
+import sys
+import tempfile
+import time as reloj
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import BancoDB, TituloDB
+from src.bvc_gestor.repositories.cache_repositorio import CacheRepositorio, instalar_invalidacion
+
+
+def crear_base():
+    """Base aislada, una fábrica de sesiones propia y su caché con invalidación"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "cache.db")
+    db.asegurar_esquema()
+    fabrica = sessionmaker(bind=db.engine)
+    cache = CacheRepositorio()
+    instalar_invalidacion(fabrica, cache)
+    return db, fabrica, cache
+
+
+def banco(n: int) -> BancoDB:
+    return BancoDB(rif=f"J-{n:08d}-0", nombre=f"Banco {n}", codigo=f"{n:04d}", estatus=True)
+
+
+def test_desalojo_lru():
+    """Al superar max_entradas sale la entrada usada hace más tiempo"""
+    cache = CacheRepositorio(max_entradas=3)
+    claves = [CacheRepositorio.clave_id('BancoDB', i) for i in (1, 2, 3, 4)]
+    for clave in claves[:3]:
+        cache.guardar(clave, clave[2])
+    
+    # Leer la 1 la vuelve la más reciente: la que sale es la 2
+    assert cache.obtener(claves[0]) == 1
+    cache.guardar(claves[3], 4)
+    
+    assert cache.obtener(claves[1], 'ausente') == 'ausente'
+    assert [cache.obtener(clave) for clave in (claves[0], claves[2], claves[3])] == [1, 3, 4]
+    datos = cache.estadisticas('BancoDB')
+    assert datos['desalojos'] == 1 and datos['entradas'] == 3, datos
+    assert datos['entradas_modelo'] == 3, datos
+
+
+def test_vencimiento_por_ttl():
+    """Una entrada vencida se elimina al leerla; el TTL es por modelo"""
+    cache = CacheRepositorio(ttl_por_defecto=60)
+    cache.configurar_ttl('PrecioTituloDB', 0.05)
+    precio = CacheRepositorio.clave_id('PrecioTituloDB', 1)
+    banco = CacheRepositorio.clave_id('BancoDB', 1)
+    cache.guardar(precio, 10)
+    cache.guardar(banco, 'Banco 1')
+    assert cache.obtener(precio) == 10
+    
+    reloj.sleep(0.1)
+    assert cache.obtener(precio, 'ausente') == 'ausente'
+    assert cache.obtener(banco) == 'Banco 1'
+    datos = cache.estadisticas('PrecioTituloDB')
+    assert datos['expiradas'] == 1 and datos['entradas_modelo'] == 0, datos
+    assert datos['entradas'] == 1, datos
+
+
+def test_invalidar_por_id_y_por_modelo():
+    """
+    Por id: el registro y las consultas de su modelo; los demás registros
+    y los otros modelos quedan. Sin id: todo el modelo
+    """
+    cache = CacheRepositorio()
+    avisos = []
+    cache.suscribir(lambda modelo, id: avisos.append((modelo, id)))
+    
+    banco_1 = CacheRepositorio.clave_id('BancoDB', 1)
+    banco_2 = CacheRepositorio.clave_id('BancoDB', 2)
+    bancos = CacheRepositorio.clave_consulta('BancoDB', 'find_many')
+    activos = CacheRepositorio.clave_consulta('BancoDB', 'find_many', {'estatus': True})
+    titulo = CacheRepositorio.clave_id('TituloDB', 1)
+    titulos = CacheRepositorio.clave_consulta('TituloDB', 'find_many')
+    for clave in (banco_1, banco_2, bancos, activos, titulo, titulos):
+        cache.guardar(clave, clave)
+    
+    cache.invalidar('BancoDB', 1)
+    for clave in (banco_1, bancos, activos):
+        assert cache.obtener(clave, 'ausente') == 'ausente', clave
+    for clave in (banco_2, titulo, titulos):
+        assert cache.obtener(clave) == clave, clave
+    
+    cache.invalidar('BancoDB')
+    assert cache.obtener(banco_2, 'ausente') == 'ausente'
+    assert cache.obtener(titulo) == titulo and cache.obtener(titulos) == titulos
+    
+    assert avisos == [('BancoDB', 1), ('BancoDB', None)]
+    datos = cache.estadisticas('BancoDB')
+    assert datos['invalidaciones'] == 2 and datos['entradas_modelo'] == 0, datos
+    assert cache.estadisticas('TituloDB')['entradas_modelo'] == 2
+
+
+def test_estadisticas():
+    """hits, misses y ratio_hits cuentan cada lectura; None guardado es un hit"""
+    cache = CacheRepositorio(max_entradas=10)
+    assert cache.estadisticas()['ratio_hits'] == 0.0
+    
+    clave = CacheRepositorio.clave_consulta('BancoDB', 'find_one', {'rif': 'J-1'})
+    cache.guardar(clave, None)
+    assert cache.obtener(clave, 'ausente') is None
+    cache.obtener(clave)
+    cache.obtener(clave)
+    cache.obtener(CacheRepositorio.clave_id('BancoDB', 9))
+    
+    datos = cache.estadisticas('BancoDB')
+    assert (datos['hits'], datos['misses']) == (3, 1), datos
+    assert datos['ratio_hits'] == 0.75, datos
+    assert (datos['entradas'], datos['max_entradas'], datos['entradas_modelo']) == (1, 10, 1), datos
+    assert 'entradas_modelo' not in cache.estadisticas()
+    
+    # Las claves de consulta no dependen del orden de los filtros
+    assert (CacheRepositorio.clave_consulta('BancoDB', 'x', {'a': 1, 'b': [2]}) ==
+            CacheRepositorio.clave_consulta('BancoDB', 'x', {'b': [2], 'a': 1}))
+
+
+def test_invalidacion_con_savepoints():
+    """Solo el fin de la transacción externa invalida o descarta"""
+    db, fabrica, cache = crear_base()
+    try:
+        bancos = CacheRepositorio.clave_consulta('BancoDB', 'find_many')
+        titulos = CacheRepositorio.clave_consulta('TituloDB', 'find_many')
+        
+        with fabrica() as session:
+            cache.guardar(bancos, [])
+            with session.begin_nested():
+                session.add(banco(1))
+            # SAVEPOINT liberado, la transacción sigue abierta: otra conexión
+            # aún lee las filas anteriores, así que la entrada se conserva
+            assert cache.obtener(bancos, 'ausente') == []
+            session.commit()
+        assert cache.obtener(bancos, 'ausente') == 'ausente'
+        
+        # Un SAVEPOINT revertido no descarta lo anotado antes en la transacción
+        with fabrica() as session:
+            cache.guardar(bancos, [])
+            session.add(banco(2))
+            session.flush()
+            try:
+                with session.begin_nested():
+                    session.add(banco(2))   # rif, nombre y código repetidos
+            except IntegrityError:
+                pass
+            session.commit()
+        assert cache.obtener(bancos, 'ausente') == 'ausente'
+        
+        # Transacción externa revertida: nada que invalidar
+        with fabrica() as session:
+            cache.guardar(bancos, [])
+            cache.guardar(titulos, [])
+            with session.begin_nested():
+                session.add(banco(3))
+            session.add(TituloDB(rif="J-50000001-0", nombre="Titulo 1", ticker="T001", estatus=True))
+            session.flush()
+            session.rollback()
+        assert cache.obtener(bancos, 'ausente') == []
+        assert cache.obtener(titulos, 'ausente') == []
+        
+        # Y lo descartado no aparece en la transacción siguiente
+        with fabrica() as session:
+            session.add(TituloDB(rif="J-50000002-0", nombre="Titulo 2", ticker="T002", estatus=True))
+            session.commit()
+        assert cache.obtener(bancos, 'ausente') == []
+        assert cache.obtener(titulos, 'ausente') == 'ausente'
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Caché de repositorios")
+    print("=" * 60)
+    
+    test_desalojo_lru()
+    test_vencimiento_por_ttl()
+    test_invalidar_por_id_y_por_modelo()
+    test_estadisticas()
+    test_invalidacion_con_savepoints()
+    
+    print("\n" + "=" * 60)
+    print("✓ Desalojo, TTL, invalidación y métricas de la caché")
+    print("=" * 60)
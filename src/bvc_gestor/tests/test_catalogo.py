@@ -0,0 +1,137 @@
+# =============================================================================
+# TEST DEL CATÁLOGO EN MEMORIA
+# Archivo: src/bvc_gestor/tests/test_catalogo.py
+# =============================================================================
+#
+# CatalogoEnMemoria se carga una vez y se refresca con las invalidaciones
+# de la caché de repositorios. Aquí se verifica que una invalidación por id
+# relee solo ese registro (y lo quita si ya no existe), que el refresco del
+# modelo relee por fecha_actualizacion desde la última carga y que, si el
+# total de filas no cuadra (hubo borrados), recarga la tabla completa.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_catalogo.py
+#     python src/bvc_gestor/tests/test_catalogo.py
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import delete, update
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import BancoDB, TituloDB
+from src.bvc_gestor.repositories.base_repository import BaseRepository
+
+
+def crear_base(bancos: int = 3) -> DatabaseEngine:
+    """Base aislada con 'bancos' bancos y un título"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "catalogo.db")
+    db.asegurar_esquema()
+    with db.engine.begin() as conn:
+        conn.execute(BancoDB.__table__.insert(), [
+            {"rif": f"J-{n:08d}-0", "nombre": f"Banco {n}", "codigo": f"{n:04d}", "estatus": True}
+            for n in range(1, bancos + 1)
+        ])
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": "J-50000001-0", "nombre": "Titulo 1", "ticker": "T001", "estatus": True}
+        ])
+    return db
+
+
+def contadores(catalogo) -> tuple:
+    datos = catalogo.estadisticas()
+    return datos['recargas'], datos['refrescos']
+
+
+def test_refresco_por_id():
+    """Una escritura por el repositorio relee solo ese registro"""
+    db = crear_base()
+    try:
+        catalogo = db.get_catalogo()
+        catalogo.cargar()
+        assert contadores(catalogo) == (3, 0)
+        assert catalogo.banco_por_codigo(" 0002 ")['nombre'] == "Banco 2"
+        
+        # El commit invalida ('BancoDB', 2): queda pendiente hasta la próxima lectura
+        assert BaseRepository(db, BancoDB).update(2, {"nombre": "Banco Dos", "codigo": "0022"})
+        assert catalogo.estadisticas()['pendientes'] == ['bancos']
+        assert catalogo.banco(2)['nombre'] == "Banco Dos"
+        assert catalogo.banco_por_codigo("0022")['id'] == 2
+        assert catalogo.banco_por_codigo("0002") is None
+        assert catalogo.banco(1)['nombre'] == "Banco 1"
+        assert contadores(catalogo) == (3, 1)
+        
+        # Un id que ya no existe se quita de la tabla y de los índices
+        with db.engine.begin() as conn:
+            conn.execute(delete(BancoDB).where(BancoDB.id == 3))
+        db.get_cache_repositorios().invalidar('BancoDB', 3)
+        assert catalogo.banco(3) is None and catalogo.banco_por_rif("J-00000003-0") is None
+        assert [b['id'] for b in catalogo.bancos()] == [1, 2]
+        assert contadores(catalogo) == (3, 2)
+        
+        # Los otros catálogos no se tocan
+        assert catalogo.titulo_por_ticker("t001")['id'] == 1
+        assert catalogo.estadisticas()['pendientes'] == []
+    finally:
+        db.cerrar()
+
+
+def test_refresco_por_marca():
+    """refrescar() relee las filas modificadas desde la última carga"""
+    db = crear_base()
+    try:
+        catalogo = db.get_catalogo()
+        catalogo.cargar()
+        
+        # SQL directo: fecha_actualizacion sale de onupdate / server_default
+        with db.engine.begin() as conn:
+            conn.execute(update(BancoDB).where(BancoDB.id == 1).values(nombre="Banco Uno"))
+            conn.execute(BancoDB.__table__.insert(), [
+                {"rif": "J-00000004-0", "nombre": "Banco 4", "codigo": "0004", "estatus": True}
+            ])
+        catalogo.refrescar('bancos')
+        
+        assert catalogo.banco(1)['nombre'] == "Banco Uno"
+        assert catalogo.banco_por_codigo("0004")['nombre'] == "Banco 4"
+        assert catalogo.estadisticas()['bancos'] == 4
+        # El total cuadra: sin recarga completa
+        assert contadores(catalogo) == (3, 1)
+    finally:
+        db.cerrar()
+
+
+def test_recarga_si_cambia_el_total():
+    """Un borrado no aparece por la marca: el total distinto fuerza la recarga"""
+    db = crear_base()
+    try:
+        catalogo = db.get_catalogo()
+        catalogo.cargar()
+        
+        with db.engine.begin() as conn:
+            conn.execute(delete(BancoDB).where(BancoDB.id == 2))
+        catalogo.refrescar('bancos')
+        
+        assert catalogo.banco(2) is None and catalogo.banco_por_codigo("0002") is None
+        assert [b['id'] for b in catalogo.bancos()] == [1, 3]
+        assert contadores(catalogo) == (4, 1)
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Catálogo en memoria")
+    print("=" * 60)
+    
+    test_refresco_por_id()
+    test_refresco_por_marca()
+    test_recarga_si_cambia_el_total()
+    
+    print("\n" + "=" * 60)
+    print("✓ El catálogo se refresca por id, por marca y por total")
+    print("=" * 60)
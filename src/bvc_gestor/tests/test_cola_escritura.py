@@ -0,0 +1,188 @@
+# =============================================================================
+# TEST DE LA COLA DE ESCRITURA (COMMIT AGRUPADO)
+# Archivo: src/bvc_gestor/tests/test_cola_escritura.py
+# =============================================================================
+#
+# La cola aplica las mutaciones de varios llamadores en una transacción por
+# lote, cada una en su SAVEPOINT. Aquí se verifica que una operación que
+# falla no arrastra a las demás del lote, que un commit fallido llega a
+# todos los llamadores sin dejar nada escrito y que detener() procesa lo
+# que quedaba en la cola antes de terminar.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_cola_escritura.py
+#     python src/bvc_gestor/tests/test_cola_escritura.py
+
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.cola_escritura import ColaEscritura
+from src.bvc_gestor.database.models_sql import BancoDB, CuentaBancariaDB
+
+
+def crear_base() -> DatabaseEngine:
+    """Base aislada y vacía"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "cola.db")
+    db.asegurar_esquema()
+    return db
+
+
+def insertar_banco(session, n: int) -> int:
+    """Operación de la cola: un banco con rif, nombre y código derivados de n"""
+    banco = BancoDB(rif=f"J-{n:08d}-0", nombre=f"Banco {n}", codigo=f"{n:04d}", estatus=True)
+    session.add(banco)
+    session.flush()
+    return banco.id
+
+
+def insertar_y_fallar(session, n: int):
+    """Escribe y luego lanza: lo escrito debe revertirse con su SAVEPOINT"""
+    insertar_banco(session, n)
+    raise ValueError(f"operación {n} rechazada")
+
+
+def insertar_sin_banco(session):
+    """
+    Cuenta bancaria con claves foráneas inexistentes y la verificación
+    diferida al COMMIT: el fallo llega en el commit del lote, no en la
+    operación
+    """
+    session.connection().exec_driver_sql("PRAGMA defer_foreign_keys = ON")
+    session.add(CuentaBancariaDB(cliente_id=999, banco_id=999, numero_cuenta="0000", estatus=True))
+    session.flush()
+
+
+def codigos_guardados(db) -> set:
+    with db.engine.connect() as conn:
+        return set(conn.execute(select(BancoDB.codigo)).scalars())
+
+
+def test_operacion_fallida_no_afecta_al_lote():
+    """Cada operación corre en su SAVEPOINT: solo se revierte la que falla"""
+    db = crear_base()
+    try:
+        cola = ColaEscritura(db)
+        resultados = cola.aplicar([
+            (insertar_banco, (1,), {}),
+            (insertar_y_fallar, (2,), {}),
+            (insertar_banco, (1,), {}),   # rif/nombre/código repetidos: UNIQUE
+            (insertar_banco, (3,), {}),
+        ])
+        
+        exitos = [exito for exito, _ in resultados]
+        assert exitos == [True, False, False, True], resultados
+        assert isinstance(resultados[1][1], ValueError)
+        assert isinstance(resultados[2][1], IntegrityError)
+        assert codigos_guardados(db) == {"0001", "0003"}
+        assert cola.estadisticas()['fallidas'] == 2
+    finally:
+        db.cerrar()
+
+
+def test_fallo_del_commit_llega_a_todos():
+    """Si falla el commit del lote, todas las operaciones reciben el error y nada queda escrito"""
+    db = crear_base()
+    try:
+        cola = ColaEscritura(db)
+        resultados = cola.aplicar([
+            (insertar_banco, (1,), {}),
+            (insertar_sin_banco, (), {}),
+            (insertar_banco, (2,), {}),
+        ])
+        
+        assert all(not exito for exito, _ in resultados), resultados
+        assert all(isinstance(error, IntegrityError) for _, error in resultados)
+        assert codigos_guardados(db) == set()
+        assert cola.estadisticas()['lotes'] == 0
+        
+        # La cola sigue funcionando después del lote fallido
+        assert cola.ejecutar(insertar_banco, 4, timeout=10) is not None
+        assert codigos_guardados(db) == {"0004"}
+        cola.detener()
+    finally:
+        db.cerrar()
+
+
+def test_error_de_una_operacion_llega_a_su_llamador():
+    """Con el hilo de la cola, ejecutar() propaga la excepción de esa operación"""
+    db = crear_base()
+    try:
+        cola = ColaEscritura(db)
+        try:
+            cola.ejecutar(insertar_y_fallar, 1, timeout=10)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Se esperaba ValueError de la operación")
+        assert cola.ejecutar(insertar_banco, 2, timeout=10) is not None
+        assert codigos_guardados(db) == {"0002"}
+        cola.detener()
+    finally:
+        db.cerrar()
+
+
+def test_detener_procesa_lo_pendiente():
+    """detener() aplica todo lo encolado antes de terminar y rechaza lo nuevo"""
+    db = crear_base()
+    try:
+        # Ventana larga: las operaciones siguen en la cola al llamar detener()
+        cola = ColaEscritura(db, ventana=0.5, max_lote=10)
+        futuros = []
+        lock = threading.Lock()
+        
+        def enviar(inicio):
+            for n in range(inicio, inicio + 10):
+                futuro = cola.enviar(insertar_banco, n)
+                with lock:
+                    futuros.append(futuro)
+        
+        hilos = [threading.Thread(target=enviar, args=(inicio,)) for inicio in range(1, 41, 10)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        
+        cola.detener(timeout=30)
+        
+        assert len(futuros) == 40
+        assert all(futuro.done() for futuro in futuros), "detener() dejó operaciones sin procesar"
+        assert all(futuro.exception() is None for futuro in futuros)
+        assert codigos_guardados(db) == {f"{n:04d}" for n in range(1, 41)}
+        
+        estadisticas = cola.estadisticas()
+        assert estadisticas['operaciones'] == 40
+        assert estadisticas['lotes'] < 40, "las operaciones no se agruparon"
+        
+        try:
+            cola.enviar(insertar_banco, 99)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("La cola detenida aceptó una operación")
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Cola de escritura")
+    print("=" * 60)
+    
+    test_operacion_fallida_no_afecta_al_lote()
+    test_fallo_del_commit_llega_a_todos()
+    test_error_de_una_operacion_llega_a_su_llamador()
+    test_detener_procesa_lo_pendiente()
+    
+    print("\n" + "=" * 60)
+    print("✓ La cola aísla fallos, propaga errores de commit y se vacía al detenerse")
+    print("=" * 60)
\ No newline at end of file
@@ -0,0 +1,163 @@
+# =============================================================================
+# TEST DE LOS CONTADORES DE ÓRDENES POR CLIENTE Y ESTADO
+# Archivo: src/bvc_gestor/tests/test_contador_ordenes.py
+# =============================================================================
+#
+# Los triggers de ordenes mantienen contador_ordenes, que es lo que lee
+# get_estadisticas_ordenes() por defecto. Aquí se verifica que, después de
+# crear órdenes, cambiarlas de estado, corregir su monto o su cliente y
+# borrarlas, las estadísticas desde los contadores son las mismas que
+# contando sobre ordenes, y que verificar_contadores_ordenes() encuentra y
+# corrige un descuadre.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_contador_ordenes.py
+#     python src/bvc_gestor/tests/test_contador_ordenes.py
+
+import sys
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import delete, text, update
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import (
+    CasaBolsaDB, ClienteDB, CuentaBursatilDB, TituloDB, OrdenDB
+)
+from src.bvc_gestor.repositories.orden_repository import OrdenRepository
+from src.bvc_gestor.utils.constants import EstadoOrden
+
+
+def crear_base() -> DatabaseEngine:
+    """Base aislada con dos clientes (una cuenta cada uno) y un título"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "contadores.db")
+    db.asegurar_esquema()
+    
+    with db.engine.begin() as conn:
+        conn.execute(CasaBolsaDB.__table__.insert(), [
+            {"rif": "J-30000000-0", "nombre": "Casa Test", "tipo": "Casa de Bolsa", "estatus": True}
+        ])
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": "J-50000001-0", "nombre": "Titulo 1", "ticker": "T001", "estatus": True}
+        ])
+        conn.execute(ClienteDB.__table__.insert(), [
+            {"nombre_completo": f"Cliente {i}", "tipo_inversor": "NATURAL", "rif_cedula": f"V-0000000{i}",
+             "telefono": "0414-0000000", "email": f"cliente{i}@mail.com", "direccion_fiscal": "N/A",
+             "ciudad_estado": "Caracas", "estatus": True}
+            for i in (1, 2)
+        ])
+        conn.execute(CuentaBursatilDB.__table__.insert(), [
+            {"cliente_id": i, "casa_bolsa_id": 1, "cuenta": f"CB-00000{i}", "default": True, "estatus": True}
+            for i in (1, 2)
+        ])
+    
+    return db
+
+
+def insertar_ordenes(conn, ordenes):
+    """ordenes: (cliente, estado, monto_total_estimado)"""
+    conn.execute(OrdenDB.__table__.insert(), [
+        {"cliente_id": cliente, "cuenta_id": cliente, "titulo_id": 1, "tipo": "COMPRA",
+         "cantidad_total": 10, "precio_limite": Decimal(10), "estado": estado,
+         "fecha_vencimiento": date.today(), "monto_total_estimado": monto, "estatus": True}
+        for cliente, estado, monto in ordenes
+    ])
+
+
+def verificar(repo: OrdenRepository) -> dict:
+    """Estadísticas desde los contadores, que deben ser las de contar sobre ordenes"""
+    resultado = {}
+    for cliente in (None, 1, 2):
+        contadores = repo.get_estadisticas_ordenes(cliente)
+        conteo = repo.get_estadisticas_ordenes(cliente, usar_contadores=False)
+        assert contadores == conteo, f"cliente {cliente}: {contadores} != {conteo}"
+        resultado[cliente] = contadores
+    assert repo.verificar_contadores_ordenes() == []
+    return resultado
+
+
+def test_contadores_igual_al_conteo():
+    """Altas, transiciones de estado, correcciones y bajas mantienen los contadores"""
+    db = crear_base()
+    try:
+        repo = OrdenRepository(db)
+        with db.engine.begin() as conn:
+            insertar_ordenes(conn, [
+                (1, "PENDIENTE", Decimal("100.50")), (1, "PENDIENTE", Decimal(200)),
+                (1, "ESPERANDO_FONDOS", Decimal(50)), (1, "BORRADOR", None),
+                (2, "PENDIENTE", Decimal(300)), (2, "CANCELADA", Decimal(10)),
+            ])
+        stats = verificar(repo)
+        assert stats[1]['total'] == 4 and stats[1]['pendientes'] == 2, stats[1]
+        assert stats[1]['monto_activo'] == 350.5, stats[1]
+        assert stats[None]['monto_activo'] == 650.5 and stats[None]['canceladas'] == 1, stats[None]
+        
+        # Ejecución por el repositorio (ORM) y cancelación por SQL directo
+        assert repo.cambiar_estado_orden(1, EstadoOrden.EJECUTADA)
+        with db.engine.begin() as conn:
+            conn.execute(update(OrdenDB).where(OrdenDB.id == 5).values(estado="CANCELADA"))
+        stats = verificar(repo)
+        assert (stats[1]['ejecutadas'], stats[1]['monto_activo']) == (1, 250.0), stats[1]
+        assert (stats[2]['canceladas'], stats[2]['monto_activo']) == (2, 0.0), stats[2]
+        
+        # Corrección de monto y de cliente; un cambio sin efecto en los contadores
+        with db.engine.begin() as conn:
+            conn.execute(update(OrdenDB).where(OrdenDB.id == 2).values(monto_total_estimado=Decimal(250)))
+            conn.execute(update(OrdenDB).where(OrdenDB.id == 3).values(cliente_id=2, cuenta_id=2))
+            conn.execute(update(OrdenDB).where(OrdenDB.id == 4).values(observaciones="sin cambio"))
+        stats = verificar(repo)
+        assert (stats[1]['monto_activo'], stats[2]['esperando_fondos']) == (250.0, 1), stats
+        
+        with db.engine.begin() as conn:
+            conn.execute(delete(OrdenDB).where(OrdenDB.id.in_([2, 6])))
+        stats = verificar(repo)
+        assert (stats[1]['total'], stats[2]['total']) == (2, 2), stats
+        assert stats[None]['monto_activo'] == 50.0, stats[None]
+    finally:
+        db.cerrar()
+
+
+def test_verificar_y_corregir_descuadre():
+    """Un contador escrito a mano se detecta y se reconstruye desde ordenes"""
+    db = crear_base()
+    try:
+        repo = OrdenRepository(db)
+        with db.engine.begin() as conn:
+            insertar_ordenes(conn, [(1, "PENDIENTE", Decimal(100)), (2, "PENDIENTE", Decimal(40))])
+            conn.execute(text(
+                "UPDATE contador_ordenes SET cantidad = 5 WHERE cliente_id = 2"
+            ))
+            conn.execute(text(
+                "INSERT INTO contador_ordenes (cliente_id, estado, cantidad, monto) "
+                "VALUES (1, 'CANCELADA', 1, 0)"
+            ))
+        
+        descuadres = repo.verificar_contadores_ordenes()
+        assert sorted((d['cliente_id'], d['estado'], d['cantidad'], d['cantidad_real'])
+                      for d in descuadres) == [(1, 'CANCELADA', 1, 0), (2, 'PENDIENTE', 5, 1)]
+        assert repo.get_estadisticas_ordenes(2)['pendientes'] == 5
+        
+        assert len(repo.verificar_contadores_ordenes(corregir=True)) == 2
+        stats = verificar(repo)
+        assert stats[2]['pendientes'] == 1 and stats[1]['canceladas'] == 0, stats
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Contadores de órdenes")
+    print("=" * 60)
+    
+    test_contadores_igual_al_conteo()
+    test_verificar_y_corregir_descuadre()
+    
+    print("\n" + "=" * 60)
+    print("✓ Los contadores coinciden con el conteo sobre ordenes")
+    print("=" * 60)
@@ -0,0 +1,167 @@
+# =============================================================================
+# TEST DE LA EJECUCIÓN ACUMULADA POR ORDEN
+# Archivo: src/bvc_gestor/tests/test_ejecucion_ordenes.py
+# =============================================================================
+#
+# Los triggers de transacciones mantienen ordenes.cantidad_ejecutada y
+# ordenes.monto_ejecutado. Aquí se verifica que, después de insertar,
+# corregir, mover y borrar transacciones, los acumulados coinciden con los
+# de RECALCULAR_EJECUCION_ORDENES (la suma desde transacciones), y que
+# verificar_ejecucion_ordenes() encuentra y corrige un descuadre.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_ejecucion_ordenes.py
+#     python src/bvc_gestor/tests/test_ejecucion_ordenes.py
+
+import sys
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import delete, select, text, update
+
+from src.bvc_gestor.database.ddl_soporte import RECALCULAR_EJECUCION_ORDENES
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import (
+    CasaBolsaDB, ClienteDB, CuentaBursatilDB, TituloDB, OrdenDB, TransaccionDB
+)
+from src.bvc_gestor.repositories.orden_repository import OrdenRepository
+
+
+def crear_base(ordenes: int = 3) -> DatabaseEngine:
+    """Base aislada con un cliente, una cuenta, un título y 'ordenes' órdenes"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "ejecucion.db")
+    db.asegurar_esquema()
+    
+    with db.engine.begin() as conn:
+        conn.execute(CasaBolsaDB.__table__.insert(), [
+            {"rif": "J-30000000-0", "nombre": "Casa Test", "tipo": "Casa de Bolsa", "estatus": True}
+        ])
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": "J-50000001-0", "nombre": "Titulo 1", "ticker": "T001", "estatus": True}
+        ])
+        conn.execute(ClienteDB.__table__.insert(), [
+            {"nombre_completo": "Cliente 1", "tipo_inversor": "NATURAL", "rif_cedula": "V-00000001",
+             "telefono": "0414-0000000", "email": "cliente1@mail.com", "direccion_fiscal": "N/A",
+             "ciudad_estado": "Caracas", "estatus": True}
+        ])
+        conn.execute(CuentaBursatilDB.__table__.insert(), [
+            {"cliente_id": 1, "casa_bolsa_id": 1, "cuenta": "CB-000001", "default": True, "estatus": True}
+        ])
+        conn.execute(OrdenDB.__table__.insert(), [
+            {"cliente_id": 1, "cuenta_id": 1, "titulo_id": 1, "tipo": "COMPRA",
+             "cantidad_total": 100, "precio_limite": Decimal(10), "estado": "PENDIENTE",
+             "fecha_vencimiento": date.today(), "monto_total_estimado": Decimal(1000), "estatus": True}
+            for _ in range(ordenes)
+        ])
+    
+    return db
+
+
+def transaccion(orden_id: int, n: int, cantidad: int, precio: str) -> dict:
+    return {"orden_id": orden_id, "numero_operacion_bvc": f"BVC-{n}",
+            "cantidad_ejecutada": cantidad, "precio_ejecucion": Decimal(precio),
+            "monto_bruto": cantidad * Decimal(precio), "monto_neto": cantidad * Decimal(precio),
+            "tasa_bcv": Decimal(1), "estatus": True}
+
+
+def acumulados(conn) -> dict:
+    """orden_id -> (cantidad_ejecutada, monto_ejecutado)"""
+    return {
+        id: (cantidad, round(float(monto), 6))
+        for id, cantidad, monto in conn.execute(
+            select(OrdenDB.id, OrdenDB.cantidad_ejecutada, OrdenDB.monto_ejecutado)
+        )
+    }
+
+
+def recalculados(db) -> dict:
+    """Los acumulados que deja RECALCULAR_EJECUCION_ORDENES (sin confirmarlos)"""
+    with db.engine.connect() as conn:
+        conn.execute(text(RECALCULAR_EJECUCION_ORDENES.format(filtro="1 = 1")))
+        valores = acumulados(conn)
+        conn.rollback()
+    return valores
+
+
+def verificar(db) -> dict:
+    """Los acumulados de los triggers, que deben ser los recalculados"""
+    with db.engine.connect() as conn:
+        valores = acumulados(conn)
+    assert valores == recalculados(db), f"{valores} != {recalculados(db)}"
+    return valores
+
+
+def test_triggers_igual_al_recalculo():
+    """Insertar, corregir, mover y borrar transacciones deja los acumulados exactos"""
+    db = crear_base()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(TransaccionDB.__table__.insert(), [
+                transaccion(1, 1, 30, "10.5"), transaccion(1, 2, 20, "10.25"),
+                transaccion(2, 3, 100, "9.75"),
+            ])
+        assert verificar(db) == {1: (50, 520.0), 2: (100, 975.0), 3: (0, 0.0)}
+        
+        # Corrección de cantidad y monto
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(TransaccionDB).where(TransaccionDB.id == 2)
+                .values(cantidad_ejecutada=25, monto_bruto=Decimal("256.25"))
+            )
+        assert verificar(db)[1] == (55, 571.25)
+        
+        # Transacción registrada en la orden equivocada
+        with db.engine.begin() as conn:
+            conn.execute(update(TransaccionDB).where(TransaccionDB.id == 3).values(orden_id=3))
+        valores = verificar(db)
+        assert valores[2] == (0, 0.0) and valores[3] == (100, 975.0), valores
+        
+        # Un cambio en columnas que no suman no mueve los acumulados
+        with db.engine.begin() as conn:
+            conn.execute(update(TransaccionDB).where(TransaccionDB.id == 1).values(comision_bvc=Decimal(3)))
+        assert verificar(db) == valores
+        
+        with db.engine.begin() as conn:
+            conn.execute(delete(TransaccionDB).where(TransaccionDB.id.in_([1, 3])))
+        assert verificar(db) == {1: (25, 256.25), 2: (0, 0.0), 3: (0, 0.0)}
+        assert OrdenRepository(db).verificar_ejecucion_ordenes() == []
+    finally:
+        db.cerrar()
+
+
+def test_verificar_y_corregir_descuadre():
+    """Un acumulado escrito a mano se detecta y se recalcula desde transacciones"""
+    db = crear_base(2)
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(TransaccionDB.__table__.insert(), [transaccion(1, 1, 40, "10")])
+            conn.execute(update(OrdenDB).where(OrdenDB.id == 2).values(cantidad_ejecutada=7))
+        
+        repo = OrdenRepository(db)
+        descuadres = repo.verificar_ejecucion_ordenes()
+        assert [(d['id'], d['cantidad_ejecutada'], d['cantidad_real']) for d in descuadres] == [(2, 7, 0)]
+        
+        assert len(repo.verificar_ejecucion_ordenes(corregir=True)) == 1
+        assert repo.verificar_ejecucion_ordenes() == []
+        assert verificar(db) == {1: (40, 400.0), 2: (0, 0.0)}
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Ejecución acumulada por orden")
+    print("=" * 60)
+    
+    test_triggers_igual_al_recalculo()
+    test_verificar_y_corregir_descuadre()
+    
+    print("\n" + "=" * 60)
+    print("✓ Los triggers coinciden con el recálculo desde transacciones")
+    print("=" * 60)
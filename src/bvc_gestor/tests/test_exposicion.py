@@ -0,0 +1,227 @@
+# =============================================================================
+# TEST DE LA EXPOSICIÓN DE LA FIRMA
+# Archivo: src/bvc_gestor/tests/test_exposicion.py
+# =============================================================================
+#
+# ExposicionService valora todas las posiciones abiertas en una pasada y
+# agrega por título, sector, casa de bolsa y tipo de inversor. Aquí se
+# verifica cada grupo contra la suma Decimal fila por fila, los conteos de
+# cuentas y de posiciones sin precio, la firma sin posiciones y que el
+# resultado guardado se descarta con los cambios de precios o posiciones
+# (y no con los de otros modelos).
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_exposicion.py
+#     python src/bvc_gestor/tests/test_exposicion.py
+
+import math
+import sys
+import tempfile
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import (
+    BancoDB, CasaBolsaDB, ClienteDB, CuentaBursatilDB, TituloDB, PrecioTituloDB, PortafolioItemDB
+)
+from src.bvc_gestor.repositories.base_repository import BaseRepository
+from src.bvc_gestor.services.exposicion_service import DIMENSIONES, SIN_SECTOR
+
+# id -> (ticker, sector)
+TITULOS = {1: ("T001", "Financiero"), 2: ("T002", "Energía"), 3: ("T003", None)}
+
+# cuenta -> (cliente, casa de bolsa); cliente -> tipo de inversor
+CUENTAS = {1: (1, 1), 2: (1, 2), 3: (2, 1)}
+CLIENTES = {1: "NATURAL", 2: "JURIDICA"}
+CASAS = {1: "Casa Uno", 2: "Casa Dos"}
+
+PRECIOS = {1: "12.37", 2: "18.91"}   # el título 3 no tiene precio
+
+# cuenta, título, cantidad, costo promedio
+POSICIONES = [
+    (1, 1, 100, "10.15"), (1, 2, 50, "20.333"),
+    (2, 1, 30, "11.07"), (2, 3, 40, "5.5"),
+    (3, 2, 70, "19.99"), (3, 3, 10, "6"),
+    (3, 1, 0, "10"),     # cerrada: no es exposición
+]
+
+
+def cercano(a, b) -> bool:
+    return math.isclose(float(a), float(b), rel_tol=1e-12, abs_tol=1e-9)
+
+
+def crear_base(posiciones=POSICIONES) -> DatabaseEngine:
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "exposicion.db")
+    db.asegurar_esquema()
+    
+    with db.engine.begin() as conn:
+        conn.execute(CasaBolsaDB.__table__.insert(), [
+            {"rif": f"J-3000000{id}-0", "nombre": nombre, "tipo": "Casa de Bolsa", "estatus": True}
+            for id, nombre in CASAS.items()
+        ])
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": f"J-5000000{id}-0", "nombre": f"Titulo {id}", "ticker": ticker,
+             "sector": sector, "estatus": True}
+            for id, (ticker, sector) in TITULOS.items()
+        ])
+        conn.execute(ClienteDB.__table__.insert(), [
+            {"nombre_completo": f"Cliente {id}", "tipo_inversor": tipo, "rif_cedula": f"V-0000000{id}",
+             "telefono": "0414-0000000", "email": f"cliente{id}@mail.com", "direccion_fiscal": "N/A",
+             "ciudad_estado": "Caracas", "estatus": True}
+            for id, tipo in CLIENTES.items()
+        ])
+        conn.execute(CuentaBursatilDB.__table__.insert(), [
+            {"cliente_id": cliente, "casa_bolsa_id": casa, "cuenta": f"CB-00000{id}",
+             "default": id == 1, "estatus": True}
+            for id, (cliente, casa) in CUENTAS.items()
+        ])
+        conn.execute(PrecioTituloDB.__table__.insert(), [
+            {"titulo_id": id, "precio": Decimal(precio), "tipo": "ACTUAL", "fuente": "TEST", "estatus": True}
+            for id, precio in PRECIOS.items()
+        ])
+        if posiciones:
+            conn.execute(PortafolioItemDB.__table__.insert(), [
+                {"cuenta_id": cuenta, "titulo_id": titulo, "cantidad": cantidad,
+                 "costo_promedio": Decimal(costo), "estatus": True}
+                for cuenta, titulo, cantidad, costo in posiciones
+            ])
+    
+    return db
+
+
+def esperado(dimension: str) -> dict:
+    """Grupos de una dimensión sumados fila por fila con Decimal"""
+    grupos = defaultdict(lambda: {'valor': Decimal(0), 'costo': Decimal(0), 'con_precio': 0,
+                                  'sin_precio': 0, 'cuentas': set()})
+    for cuenta, titulo, cantidad, costo in POSICIONES:
+        if cantidad <= 0:
+            continue
+        cliente, casa = CUENTAS[cuenta]
+        clave = {
+            'ticker': TITULOS[titulo][0],
+            'sector': TITULOS[titulo][1] or SIN_SECTOR,
+            'casa_bolsa': CASAS[casa],
+            'tipo_inversor': CLIENTES[cliente].capitalize(),
+        }[dimension]
+        grupo = grupos[clave]
+        grupo['cuentas'].add(cuenta)
+        if titulo not in PRECIOS:
+            grupo['sin_precio'] += 1
+            continue
+        grupo['con_precio'] += 1
+        grupo['valor'] += cantidad * Decimal(PRECIOS[titulo])
+        grupo['costo'] += cantidad * Decimal(costo)
+    return grupos
+
+
+def test_grupos_igual_a_suma_decimal():
+    """Cada grupo de cada dimensión suma lo mismo que fila por fila"""
+    db = crear_base()
+    try:
+        resultado = db.get_exposicion().exposicion()
+        assert resultado['posiciones'] == 6
+        assert resultado['totales']['sin_precio'] == 2
+        
+        valor_total = sum(g['valor'] for g in esperado('ticker').values())
+        assert cercano(resultado['totales']['valor_mercado_total'], valor_total)
+        
+        for dimension in DIMENSIONES:
+            grupos = resultado[f'por_{dimension}']
+            esperados = esperado(dimension)
+            assert sorted(g[dimension] for g in grupos) == sorted(esperados), (dimension, grupos)
+            
+            for grupo in grupos:
+                datos = esperados[grupo[dimension]]
+                assert cercano(grupo['valor_mercado_total'], datos['valor']), (dimension, grupo)
+                assert cercano(grupo['inversion_total'], datos['costo']), (dimension, grupo)
+                assert cercano(grupo['ganancia_perdida_total'], datos['valor'] - datos['costo'])
+                assert grupo['total_posiciones'] == datos['con_precio'], (dimension, grupo)
+                assert grupo['sin_precio'] == datos['sin_precio'], (dimension, grupo)
+                assert grupo['cuentas'] == len(datos['cuentas']), (dimension, grupo)
+                assert cercano(grupo['peso_pct'], datos['valor'] / valor_total * 100)
+            
+            valores = [g['valor_mercado_total'] for g in grupos]
+            assert valores == sorted(valores, reverse=True), (dimension, valores)
+            assert cercano(sum(g['peso_pct'] for g in grupos), 100)
+        
+        # Un grupo sin ninguna posición con precio sale en cero
+        sin_precio = db.get_exposicion().exposicion_ticker(" t003 ")
+        assert sin_precio['valor_mercado_total'] == 0 and sin_precio['sin_precio'] == 2, sin_precio
+        assert sin_precio['nombre'] == "Titulo 3" and sin_precio['cuentas'] == 2
+    finally:
+        db.cerrar()
+
+
+def test_firma_sin_posiciones():
+    """Sin posiciones abiertas: totales en cero, grupos vacíos y nada guardado"""
+    db = crear_base(posiciones=[(1, 1, 0, "10")])
+    try:
+        servicio = db.get_exposicion()
+        resultado = servicio.exposicion()
+        assert resultado['posiciones'] == 0
+        assert resultado['totales']['valor_mercado_total'] == 0 and resultado['totales']['sin_precio'] == 0
+        for dimension in DIMENSIONES:
+            assert resultado[f'por_{dimension}'] == []
+        assert servicio.estadisticas() == {'calculos': 1, 'vigente': False}
+        
+        # Cada lectura recalcula
+        assert servicio.exposicion_ticker("T001") is None
+        assert servicio.estadisticas()['calculos'] == 2
+    finally:
+        db.cerrar()
+
+
+def test_resultado_descartado_por_invalidacion():
+    """Un precio o una posición nuevos descartan el resultado; otros modelos no"""
+    db = crear_base()
+    try:
+        servicio = db.get_exposicion()
+        primero = servicio.exposicion()
+        assert servicio.exposicion() is primero
+        assert servicio.estadisticas() == {'calculos': 1, 'vigente': True}
+        
+        # Otro modelo: el resultado sigue vigente
+        assert BaseRepository(db, BancoDB).create({"rif": "J-00000001-0", "nombre": "Banco 1", "codigo": "0001"})
+        assert servicio.exposicion() is primero
+        
+        # Precio nuevo del título 3 (PrecioTituloDB)
+        assert BaseRepository(db, PrecioTituloDB).bulk_create([
+            {"titulo_id": 3, "precio": Decimal("7.25"), "tipo": "ACTUAL", "fuente": "TEST"}
+        ]) == 1
+        segundo = servicio.exposicion()
+        assert servicio.estadisticas()['calculos'] == 2
+        assert segundo['totales']['sin_precio'] == 0
+        assert cercano(servicio.exposicion_ticker("T003")['valor_mercado_total'], 50 * Decimal("7.25"))
+        
+        # Posición modificada (PortafolioItemDB)
+        repo = BaseRepository(db, PortafolioItemDB)
+        fila = repo.find_one(cuenta_id=1, titulo_id=1)
+        assert repo.update(fila['id'], {"cantidad": 200})
+        tercero = servicio.exposicion()
+        assert servicio.estadisticas()['calculos'] == 3
+        assert cercano(
+            tercero['totales']['valor_mercado_total'] - segundo['totales']['valor_mercado_total'],
+            100 * Decimal(PRECIOS[1])
+        )
+        assert servicio.exposicion() is tercero
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Exposición de la firma")
+    print("=" * 60)
+    
+    test_grupos_igual_a_suma_decimal()
+    test_firma_sin_posiciones()
+    test_resultado_descartado_por_invalidacion()
+    
+    print("\n" + "=" * 60)
+    print("✓ Los grupos cuadran con la suma exacta y el resultado se invalida")
+    print("=" * 60)
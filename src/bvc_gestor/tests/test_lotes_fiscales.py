@@ -0,0 +1,367 @@
+# =============================================================================
+# TEST DEL LIBRO DE LOTES FISCALES
+# Archivo: src/bvc_gestor/tests/test_lotes_fiscales.py
+# =============================================================================
+#
+# Las ventas consumen lotes por FIFO o al costo promedio. Aquí se verifican
+# ambos métodos sobre un caso calculado a mano, que el registro dentro de la
+# transacción de la ejecución no toca un libro aún no construido (la
+# posición de apertura sale del portafolio, que se actualiza después) y que
+# una ejecución importada con fecha anterior a otras ya aplicadas deja el
+# libro igual que reconstruirlo. También que el año fiscal se corta en la
+# medianoche local aunque las fechas de venta estén en UTC.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_lotes_fiscales.py
+#     python src/bvc_gestor/tests/test_lotes_fiscales.py
+
+import os
+import sys
+import tempfile
+import time as reloj
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import select, update
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import (
+    CasaBolsaDB, ClienteDB, CuentaBursatilDB, TituloDB, OrdenDB, TransaccionDB,
+    PortafolioItemDB, LoteFiscalDB, GananciaRealizadaDB
+)
+from src.bvc_gestor.services.lotes_fiscales_service import LotesFiscalesService
+from src.bvc_gestor.utils.constants import MetodoCosto
+
+HOY = date.today()
+
+
+def momento(dias: int) -> datetime:
+    return datetime.combine(HOY + timedelta(days=dias), time(10))
+
+
+def crear_base(posiciones) -> DatabaseEngine:
+    """
+    Base aislada con dos cuentas y dos títulos; 'posiciones' son las filas
+    del portafolio como (cuenta, título, cantidad, costo_promedio)
+    """
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "lotes.db")
+    db.asegurar_esquema()
+    
+    with db.engine.begin() as conn:
+        conn.execute(CasaBolsaDB.__table__.insert(), [
+            {"rif": "J-30000000-0", "nombre": "Casa Test", "tipo": "Casa de Bolsa", "estatus": True}
+        ])
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": f"J-5000000{i}-0", "nombre": f"Titulo {i}", "ticker": f"T00{i}", "estatus": True}
+            for i in (1, 2)
+        ])
+        conn.execute(ClienteDB.__table__.insert(), [
+            {"nombre_completo": "Cliente 1", "tipo_inversor": "NATURAL", "rif_cedula": "V-00000001",
+             "telefono": "0414-0000000", "email": "cliente1@mail.com", "direccion_fiscal": "N/A",
+             "ciudad_estado": "Caracas", "estatus": True}
+        ])
+        conn.execute(CuentaBursatilDB.__table__.insert(), [
+            {"cliente_id": 1, "casa_bolsa_id": 1, "cuenta": f"CB-00000{i}", "default": i == 1, "estatus": True}
+            for i in (1, 2)
+        ])
+        for cuenta, titulo, cantidad, costo in posiciones:
+            fijar_posicion(conn, cuenta, titulo, cantidad, costo, insertar=True)
+    
+    return db
+
+
+def fijar_posicion(conn, cuenta, titulo, cantidad, costo, insertar=False):
+    """Fila del portafolio como la deja OperacionesService después de ejecutar"""
+    if insertar:
+        conn.execute(PortafolioItemDB.__table__.insert(), [
+            {"cuenta_id": cuenta, "titulo_id": titulo, "cantidad": cantidad,
+             "costo_promedio": Decimal(costo), "estatus": True}
+        ])
+    else:
+        conn.execute(
+            update(PortafolioItemDB)
+            .where(PortafolioItemDB.cuenta_id == cuenta, PortafolioItemDB.titulo_id == titulo)
+            .values(cantidad=cantidad, costo_promedio=Decimal(costo))
+        )
+
+
+def registrar_ejecucion(conn, cuenta, titulo, tipo, cantidad, precio, dia, fecha=None) -> int:
+    """
+    Orden ejecutada y su transacción; retorna el id de la transacción.
+    'fecha' (UTC, como la estampa la base) reemplaza al día relativo
+    """
+    monto = Decimal(cantidad) * Decimal(precio)
+    orden_id = conn.execute(OrdenDB.__table__.insert(), [
+        {"cliente_id": 1, "cuenta_id": cuenta, "titulo_id": titulo, "tipo": tipo,
+         "cantidad_total": cantidad, "precio_limite": Decimal(precio), "estado": "EJECUTADA",
+         "fecha_vencimiento": HOY, "monto_total_estimado": monto, "estatus": True}
+    ]).inserted_primary_key[0]
+    return conn.execute(TransaccionDB.__table__.insert(), [
+        {"orden_id": orden_id, "numero_operacion_bvc": f"BVC-{orden_id}",
+         "cantidad_ejecutada": cantidad, "precio_ejecucion": Decimal(precio),
+         "monto_bruto": monto, "monto_neto": monto, "tasa_bcv": Decimal(1),
+         "estatus": True, "fecha_registro": fecha or momento(dia)}
+    ]).inserted_primary_key[0]
+
+
+def libro(db) -> tuple:
+    """
+    Lotes y ganancias sin sus ids (cada ganancia identifica su lote por la
+    fecha de compra), con montos redondeados
+    """
+    def valor(x):
+        return round(float(x), 6) if isinstance(x, (float, Decimal)) else x
+    
+    def orden(fila):
+        # Los lotes de apertura no tienen transacción
+        return [(x is not None, x) for x in fila]
+    
+    with db.engine.connect() as conn:
+        lotes = sorted(
+            (tuple(valor(x) for x in fila) for fila in conn.execute(select(
+                LoteFiscalDB.cuenta_id, LoteFiscalDB.titulo_id, LoteFiscalDB.transaccion_id,
+                LoteFiscalDB.fecha_compra, LoteFiscalDB.cantidad_original,
+                LoteFiscalDB.cantidad_restante, LoteFiscalDB.costo_unitario
+            ))),
+            key=orden
+        )
+        ganancias = sorted(
+            (tuple(valor(x) for x in fila) for fila in conn.execute(select(
+                GananciaRealizadaDB.transaccion_id, GananciaRealizadaDB.cuenta_id,
+                GananciaRealizadaDB.titulo_id, GananciaRealizadaDB.fecha_compra,
+                GananciaRealizadaDB.cantidad, GananciaRealizadaDB.monto_venta,
+                GananciaRealizadaDB.costo_base, GananciaRealizadaDB.ganancia_perdida
+            ))),
+            key=orden
+        )
+    return lotes, ganancias
+
+
+def registrar_con_hook(db, servicio, transaccion_id) -> dict:
+    """Como OperacionesService: en la transacción que registra la ejecución"""
+    with db.get_write_session() as session:
+        resumen = servicio.registrar_ejecuciones_tx(session, [transaccion_id])
+        session.commit()
+    return resumen
+
+
+def caso_a_mano(metodo: MetodoCosto):
+    """Compra 10 a 10, compra 10 a 20 y vende 15 a 30"""
+    db = crear_base([(1, 1, 5, Decimal(20))])
+    with db.engine.begin() as conn:
+        compra_1 = registrar_ejecucion(conn, 1, 1, "COMPRA", 10, 10, -10)
+        compra_2 = registrar_ejecucion(conn, 1, 1, "COMPRA", 10, 20, -9)
+        venta = registrar_ejecucion(conn, 1, 1, "VENTA", 15, 30, -5)
+    resumen = LotesFiscalesService(db, metodo).sincronizar()
+    assert resumen['ejecuciones'] == 3 and resumen['aperturas'] == 0, resumen
+    assert resumen['ventas_sin_lote'] == 0
+    return db, compra_1, compra_2, venta
+
+
+def test_fifo():
+    """La venta consume el lote más antiguo entero y 5 del siguiente, cada uno a su costo"""
+    db, compra_1, compra_2, venta = caso_a_mano(MetodoCosto.FIFO)
+    try:
+        lotes, ganancias = libro(db)
+        assert lotes == [
+            (1, 1, compra_1, momento(-10), 10, 0, 10.0),
+            (1, 1, compra_2, momento(-9), 10, 5, 20.0),
+        ], lotes
+        assert ganancias == [
+            (venta, 1, 1, momento(-10), 10, 300.0, 100.0, 200.0),
+            (venta, 1, 1, momento(-9), 5, 150.0, 100.0, 50.0),
+        ], ganancias
+    finally:
+        db.cerrar()
+
+
+def test_costo_promedio():
+    """Al costo promedio (15) la venta cuesta 225 y el lote que queda pasa a ese costo"""
+    db, compra_1, compra_2, venta = caso_a_mano(MetodoCosto.PROMEDIO)
+    try:
+        lotes, ganancias = libro(db)
+        assert lotes == [
+            (1, 1, compra_1, momento(-10), 10, 0, 10.0),
+            (1, 1, compra_2, momento(-9), 10, 5, 15.0),
+        ], lotes
+        assert ganancias == [
+            (venta, 1, 1, momento(-10), 10, 300.0, 150.0, 150.0),
+            (venta, 1, 1, momento(-9), 5, 150.0, 75.0, 75.0),
+        ], ganancias
+        assert sum(g[6] for g in ganancias) == 225.0
+    finally:
+        db.cerrar()
+
+
+def test_libro_sin_construir():
+    """
+    Con una posición previa a las ejecuciones, el registro no escribe nada
+    hasta que sincronizar() construye el libro con su lote de apertura
+    """
+    for metodo in MetodoCosto:
+        # 30 títulos a 8 antes de comprar 10 a 10 y vender 25 a 12
+        db = crear_base([(1, 1, 30, Decimal(8))])
+        try:
+            servicio = LotesFiscalesService(db, metodo)
+            with db.engine.begin() as conn:
+                compra = registrar_ejecucion(conn, 1, 1, "COMPRA", 10, 10, -5)
+            resumen = registrar_con_hook(db, servicio, compra)
+            assert resumen['ejecuciones'] == 0 and resumen['pendientes'] == 1, resumen
+            with db.engine.begin() as conn:
+                fijar_posicion(conn, 1, 1, 40, Decimal("8.5"))
+                venta = registrar_ejecucion(conn, 1, 1, "VENTA", 25, 12, -3)
+            assert registrar_con_hook(db, servicio, venta)['pendientes'] == 1
+            with db.engine.begin() as conn:
+                fijar_posicion(conn, 1, 1, 15, Decimal("8.5"))
+            assert libro(db) == ([], [])
+            
+            resumen = servicio.sincronizar()
+            assert resumen['aperturas'] == 1 and resumen['ventas_sin_lote'] == 0, resumen
+            lotes, ganancias = libro(db)
+            # La venta sale del lote de apertura (al costo promedio actual y
+            # con la fecha de la primera ejecución)
+            if metodo == MetodoCosto.FIFO:
+                costos = (8.5, 10.0)
+            else:
+                costos = (8.875, 8.875)   # (30 * 8.5 + 100) / 40
+            assert lotes == [
+                (1, 1, None, momento(-5), 30, 5, costos[0]),
+                (1, 1, compra, momento(-5), 10, 10, costos[1]),
+            ], lotes
+            assert [(g[3], g[4]) for g in ganancias] == [(momento(-5), 25)], ganancias
+            
+            # Lo mismo que reconstruir, y el libro ya construido recibe las siguientes
+            assert servicio.reconstruir()['ventas_sin_lote'] == 0
+            assert libro(db) == (lotes, ganancias)
+            with db.engine.begin() as conn:
+                otra = registrar_ejecucion(conn, 1, 1, "VENTA", 5, 15, -1)
+            assert registrar_con_hook(db, servicio, otra)['ejecuciones'] == 1
+        finally:
+            db.cerrar()
+
+
+def test_ejecucion_anterior_a_las_aplicadas():
+    """
+    Una compra importada con fecha anterior a una venta ya aplicada queda
+    pendiente en el registro y sincronizar() reconstruye su posición
+    """
+    for metodo in MetodoCosto:
+        db = crear_base([(1, 1, 5, Decimal(10)), (2, 2, 10, Decimal(7))])
+        try:
+            servicio = LotesFiscalesService(db, metodo)
+            with db.engine.begin() as conn:
+                registrar_ejecucion(conn, 1, 1, "COMPRA", 10, 10, -10)
+                registrar_ejecucion(conn, 1, 1, "VENTA", 5, 30, -5)
+                registrar_ejecucion(conn, 2, 2, "COMPRA", 10, 7, -6)
+            servicio.sincronizar()
+            
+            # La importada es la más antigua de la posición; la de la cuenta 2 va en orden
+            with db.engine.begin() as conn:
+                importada = registrar_ejecucion(conn, 1, 1, "COMPRA", 10, 5, -12)
+                fijar_posicion(conn, 1, 1, 15, Decimal("7.5"))
+                en_orden = registrar_ejecucion(conn, 2, 2, "VENTA", 4, 9, -2)
+                fijar_posicion(conn, 2, 2, 6, Decimal(7))
+            resumen = registrar_con_hook(db, servicio, importada)
+            assert resumen['ejecuciones'] == 0 and resumen['pendientes'] == 1, resumen
+            
+            resumen = servicio.sincronizar()
+            assert resumen['posiciones_reconstruidas'] == 1, resumen
+            assert resumen['ejecuciones'] == 4 and resumen['ventas_sin_lote'] == 0, resumen
+            sincronizado = libro(db)
+            
+            # La venta consume primero el lote importado
+            venta = [g for g in sincronizado[1] if g[1] == 1]
+            assert [(g[3], g[4], g[6]) for g in venta] == [
+                (momento(-12), 5, 25.0 if metodo == MetodoCosto.FIFO else 37.5)
+            ], venta
+            
+            servicio.reconstruir()
+            assert libro(db) == sincronizado
+        finally:
+            db.cerrar()
+
+
+def test_reportes_sincronizan_pendientes():
+    """Los reportes construyen el libro o aplican lo pendiente antes de consultar"""
+    db = crear_base([(1, 1, 5, Decimal(10))])
+    try:
+        servicio = LotesFiscalesService(db)
+        with db.engine.begin() as conn:
+            compra = registrar_ejecucion(conn, 1, 1, "COMPRA", 10, 10, -10)
+            venta = registrar_ejecucion(conn, 1, 1, "VENTA", 5, 30, -5)
+        assert servicio.lote_repo.hay_ejecuciones_pendientes()
+        
+        # Libro sin construir: el reporte no sale vacío
+        ganancias = servicio.ganancias_periodo(HOY - timedelta(days=30), HOY)
+        assert [(g['transaccion_id'], g['cantidad']) for g in ganancias] == [(venta, 5)], ganancias
+        assert not servicio.lote_repo.hay_ejecuciones_pendientes()
+        fiscal = servicio.resumen_fiscal(momento(-5).year)
+        assert fiscal['totales']['ganancia_perdida'] == 100, fiscal['totales']
+        
+        # Compra importada que el registro dejó pendiente (anterior a la venta)
+        with db.engine.begin() as conn:
+            importada = registrar_ejecucion(conn, 1, 1, "COMPRA", 10, 5, -12)
+            fijar_posicion(conn, 1, 1, 15, Decimal("7.5"))
+        assert registrar_con_hook(db, servicio, importada)['pendientes'] == 1
+        lotes = servicio.lotes_abiertos(1)
+        assert sorted((l['transaccion_id'], l['cantidad_restante']) for l in lotes) == [
+            (compra, 10), (importada, 5)
+        ], lotes
+    finally:
+        db.cerrar()
+
+
+
+def test_cierre_de_anio_fiscal():
+    """Con la zona local en UTC-4, una venta del 31/12 a las 22:00 es del año que termina"""
+    zona = os.environ.get('TZ')
+    os.environ['TZ'] = 'America/Caracas'
+    reloj.tzset()
+    db = crear_base([(1, 1, 5, Decimal(10))])
+    try:
+        with db.engine.begin() as conn:
+            registrar_ejecucion(conn, 1, 1, "COMPRA", 10, 10, 0, fecha=datetime(2024, 6, 3, 14))
+            # 2024-12-31 22:00 y 2025-01-01 01:00 en Caracas
+            fin_de_anio = registrar_ejecucion(conn, 1, 1, "VENTA", 3, 30, 0, fecha=datetime(2025, 1, 1, 2))
+            anio_nuevo = registrar_ejecucion(conn, 1, 1, "VENTA", 2, 30, 0, fecha=datetime(2025, 1, 1, 5))
+        servicio = LotesFiscalesService(db)
+        servicio.sincronizar()
+        
+        fiscal = servicio.resumen_fiscal(2024)
+        assert fiscal['totales']['ganancia_perdida'] == 60, fiscal['totales']
+        fiscal = servicio.resumen_fiscal(2025)
+        assert fiscal['totales']['ganancia_perdida'] == 40, fiscal['totales']
+        
+        ganancias = servicio.ganancias_periodo(date(2025, 1, 1), date(2025, 1, 1))
+        assert [g['transaccion_id'] for g in ganancias] == [anio_nuevo], ganancias
+        ganancias = servicio.ganancias_periodo(date(2024, 12, 31), date(2024, 12, 31))
+        assert [g['transaccion_id'] for g in ganancias] == [fin_de_anio], ganancias
+    finally:
+        db.cerrar()
+        if zona is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = zona
+        reloj.tzset()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Libro de lotes fiscales")
+    print("=" * 60)
+    
+    test_fifo()
+    test_costo_promedio()
+    test_libro_sin_construir()
+    test_ejecucion_anterior_a_las_aplicadas()
+    test_reportes_sincronizan_pendientes()
+    test_cierre_de_anio_fiscal()
+    
+    print("\n" + "=" * 60)
+    print("✓ El libro incremental coincide con el reconstruido")
+    print("=" * 60)
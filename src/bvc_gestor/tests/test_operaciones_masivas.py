@@ -0,0 +1,195 @@
+# =============================================================================
+# TEST DE OPERACIONES MASIVAS DEL REPOSITORIO BASE
+# Archivo: src/bvc_gestor/tests/test_operaciones_masivas.py
+# =============================================================================
+#
+# bulk_upsert (INSERT ... ON CONFLICT) y bulk_update (UPDATE por lotes con
+# executemany) escriben sin pasar por el ORM. Aquí se verifica qué clave
+# usa el ON CONFLICT, que las filas existentes se actualizan o se respetan
+# según 'actualizar' (y cuántas se cuentan como escritas), que lanzar=True
+# propaga el error y que bulk_update agrupa filas con campos distintos.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_operaciones_masivas.py
+#     python src/bvc_gestor/tests/test_operaciones_masivas.py
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import BancoDB, TituloDB, SaldoDB, OrdenMovimientoDB
+from src.bvc_gestor.repositories.base_repository import BaseRepository
+
+
+def crear_base() -> DatabaseEngine:
+    """Base aislada y vacía"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "masivas.db")
+    db.asegurar_esquema()
+    return db
+
+
+def titulos(db) -> dict:
+    """ticker -> (id, nombre, sector)"""
+    with db.engine.connect() as conn:
+        filas = conn.execute(select(TituloDB.ticker, TituloDB.id, TituloDB.nombre, TituloDB.sector))
+        return {ticker: (id_, nombre, sector) for ticker, id_, nombre, sector in filas}
+
+
+def esperar_valueerror(func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except ValueError:
+        return
+    raise AssertionError(f"Se esperaba ValueError de {func.__name__}{args}")
+
+
+def test_claves_conflicto():
+    """Se infiere la clave solo si el modelo tiene una; si no, hay que indicarla"""
+    db = crear_base()
+    try:
+        assert BaseRepository(db, TituloDB)._claves_conflicto() == ('ticker',)
+        assert BaseRepository(db, SaldoDB)._claves_conflicto() == ('cuenta_id', 'moneda')
+        assert BaseRepository(db, OrdenMovimientoDB)._claves_conflicto() == ('orden_id', 'movimiento_id')
+        
+        bancos = BaseRepository(db, BancoDB)
+        assert set(bancos._claves_unicas()) == {('rif',), ('nombre',), ('codigo',)}
+        esperar_valueerror(bancos._claves_conflicto)
+        assert bancos._claves_conflicto(('codigo',)) == ('codigo',)
+        
+        # Una clave explícita debe ser una restricción UNIQUE (en cualquier orden)
+        assert BaseRepository(db, SaldoDB)._claves_conflicto(['moneda', 'cuenta_id']) == ('moneda', 'cuenta_id')
+        esperar_valueerror(bancos._claves_conflicto, ('estatus',))
+        esperar_valueerror(BaseRepository(db, SaldoDB)._claves_conflicto, ('cuenta_id',))
+        
+        # Un upsert ambiguo no escribe nada
+        esperar_valueerror(bancos.bulk_upsert, [{"rif": "J-1", "nombre": "Banco", "codigo": "0001"}])
+    finally:
+        db.cerrar()
+
+
+def test_bulk_upsert_inserta_y_actualiza():
+    """Las filas nuevas se insertan y las existentes se actualizan por la clave"""
+    db = crear_base()
+    try:
+        repo = BaseRepository(db, TituloDB)
+        assert repo.bulk_upsert([
+            {"rif": "J-1", "nombre": "Uno", "ticker": "AAA", "sector": "Financiero"},
+            {"rif": "J-2", "nombre": "Dos", "ticker": "BBB", "sector": "Energía"},
+        ]) == 2
+        antes = titulos(db)
+        
+        # Filas con claves distintas en el mismo llamado; 'no_existe' se descarta
+        assert repo.bulk_upsert([
+            {"rif": "J-1", "nombre": "Uno bis", "ticker": "AAA", "no_existe": 1},
+            {"rif": "J-3", "nombre": "Tres", "ticker": "CCC", "sector": "Banca"},
+        ]) == 2
+        despues = titulos(db)
+        
+        assert despues["AAA"] == (antes["AAA"][0], "Uno bis", "Financiero")   # mismo id, sector intacto
+        assert despues["BBB"] == antes["BBB"]
+        assert despues["CCC"][1:] == ("Tres", "Banca")
+        
+        with db.engine.connect() as conn:
+            fechas = conn.execute(text(
+                "SELECT ticker, fecha_actualizacion FROM titulos ORDER BY ticker"
+            )).all()
+        assert fechas[0][1] is not None
+    finally:
+        db.cerrar()
+
+
+def test_bulk_upsert_sin_actualizar():
+    """actualizar=() deja las filas existentes como estaban (DO NOTHING)"""
+    db = crear_base()
+    try:
+        repo = BaseRepository(db, BancoDB)
+        repo.bulk_upsert([{"rif": "J-1", "nombre": "Banco Uno", "codigo": "0001"}], conflicto=('rif',))
+        # Cuenta solo la fila insertada, no la que ya existía
+        assert repo.bulk_upsert([
+            {"rif": "J-1", "nombre": "Banco Renombrado", "codigo": "0001"},
+            {"rif": "J-2", "nombre": "Banco Dos", "codigo": "0002"},
+        ], conflicto=('rif',), actualizar=()) == 1
+        
+        with db.engine.connect() as conn:
+            filas = dict(conn.execute(select(BancoDB.rif, BancoDB.nombre)).all())
+        assert filas == {"J-1": "Banco Uno", "J-2": "Banco Dos"}
+        
+        # Solo las columnas pedidas; el nombre recibido se ignora
+        repo.bulk_upsert([{"rif": "J-2", "nombre": "Otro", "codigo": "0022"}],
+                         conflicto=('rif',), actualizar=('codigo',))
+        with db.engine.connect() as conn:
+            fila = conn.execute(select(BancoDB.nombre, BancoDB.codigo).where(BancoDB.rif == "J-2")).one()
+        assert tuple(fila) == ("Banco Dos", "0022")
+        
+        # Choque con otra clave UNIQUE (nombre): falla el lote completo
+        assert repo.bulk_upsert([
+            {"rif": "J-3", "nombre": "Banco Tres", "codigo": "0003"},
+            {"rif": "J-4", "nombre": "Banco Uno", "codigo": "0004"},
+        ], conflicto=('rif',)) == 0
+        with db.engine.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM bancos")).scalar() == 2
+        
+        # Con lanzar=True el error llega al llamador
+        try:
+            repo.bulk_upsert([{"rif": "J-4", "nombre": "Banco Uno", "codigo": "0004"}],
+                             conflicto=('rif',), lanzar=True)
+        except IntegrityError:
+            pass
+        else:
+            raise AssertionError("bulk_upsert(lanzar=True) no propagó el error")
+    finally:
+        db.cerrar()
+
+
+def test_bulk_update():
+    """Un UPDATE por combinación de campos; cuenta solo las filas que existen"""
+    db = crear_base()
+    try:
+        repo = BaseRepository(db, TituloDB)
+        repo.bulk_upsert([
+            {"rif": f"J-{n}", "nombre": f"Titulo {n}", "ticker": f"T{n}", "sector": "General"}
+            for n in range(1, 6)
+        ])
+        ids = {ticker: fila[0] for ticker, fila in titulos(db).items()}
+        
+        actualizadas = repo.bulk_update([
+            {"id": ids["T1"], "nombre": "Nuevo 1"},
+            {"id": ids["T2"], "sector": "Banca"},
+            {"id": ids["T3"], "nombre": "Nuevo 3", "sector": "Energía"},
+            {"id": ids["T4"], "nombre": "Nuevo 4", "no_existe": True},
+            {"nombre": "Sin id"},                 # se ignora
+            {"id": 999, "nombre": "No existe"},   # no cuenta
+        ], tamano_lote=2)
+        assert actualizadas == 4
+        
+        resultado = titulos(db)
+        assert resultado["T1"][1:] == ("Nuevo 1", "General")
+        assert resultado["T2"][1:] == ("Titulo 2", "Banca")
+        assert resultado["T3"][1:] == ("Nuevo 3", "Energía")
+        assert resultado["T4"][1:] == ("Nuevo 4", "General")
+        assert resultado["T5"][1:] == ("Titulo 5", "General")
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Operaciones masivas")
+    print("=" * 60)
+    
+    test_claves_conflicto()
+    test_bulk_upsert_inserta_y_actualiza()
+    test_bulk_upsert_sin_actualizar()
+    test_bulk_update()
+    
+    print("\n" + "=" * 60)
+    print("✓ bulk_upsert y bulk_update escriben lo esperado")
+    print("=" * 60)
\ No newline at end of file
@@ -0,0 +1,188 @@
+# =============================================================================
+# TEST DE PAGINACIÓN POR CURSOR (KEYSET)
+# Archivo: src/bvc_gestor/tests/test_paginacion.py
+# =============================================================================
+#
+# Recorre todas las páginas de find_pagina() y de los listados de órdenes y
+# verifica que cada fila aparece exactamente una vez y en el orden de la
+# consulta, con empates en fecha_registro y con los dos formatos en que
+# SQLite guarda un DateTime sin microsegundos: '...:00' (CURRENT_TIMESTAMP)
+# y '...:00.000000' (SQLAlchemy).
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_paginacion.py
+#     python src/bvc_gestor/tests/test_paginacion.py
+
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import text
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import (
+    CasaBolsaDB, ClienteDB, CuentaBursatilDB, TituloDB, OrdenDB
+)
+from src.bvc_gestor.repositories.base_repository import BaseRepository
+from src.bvc_gestor.repositories.orden_repository import OrdenRepository
+
+INSTANTE = datetime(2025, 3, 14, 10, 0, 0)
+
+# (fecha_registro, órdenes, guardada como CURRENT_TIMESTAMP sin microsegundos)
+GRUPOS = [
+    (INSTANTE - timedelta(seconds=1), 2, False),
+    (INSTANTE, 4, False),                                  # '...:00.000000'
+    (INSTANTE, 3, True),                                   # '...:00'
+    (INSTANTE + timedelta(seconds=1, microseconds=500000), 3, False),
+]
+
+
+def crear_base() -> DatabaseEngine:
+    """Base aislada con un cliente y órdenes con fechas repetidas"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "paginacion.db")
+    db.asegurar_esquema()
+    
+    orden = {
+        "cliente_id": 1, "cuenta_id": 1, "titulo_id": 1, "tipo": "COMPRA",
+        "cantidad_total": 10, "precio_limite": Decimal("11"), "estado": "PENDIENTE",
+        "fecha_vencimiento": date(2025, 12, 31), "monto_total_estimado": Decimal("110"),
+        "estatus": True,
+    }
+    with db.engine.begin() as conn:
+        conn.execute(CasaBolsaDB.__table__.insert(), [
+            {"rif": "J-30000000-0", "nombre": "Casa Test", "tipo": "Casa de Bolsa", "estatus": True}
+        ])
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": "J-50000001-0", "nombre": "Titulo 1", "ticker": "T001", "estatus": True}
+        ])
+        conn.execute(ClienteDB.__table__.insert(), [
+            {"nombre_completo": "Cliente 1", "tipo_inversor": "NATURAL", "rif_cedula": "V-00000001",
+             "telefono": "0414-0000000", "email": "cliente1@mail.com", "direccion_fiscal": "N/A",
+             "ciudad_estado": "Caracas", "estatus": True}
+        ])
+        conn.execute(CuentaBursatilDB.__table__.insert(), [
+            {"cliente_id": 1, "casa_bolsa_id": 1, "cuenta": "CB-000001", "default": True, "estatus": True}
+        ])
+        for fecha, cantidad, sin_microsegundos in GRUPOS:
+            for _ in range(cantidad):
+                conn.execute(OrdenDB.__table__.insert(), [{**orden, "fecha_registro": fecha}])
+                if sin_microsegundos:
+                    # Como las filas con server_default: texto sin fracción
+                    conn.execute(
+                        text("UPDATE ordenes SET fecha_registro = :texto WHERE id = (SELECT max(id) FROM ordenes)"),
+                        {"texto": fecha.strftime('%Y-%m-%d %H:%M:%S')}
+                    )
+    
+    return db
+
+
+def orden_esperado(db, descendente: bool) -> list:
+    """Ids en el orden en que SQLite ordena (fecha_registro, id)"""
+    direccion = "DESC" if descendente else "ASC"
+    with db.engine.connect() as conn:
+        return list(conn.execute(text(
+            f"SELECT id FROM ordenes ORDER BY fecha_registro {direccion}, id {direccion}"
+        )).scalars())
+
+
+def recorrer(pagina_siguiente, total: int) -> list:
+    """Ids de todas las páginas; falla si el recorrido no termina"""
+    ids, cursor = [], None
+    for _ in range(total + 2):
+        pagina = pagina_siguiente(cursor)
+        ids.extend(item['id'] for item in pagina['items'])
+        cursor = pagina['cursor']
+        if cursor is None:
+            return ids
+    raise AssertionError(f"La paginación no terminó: {ids}")
+
+
+def test_formatos_de_fecha_guardados():
+    """La base de prueba tiene los dos formatos de texto en la misma fecha"""
+    db = crear_base()
+    try:
+        with db.engine.connect() as conn:
+            textos = set(conn.execute(text(
+                "SELECT fecha_registro FROM ordenes WHERE fecha_registro LIKE '2025-03-14 10:00:00%'"
+            )).scalars())
+        assert textos == {"2025-03-14 10:00:00", "2025-03-14 10:00:00.000000"}, textos
+    finally:
+        db.cerrar()
+
+
+def test_find_pagina_con_empates():
+    """find_pagina() recorre cada fila una vez, en ambas direcciones"""
+    db = crear_base()
+    try:
+        repo = BaseRepository(db, OrdenDB)
+        total = sum(cantidad for _, cantidad, _ in GRUPOS)
+        for order_by in ('fecha_registro', '-fecha_registro'):
+            esperado = orden_esperado(db, order_by.startswith('-'))
+            for limit in (1, 2, 3, 5):
+                ids = recorrer(
+                    lambda cursor: repo.find_pagina(limit=limit, cursor=cursor, order_by=order_by),
+                    total
+                )
+                assert ids == esperado, f"{order_by} limit={limit}: {ids} != {esperado}"
+        
+        # La columna auxiliar del cursor no aparece en los items
+        pagina = repo.find_pagina(limit=2)
+        assert all('_clave_cursor' not in item for item in pagina['items'])
+        assert isinstance(pagina['items'][0]['fecha_registro'], str)
+    finally:
+        db.cerrar()
+
+
+def test_ordenes_por_cliente_con_empates():
+    """Los listados de órdenes (lambda_stmt) no saltan filas empatadas"""
+    db = crear_base()
+    try:
+        repo = OrdenRepository(db)
+        total = sum(cantidad for _, cantidad, _ in GRUPOS)
+        esperado = orden_esperado(db, descendente=True)
+        for limit in (1, 2, 3, 4):
+            ids = recorrer(
+                lambda cursor: repo.get_ordenes_por_cliente_pagina(1, limit=limit, cursor=cursor),
+                total
+            )
+            assert ids == esperado, f"limit={limit}: {ids} != {esperado}"
+            
+            ids = recorrer(
+                lambda cursor: repo.buscar_ordenes_pagina(cliente_id=1, limit=limit, cursor=cursor),
+                total
+            )
+            assert ids == esperado, f"buscar limit={limit}: {ids} != {esperado}"
+    finally:
+        db.cerrar()
+
+
+def test_cursor_invalido():
+    """Un token ajeno no devuelve filas en lugar de una página equivocada"""
+    db = crear_base()
+    try:
+        repo = BaseRepository(db, OrdenDB)
+        token = BaseRepository._codificar_cursor([1, 2, 3])
+        assert repo.find_pagina(limit=2, cursor=token) == {'items': [], 'cursor': None}
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Paginación por cursor")
+    print("=" * 60)
+    
+    test_formatos_de_fecha_guardados()
+    test_find_pagina_con_empates()
+    test_ordenes_por_cliente_con_empates()
+    test_cursor_invalido()
+    
+    print("\n" + "=" * 60)
+    print("✓ Todas las filas aparecen una vez y en orden")
+    print("=" * 60)
\ No newline at end of file
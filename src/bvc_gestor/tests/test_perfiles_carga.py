@@ -0,0 +1,236 @@
+# =============================================================================
+# TEST DE PERFILES DE CARGA (SENTENCIAS SQL POR PERFIL)
+# Archivo: src/bvc_gestor/tests/test_perfiles_carga.py
+# =============================================================================
+#
+# Cada perfil de repositories/perfiles_carga.py declara cuántas sentencias
+# emite. Aquí se cuentan las que realmente llegan a SQLite, con una y con
+# varias filas (el número no debe crecer con las filas), y se verifica que
+# to_dict() y las relaciones del perfil se leen sin consultas adicionales.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_perfiles_carga.py
+#     python src/bvc_gestor/tests/test_perfiles_carga.py
+
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import event
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import (
+    BancoDB, CasaBolsaDB, ClienteDB, CuentaBursatilDB, TituloDB, PrecioTituloDB,
+    OrdenDB, TransaccionDB, SaldoDB, PortafolioItemDB
+)
+from src.bvc_gestor.repositories.base_repository import BaseRepository
+from src.bvc_gestor.repositories.perfiles_carga import perfiles, sentencias_perfil
+
+NUM_CUENTAS = 5
+TITULOS_POR_CUENTA = 3
+ORDENES_POR_CUENTA = 4
+
+
+# Lo que cada perfil debe dejar cargado (se lee con la sesión ya cerrada)
+ACCESOS = {
+    (OrdenDB, "lista"): lambda o: o.to_dict(),
+    (OrdenDB, "detalle"): lambda o: (
+        o.to_dict(), o.titulo.ticker, o.titulo.precio_actual, o.cliente.nombre_completo,
+        o.cuenta.casa_bolsa.nombre, [t.monto_bruto for t in o.transacciones]
+    ),
+    (PortafolioItemDB, "lista"): lambda p: (p.cantidad, p.costo_total),
+    (PortafolioItemDB, "valoracion"): lambda p: (p.to_dict(), p.titulo.ticker),
+    (PortafolioItemDB, "detalle"): lambda p: (p.to_dict(), p.cuenta.casa_bolsa.nombre),
+    (CuentaBursatilDB, "lista"): lambda c: c.to_dict(),
+    (CuentaBursatilDB, "detalle"): lambda c: (
+        c.to_dict(), c.casa_bolsa.nombre, c.cliente.rif_cedula, [s.to_dict() for s in c.saldos]
+    ),
+    (CuentaBursatilDB, "valoracion"): lambda c: (
+        [s.to_dict() for s in c.saldos], [p.to_dict() for p in c.portafolio]
+    ),
+    (SaldoDB, "lista"): lambda s: s.to_dict(),
+    (SaldoDB, "detalle"): lambda s: (s.to_dict(), s.cuenta.cuenta, s.cuenta.casa_bolsa.nombre),
+    (TituloDB, "lista"): lambda t: t.to_dict(),
+}
+
+
+class ContadorSQL:
+    """Consultas ejecutadas en un motor (sin contar el BEGIN de cada sesión)"""
+    
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+    
+    def _contar(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("BEGIN"):
+            self.total += 1
+    
+    def medir(self, funcion):
+        inicio = self.total
+        resultado = funcion()
+        return resultado, self.total - inicio
+
+
+def crear_base() -> DatabaseEngine:
+    """Base aislada con cuentas, títulos con precio, órdenes y posiciones"""
+    db_path = Path(tempfile.mkdtemp()) / "perfiles.db"
+    db = DatabaseEngine.crear_aislado(db_path)
+    db.asegurar_esquema()
+    
+    ahora = datetime.now()
+    with db.engine.begin() as conn:
+        conn.execute(BancoDB.__table__.insert(), [
+            {"rif": "J-00000000-0", "nombre": "Banco Test", "codigo": "0001", "estatus": True}
+        ])
+        conn.execute(CasaBolsaDB.__table__.insert(), [
+            {"rif": "J-30000000-0", "nombre": "Casa Test", "tipo": "Casa de Bolsa", "estatus": True}
+        ])
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": f"J-5{i:07d}-0", "nombre": f"Titulo {i}", "ticker": f"T{i:03d}", "estatus": True}
+            for i in range(1, TITULOS_POR_CUENTA + 1)
+        ])
+        conn.execute(PrecioTituloDB.__table__.insert(), [
+            {"titulo_id": i, "precio": Decimal("10.5") * i, "tipo": "ACTUAL",
+             "fuente": "TEST", "fecha_hora": ahora, "estatus": True}
+            for i in range(1, TITULOS_POR_CUENTA + 1)
+        ])
+        conn.execute(ClienteDB.__table__.insert(), [
+            {"nombre_completo": f"Cliente {i}", "tipo_inversor": "NATURAL",
+             "rif_cedula": f"V-{i:08d}", "telefono": "0414-0000000",
+             "email": f"cliente{i}@mail.com", "direccion_fiscal": "N/A",
+             "ciudad_estado": "Caracas", "estatus": True}
+            for i in range(1, NUM_CUENTAS + 1)
+        ])
+        conn.execute(CuentaBursatilDB.__table__.insert(), [
+            {"cliente_id": i, "casa_bolsa_id": 1, "cuenta": f"CB-{i:06d}",
+             "default": True, "estatus": True}
+            for i in range(1, NUM_CUENTAS + 1)
+        ])
+        conn.execute(SaldoDB.__table__.insert(), [
+            {"cuenta_id": i, "moneda": "VES", "disponible": Decimal("1000"),
+             "en_transito": Decimal("0"), "bloqueado": Decimal("0"), "estatus": True}
+            for i in range(1, NUM_CUENTAS + 1)
+        ])
+        conn.execute(PortafolioItemDB.__table__.insert(), [
+            {"cuenta_id": c, "titulo_id": t, "cantidad": 100, "costo_promedio": Decimal("9"), "estatus": True}
+            for c in range(1, NUM_CUENTAS + 1)
+            for t in range(1, TITULOS_POR_CUENTA + 1)
+        ])
+        conn.execute(OrdenDB.__table__.insert(), [
+            {"cliente_id": c, "cuenta_id": c, "titulo_id": (n % TITULOS_POR_CUENTA) + 1,
+             "tipo": "COMPRA", "cantidad_total": 10, "precio_limite": Decimal("11"),
+             "estado": "EJECUTADA", "fecha_vencimiento": date.today() + timedelta(days=30),
+             "monto_total_estimado": Decimal("110"), "estatus": True}
+            for c in range(1, NUM_CUENTAS + 1)
+            for n in range(ORDENES_POR_CUENTA)
+        ])
+        conn.execute(TransaccionDB.__table__.insert(), [
+            {"orden_id": o, "numero_operacion_bvc": f"BVC-{o:06d}", "cantidad_ejecutada": 10,
+             "precio_ejecucion": Decimal("11"), "monto_bruto": Decimal("110"),
+             "monto_neto": Decimal("110"), "tasa_bcv": Decimal("36.5"), "estatus": True}
+            for o in range(1, NUM_CUENTAS * ORDENES_POR_CUENTA + 1)
+        ])
+    
+    return db
+
+
+def _verificar_perfil(db, contador, modelo, perfil):
+    repo = BaseRepository(db, modelo)
+    esperadas = sentencias_perfil(modelo, perfil)
+    acceso = ACCESOS[(modelo, perfil)]
+    
+    entidad, sentencias = contador.medir(lambda: repo.get_entidad(1, perfil=perfil))
+    assert entidad is not None, f"{modelo.__name__}/{perfil}: sin resultado"
+    assert sentencias == esperadas, (
+        f"{modelo.__name__}/{perfil}: get_entidad emitió {sentencias} sentencias, se esperaban {esperadas}"
+    )
+    
+    entidades, sentencias = contador.medir(lambda: repo.find_entidades(perfil=perfil))
+    assert len(entidades) > 1
+    assert sentencias == esperadas, (
+        f"{modelo.__name__}/{perfil}: find_entidades ({len(entidades)} filas) emitió "
+        f"{sentencias} sentencias, se esperaban {esperadas}"
+    )
+    
+    # Todo lo que el perfil promete se lee sin volver a la base de datos
+    _, sentencias = contador.medir(lambda: [acceso(e) for e in [entidad] + entidades])
+    assert sentencias == 0, f"{modelo.__name__}/{perfil}: {sentencias} sentencias al leer la entidad"
+    
+    return len(entidades), esperadas
+
+
+def test_sentencias_por_perfil():
+    """Cada perfil emite exactamente las sentencias que declara"""
+    db = crear_base()
+    contador = ContadorSQL(db.read_engine)
+    try:
+        for modelo, perfil in ACCESOS:
+            filas, esperadas = _verificar_perfil(db, contador, modelo, perfil)
+            print(f"✓ {modelo.__name__}/{perfil}: {esperadas} sentencia(s) para {filas} filas")
+    finally:
+        db.cerrar()
+
+
+def test_perfiles_cubiertos():
+    """Todos los perfiles registrados tienen su verificación en ACCESOS"""
+    for modelo in {m for m, _ in ACCESOS}:
+        for perfil in perfiles(modelo):
+            assert (modelo, perfil) in ACCESOS, f"Perfil sin test: {modelo.__name__}/{perfil}"
+
+
+def test_relacion_fuera_del_perfil_lanza():
+    """Lo que el perfil no carga lanza en vez de emitir una consulta por fila"""
+    db = crear_base()
+    try:
+        portafolio = BaseRepository(db, PortafolioItemDB).find_entidades(perfil="lista")
+        try:
+            portafolio[0].titulo
+        except Exception:
+            pass
+        else:
+            raise AssertionError("PortafolioItemDB/lista cargó 'titulo' de forma perezosa")
+        
+        orden = BaseRepository(db, OrdenDB).get_entidad(1, perfil="detalle")
+        try:
+            orden.movimientos_vinculados
+        except Exception:
+            pass
+        else:
+            raise AssertionError("OrdenDB/detalle cargó 'movimientos_vinculados' de forma perezosa")
+    finally:
+        db.cerrar()
+
+
+def test_perfil_inexistente():
+    """Un perfil no definido es un error de programación, no un resultado vacío"""
+    db = crear_base()
+    try:
+        try:
+            BaseRepository(db, OrdenDB).find_entidades(perfil="inexistente")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Se esperaba ValueError para un perfil no definido")
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Perfiles de carga")
+    print("=" * 60)
+    
+    test_perfiles_cubiertos()
+    test_sentencias_por_perfil()
+    test_relacion_fuera_del_perfil_lanza()
+    test_perfil_inexistente()
+    
+    print("\n" + "=" * 60)
+    print("✓ Todos los perfiles emiten las sentencias declaradas")
+    print("=" * 60)
\ No newline at end of file
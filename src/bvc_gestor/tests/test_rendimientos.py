@@ -0,0 +1,170 @@
+# =============================================================================
+# TEST DEL CÁLCULO DE RENDIMIENTOS (TWR Y MWR/TIR)
+# Archivo: src/bvc_gestor/tests/test_rendimientos.py
+# =============================================================================
+#
+# utils/rendimientos.py resuelve todas las columnas a la vez. Aquí se
+# verifica un caso con aportes calculado a mano, rangos de un día con
+# movimientos grandes (donde la tasa anual es enorme) y columnas sin
+# flujos, donde TWR y MWR coinciden. También que RendimientoService no
+# sirve un cierre de hoy anterior a un precio nuevo.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_rendimientos.py
+#     python src/bvc_gestor/tests/test_rendimientos.py
+
+import math
+import sys
+import tempfile
+import time as reloj
+from datetime import datetime, time, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import (
+    CasaBolsaDB, ClienteDB, CuentaBursatilDB, TituloDB, PrecioTituloDB, PortafolioItemDB
+)
+from src.bvc_gestor.repositories.snapshot_repository import SnapshotRepository
+from src.bvc_gestor.services.rendimiento_service import RendimientoService
+from src.bvc_gestor.utils.rendimientos import DIAS_ANIO, resumen_rango
+
+
+def cercano(a, b, tolerancia=1e-9) -> bool:
+    return math.isclose(float(a), float(b), rel_tol=tolerancia, abs_tol=tolerancia)
+
+
+def test_caso_con_aportes():
+    """
+    Valor 100; día 1 cierra en 110; día 2 compra 50 y cierra en 165; día 3
+    cierra en 170 y cobra 2 de dividendo
+    """
+    valor = np.array([[100.0], [110.0], [165.0], [170.0]])
+    flujo = np.array([[0.0], [50.0], [0.0]])
+    ingreso = np.array([[0.0], [0.0], [2.0]])
+    twr, tir_anual, mwr, ganancia = resumen_rango(valor, flujo, ingreso)
+    
+    # La compra cuenta como capital expuesto desde el inicio del día
+    esperado = (110 / 100) * (1 + (165 - 110 - 50) / 160) * (172 / 165) - 1
+    assert cercano(twr[0], esperado), twr
+    assert cercano(ganancia[0], 170 - 100 - 50 + 2)
+    
+    # La TIR anula el valor presente de los flujos del inversor (un solo
+    # cambio de signo: la raíz es única), con g = 1 + mwr:
+    # -100 g - 50 g^(1/3) + 172 = 0
+    flujos = [(-100.0, 0), (-50.0, 2), (172.0, 3)]
+    valor_presente = sum(c * (1 + mwr[0]) ** (-dia / 3) for c, dia in flujos)
+    assert abs(valor_presente) < 1e-8, (mwr, valor_presente)
+    assert cercano(mwr[0], 0.190131267, 1e-8), mwr
+    assert cercano(tir_anual[0], (1 + mwr[0]) ** (DIAS_ANIO / 3) - 1)
+
+
+def test_rango_de_un_dia():
+    """Un día al +20%, -20% y +30%: MWR y TWR son el movimiento del día"""
+    movimientos = np.array([0.2, -0.2, 0.3])
+    valor = np.vstack([np.full(3, 100.0), 100.0 * (1 + movimientos)])
+    cero = np.zeros((1, 3))
+    twr, tir_anual, mwr, ganancia = resumen_rango(valor, cero, cero)
+    
+    assert not np.isnan(mwr).any() and not np.isnan(tir_anual).any(), (mwr, tir_anual)
+    for k, r in enumerate(movimientos):
+        assert cercano(twr[k], r) and cercano(mwr[k], r), (twr, mwr)
+        assert cercano(tir_anual[k], (1 + r) ** DIAS_ANIO - 1, 1e-6), tir_anual
+        assert cercano(ganancia[k], 100 * r)
+
+
+def test_sin_flujos():
+    """Sin compras ni ventas MWR es igual a TWR; sin capital no hay TIR"""
+    dias = 30
+    crecimiento = np.array([1.0, 1.5, 0.7])
+    trayectoria = np.linspace(0.0, 1.0, dias + 1)[:, None]
+    valor = 100.0 * crecimiento[None, :] ** trayectoria
+    valor = np.hstack([valor, np.zeros((dias + 1, 1))])
+    cero = np.zeros((dias, 4))
+    twr, tir_anual, mwr, _ = resumen_rango(valor, cero, cero)
+    
+    for k, g in enumerate(crecimiento):
+        assert cercano(twr[k], g - 1) and cercano(mwr[k], g - 1), (twr, mwr)
+        assert cercano(tir_anual[k], g ** (DIAS_ANIO / dias) - 1, 1e-6), tir_anual
+    assert twr[3] == 0 and np.isnan(mwr[3]) and np.isnan(tir_anual[3])
+
+
+def insertar_precio(db, precio: str, fecha_hora: datetime):
+    with db.engine.begin() as conn:
+        conn.execute(PrecioTituloDB.__table__.insert(), [
+            {"titulo_id": 1, "precio": Decimal(precio), "tipo": "ACTUAL", "fuente": "TEST",
+             "fecha_hora": fecha_hora, "estatus": True}
+        ])
+
+
+def test_cierre_de_hoy_al_dia():
+    """Un precio de hoy posterior al cierre rehace el cierre y descarta el resultado guardado"""
+    # El día de los cierres es el de la base (UTC)
+    hoy = datetime.now(timezone.utc).date()
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "rendimientos.db")
+    try:
+        db.asegurar_esquema()
+        with db.engine.begin() as conn:
+            conn.execute(CasaBolsaDB.__table__.insert(), [
+                {"rif": "J-30000000-0", "nombre": "Casa Test", "tipo": "Casa de Bolsa", "estatus": True}
+            ])
+            conn.execute(TituloDB.__table__.insert(), [
+                {"rif": "J-50000001-0", "nombre": "Titulo 1", "ticker": "T001", "estatus": True}
+            ])
+            conn.execute(ClienteDB.__table__.insert(), [
+                {"nombre_completo": "Cliente 1", "tipo_inversor": "NATURAL", "rif_cedula": "V-00000001",
+                 "telefono": "0414-0000000", "email": "cliente1@mail.com", "direccion_fiscal": "N/A",
+                 "ciudad_estado": "Caracas", "estatus": True}
+            ])
+            conn.execute(CuentaBursatilDB.__table__.insert(), [
+                {"cliente_id": 1, "casa_bolsa_id": 1, "cuenta": "CB-000001", "default": True, "estatus": True}
+            ])
+            conn.execute(PortafolioItemDB.__table__.insert(), [
+                {"cuenta_id": 1, "titulo_id": 1, "cantidad": 10, "costo_promedio": Decimal(15),
+                 "estatus": True, "fecha_registro": datetime.combine(hoy - timedelta(days=5), time(10)),
+                 "fecha_actualizacion": datetime.combine(hoy - timedelta(days=5), time(10))}
+            ])
+        insertar_precio(db, "20", datetime.combine(hoy - timedelta(days=3), time.min))
+        
+        servicio = RendimientoService(db)
+        ayer = hoy - timedelta(days=1)
+        primero = servicio.rendimiento_cuenta(1, ayer, hoy)
+        assert primero['valor_final'] == 200.0 and primero['twr'] == 0.0, primero
+        
+        # Precio nuevo después del cierre de hoy: el mismo rango ya no es el guardado
+        insertar_precio(db, "30", SnapshotRepository(db).ahora())
+        # Las marcas se comparan al segundo: un cierre en el mismo segundo
+        # del precio lo seguiría viendo como cambio
+        reloj.sleep(1.1)
+        segundo = servicio.rendimiento_cuenta(1, ayer, hoy)
+        assert segundo['valor_final'] == 300.0, segundo
+        assert cercano(segundo['twr'], 0.5) and cercano(segundo['mwr'], 0.5), segundo
+        assert servicio.calcular(hoy, hoy).loc[1, 'valor_final'] == 300.0
+        
+        # Sin cambios, el resultado guardado se reutiliza
+        calculos = servicio.calculos
+        assert servicio.rendimiento_cuenta(1, ayer, hoy) == segundo
+        assert servicio.calculos == calculos
+    finally:
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Rendimientos TWR y MWR")
+    print("=" * 60)
+    
+    test_caso_con_aportes()
+    test_rango_de_un_dia()
+    test_sin_flujos()
+    test_cierre_de_hoy_al_dia()
+    
+    print("\n" + "=" * 60)
+    print("✓ TWR y TIR coinciden con los casos calculados a mano")
+    print("=" * 60)
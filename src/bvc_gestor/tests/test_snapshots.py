@@ -0,0 +1,264 @@
+# =============================================================================
+# TEST DEL CIERRE DIARIO DE SNAPSHOTS
+# Archivo: src/bvc_gestor/tests/test_snapshots.py
+# =============================================================================
+#
+# cerrar_dia() recalcula solo las cuentas que cambiaron y arrastra el resto;
+# backfill() reconstruye el día desde las ejecuciones y el historial de
+# precios. Aquí se verifica que ambos llegan al mismo cierre y que
+# fecha_calculo se estampa con un solo reloj (el de la base), que es con el
+# que se comparan las columnas de auditoría al buscar cambios. El día de
+# hoy también sale de ese reloj, como el reparto de ejecuciones por día.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_snapshots.py
+#     python src/bvc_gestor/tests/test_snapshots.py
+
+import os
+import sys
+import tempfile
+import time as reloj
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import text, update
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import (
+    CasaBolsaDB, ClienteDB, CuentaBursatilDB, TituloDB, PrecioTituloDB,
+    OrdenDB, TransaccionDB, PortafolioItemDB
+)
+from src.bvc_gestor.repositories.snapshot_repository import SnapshotRepository
+from src.bvc_gestor.services.rendimiento_service import RendimientoService
+from src.bvc_gestor.services.snapshot_service import SnapshotService
+
+COLUMNAS = ('valor_mercado', 'costo_total', 'ganancia_perdida', 'posiciones', 'sin_precio', 'flujo_neto')
+
+
+def hoy_base() -> date:
+    """Día actual de los cierres: el de la base (CURRENT_TIMESTAMP, UTC)"""
+    return datetime.now(timezone.utc).date()
+
+
+def momento(hoy: date, dias: int, hora: int = 10) -> datetime:
+    return datetime.combine(hoy + timedelta(days=dias), time(hora))
+
+
+def crear_base(hoy: date) -> DatabaseEngine:
+    """
+    Cuatro cuentas: 1 y 2 con posiciones que salen de sus ejecuciones, 3
+    con una posición inicial sin ejecuciones y 4 con un título sin precio
+    """
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "snapshots.db")
+    db.asegurar_esquema()
+    
+    with db.engine.begin() as conn:
+        conn.execute(CasaBolsaDB.__table__.insert(), [
+            {"rif": "J-30000000-0", "nombre": "Casa Test", "tipo": "Casa de Bolsa", "estatus": True}
+        ])
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": f"J-5000000{i}-0", "nombre": f"Titulo {i}", "ticker": f"T00{i}", "estatus": True}
+            for i in (1, 2, 3)
+        ])
+        conn.execute(ClienteDB.__table__.insert(), [
+            {"nombre_completo": "Cliente 1", "tipo_inversor": "NATURAL", "rif_cedula": "V-00000001",
+             "telefono": "0414-0000000", "email": "cliente1@mail.com", "direccion_fiscal": "N/A",
+             "ciudad_estado": "Caracas", "estatus": True}
+        ])
+        conn.execute(CuentaBursatilDB.__table__.insert(), [
+            {"cliente_id": 1, "casa_bolsa_id": 1, "cuenta": f"CB-00000{i}", "default": i == 1, "estatus": True}
+            for i in (1, 2, 3, 4)
+        ])
+        
+        precios = [
+            {"titulo_id": 1, "precio": Decimal(20 + n), "tipo": "ACTUAL", "fuente": "TEST",
+             "fecha_hora": momento(hoy, n, 0), "estatus": True}
+            for n in range(-12, 0)
+        ] + [
+            {"titulo_id": 2, "precio": Decimal(20) + Decimal(n) / 4, "tipo": "ACTUAL", "fuente": "TEST",
+             "fecha_hora": momento(hoy, n, 0), "estatus": True}
+            for n in range(-12, 0, 2)
+        ]
+        conn.execute(PrecioTituloDB.__table__.insert(), precios)
+        
+        # cuenta, título, tipo, cantidad, precio, día
+        ejecuciones = [
+            (1, 1, "COMPRA", 100, 10, -8), (1, 1, "VENTA", 40, 12, -5),
+            (2, 2, "COMPRA", 50, 20, -7), (2, 2, "COMPRA", 30, 22, -3),
+        ]
+        for i, (cuenta, titulo, tipo, cantidad, precio, dia) in enumerate(ejecuciones, 1):
+            registrar_ejecucion(conn, i, hoy, cuenta, titulo, tipo, cantidad, precio, momento(hoy, dia))
+        
+        conn.execute(PortafolioItemDB.__table__.insert(), [
+            {"cuenta_id": cuenta, "titulo_id": titulo, "cantidad": cantidad, "costo_promedio": costo,
+             "estatus": True, "fecha_registro": momento(hoy, -1), "fecha_actualizacion": momento(hoy, -1)}
+            for cuenta, titulo, cantidad, costo in (
+                (1, 1, 60, Decimal(10)), (2, 2, 80, Decimal(1660) / 80),
+                (3, 1, 200, Decimal(9)), (4, 3, 10, Decimal(5)),
+            )
+        ])
+    
+    return db
+
+
+def registrar_ejecucion(conn, orden_id, hoy, cuenta, titulo, tipo, cantidad, precio, fecha=None):
+    """Orden ejecutada y su transacción; sin fecha, la de la base (CURRENT_TIMESTAMP)"""
+    monto = Decimal(cantidad * precio)
+    conn.execute(OrdenDB.__table__.insert(), [
+        {"cliente_id": 1, "cuenta_id": cuenta, "titulo_id": titulo, "tipo": tipo,
+         "cantidad_total": cantidad, "precio_limite": Decimal(precio), "estado": "EJECUTADA",
+         "fecha_vencimiento": hoy, "monto_total_estimado": monto, "estatus": True}
+    ])
+    transaccion = {"orden_id": orden_id, "numero_operacion_bvc": f"BVC-{orden_id}",
+                   "cantidad_ejecutada": cantidad, "precio_ejecucion": Decimal(precio),
+                   "monto_bruto": monto, "monto_neto": monto, "tasa_bcv": Decimal(1), "estatus": True}
+    if fecha is not None:
+        transaccion["fecha_registro"] = fecha
+    conn.execute(TransaccionDB.__table__.insert(), [transaccion])
+
+
+def cierre(repo: SnapshotRepository, fecha: date) -> dict:
+    """cuenta_id -> valores del cierre (montos redondeados)"""
+    return {
+        fila['cuenta_id']: tuple(
+            round(float(fila[c]), 6) if isinstance(fila[c], (float, Decimal)) else fila[c]
+            for c in COLUMNAS
+        )
+        for fila in repo.get_cierre(fecha)
+    }
+
+
+def test_cierre_incremental_igual_al_backfill():
+    """El cierre de hoy (recalculadas + arrastradas) es el mismo que da el backfill"""
+    hoy = hoy_base()
+    db = crear_base(hoy)
+    try:
+        servicio = SnapshotService(db)
+        repo = SnapshotRepository(db)
+        servicio.backfill(hoy - timedelta(days=10), hoy - timedelta(days=1), dias_por_bloque=3)
+        
+        # Actividad de hoy: una compra en la cuenta 2 y un precio nuevo del título 1
+        ahora = repo.ahora()
+        with db.engine.begin() as conn:
+            registrar_ejecucion(conn, 5, hoy, 2, 2, "COMPRA", 20, 25)
+            conn.execute(
+                update(PortafolioItemDB)
+                .where(PortafolioItemDB.cuenta_id == 2, PortafolioItemDB.titulo_id == 2)
+                .values(cantidad=100, costo_promedio=Decimal("21.6"))
+            )
+            conn.execute(PrecioTituloDB.__table__.insert(), [
+                {"titulo_id": 1, "precio": Decimal("33"), "tipo": "ACTUAL", "fuente": "TEST",
+                 "fecha_hora": ahora, "estatus": True}
+            ])
+        
+        resumen = servicio.cerrar_dia()
+        assert resumen['recalculadas'] > 0 and resumen['arrastradas'] > 0, resumen
+        incremental = cierre(repo, hoy)
+        
+        servicio.backfill(hoy, hoy)
+        completo = cierre(repo, hoy)
+        
+        assert incremental == completo, f"{incremental} != {completo}"
+        assert set(completo) == {1, 2, 3, 4}
+        assert completo[2][COLUMNAS.index('flujo_neto')] == 500.0
+    finally:
+        db.cerrar()
+
+
+def test_fecha_calculo_con_reloj_de_la_base():
+    """
+    Con la zona local adelantada respecto a UTC, fecha_calculo sigue el
+    reloj de la base: un cambio posterior al cierre queda después de la marca
+    """
+    zona = os.environ.get('TZ')
+    os.environ['TZ'] = 'Etc/GMT-5'   # UTC+5
+    reloj.tzset()
+    hoy = hoy_base()
+    db = crear_base(hoy)
+    try:
+        servicio = SnapshotService(db)
+        repo = SnapshotRepository(db)
+        servicio.backfill(hoy - timedelta(days=3), hoy - timedelta(days=1))
+        with db.engine.begin() as conn:
+            conn.execute(PrecioTituloDB.__table__.insert(), [
+                {"titulo_id": 2, "precio": Decimal("30"), "tipo": "ACTUAL", "fuente": "TEST",
+                 "fecha_hora": repo.ahora(), "estatus": True}
+            ])
+        resumen = servicio.cerrar_dia()
+        assert resumen['recalculadas'] > 0 and resumen['arrastradas'] > 0, resumen
+        
+        # Un solo instante para recalculadas y arrastradas, y no posterior a la base
+        with db.engine.connect() as conn:
+            marcas = set(conn.execute(text(
+                "SELECT DISTINCT fecha_calculo FROM snapshot_valoracion WHERE fecha = :f"
+            ), {"f": hoy.isoformat()}).scalars())
+        assert len(marcas) == 1, marcas
+        assert repo.marca_cierre(hoy) <= repo.ahora()
+        
+        # Cambio confirmado después del cierre: el cierre siguiente lo ve
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(PortafolioItemDB).where(PortafolioItemDB.cuenta_id == 4).values(cantidad=12)
+            )
+        assert 4 in repo.get_cuentas_cambiadas(repo.marca_cierre(hoy), hoy)
+    finally:
+        db.cerrar()
+        if zona is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = zona
+        reloj.tzset()
+
+
+
+def test_dia_del_cierre_con_reloj_de_la_base():
+    """
+    Con el día local distinto del día UTC, cerrar_dia() cierra el día de la
+    base y toma los flujos de ese día
+    """
+    zona = os.environ.get('TZ')
+    # La zona que, a esta hora, cae en otro día que UTC
+    os.environ['TZ'] = 'Etc/GMT-14' if datetime.now(timezone.utc).hour >= 12 else 'Etc/GMT+12'
+    reloj.tzset()
+    hoy = hoy_base()
+    assert date.today() != hoy
+    db = crear_base(hoy)
+    try:
+        servicio = SnapshotService(db)
+        repo = SnapshotRepository(db)
+        servicio.backfill(hoy - timedelta(days=3), hoy - timedelta(days=1))
+        with db.engine.begin() as conn:
+            registrar_ejecucion(conn, 5, hoy, 2, 2, "COMPRA", 20, 25)
+        
+        resumen = servicio.cerrar_dia()
+        assert resumen['fecha'] == hoy, resumen
+        assert cierre(repo, hoy)[2][COLUMNAS.index('flujo_neto')] == 500.0
+        
+        # Los rendimientos usan el mismo día: hoy no es un día futuro
+        assert 2 in RendimientoService(db).calcular(hoy, hoy).index
+    finally:
+        db.cerrar()
+        if zona is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = zona
+        reloj.tzset()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Cierre diario de snapshots")
+    print("=" * 60)
+    
+    test_cierre_incremental_igual_al_backfill()
+    test_fecha_calculo_con_reloj_de_la_base()
+    test_dia_del_cierre_con_reloj_de_la_base()
+    
+    print("\n" + "=" * 60)
+    print("✓ El cierre incremental coincide con el backfill")
+    print("=" * 60)
\ No newline at end of file
@@ -0,0 +1,105 @@
+# =============================================================================
+# TEST DEL PRECIO VIGENTE (ULTIMO_PRECIO)
+# Archivo: src/bvc_gestor/tests/test_ultimo_precio.py
+# =============================================================================
+#
+# trg_ultimo_precio_insert solo reemplaza el precio vigente por uno que no
+# sea más antiguo, comparando fecha_hora. Los precios del feed la reciben
+# del reloj de la base (UTC); aquí se verifica que un precio manual,
+# registrado como lo hace OperacionesController.actualizar_precios_masivo()
+# (sin fecha_hora), pasa a ser el vigente aunque la zona local esté detrás
+# de UTC.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_ultimo_precio.py
+#     python src/bvc_gestor/tests/test_ultimo_precio.py
+
+import os
+import sys
+import tempfile
+import time as reloj
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import select
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.models_sql import TituloDB, PrecioTituloDB, UltimoPrecioDB
+from src.bvc_gestor.repositories.base_repository import BaseRepository
+
+
+def vigente(db, titulo_id: int) -> tuple:
+    """(precio_id, precio) de ultimo_precio"""
+    with db.engine.connect() as conn:
+        fila = conn.execute(
+            select(UltimoPrecioDB.precio_id, UltimoPrecioDB.precio)
+            .where(UltimoPrecioDB.titulo_id == titulo_id)
+        ).one()
+    return fila[0], Decimal(str(fila[1]))
+
+
+def test_precio_manual_pasa_a_vigente():
+    """Con la zona local en UTC-4, el precio manual posterior al del feed queda vigente"""
+    zona = os.environ.get('TZ')
+    os.environ['TZ'] = 'America/Caracas'
+    reloj.tzset()
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "precios.db")
+    try:
+        db.asegurar_esquema()
+        with db.engine.begin() as conn:
+            conn.execute(TituloDB.__table__.insert(), [
+                {"rif": f"J-5000000{i}-0", "nombre": f"Titulo {i}", "ticker": f"T00{i}", "estatus": True}
+                for i in (1, 2)
+            ])
+        
+        # Precio del feed: fecha_hora por server_default
+        repo = BaseRepository(db, PrecioTituloDB)
+        assert repo.bulk_create([
+            {"titulo_id": i, "precio": Decimal("10"), "tipo": "ACTUAL", "fuente": "FEED"} for i in (1, 2)
+        ]) == 2
+        
+        # Actualización manual, con las mismas filas que arma el controller
+        actualizados = [{'ticker_id': 1, 'precio_nuevo': Decimal("12")}]
+        assert repo.bulk_create([
+            {'titulo_id': item['ticker_id'], 'precio': item['precio_nuevo'],
+             'tipo': 'ACTUAL', 'fuente': 'MANUAL'}
+            for item in actualizados
+        ]) == 1
+        
+        with db.engine.connect() as conn:
+            manual = conn.execute(
+                select(PrecioTituloDB.id).where(PrecioTituloDB.fuente == 'MANUAL')
+            ).scalar_one()
+        assert vigente(db, 1) == (manual, Decimal("12"))
+        
+        # Con la hora local el precio quedaría 4 horas antes que el del feed
+        # y el trigger lo descartaría
+        assert repo.bulk_create([
+            {'titulo_id': 2, 'precio': Decimal("11"), 'tipo': 'ACTUAL', 'fuente': 'MANUAL',
+             'fecha_hora': datetime.now()}
+        ]) == 1
+        assert vigente(db, 2)[1] == Decimal("10")
+    finally:
+        db.cerrar()
+        if zona is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = zona
+        reloj.tzset()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Precio vigente")
+    print("=" * 60)
+    
+    test_precio_manual_pasa_a_vigente()
+    
+    print("\n" + "=" * 60)
+    print("✓ El precio manual queda como vigente")
+    print("=" * 60)
@@ -0,0 +1,134 @@
+# =============================================================================
+# TEST DE LA VALORACIÓN VECTORIZADA
+# Archivo: src/bvc_gestor/tests/test_valoracion.py
+# =============================================================================
+#
+# utils/valoracion.py suma por grupo con bincount y concilia con Decimal.
+# Aquí se verifica totales_por_grupo() contra la suma Decimal de cada
+# grupo (las posiciones sin precio no entran y un grupo sin ninguna con
+# precio no aparece) y que totales_exactos() da la suma exacta de los
+# valores guardados, de la que los totales float64 no se alejan más que
+# TOLERANCIA_CONCILIACION.
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_valoracion.py
+#     python src/bvc_gestor/tests/test_valoracion.py
+
+import math
+import random
+import sys
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.bvc_gestor.utils.valoracion import (
+    TOLERANCIA_CONCILIACION, valorar_arrays, totales, totales_por_grupo, totales_exactos
+)
+
+
+def cercano(a, b) -> bool:
+    return math.isclose(float(a), float(b), rel_tol=1e-12, abs_tol=1e-9)
+
+
+def posiciones_aleatorias(n: int, semilla: int = 7):
+    """(grupo, cantidad, costo, precio) con montos de 8 decimales; ~10% sin precio"""
+    azar = random.Random(semilla)
+    filas = []
+    for _ in range(n):
+        precio = None if azar.random() < 0.1 else Decimal(azar.randint(1, 10 ** 11)) / 10 ** 8
+        filas.append((azar.choice((3, 8, 21, 40)), azar.randint(1, 100000),
+                      Decimal(azar.randint(1, 10 ** 11)) / 10 ** 8, precio))
+    return filas
+
+
+def arreglos(filas):
+    grupo = np.array([f[0] for f in filas], dtype=np.int64)
+    cantidad = np.array([f[1] for f in filas], dtype=float)
+    costo = np.array([float(f[2]) for f in filas])
+    precio = np.array([np.nan if f[3] is None else float(f[3]) for f in filas])
+    return grupo, cantidad, costo, precio
+
+
+def test_totales_por_grupo():
+    """Cada grupo suma lo mismo que con Decimal; sin precio no cuenta"""
+    filas = posiciones_aleatorias(2000)
+    # Un grupo donde ninguna posición tiene precio
+    filas += [(99, 10, Decimal("5.5"), None), (99, 20, Decimal("6"), None)]
+    # Un grupo con costo cero: rendimiento 0
+    filas += [(50, 10, Decimal(0), Decimal("3.25"))]
+    grupo, cantidad, costo, precio = arreglos(filas)
+    metricas = valorar_arrays(cantidad, costo, precio)
+    
+    esperados = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+    for clave, n, costo_promedio, p in filas:
+        if p is None:
+            continue
+        esperados[clave][0] += 1
+        esperados[clave][1] += n * p
+        esperados[clave][2] += n * costo_promedio
+    
+    resultado = totales_por_grupo(grupo, metricas)
+    assert sorted(resultado) == sorted(esperados) and 99 not in resultado, sorted(resultado)
+    for clave, (n, valor, inversion) in esperados.items():
+        datos = resultado[clave]
+        assert datos['total_posiciones'] == n, (clave, datos)
+        assert cercano(datos['valor_mercado_total'], valor), (clave, datos, valor)
+        assert cercano(datos['inversion_total'], inversion), (clave, datos, inversion)
+        assert cercano(datos['ganancia_perdida_total'], valor - inversion), (clave, datos)
+        if inversion > 0:
+            assert cercano(datos['rendimiento_total_pct'], (valor - inversion) / inversion * 100)
+    assert resultado[50]['rendimiento_total_pct'] == 0.0
+    
+    # Los grupos suman lo mismo que totales() de todas las posiciones
+    general = totales(metricas)
+    assert general['total_posiciones'] == sum(d['total_posiciones'] for d in resultado.values())
+    assert cercano(general['valor_mercado_total'], sum(d['valor_mercado_total'] for d in resultado.values()))
+    
+    vacio = valorar_arrays(np.array([]), np.array([]), np.array([]))
+    assert totales_por_grupo(np.array([], dtype=np.int64), vacio) == {}
+
+
+def test_totales_exactos():
+    """La suma Decimal de los valores guardados, sin las posiciones sin precio"""
+    filas = posiciones_aleatorias(5000, semilla=11)
+    exactos = totales_exactos((n, float(c), None if p is None else float(p)) for _, n, c, p in filas)
+    
+    valor = sum((n * p for _, n, _, p in filas if p is not None), Decimal(0))
+    inversion = sum((n * c for _, n, c, p in filas if p is not None), Decimal(0))
+    assert exactos == {
+        'valor_mercado_total': valor,
+        'inversion_total': inversion,
+        'ganancia_perdida_total': valor - inversion,
+    }, exactos
+    
+    # Los totales float64 se alejan de los exactos menos que la tolerancia
+    _, cantidad, costo, precio = arreglos(filas)
+    vectorizados = totales(valorar_arrays(cantidad, costo, precio))
+    for clave, exacto in exactos.items():
+        assert abs(exacto - Decimal(repr(vectorizados[clave]))) <= TOLERANCIA_CONCILIACION, clave
+    
+    # 0.1 se lee como el decimal guardado, no como su binario; NaN no entra
+    assert totales_exactos([(3, 0.1, 0.2), (5, 1.0, float('nan'))]) == {
+        'valor_mercado_total': Decimal("0.6"),
+        'inversion_total': Decimal("0.3"),
+        'ganancia_perdida_total': Decimal("0.3"),
+    }
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Valoración vectorizada")
+    print("=" * 60)
+    
+    test_totales_por_grupo()
+    test_totales_exactos()
+    
+    print("\n" + "=" * 60)
+    print("✓ Los totales por grupo y los exactos cuadran con Decimal")
+    print("=" * 60)
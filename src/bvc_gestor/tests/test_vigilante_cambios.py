@@ -0,0 +1,187 @@
+# =============================================================================
+# TEST DEL VIGILANTE DE CAMBIOS (INVALIDACIÓN ENTRE PROCESOS)
+# Archivo: src/bvc_gestor/tests/test_vigilante_cambios.py
+# =============================================================================
+#
+# El vigilante invalida la caché cuando otro proceso confirma cambios. Aquí
+# se verifica que solo las tablas vigiladas tienen triggers de versión, que
+# los commits de este proceso no vuelven como invalidaciones externas y que
+# los de otro motor sobre la misma base sí (en tablas vigiladas y no
+# vigiladas).
+#
+# Uso:
+#     python -m pytest src/bvc_gestor/tests/test_vigilante_cambios.py
+#     python src/bvc_gestor/tests/test_vigilante_cambios.py
+
+import sys
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+root_dir = Path(__file__).parent.parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from sqlalchemy import text
+
+from src.bvc_gestor.database.engine import DatabaseEngine
+from src.bvc_gestor.database.ddl_soporte import TABLAS_VIGILADAS, TABLAS_NO_VIGILADAS
+from src.bvc_gestor.database.models_sql import BancoDB, TituloDB, PrecioTituloDB
+from src.bvc_gestor.repositories.base_repository import BaseRepository
+
+
+def crear_base():
+    """Base aislada, su vigilante con la línea base fijada y otro motor sobre el mismo archivo"""
+    ruta = Path(tempfile.mkdtemp()) / "vigilante.db"
+    db = DatabaseEngine.crear_aislado(ruta)
+    db.asegurar_esquema()
+    with db.engine.begin() as conn:
+        conn.execute(TituloDB.__table__.insert(), [
+            {"rif": "J-50000001-0", "nombre": "Titulo 1", "ticker": "T001", "estatus": True}
+        ])
+    
+    db.get_cache_repositorios()
+    vigilante = db._vigilante_cambios
+    vigilante.verificar(forzar=True)
+    
+    # "Otro proceso": sus commits no pasan por las sesiones del primer motor
+    otro = DatabaseEngine.crear_aislado(ruta)
+    return db, vigilante, otro
+
+
+def insertar_banco(db, n: int):
+    with db.engine.begin() as conn:
+        conn.execute(BancoDB.__table__.insert(), [
+            {"rif": f"J-{n:08d}-0", "nombre": f"Banco {n}", "codigo": f"{n:04d}", "estatus": True}
+        ])
+
+
+def insertar_precio(db):
+    with db.engine.begin() as conn:
+        conn.execute(PrecioTituloDB.__table__.insert(), [
+            {"titulo_id": 1, "precio": Decimal("10.5"), "tipo": "ACTUAL",
+             "fuente": "TEST", "fecha_hora": datetime.now(), "estatus": True}
+        ])
+
+
+def test_triggers_solo_en_tablas_vigiladas():
+    """Un trigger por operación en cada tabla vigilada y ninguno en el resto"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "triggers.db")
+    try:
+        db.asegurar_esquema()
+        with db.engine.connect() as conn:
+            triggers = set(conn.execute(text(
+                "SELECT tbl_name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_cambios_%'"
+            )).scalars())
+            tablas = set(conn.execute(text("SELECT tabla FROM cambios_tablas")).scalars())
+        assert triggers == set(TABLAS_VIGILADAS), triggers
+        assert tablas == set(TABLAS_VIGILADAS), tablas
+        assert {'precios_titulos', 'transacciones', 'ultimo_precio', 'contador_ordenes'} <= set(TABLAS_NO_VIGILADAS)
+    finally:
+        db.cerrar()
+
+
+def test_migracion_quita_triggers_anteriores():
+    """Una base con los triggers de todas las tablas pierde los de las no vigiladas"""
+    db = DatabaseEngine.crear_aislado(Path(tempfile.mkdtemp()) / "migracion.db")
+    try:
+        db.asegurar_esquema()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO cambios_tablas (tabla, version) VALUES ('precios_titulos', 7)")
+            conn.exec_driver_sql("""
+                CREATE TRIGGER trg_cambios_precios_titulos_insert AFTER INSERT ON precios_titulos
+                BEGIN
+                    UPDATE cambios_tablas SET version = version + 1 WHERE tabla = 'precios_titulos';
+                END
+            """)
+            conn.exec_driver_sql("PRAGMA user_version = 0")
+        
+        assert db.asegurar_esquema()
+        with db.engine.connect() as conn:
+            assert conn.execute(text(
+                "SELECT count(*) FROM sqlite_master WHERE name = 'trg_cambios_precios_titulos_insert'"
+            )).scalar() == 0
+            assert conn.execute(text(
+                "SELECT count(*) FROM cambios_tablas WHERE tabla = 'precios_titulos'"
+            )).scalar() == 0
+    finally:
+        db.cerrar()
+
+
+def test_commits_propios_no_invalidan():
+    """Lo que escribe este proceso ya lo invalidó su sesión: el vigilante no lo repite"""
+    db, vigilante, otro = crear_base()
+    try:
+        repo = BaseRepository(db, BancoDB)
+        for n in range(1, 4):
+            repo.create({"rif": f"J-{n:08d}-0", "nombre": f"Banco {n}", "codigo": f"{n:04d}"})
+        assert repo.bulk_update([{"id": 1, "nombre": "Banco Uno"}]) == 1
+        
+        assert vigilante.verificar(forzar=True) == []
+        assert vigilante.cambios_detectados == 0
+    finally:
+        otro.cerrar()
+        db.cerrar()
+
+
+def test_commits_externos_invalidan():
+    """Los commits de otro motor invalidan las tablas vigiladas que tocaron"""
+    db, vigilante, otro = crear_base()
+    try:
+        repo = BaseRepository(db, BancoDB)
+        repo.create({"rif": "J-00000001-0", "nombre": "Banco 1", "codigo": "0001"})
+        assert repo.get_by_id(1)['nombre'] == "Banco 1"
+        
+        # Un commit propio y uno externo en el mismo intervalo
+        repo.create({"rif": "J-00000002-0", "nombre": "Banco 2", "codigo": "0002"})
+        with otro.engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE bancos SET nombre = 'Banco Externo' WHERE id = 1")
+        
+        cambiadas = vigilante.verificar(forzar=True)
+        assert 'bancos' in cambiadas and 'titulos' not in cambiadas, cambiadas
+        assert repo.get_by_id(1)['nombre'] == "Banco Externo"
+    finally:
+        otro.cerrar()
+        db.cerrar()
+
+
+def test_commit_externo_en_tabla_no_vigilada():
+    """Sin versión propia, un commit externo invalida los modelos de las tablas no vigiladas"""
+    db, vigilante, otro = crear_base()
+    try:
+        insertar_precio(otro)
+        cambiadas = vigilante.verificar(forzar=True)
+        assert 'precios_titulos' in cambiadas, cambiadas
+        assert not set(cambiadas) & set(TABLAS_VIGILADAS), cambiadas
+        
+        # Los mismos cambios hechos por este proceso no se repiten
+        insertar_precio(db)
+        insertar_banco(db, 5)
+        vigilante.verificar(forzar=True)
+        with db.get_write_session() as session:
+            session.execute(PrecioTituloDB.__table__.insert(), [
+                {"titulo_id": 1, "precio": Decimal("11"), "tipo": "ACTUAL",
+                 "fuente": "TEST", "fecha_hora": datetime.now(), "estatus": True}
+            ])
+            session.commit()
+        assert vigilante.verificar(forzar=True) == []
+    finally:
+        otro.cerrar()
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TEST: Vigilante de cambios")
+    print("=" * 60)
+    
+    test_triggers_solo_en_tablas_vigiladas()
+    test_migracion_quita_triggers_anteriores()
+    test_commits_propios_no_invalidan()
+    test_commits_externos_invalidan()
+    test_commit_externo_en_tabla_no_vigilada()
+    
+    print("\n" + "=" * 60)
+    print("✓ Solo los commits externos invalidan la caché")
+    print("=" * 60)
\ No newline at end of file
@@ -124,6 +124,15 @@ class FuentePrecio(Enum):
     IMPORTACION = "Importacion"
 
 
+class MetodoCosto(Enum):
+    """
+    Método de costo con que una venta consume los lotes fiscales
+    NUEVO: Para ganancias realizadas
+    """
+    FIFO = "FIFO"                      # Primero en entrar, primero en salir
+    PROMEDIO = "Costo Promedio"        # Costo promedio ponderado de los lotes abiertos
+
+
 # =========================================================
 #  CONSTANTES DE COMISIONES (VALORES POR DEFECTO)
 # =========================================================
@@ -16,6 +16,7 @@ sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from sqlalchemy.orm import Session
 from bvc_gestor.database.engine import get_database
+from bvc_gestor.repositories.base_repository import BaseRepository
 from bvc_gestor.database.models_sql import (
     BancoDB, CasaBolsaDB, ClienteDB, CuentaBancariaDB, 
     CuentaBursatilDB, DocumentoDB, TituloDB
@@ -28,30 +29,32 @@ class DataInitializer:
     def __init__(self):
         self.db_engine = get_database()
         self.session = self.db_engine.get_session()
-        
+    
     def run(self):
         """Ejecutar toda la inicialización"""
         print("🚀 Inicializando base de datos...")
         
         try:
-            # 1. Cargar bancos (desde CSV o datos de prueba)
-            self._load_bancos()
-            
-            # 2. Cargar casas de bolsa (desde CSV o datos de prueba)
-            self._load_casas_bolsa()
-            
-            # 3. Cargar titulos (desde CSV o datos de prueba)
-            self._load_titulos()
-            
-            # 4. Crear clientes de prueba
-            self._create_clientes_prueba()
-            
-            # 5. Crear configuración básica
-            #self._create_configuracion()
-            
-            self.session.commit()
+            # Carga masiva: perfil bulk-load mientras dura la inicialización
+            with self.db_engine.perfil_temporal("bulk-load"):
+                # 1. Cargar bancos (desde CSV o datos de prueba)
+                self._load_bancos()
+                
+                # 2. Cargar casas de bolsa (desde CSV o datos de prueba)
+                self._load_casas_bolsa()
+                
+                # 3. Cargar titulos (desde CSV o datos de prueba)
+                self._load_titulos()
+                
+                # 4. Crear clientes de prueba
+                self._create_clientes_prueba()
+                
+                # 5. Crear configuración básica
+                #self._create_configuracion()
+                
+                self.session.commit()
             print("✅ Base de datos inicializada correctamente!")
-            
+        
         except Exception as e:
             self.session.rollback()
             print(f"❌ Error: {str(e)}")
@@ -66,22 +69,19 @@ class DataInitializer:
         # Si existe CSV, cargarlo
         if csv_path.exists():
             print(f"📄 Cargando bancos desde {csv_path}...")
-            bancos_creados = 0
             
             with open(csv_path, 'r', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
-                for row in reader:
-                    if not self.session.query(BancoDB).filter_by(rif=row['rif']).first():
-                        banco = BancoDB(
-                            rif=row['rif'],
-                            nombre=row['nombre'],
-                            codigo=row['codigo']
-                        )
-                        self.session.add(banco)
-                        bancos_creados += 1
+                bancos = [
+                    {'rif': row['rif'], 'nombre': row['nombre'], 'codigo': row['codigo']}
+                    for row in reader
+                ]
             
-            self.session.commit()
-            print(f"✅ {bancos_creados} bancos cargados desde CSV")
+            # Inserta los nuevos y refresca los existentes (clave: rif)
+            bancos_cargados = BaseRepository(self.db_engine, BancoDB).bulk_upsert(
+                bancos, conflicto=('rif',), lanzar=True
+            )
+            print(f"✅ {bancos_cargados} bancos cargados desde CSV")
             return
         
         # Si no hay CSV, crear datos de prueba
@@ -99,13 +99,11 @@ class DataInitializer:
             {"rif": "J-00000009-9", "nombre": "100% Banco", "codigo": "0156"},
         ]
         
-        for banco in bancos_prueba:
-            if not self.session.query(BancoDB).filter_by(rif=banco["rif"]).first():
-                banco_db = BancoDB(**banco)
-                self.session.add(banco_db)
-        
-        self.session.commit()
-        print(f"✅ {len(bancos_prueba)} bancos creados")
+        # Solo los que falten: no se pisan cambios hechos sobre los existentes
+        bancos_creados = BaseRepository(self.db_engine, BancoDB).bulk_upsert(
+            bancos_prueba, conflicto=('rif',), actualizar=(), lanzar=True
+        )
+        print(f"✅ {bancos_creados} bancos creados")
     
     def _load_casas_bolsa(self):
         """Cargar casas de bolsa desde CSV o crear datos de prueba"""
@@ -114,23 +112,24 @@ class DataInitializer:
         # Si existe CSV, cargarlo
         if csv_path.exists():
             print(f"📄 Cargando casas de bolsa desde {csv_path}...")
-            casas_creadas = 0
             
             with open(csv_path, 'r', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
-                for row in reader:
-                    if not self.session.query(CasaBolsaDB).filter_by(rif=row['rif']).first():
-                        casa = CasaBolsaDB(
-                            rif=row['rif'],
-                            nombre=row['nombre'],
-                            sector=row.get('sector', 'Financiero'),
-                            tipo=row.get('tipo', 'Casa de Bolsa')
-                        )
-                        self.session.add(casa)
-                        casas_creadas += 1
+                casas = [
+                    {
+                        'rif': row['rif'],
+                        'nombre': row['nombre'],
+                        'sector': row.get('sector', 'Financiero'),
+                        'tipo': row.get('tipo', 'Casa de Bolsa')
+                    }
+                    for row in reader
+                ]
             
-            self.session.commit()
-            print(f"✅ {casas_creadas} casas de bolsa cargadas desde CSV")
+            # Inserta las nuevas y refresca las existentes (clave: rif)
+            casas_cargadas = BaseRepository(self.db_engine, CasaBolsaDB).bulk_upsert(
+                casas, conflicto=('rif',), lanzar=True
+            )
+            print(f"✅ {casas_cargadas} casas de bolsa cargadas desde CSV")
             return
         
         # Si no hay CSV, crear datos de prueba
@@ -146,13 +145,11 @@ class DataInitializer:
             {"rif": "J-30000007-7", "nombre": "Global Casa de Bolsa", "sector": "Financiero", "tipo": "Casa de Bolsa"},
         ]
         
-        for casa in casas_prueba:
-            if not self.session.query(CasaBolsaDB).filter_by(rif=casa["rif"]).first():
-                casa_db = CasaBolsaDB(**casa)
-                self.session.add(casa_db)
-        
-        self.session.commit()
-        print(f"✅ {len(casas_prueba)} casas de bolsa creadas")
+        # Solo las que falten: no se pisan cambios hechos sobre las existentes
+        casas_creadas = BaseRepository(self.db_engine, CasaBolsaDB).bulk_upsert(
+            casas_prueba, conflicto=('rif',), actualizar=(), lanzar=True
+        )
+        print(f"✅ {casas_creadas} casas de bolsa creadas")
     
     def _load_titulos(self):
         """Cargar titulos desde CSV o crear datos de prueba"""
@@ -161,24 +158,25 @@ class DataInitializer:
         # Si existe CSV, cargarlo
         if csv_path.exists():
             print(f"📄 Cargando titulos desde {csv_path}...")
-            titulos_creados = 0
             
             with open(csv_path, 'r', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
-                for row in reader:
-                    if not self.session.query(TituloDB).filter_by(ticker=row['ticker']).first():
-                        titulo = TituloDB(
-                            rif=row['rif'],
-                            nombre=row['nombre'],
-                            ticker=row['ticker'],
-                            tipo=row['tipo'],
-                            sector=row.get('sector', 'General')
-                        )
-                        self.session.add(titulo)
-                        titulos_creados += 1
+                titulos = [
+                    {
+                        'rif': row['rif'],
+                        'nombre': row['nombre'],
+                        'ticker': row['ticker'],
+                        'tipo': row['tipo'],
+                        'sector': row.get('sector', 'General')
+                    }
+                    for row in reader
+                ]
             
-            self.session.commit()
-            print(f"✅ {titulos_creados} titulos cargados desde CSV")
+            # Inserta los nuevos y refresca los existentes (clave: ticker)
+            titulos_cargados = BaseRepository(self.db_engine, TituloDB).bulk_upsert(
+                titulos, conflicto=('ticker',), lanzar=True
+            )
+            print(f"✅ {titulos_cargados} titulos cargados desde CSV")
             return
         
         # Si no hay CSV, crear datos de prueba
@@ -196,13 +194,11 @@ class DataInitializer:
             {"rif": "J-50000009-9", "nombre": "Cemento Andino", "ticker": "CANDINO", "sector": "Construcción"},
         ]
         
-        for titulo in titulos_prueba:
-            if not self.session.query(TituloDB).filter_by(ticker=titulo["ticker"]).first():
-                titulo_db = TituloDB(**titulo)
-                self.session.add(titulo_db)
-        
-        self.session.commit()
-        print(f"✅ {len(titulos_prueba)} titulos creados")
+        # Solo los que falten: no se pisan cambios hechos sobre los existentes
+        titulos_creados = BaseRepository(self.db_engine, TituloDB).bulk_upsert(
+            titulos_prueba, conflicto=('ticker',), actualizar=(), lanzar=True
+        )
+        print(f"✅ {titulos_creados} titulos creados")
     
     def _create_clientes_prueba(self):
         """Crear 10 clientes de prueba con datos realistas"""
@@ -0,0 +1,128 @@
+"""
+Cálculo vectorizado de rendimientos (TWR y MWR/TIR).
+
+Cada función recibe matrices día × cuenta (una columna por cuenta o
+cliente) y resuelve todas las columnas a la vez, sin recorrer cuentas:
+
+- valor: (dias + 1) × n, valor de cierre; la fila 0 es el cierre del día
+  anterior al rango.
+- flujo: dias × n, aportes netos del día al portafolio (compras con sus
+  comisiones menos ventas netas de comisiones).
+- ingreso: dias × n, ingresos que no quedan en el portafolio (dividendos,
+  menos comisiones cobradas aparte).
+
+Rendimiento diario (TWR): las compras se toman al inicio del día y las
+ventas al cierre, así que el capital expuesto es el cierre anterior más
+lo comprado en el día:
+
+    r_t = (V_t + I_t - V_{t-1} - F_t) / (V_{t-1} + max(F_t, 0))
+
+Un día sin capital expuesto rinde 0. La TIR (MWR) se resuelve con Newton
+sobre la tasa continua del periodo, con el tiempo como fracción del rango,
+para todas las columnas a la vez, y después se anualiza; las columnas sin
+solución (sin flujos, sin cambio de signo) quedan en NaN.
+"""
+
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+# Días por año para anualizar y para los exponentes de la TIR
+DIAS_ANIO = 365.0
+
+# Newton de la TIR: iteraciones máximas y tolerancia sobre la tasa continua
+# del periodo
+ITERACIONES_TIR = 60
+TOLERANCIA_TIR = 1e-10
+
+
+def retornos_diarios(valor: np.ndarray, flujo: np.ndarray, ingreso: np.ndarray) -> np.ndarray:
+    """Rendimiento de cada día y columna (dias × n)"""
+    anterior = valor[:-1]
+    base = anterior + np.maximum(flujo, 0.0)
+    resultado = valor[1:] + ingreso - anterior - flujo
+    
+    retornos = np.zeros_like(base)
+    np.divide(resultado, base, out=retornos, where=base > 0)
+    return retornos
+
+
+def encadenar(retornos: np.ndarray, axis: int = 0) -> np.ndarray:
+    """Rendimiento compuesto de una serie de retornos (TWR)"""
+    return np.prod(1.0 + retornos, axis=axis) - 1.0
+
+
+def retornos_por_periodo(retornos: pd.DataFrame, frecuencia: str = 'M') -> pd.DataFrame:
+    """
+    TWR por periodo calendario ('M' mes, 'Q' trimestre, 'Y' año) a partir
+    de retornos diarios con índice de fechas: una fila por periodo
+    """
+    periodos = retornos.index.to_period(frecuencia)
+    return (1.0 + retornos).groupby(periodos).prod() - 1.0
+
+
+def flujos_inversor(valor: np.ndarray, flujo: np.ndarray, ingreso: np.ndarray) -> np.ndarray:
+    """
+    Flujos desde el punto de vista del inversor ((dias + 1) × n): el valor
+    inicial y los aportes salen (negativos); los ingresos y el valor final
+    entran (positivos)
+    """
+    flujos = np.zeros_like(valor)
+    flujos[0] = -valor[0]
+    flujos[1:] = ingreso - flujo
+    flujos[-1] += valor[-1]
+    return flujos
+
+
+def tir_periodo(flujos: np.ndarray, dias: np.ndarray) -> np.ndarray:
+    """
+    TIR de cada columna de 'flujos' ((dias + 1) × n) como rendimiento del
+    rango completo, con 'dias' los días transcurridos de cada fila. NaN
+    donde no hay solución.
+    
+    Se resuelve la tasa del periodo y no la anual: en un rango corto la
+    tasa anual es enorme (un día al +20% es 1.2^365 - 1) y los pasos
+    acotados de Newton no llegan a ella.
+    """
+    n = flujos.shape[1]
+    fraccion = (dias / dias[-1])[:, None]
+    tasa = np.zeros(n)
+    activa = (flujos > 0).any(axis=0) & (flujos < 0).any(axis=0)
+    convergida = ~activa
+    
+    for _ in range(ITERACIONES_TIR):
+        pendientes = ~convergida
+        if not pendientes.any():
+            break
+        c = flujos[:, pendientes]
+        descuento = np.exp(-fraccion * tasa[pendientes])
+        valor_presente = (c * descuento).sum(axis=0)
+        derivada = -(fraccion * c * descuento).sum(axis=0)
+        
+        paso = np.zeros_like(valor_presente)
+        np.divide(valor_presente, derivada, out=paso, where=derivada != 0)
+        # Pasos acotados: lejos de la raíz la exponencial puede desbordar
+        paso = np.clip(paso, -1.0, 1.0)
+        tasa[pendientes] -= paso
+        convergida[pendientes] = np.abs(paso) < TOLERANCIA_TIR
+    
+    resultado = np.expm1(tasa)
+    resultado[~(activa & convergida)] = np.nan
+    return resultado
+
+
+def anualizar(rendimiento: np.ndarray, dias: int) -> np.ndarray:
+    """Rendimiento de un rango de 'dias' días llevado a tasa anual"""
+    with np.errstate(over='ignore'):
+        return np.power(1.0 + rendimiento, DIAS_ANIO / dias) - 1.0
+
+
+def resumen_rango(valor: np.ndarray, flujo: np.ndarray,
+                  ingreso: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(twr, tir_anual, mwr, ganancia) de cada columna para el rango completo"""
+    dias = flujo.shape[0]
+    twr = encadenar(retornos_diarios(valor, flujo, ingreso))
+    mwr = tir_periodo(flujos_inversor(valor, flujo, ingreso), np.arange(dias + 1, dtype=float))
+    ganancia = valor[-1] - valor[0] - flujo.sum(axis=0) + ingreso.sum(axis=0)
+    return twr, anualizar(mwr, dias), mwr, ganancia
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Cálculo vectorizado de valoración de posiciones.
+
+Cantidades, costos promedio y precios llegan como arreglos de NumPy
+(float64) y las métricas de todas las posiciones se calculan en una sola
+pasada, sin aritmética Decimal fila por fila. Una posición sin precio
+(NaN) no tiene valor de mercado ni ganancia, y no entra en los totales.
+
+Los totales en float64 pueden diferir en fracciones de céntimo de la suma
+exacta; totales_exactos() la recalcula con Decimal para conciliar.
+"""
+
+from decimal import Decimal
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+# Métricas por posición que devuelve valorar_arrays()
+METRICAS = ('valor_mercado', 'costo_total', 'ganancia_perdida', 'rendimiento_pct')
+
+# Diferencia máxima aceptada entre los totales float64 y los exactos
+TOLERANCIA_CONCILIACION = Decimal('0.01')
+
+
+def valorar_arrays(cantidad: np.ndarray, costo_promedio: np.ndarray,
+                   precio: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Métricas de todas las posiciones en una pasada.
+    
+    precio NaN: valor de mercado, ganancia y rendimiento quedan en NaN.
+    Rendimiento 0 cuando el costo total no es positivo.
+    """
+    costo_total = cantidad * costo_promedio
+    valor_mercado = cantidad * precio
+    ganancia_perdida = valor_mercado - costo_total
+    
+    rendimiento_pct = np.zeros_like(costo_total)
+    np.divide(ganancia_perdida * 100.0, costo_total, out=rendimiento_pct, where=costo_total > 0)
+    rendimiento_pct[np.isnan(precio)] = np.nan
+    
+    return {
+        'valor_mercado': valor_mercado,
+        'costo_total': costo_total,
+        'ganancia_perdida': ganancia_perdida,
+        'rendimiento_pct': rendimiento_pct,
+    }
+
+
+def totales(metricas: Dict[str, np.ndarray], mascara: np.ndarray = None) -> Dict[str, float]:
+    """Totales de las posiciones con precio (opcionalmente filtradas por 'mascara')"""
+    con_precio = ~np.isnan(metricas['valor_mercado'])
+    if mascara is not None:
+        con_precio &= mascara
+    
+    valor = float(metricas['valor_mercado'][con_precio].sum())
+    costo = float(metricas['costo_total'][con_precio].sum())
+    ganancia = valor - costo
+    return {
+        'total_posiciones': int(con_precio.sum()),
+        'valor_mercado_total': valor,
+        'inversion_total': costo,
+        'ganancia_perdida_total': ganancia,
+        'rendimiento_total_pct': (ganancia / costo * 100) if costo > 0 else 0.0,
+    }
+
+
+def totales_por_grupo(claves: np.ndarray, metricas: Dict[str, np.ndarray]) -> Dict[int, Dict[str, float]]:
+    """
+    Totales por clave (cuenta, título, cliente) con una sola pasada de
+    bincount por métrica, sin recorrer los grupos.
+    """
+    con_precio = ~np.isnan(metricas['valor_mercado'])
+    unicas, indice = np.unique(claves[con_precio], return_inverse=True)
+    
+    valor = np.bincount(indice, weights=metricas['valor_mercado'][con_precio], minlength=len(unicas))
+    costo = np.bincount(indice, weights=metricas['costo_total'][con_precio], minlength=len(unicas))
+    posiciones = np.bincount(indice, minlength=len(unicas))
+    ganancia = valor - costo
+    rendimiento = np.zeros(len(unicas))
+    np.divide(ganancia * 100.0, costo, out=rendimiento, where=costo > 0)
+    
+    return {
+        int(clave): {
+            'total_posiciones': int(n),
+            'valor_mercado_total': float(v),
+            'inversion_total': float(c),
+            'ganancia_perdida_total': float(g),
+            'rendimiento_total_pct': float(r),
+        }
+        for clave, n, v, c, g, r in zip(
+            unicas.tolist(), posiciones.tolist(), valor.tolist(),
+            costo.tolist(), ganancia.tolist(), rendimiento.tolist()
+        )
+    }
+
+
+def totales_exactos(posiciones: Iterable[Tuple[int, float, float]]) -> Dict[str, Decimal]:
+    """
+    Totales con aritmética Decimal a partir de (cantidad, costo_promedio,
+    precio). Los float se leen por su representación decimal más corta,
+    que es el valor guardado (DECIMAL(20, 8)). Posiciones sin precio no
+    entran, igual que en totales().
+    """
+    valor = Decimal(0)
+    costo = Decimal(0)
+    for cantidad, costo_promedio, precio in posiciones:
+        if precio is None or precio != precio:
+            continue
+        unidades = Decimal(int(cantidad))
+        valor += unidades * Decimal(repr(float(precio)))
+        costo += unidades * Decimal(repr(float(costo_promedio)))
+    return {
+        'valor_mercado_total': valor,
+        'inversion_total': costo,
+        'ganancia_perdida_total': valor - costo,
+    }
\ No newline at end of file